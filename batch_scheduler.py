@@ -0,0 +1,150 @@
+"""
+Cross-file batch scheduling under one global worker budget.
+
+Each running FFmpeg process counts as one worker. The scheduler starts as many
+files at once as the budget allows and hands each file a share of the free
+workers for its own segment parallelism, so a queue of short clips runs many
+files side by side while a single long film gets most of the budget to itself.
+"""
+
+from __future__ import annotations
+
+import contextvars
+import os
+import threading
+from collections import deque
+from collections.abc import Callable, Hashable, Sequence
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Any
+
+from detector import BlackdetectCancelled
+
+
+def default_worker_budget() -> int:
+    return max(1, os.cpu_count() or 1)
+
+
+def worker_share(free: int, waiting: int, useful: int) -> int:
+    """
+    Workers to grant the next file when ``free`` workers are idle.
+
+    The free workers are divided evenly over the files that could start now
+    (at most one worker each), and the grant never exceeds what the file can use.
+    """
+    if free <= 0:
+        return 0
+    starters = max(1, min(waiting, free))
+    return max(1, min(max(1, useful), free // starters))
+
+
+def run_batch(
+    count: int,
+    scan_one: Callable[[int, int], Any],
+    *,
+    useful_jobs: Callable[[int], int] | None = None,
+    budget: int | None = None,
+    order: Sequence[int] | None = None,
+    is_cancelled: Callable[[], bool] | None = None,
+    on_result: Callable[[int, Any], None] | None = None,
+    on_error: Callable[[int, BaseException], None] | None = None,
+    poll_interval: float = 0.1,
+    cancelled_errors: tuple[type[BaseException], ...] = (BlackdetectCancelled,),
+    early_release: bool = False,
+    group_of: Callable[[int], tuple[Hashable, int] | None] | None = None,
+) -> bool:
+    """
+    Run ``scan_one(index, jobs)`` for every index in ``order`` (default ``0..count-1``).
+
+    ``useful_jobs(index)`` is the most segment workers that file can use (1 for
+    short files); ``jobs`` passed to ``scan_one`` is the share granted from
+    ``budget`` free workers. Results go to ``on_result`` and exceptions other than
+    ``cancelled_errors`` to ``on_error``, both called on the calling thread.
+    Returns False when cancelled before every file finished.
+
+    With ``early_release``, ``scan_one(index, jobs, release)`` also gets a
+    ``release()`` it may call (from any thread) each time one of its workers has
+    no more work, so the next file can start on it before this one finishes; a
+    file never releases more than its ``jobs``.
+
+    ``group_of(index)`` may return ``(key, limit)``: at most ``limit`` files with
+    the same key run at once (for example files on one spinning disk). A file
+    whose group is full waits while later files in ``order`` start.
+    """
+    cancel = is_cancelled or (lambda: False)
+    budget = max(1, int(budget or default_worker_budget()))
+    pending: deque[int] = deque(order if order is not None else range(count))
+    running: dict[Future, tuple[int, int]] = {}
+    free = budget
+    released: dict[int, int] = {}
+    groups = {index: group_of(index) for index in pending} if group_of else {}
+    group_running: dict[Hashable, int] = {}
+
+    def next_startable() -> int | None:
+        for index in pending:
+            group = groups.get(index)
+            if group is None or group_running.get(group[0], 0) < max(1, group[1]):
+                return index
+        return None
+
+    lock = threading.Lock()
+    cancelled = False
+
+    def releaser(index: int, jobs: int) -> Callable[[], None]:
+        def release() -> None:
+            nonlocal free
+            with lock:
+                if released.get(index, 0) < jobs:
+                    released[index] = released.get(index, 0) + 1
+                    free += 1
+
+        return release
+
+    # A file that gave its workers back may still be finishing up next to the
+    # files started on them.
+    threads = 2 * budget if early_release else budget
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        while pending or running:
+            if cancel():
+                cancelled = True
+                break
+            while pending and free > 0:
+                index = next_startable()
+                if index is None:
+                    break
+                useful = useful_jobs(index) if useful_jobs else 1
+                with lock:
+                    jobs = worker_share(free, len(pending), useful)
+                    free -= jobs
+                pending.remove(index)
+                group = groups.get(index)
+                if group is not None:
+                    group_running[group[0]] = group_running.get(group[0], 0) + 1
+                args = (index, jobs, releaser(index, jobs)) if early_release else (index, jobs)
+                # The caller's context (its process_governor priority) follows the file.
+                context = contextvars.copy_context()
+                running[pool.submit(context.run, scan_one, *args)] = (index, jobs)
+            done, _ = wait(list(running), timeout=poll_interval, return_when=FIRST_COMPLETED)
+            for fut in done:
+                index, jobs = running.pop(fut)
+                with lock:
+                    free += jobs - released.pop(index, 0)
+                group = groups.get(index)
+                if group is not None:
+                    group_running[group[0]] -= 1
+                try:
+                    result = fut.result()
+                except cancelled_errors:
+                    cancelled = True
+                    continue
+                except Exception as e:
+                    if on_error:
+                        on_error(index, e)
+                    continue
+                if on_result:
+                    on_result(index, result)
+            if cancelled:
+                break
+        if cancelled:
+            for fut in running:
+                fut.cancel()
+    return not cancelled
@@ -2,29 +2,16 @@
 
 from __future__ import annotations
 
-from typing import Any
+from typing import TYPE_CHECKING, Any
 
 from PySide6.QtCore import QThread, Signal
 
-from detector import BlackdetectCancelled, BlackdetectError, detect_black_frames
-from export_utils import get_media_duration_seconds
-from time_windows import expand_scan_time_windows
+from detector import BlackdetectCancelled, BlackdetectError, chapter_times_from_events
+from process_governor import BACKGROUND, FOREGROUND, scan_priority
+from scan_runner import scan_batch, scan_file
 
-
-def _max_analysis_width_from_settings(settings: dict[str, Any]) -> int | None:
-    mw = settings.get("max_analysis_width", 854)
-    if mw is None:
-        return 854
-    mw = int(mw)
-    return mw if mw > 0 else None
-
-
-def _use_hwaccel_from_settings(settings: dict[str, Any]) -> bool:
-    return bool(settings.get("use_hwaccel", False))
-
-
-def _parallel_scan_jobs_from_settings(settings: dict[str, Any]) -> int:
-    return max(1, int(settings.get("parallel_scan_jobs", 4)))
+if TYPE_CHECKING:
+    from scan_checkpoint import BatchCheckpoint
 
 
 def format_eta(seconds: float | None) -> str:
@@ -42,6 +29,10 @@ class EditorBlackdetectWorker(QThread):
     """Single-file scan for the main chapter editor."""
 
     progress_ratio = Signal(float)
+    event_found = Signal(dict)
+    """A black event reported while the scan is still running (preview)."""
+    coarse_report = Signal(object)
+    """The ``CoarseScanReport`` of a coarse-to-fine scan."""
     finished_ok = Signal(list)
     failed = Signal(object)
     canceled = Signal()
@@ -57,31 +48,21 @@ class EditorBlackdetectWorker(QThread):
 
     def run(self) -> None:
         try:
-            duration = get_media_duration_seconds(self.video_path) or 0.0
-            window_list = expand_scan_time_windows(
-                str(self.settings.get("window_list", "") or ""),
-                duration,
-            )
 
             def on_ratio(r: float) -> None:
                 self.progress_ratio.emit(r)
 
-            events = detect_black_frames(
-                self.video_path,
-                min_black_seconds=self.settings["min_black_seconds"],
-                ratio_black_pixels=self.settings["ratio_black_pixels"],
-                black_pixel_threshold=self.settings["black_pixel_threshold"],
-                window_list=window_list,
-                max_analysis_width=_max_analysis_width_from_settings(self.settings),
-                use_hwaccel=_use_hwaccel_from_settings(self.settings),
-                parallel_jobs=_parallel_scan_jobs_from_settings(self.settings),
-                is_cancelled=lambda: self._cancel,
-                on_time_ratio=on_ratio if duration > 0 else None,
-                duration_hint_sec=duration if duration > 0 else None,
-            )
-            chapters = [
-                round(e["black_start"] + (e["black_duration"] / 2), 3) for e in events
-            ]
+            # Queue scans pause until this one is done.
+            with scan_priority(FOREGROUND):
+                events = scan_file(
+                    self.video_path,
+                    self.settings,
+                    is_cancelled=lambda: self._cancel,
+                    on_time_ratio=on_ratio,
+                    on_event=self.event_found.emit,
+                    on_report=self.coarse_report.emit,
+                )
+            chapters = chapter_times_from_events(events)
             self.finished_ok.emit(chapters)
         except BlackdetectCancelled:
             self.canceled.emit()
@@ -90,18 +71,38 @@ class EditorBlackdetectWorker(QThread):
 
 
 class BatchBlackdetectWorker(QThread):
-    """Queue: scan many files with cancel and per-file progress."""
+    """
+    Queue: scan many files concurrently with cancel and per-file progress.
+
+    Runs at background priority: its FFmpeg processes are niced and paused while
+    an editor scan runs. With a ``checkpoint``, progress is saved as files and
+    chunks finish, and work it already holds is not repeated.
+    """
 
     file_progress = Signal(int, int, str, float)
+    plan_ready = Signal(list, int)
+    """(predicted core-seconds per file, CPU budget) before the first file starts."""
+    event_found = Signal(int, dict)
+    """(file index, black event) reported while that file is still scanning."""
+    coarse_report = Signal(int, object)
+    """(file index, ``CoarseScanReport``) of a coarse-to-fine scan."""
     result = Signal(int, list)
     finished = Signal()
+    batch_completed = Signal()
+    """Every file was scanned; unlike ``finished``, not emitted after a cancel."""
     canceled = Signal()
     file_error = Signal(str, str)
 
-    def __init__(self, file_list: list[str], settings: dict[str, Any]):
+    def __init__(
+        self,
+        file_list: list[str],
+        settings: dict[str, Any],
+        checkpoint: BatchCheckpoint | None = None,
+    ):
         super().__init__()
         self.file_list = file_list
         self.settings = settings
+        self.checkpoint = checkpoint
         self._cancel = False
 
     def cancel(self) -> None:
@@ -109,55 +110,37 @@ class BatchBlackdetectWorker(QThread):
 
     def run(self) -> None:
         n = len(self.file_list)
-        for i, path in enumerate(self.file_list):
-            if self._cancel:
-                self.canceled.emit()
-                return
 
-            self.file_progress.emit(i, n, path, 0.0)
+        def on_start(index: int, _jobs: int) -> None:
+            self.file_progress.emit(index, n, self.file_list[index], 0.0)
 
-            duration = get_media_duration_seconds(path) or 0.0
-            window_list = expand_scan_time_windows(
-                str(self.settings.get("window_list", "") or ""),
-                duration,
-            )
+        def on_progress(index: int, ratio: float) -> None:
+            self.file_progress.emit(index, n, self.file_list[index], ratio)
 
-            try:
-
-                def on_ratio(
-                    r: float,
-                    *,
-                    ii: int = i,
-                    nn: int = n,
-                    pp: str = path,
-                ) -> None:
-                    self.file_progress.emit(ii, nn, pp, r)
-
-                events = detect_black_frames(
-                    path,
-                    min_black_seconds=self.settings["min_black_seconds"],
-                    ratio_black_pixels=self.settings["ratio_black_pixels"],
-                    black_pixel_threshold=self.settings["black_pixel_threshold"],
-                    window_list=window_list,
-                    max_analysis_width=_max_analysis_width_from_settings(self.settings),
-                    use_hwaccel=_use_hwaccel_from_settings(self.settings),
-                    parallel_jobs=_parallel_scan_jobs_from_settings(self.settings),
-                    is_cancelled=lambda: self._cancel,
-                    on_time_ratio=on_ratio if duration > 0 else None,
-                    duration_hint_sec=duration if duration > 0 else None,
-                )
-            except BlackdetectCancelled:
-                self.canceled.emit()
-                return
-            except BlackdetectError as e:
-                self.file_error.emit(path, str(e))
-                self.result.emit(i, [])
-                continue
-
-            chapters = [
-                round(e["black_start"] + (e["black_duration"] / 2), 3) for e in events
-            ]
-            self.file_progress.emit(i, n, path, 1.0)
-            self.result.emit(i, chapters)
-
-        self.finished.emit()
+        def on_result(index: int, events: list[dict[str, float]]) -> None:
+            self.file_progress.emit(index, n, self.file_list[index], 1.0)
+            self.result.emit(index, chapter_times_from_events(events))
+
+        def on_error(index: int, err: BaseException) -> None:
+            self.file_error.emit(self.file_list[index], str(err))
+            self.result.emit(index, [])
+
+        with scan_priority(BACKGROUND):
+            completed = scan_batch(
+                self.file_list,
+                self.settings,
+                is_cancelled=lambda: self._cancel,
+                on_start=on_start,
+                on_progress=on_progress,
+                on_result=on_result,
+                on_error=on_error,
+                on_event=self.event_found.emit,
+                on_plan=self.plan_ready.emit,
+                checkpoint=self.checkpoint,
+                on_report=self.coarse_report.emit,
+            )
+        if completed and not self._cancel:
+            self.batch_completed.emit()
+            self.finished.emit()
+        else:
+            self.canceled.emit()
@@ -0,0 +1,559 @@
+"""
+``machap`` command line: headless scanning and export without importing Qt.
+
+``machap scan`` writes one JSON object per input file (JSON Lines) with the black
+events and chapter marks; ``machap export`` reads those lines back and writes
+chapter sidecars or remuxed files; ``machap bench`` times scans of generated test
+videos. Only ``detector``, ``time_windows``, ``export_utils`` and their Qt-free
+helpers are imported.
+"""
+
+from __future__ import annotations
+
+import argparse
+import glob
+import json
+import logging
+import os
+import signal
+import sys
+import tempfile
+import threading
+import time
+from collections.abc import Iterable, Iterator
+from typing import Any, TextIO
+
+from coarse_scan import CoarseScanReport
+from combined_detect import DETECTION_MODES
+from detector import BlackdetectError, chapter_times_from_events
+from export_utils import DEFAULT_EXPORT_JOBS, export_batch
+from process_governor import BACKGROUND, NORMAL, default_governor, scan_priority
+from scan_checkpoint import BatchCheckpoint
+from scan_cost import BATCH_ORDERS
+from scan_metrics import ScanMetrics
+from scan_runner import DEFAULT_SCAN_SETTINGS, SCAN_MODES, scan_batch, staging_from_settings
+from storage_class import STORAGE_CLASSES
+
+logger = logging.getLogger("machap")
+
+_GLOB_CHARS = set("*?[")
+
+
+def expand_inputs(patterns: Iterable[str], files_from: Iterable[str] = ()) -> list[str]:
+    """
+    Expand globs (``**`` is recursive) and list files into a de-duplicated path list.
+
+    ``files_from`` names text files with one path per line; blank lines and lines
+    starting with ``#`` are ignored, and ``-`` reads the list from stdin. Patterns
+    without glob characters are passed through even if they do not exist, so the
+    scan reports them as errors instead of silently skipping them.
+    """
+    out: list[str] = []
+    seen: set[str] = set()
+
+    def add(path: str) -> None:
+        if path not in seen:
+            seen.add(path)
+            out.append(path)
+
+    for pattern in patterns:
+        if _GLOB_CHARS & set(pattern):
+            for match in sorted(glob.glob(pattern, recursive=True)):
+                if os.path.isfile(match):
+                    add(match)
+        else:
+            add(pattern)
+
+    for list_path in files_from:
+        handle: TextIO
+        if list_path == "-":
+            handle = sys.stdin
+        else:
+            handle = open(list_path, encoding="utf-8")
+        try:
+            for line in handle:
+                line = line.strip()
+                if line and not line.startswith("#"):
+                    add(line)
+        finally:
+            if handle is not sys.stdin:
+                handle.close()
+    return out
+
+
+def _settings_from_args(args: argparse.Namespace) -> dict[str, Any]:
+    settings = dict(DEFAULT_SCAN_SETTINGS)
+    settings.update(
+        {
+            "min_black_seconds": args.min_black_seconds,
+            "ratio_black_pixels": args.ratio_black_pixels,
+            "black_pixel_threshold": args.black_pixel_threshold,
+            "window_list": args.windows,
+            "max_analysis_width": args.max_width,
+            "use_hwaccel": args.hwaccel,
+            "parallel_scan_jobs": args.parallel_scan_jobs,
+            "pin_scan_workers": args.pin_cpus,
+            "storage_class": args.storage,
+            **_staging_settings_from_args(args),
+            "cpu_budget": args.jobs,
+            "batch_order": args.order,
+            "force_rescan": args.force_rescan,
+            "luma_index": args.luma_index,
+            "scan_mode": args.scan_mode,
+            "detection_mode": args.detect,
+            "silence_noise_db": args.silence_noise_db,
+        }
+    )
+    return settings
+
+
+def _staging_settings_from_args(args: argparse.Namespace) -> dict[str, Any]:
+    return {
+        "stage_remote_files": args.stage,
+        "staging_dir": args.stage_dir or "",
+        "staging_max_gb": args.stage_max_gb,
+    }
+
+
+def _error_record(path: str, err: BaseException) -> dict[str, Any]:
+    record: dict[str, Any] = {"path": path, "error": str(err)}
+    if isinstance(err, BlackdetectError) and err.stderr:
+        record["stderr_tail"] = err.stderr[-2000:]
+    return record
+
+
+def _write_jsonl(out: TextIO, record: dict[str, Any]) -> None:
+    out.write(json.dumps(record, separators=(",", ":")) + "\n")
+    out.flush()
+
+
+def run_scan(args: argparse.Namespace) -> int:
+    paths = expand_inputs(args.inputs, args.files_from or ())
+    if not paths:
+        logger.error("no input files matched")
+        return 2
+
+    settings = _settings_from_args(args)
+    checkpoint = BatchCheckpoint(args.checkpoint, paths, settings) if args.checkpoint else None
+    cancel = threading.Event()
+    started: dict[int, float] = {}
+    metrics: dict[int, list[dict[str, Any]]] = {}
+    reports: dict[int, dict[str, Any]] = {}
+    metrics_lock = threading.Lock()
+    failures = 0
+    out: TextIO = (
+        sys.stdout if args.output in (None, "-") else open(args.output, "w", encoding="utf-8")
+    )
+
+    def elapsed(index: int) -> float:
+        return round(time.monotonic() - started.get(index, time.monotonic()), 3)
+
+    def on_start(index: int, jobs: int) -> None:
+        started[index] = time.monotonic()
+        logger.debug("%s: start with %d worker(s)", paths[index], jobs)
+
+    def on_metrics(index: int, scan: ScanMetrics) -> None:
+        with metrics_lock:
+            metrics.setdefault(index, []).append(scan.to_dict())
+
+    def on_report(index: int, report: CoarseScanReport) -> None:
+        with metrics_lock:
+            reports[index] = report.as_dict()
+
+    def on_result(index: int, events: list[dict[str, float]]) -> None:
+        record = {
+            "path": paths[index],
+            "events": events,
+            "chapters": chapter_times_from_events(events),
+            "elapsed_sec": elapsed(index),
+        }
+        if index not in started:
+            # Finished in an earlier run recorded in --checkpoint.
+            record["resumed"] = True
+        with metrics_lock:
+            if index in metrics:
+                record["metrics"] = metrics.pop(index)
+            if index in reports:
+                record["coarse"] = reports.pop(index)
+        logger.info(
+            "%s: %d chapter(s) in %.1fs",
+            paths[index],
+            len(record["chapters"]),
+            record["elapsed_sec"],
+        )
+        _write_jsonl(out, record)
+
+    def on_error(index: int, err: BaseException) -> None:
+        nonlocal failures
+        failures += 1
+        logger.warning("%s: %s", paths[index], err)
+        record = _error_record(paths[index], err)
+        record["elapsed_sec"] = elapsed(index)
+        _write_jsonl(out, record)
+
+    # Ctrl+C only raises the cancel flag so running FFmpeg processes are killed
+    # and the scheduler drains instead of leaving worker threads behind.
+    previous_handler = signal.signal(signal.SIGINT, lambda _sig, _frame: cancel.set())
+    if args.max_processes:
+        default_governor().set_limit(args.max_processes)
+    try:
+        with scan_priority(BACKGROUND if args.background else NORMAL):
+            completed = scan_batch(
+                paths,
+                settings,
+                is_cancelled=cancel.is_set,
+                on_start=on_start,
+                on_result=on_result,
+                on_error=on_error,
+                cache=not args.no_cache,
+                on_metrics=on_metrics,
+                checkpoint=checkpoint,
+                on_report=on_report,
+            )
+    finally:
+        signal.signal(signal.SIGINT, previous_handler)
+        if out is not sys.stdout:
+            out.close()
+    if not completed:
+        logger.error("cancelled")
+        return 130
+    if checkpoint is not None and not failures:
+        checkpoint.clear()
+    return 1 if failures else 0
+
+
+def _read_jsonl(paths: Iterable[str]) -> Iterator[dict[str, Any]]:
+    for path in paths:
+        handle = sys.stdin if path == "-" else open(path, encoding="utf-8")
+        try:
+            for line in handle:
+                line = line.strip()
+                if line:
+                    yield json.loads(line)
+        finally:
+            if handle is not sys.stdin:
+                handle.close()
+
+
+def run_export(args: argparse.Namespace) -> int:
+    os.makedirs(args.output_dir, exist_ok=True)
+    items = [
+        {"path": record["path"], "chapters": record["chapters"], "format": args.format}
+        for record in _read_jsonl(args.results)
+        if record.get("path") and not record.get("error") and record.get("chapters")
+    ]
+    cancel = threading.Event()
+    failures = 0
+
+    def on_result(index: int, written: str) -> None:
+        logger.info("%s -> %s", items[index]["path"], written)
+
+    def on_error(index: int, err: BaseException) -> None:
+        nonlocal failures
+        failures += 1
+        logger.warning("%s: %s", items[index]["path"], err)
+
+    previous_handler = signal.signal(signal.SIGINT, lambda _sig, _frame: cancel.set())
+    try:
+        completed = export_batch(
+            items,
+            args.output_dir,
+            max_workers=args.jobs,
+            in_place=args.in_place,
+            is_cancelled=cancel.is_set,
+            staging=staging_from_settings(_staging_settings_from_args(args)),
+            on_result=on_result,
+            on_error=on_error,
+        )
+    finally:
+        signal.signal(signal.SIGINT, previous_handler)
+    if not completed:
+        logger.error("cancelled")
+        return 130
+    return 1 if failures else 0
+
+
+def _int_list(text: str) -> list[int]:
+    return [int(part) for part in text.split(",") if part.strip()]
+
+
+def run_bench(args: argparse.Namespace) -> int:
+    import scan_benchmark
+
+    windows = [w.strip() for w in args.windows.split(",") if w.strip()]
+    unknown = sorted(set(windows) - set(scan_benchmark.WINDOW_LAYOUTS))
+    if unknown:
+        logger.error("unknown window layout(s): %s", ", ".join(unknown))
+        return 2
+    configs = scan_benchmark.default_configs(
+        _int_list(args.parallel_jobs),
+        [w if w > 0 else None for w in _int_list(args.widths)],
+        windows,
+    )
+    videos = scan_benchmark.QUICK_SUITE if args.quick else scan_benchmark.FULL_SUITE
+
+    def on_result(result: dict[str, Any]) -> None:
+        acc = result["accuracy"]
+        logger.info(
+            "%s %s: %.2fs (%.1fx), %d/%d found, drift %.3f/%.3fs",
+            result["video"],
+            result["config"],
+            result["median_wall_sec"],
+            result["speed_x"] or 0.0,
+            acc["matched"],
+            acc["expected"],
+            acc["max_start_drift"],
+            acc["max_end_drift"],
+        )
+
+    report = scan_benchmark.run_suite(
+        videos,
+        configs,
+        directory=args.work_dir,
+        repeat=args.repeat,
+        on_result=on_result,
+    )
+    text = json.dumps(report, indent=2)
+    if args.output in (None, "-"):
+        sys.stdout.write(text + "\n")
+    else:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+
+    if not args.baseline:
+        return 0
+    with open(args.baseline, encoding="utf-8") as f:
+        baseline = json.load(f)
+    problems = scan_benchmark.compare_reports(
+        baseline, report, max_slowdown=args.max_slowdown, max_drift=args.max_drift
+    )
+    for problem in problems:
+        logger.error("regression: %s", problem)
+    return 1 if problems else 0
+
+
+def _add_staging_arguments(parser: argparse.ArgumentParser) -> None:
+    defaults = DEFAULT_SCAN_SETTINGS
+    parser.add_argument(
+        "--stage",
+        action="store_true",
+        help="copy files on network shares to a local staging directory and read the "
+        "copies; the next file is copied while the current one is processed",
+    )
+    parser.add_argument(
+        "--stage-dir",
+        metavar="DIR",
+        help="staging directory (default: 'staging' in the cache directory)",
+    )
+    parser.add_argument(
+        "--stage-max-gb",
+        type=float,
+        default=defaults["staging_max_gb"],
+        help="staging size limit; least recently used copies are evicted (default: %(default)s)",
+    )
+
+
+def build_parser() -> argparse.ArgumentParser:
+    defaults = DEFAULT_SCAN_SETTINGS
+    parser = argparse.ArgumentParser(
+        prog="machap",
+        description="Headless MaChap black-frame chapter scanner and exporter.",
+    )
+    parser.add_argument("-v", "--verbose", action="count", default=0, help="more logging")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    scan = sub.add_parser("scan", help="detect black-frame chapters; write JSON Lines")
+    scan.add_argument("inputs", nargs="*", help="video files or glob patterns")
+    scan.add_argument(
+        "--files-from",
+        action="append",
+        metavar="LIST",
+        help="read paths from LIST, one per line ('-' for stdin); repeatable",
+    )
+    scan.add_argument("-o", "--output", help="JSON Lines output file (default stdout)")
+    scan.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=0,
+        help="global worker budget: FFmpeg processes across all files (default: CPU count)",
+    )
+    scan.add_argument("--min-black-seconds", type=float, default=defaults["min_black_seconds"])
+    scan.add_argument("--ratio-black-pixels", type=float, default=defaults["ratio_black_pixels"])
+    scan.add_argument(
+        "--black-pixel-threshold", type=float, default=defaults["black_pixel_threshold"]
+    )
+    scan.add_argument(
+        "--windows",
+        default=defaults["window_list"],
+        help="scan time windows, same syntax as the GUI ('' scans the whole file)",
+    )
+    scan.add_argument("--max-width", type=int, default=defaults["max_analysis_width"])
+    scan.add_argument(
+        "--parallel-scan-jobs",
+        type=int,
+        default=defaults["parallel_scan_jobs"],
+        help="0 = tune segment jobs and FFmpeg threads per file; 1 = one sequential pass "
+        "per file; otherwise files split the --jobs budget",
+    )
+    scan.add_argument(
+        "--pin-cpus",
+        action="store_true",
+        help="with --parallel-scan-jobs 0, pin each FFmpeg process to its own cores",
+    )
+    scan.add_argument(
+        "--storage",
+        choices=("auto", *STORAGE_CLASSES),
+        default=defaults["storage_class"],
+        help="storage the files are on (auto = detect); hdd and network limit how many "
+        "processes read a file and how many files of one disk or share scan at once",
+    )
+    _add_staging_arguments(scan)
+    scan.add_argument(
+        "--order",
+        choices=BATCH_ORDERS,
+        default=defaults["batch_order"],
+        help="start files by predicted scan time: longest first (shortest total time), "
+        "shortest first (most files done early) or in the given order",
+    )
+    scan.add_argument("--hwaccel", action="store_true", help="pass -hwaccel auto")
+    scan.add_argument("--force-rescan", action="store_true", help="ignore cached results")
+    scan.add_argument("--no-cache", action="store_true", help="neither read nor write the cache")
+    scan.add_argument(
+        "--luma-index", action="store_true", help="scan via the re-tunable luma index"
+    )
+    scan.add_argument(
+        "--scan-mode",
+        choices=SCAN_MODES,
+        default=defaults["scan_mode"],
+        help="full decode, or coarse-to-fine sampling keyframes (nokey) or reference "
+        "frames (noref) first; coarse modes can miss runs shorter than the sample gap",
+    )
+    scan.add_argument(
+        "--detect",
+        choices=DETECTION_MODES,
+        default=defaults["detection_mode"],
+        help="black only, or black runs that are also silent (optionally scored by scene "
+        "cuts) from one decode; events gain silence_overlap, scene_score and score",
+    )
+    scan.add_argument(
+        "--silence-noise-db",
+        type=float,
+        default=defaults["silence_noise_db"],
+        help="audio level counted as silence for --detect black_silence*",
+    )
+    scan.add_argument(
+        "--metrics-log",
+        metavar="FILE",
+        help="append one JSON metrics record per FFmpeg scan pass to FILE",
+    )
+    scan.add_argument(
+        "--checkpoint",
+        metavar="FILE",
+        help="save progress per finished file and chunk to FILE; running the same scan "
+        "again resumes the unfinished work (FILE is deleted once every file succeeded)",
+    )
+    scan.add_argument(
+        "--background",
+        action="store_true",
+        help="run FFmpeg at low CPU priority (nice) and idle I/O priority (ionice)",
+    )
+    scan.add_argument(
+        "--max-processes",
+        type=int,
+        default=0,
+        metavar="N",
+        help="cap on FFmpeg/ffprobe processes at once (default 0: twice the CPU count)",
+    )
+    scan.set_defaults(func=run_scan)
+
+    export = sub.add_parser("export", help="export chapters from 'machap scan' results")
+    export.add_argument("results", nargs="+", help="JSON Lines files from 'scan' ('-' = stdin)")
+    export.add_argument(
+        "-f",
+        "--format",
+        default=defaults["export_format"],
+        help="mp4, mkv, txt (ffmetadata) or mkvmerge_txt",
+    )
+    export.add_argument("-d", "--output-dir", default=".", help="directory for exported files")
+    export.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=DEFAULT_EXPORT_JOBS,
+        help="files remuxed at once; bound by disk bandwidth (default: %(default)s)",
+    )
+    export.add_argument(
+        "--in-place",
+        action="store_true",
+        help="write chapters into MKV/MP4 sources of the same format instead of a copy",
+    )
+    _add_staging_arguments(export)
+    export.set_defaults(func=run_export)
+
+    bench = sub.add_parser(
+        "bench", help="time scans of generated videos against known black frames; write JSON"
+    )
+    bench.add_argument("-o", "--output", help="JSON report file (default stdout)")
+    bench.add_argument(
+        "--work-dir",
+        default=os.path.join(tempfile.gettempdir(), "machap-bench"),
+        help="where generated videos are kept between runs (default: %(default)s)",
+    )
+    bench.add_argument("--quick", action="store_true", help="one short 360p video only")
+    bench.add_argument("--repeat", type=int, default=1, help="runs per case; the median counts")
+    bench.add_argument(
+        "--parallel-jobs", default="1,2,4", help="comma-separated (default: %(default)s)"
+    )
+    bench.add_argument(
+        "--widths",
+        default="0,854,320",
+        help="max analysis widths, 0 = full resolution (default: %(default)s)",
+    )
+    bench.add_argument(
+        "--windows",
+        default="full,span,edges",
+        help="whole file, the default trimmed span, and/or first+last quarter "
+        "(default: %(default)s)",
+    )
+    bench.add_argument("--baseline", help="earlier report; exit 1 on regressions against it")
+    bench.add_argument(
+        "--max-slowdown",
+        type=float,
+        default=1.25,
+        help="allowed wall-time ratio against --baseline (default: %(default)s)",
+    )
+    bench.add_argument(
+        "--max-drift",
+        type=float,
+        default=0.05,
+        help="allowed black start/end error in seconds (default: %(default)s)",
+    )
+    bench.set_defaults(func=run_bench)
+    return parser
+
+
+def _log_metrics_to(path: str) -> None:
+    """Send the ``scan_metrics`` JSON records, and only those, to ``path``."""
+    handler = logging.FileHandler(path, encoding="utf-8")
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    metrics_logger = logging.getLogger("scan_metrics")
+    metrics_logger.setLevel(logging.INFO)
+    metrics_logger.propagate = False
+    metrics_logger.addHandler(handler)
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    level = logging.WARNING - 10 * min(args.verbose, 2)
+    logging.basicConfig(level=level, format="%(levelname)s %(name)s: %(message)s")
+    if getattr(args, "metrics_log", None):
+        _log_metrics_to(args.metrics_log)
+    # CPU time spent so far is interpreter start-up plus imports; no Qt is loaded.
+    logger.debug("startup %.1f ms CPU", time.process_time() * 1000.0)
+    return int(args.func(args))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
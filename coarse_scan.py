@@ -0,0 +1,258 @@
+"""
+Two-phase coarse-to-fine black detection.
+
+Pass 1 decodes only a subset of frames (keyframes, or reference frames) with
+``-skip_frame`` and marks every sampled frame that is black. Pass 2 decodes at full
+frame accuracy only between the non-black samples around each candidate, which is
+exactly where the boundaries of that black run can lie. On long files with little
+black this skips most of the decode.
+
+The trade-off is recall: a black run that contains no sampled frame is invisible
+to pass 1. ``CoarseScanReport.max_sample_gap`` is the longest stretch between
+samples, so any run at least that long is guaranteed to be found.
+"""
+
+from __future__ import annotations
+
+import contextvars
+import logging
+import re
+import threading
+import time
+from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass
+
+from detector import (
+    BlackdetectCancelled,
+    _parse_blackdetect_stderr,
+    _run_blackdetect_stream,
+    build_blackdetect_filter,
+    detect_black_frames,
+)
+from scan_metrics import PROGRESS_ARGS, MetricsRecorder, ScanMetrics
+from time_windows import TimeWindowSet
+
+logger = logging.getLogger(__name__)
+
+# ``-skip_frame`` values: ``nokey`` decodes keyframes only (fastest, samples every
+# GOP); ``noref`` also decodes P-frames and skips only non-reference B-frames.
+COARSE_MODES = ("nokey", "noref")
+
+_SHOWINFO_PTS = re.compile(r"pts_time:\s*(-?[\d.]+)")
+
+
+@dataclass
+class CoarseScanReport:
+    mode: str
+    sampled_frames: int
+    candidates: int
+    max_sample_gap: float
+    refined_seconds: float
+    duration: float
+    coarse_wall_sec: float
+    fine_wall_sec: float
+
+    @property
+    def decoded_fraction(self) -> float:
+        """Share of the file decoded at full frame rate in pass 2."""
+        return self.refined_seconds / self.duration if self.duration > 0 else 1.0
+
+    def as_dict(self) -> dict[str, float | int | str]:
+        d = asdict(self)
+        d["decoded_fraction"] = round(self.decoded_fraction, 4)
+        return d
+
+    def summary(self) -> str:
+        """One line on the decode savings and the recall bound, for logs and status text."""
+        return (
+            f"{self.sampled_frames} samples, {self.candidates} candidate region(s), "
+            f"{100.0 * self.decoded_fraction:.1f}% decoded at full rate; black runs shorter "
+            f"than {self.max_sample_gap:.2f}s without a sampled frame can be missed"
+        )
+
+
+def _coarse_cmd(video_path: str, vf_filter: str, mode: str, use_hwaccel: bool) -> list[str]:
+    cmd = ["ffmpeg"]
+    if use_hwaccel:
+        cmd += ["-hwaccel", "auto"]
+    cmd += ["-hide_banner", *PROGRESS_ARGS, "-skip_frame", mode, "-i", video_path]
+    cmd += ["-vf", vf_filter, "-an", "-sn", "-f", "null", "-"]
+    return cmd
+
+
+def candidate_regions(
+    sample_times: list[float],
+    black_events: list[dict[str, float]],
+    duration: float,
+    *,
+    pad: float = 0.5,
+) -> list[tuple[float, float]]:
+    """
+    Regions to re-scan at full frame rate, merged and sorted.
+
+    A coarse run starts at a black sample and ends at the next (non-black) sample,
+    so the exact run lies between the sample before its start and its end; that
+    span plus ``pad`` seconds either side is refined.
+    """
+    times = sorted(sample_times)
+    regions: list[tuple[float, float]] = []
+    for e in black_events:
+        start = e["black_start"]
+        end = e.get("black_end", start + e.get("black_duration", 0.0))
+        before = [t for t in times if t < start - 1e-6]
+        after = [t for t in times if t >= end - 1e-6]
+        lo = (before[-1] if before else 0.0) - pad
+        hi = (after[0] if after else (duration if duration > 0 else end)) + pad
+        if duration > 0:
+            hi = min(hi, duration)
+        regions.append((max(0.0, lo), max(hi, end)))
+    regions.sort()
+    merged: list[tuple[float, float]] = []
+    for lo, hi in regions:
+        if merged and lo <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], hi))
+        else:
+            merged.append((lo, hi))
+    return merged
+
+
+def max_sample_gap(sample_times: list[float], duration: float) -> float:
+    """Longest interval without a sampled frame, including the file head and tail."""
+    times = sorted(sample_times)
+    if not times:
+        return duration
+    edges = [0.0, *times, max(duration, times[-1])]
+    return max(b - a for a, b in zip(edges, edges[1:]))
+
+
+def detect_black_frames_coarse_to_fine(
+    video_path: str,
+    min_black_seconds: float = 0.4,
+    ratio_black_pixels: float = 0.98,
+    black_pixel_threshold: float = 0.08,
+    window_list: list[tuple[float, float]] | None = None,
+    *,
+    mode: str = "nokey",
+    max_analysis_width: int | None = 854,
+    use_hwaccel: bool = False,
+    parallel_jobs: int = 1,
+    is_cancelled: Callable[[], bool] | None = None,
+    on_time_ratio: Callable[[float], None] | None = None,
+    duration_hint_sec: float | None = None,
+    on_report: Callable[[CoarseScanReport], None] | None = None,
+    on_event: Callable[[dict[str, float]], None] | None = None,
+    on_metrics: Callable[[ScanMetrics], None] | None = None,
+) -> list[dict[str, float]]:
+    """
+    ``detect_black_frames`` via a sampled pass plus full-rate refinement.
+
+    Returns the same event list a full scan would for every black run that
+    contains a sampled frame. ``parallel_jobs`` regions are refined concurrently.
+    ``on_report`` receives a ``CoarseScanReport`` with the decode savings and the
+    recall bound; it is also logged. ``on_event`` receives each refined event as
+    its region finishes. ``on_metrics`` receives one ``ScanMetrics`` for the sampled
+    pass (mode ``"coarse"``) and one per refined region.
+    """
+    if mode not in COARSE_MODES:
+        raise ValueError(f"Unknown coarse scan mode {mode!r}")
+    cancel = is_cancelled or (lambda: False)
+    duration = float(duration_hint_sec or 0.0)
+
+    def coarse_progress(r: float) -> None:
+        if on_time_ratio:
+            on_time_ratio(0.3 * r)
+
+    t0 = time.monotonic()
+    vf = "showinfo," + build_blackdetect_filter(
+        0.0, ratio_black_pixels, black_pixel_threshold, max_analysis_width
+    )
+    samples: list[float] = []
+
+    def collect_sample(line: str) -> None:
+        if "showinfo" in line and (m := _SHOWINFO_PTS.search(line)):
+            samples.append(float(m.group(1)))
+
+    recorder = MetricsRecorder(video_path, "coarse", on_metrics)
+    stderr = _run_blackdetect_stream(
+        _coarse_cmd(video_path, vf, mode, use_hwaccel),
+        cancel,
+        coarse_progress if on_time_ratio else None,
+        duration if duration > 0 else None,
+        on_line=collect_sample,
+        recorder=recorder,
+    )
+    recorder.finish()
+    coarse_events = _parse_blackdetect_stderr(stderr)
+    if duration <= 0 and samples:
+        duration = samples[-1]
+    regions = candidate_regions(samples, coarse_events, duration)
+    if window_list:
+        regions = [
+            (lo, hi)
+            for lo, hi in regions
+            if any(lo <= w_hi and w_lo <= hi for w_lo, w_hi in window_list)
+        ]
+    t1 = time.monotonic()
+
+    refined_total = sum(hi - lo for lo, hi in regions) or 1.0
+    done = [0.0]
+    done_lock = threading.Lock()
+
+    window_set = TimeWindowSet(window_list or [])
+
+    def in_windows(e: dict[str, float]) -> bool:
+        return not window_set or e["black_start"] in window_set
+
+    def refine(region: tuple[float, float]) -> list[dict[str, float]]:
+        if cancel():
+            raise BlackdetectCancelled()
+        events = detect_black_frames(
+            video_path,
+            min_black_seconds=min_black_seconds,
+            ratio_black_pixels=ratio_black_pixels,
+            black_pixel_threshold=black_pixel_threshold,
+            window_list=[region],
+            max_analysis_width=max_analysis_width,
+            use_hwaccel=use_hwaccel,
+            parallel_jobs=1,
+            is_cancelled=cancel,
+            duration_hint_sec=duration if duration > 0 else None,
+            on_metrics=on_metrics,
+        )
+        if on_event:
+            for e in events:
+                if in_windows(e):
+                    on_event(e)
+        with done_lock:
+            done[0] += region[1] - region[0]
+            if on_time_ratio:
+                on_time_ratio(0.3 + 0.7 * min(1.0, done[0] / refined_total))
+        return events
+
+    events: list[dict[str, float]] = []
+    if regions:
+        with ThreadPoolExecutor(max_workers=max(1, min(parallel_jobs, len(regions)))) as pool:
+            # Refine processes keep the caller's process_governor priority.
+            contexts = [contextvars.copy_context() for _ in regions]
+            for found in pool.map(lambda ctx, region: ctx.run(refine, region), contexts, regions):
+                events.extend(found)
+    events.sort(key=lambda e: e["black_start"])
+    events = [e for e in events if in_windows(e)]
+    if on_time_ratio:
+        on_time_ratio(1.0)
+
+    report = CoarseScanReport(
+        mode=mode,
+        sampled_frames=len(samples),
+        candidates=len(regions),
+        max_sample_gap=round(max_sample_gap(samples, duration), 3),
+        refined_seconds=round(sum(hi - lo for lo, hi in regions), 3),
+        duration=round(duration, 3),
+        coarse_wall_sec=round(t1 - t0, 3),
+        fine_wall_sec=round(time.monotonic() - t1, 3),
+    )
+    logger.info("coarse-to-fine %s: %s", video_path, report.summary())
+    if on_report:
+        on_report(report)
+    return events
@@ -0,0 +1,298 @@
+"""
+Black + silence (+ scene change) detection from one FFmpeg decode.
+
+One ``-filter_complex`` runs ``blackdetect`` (optionally followed by scene scoring)
+on the first video stream and ``silencedetect`` on the first audio stream, so the
+file is demuxed and decoded once. The three event streams are combined into a
+scored list of chapter candidates: black runs, annotated with how much of the run
+is silent and how sharp the cut around it is.
+"""
+
+from __future__ import annotations
+
+import logging
+import re
+from collections.abc import Callable
+
+from detector import (
+    WINDOW_PAD_SECONDS,
+    _parse_blackdetect_stderr,
+    _run_blackdetect_stream,
+    _shift_events,
+    build_blackdetect_filter,
+)
+from media_probe import probe_media
+from scan_metrics import PROGRESS_ARGS, MetricsRecorder, ScanMetrics
+from time_windows import TimeWindowSet, merge_time_windows
+
+logger = logging.getLogger(__name__)
+
+# ``black`` keeps the plain blackdetect scan; the others use the fused filtergraph.
+DETECTION_MODES = ("black", "black_silence", "black_silence_scene")
+
+DEFAULT_SILENCE_NOISE_DB = -50.0
+DEFAULT_SILENCE_MIN_SECONDS = 0.3
+DEFAULT_SCENE_THRESHOLD = 0.3
+# A scene cut this close to either end of a black run counts towards its score.
+SCENE_EDGE_WINDOW = 1.0
+
+_SILENCE_START = re.compile(r"silence_start:\s*(-?[\d.]+)")
+_SILENCE_END = re.compile(r"silence_end:\s*(-?[\d.]+)")
+_META_PTS = re.compile(r"pts_time:\s*(-?[\d.]+)")
+_SCENE_SCORE = re.compile(r"lavfi\.scene_score=([\d.]+)")
+
+
+def _is_result_line(line: str) -> bool:
+    return "black_start" in line or "silencedetect" in line or "Parsed_metadata" in line
+
+
+def build_combined_filter(
+    video_filter: str,
+    *,
+    audio: bool,
+    silence_noise_db: float = DEFAULT_SILENCE_NOISE_DB,
+    silence_min_seconds: float = DEFAULT_SILENCE_MIN_SECONDS,
+    scene_threshold: float | None = None,
+) -> tuple[str, list[str]]:
+    """
+    ``-filter_complex`` graph and its output labels for ``-map``.
+
+    ``video_filter`` is a ``build_blackdetect_filter`` chain. Scene scoring runs
+    after ``blackdetect`` (on the downscaled frames) and only prints frames whose
+    score exceeds ``scene_threshold``.
+    """
+    video = f"[0:v:0]{video_filter}"
+    if scene_threshold is not None:
+        video += f",select='gt(scene\\,{scene_threshold})',metadata=print:key=lavfi.scene_score"
+    parts = [f"{video}[v]"]
+    labels = ["[v]"]
+    if audio:
+        parts.append(f"[0:a:0]silencedetect=n={silence_noise_db}dB:d={silence_min_seconds}[a]")
+        labels.append("[a]")
+    return ";".join(parts), labels
+
+
+def _combined_cmd(
+    video_path: str,
+    graph: str,
+    labels: list[str],
+    *,
+    use_hwaccel: bool,
+    ss_before_input: float | None = None,
+    output_duration: float | None = None,
+) -> list[str]:
+    cmd: list[str] = ["ffmpeg"]
+    if use_hwaccel:
+        cmd += ["-hwaccel", "auto"]
+    cmd += ["-hide_banner", *PROGRESS_ARGS]
+    if ss_before_input is not None and ss_before_input > 0:
+        cmd += ["-ss", f"{ss_before_input:.4f}"]
+    cmd += ["-i", video_path]
+    if output_duration is not None and output_duration > 0:
+        cmd += ["-t", f"{output_duration:.4f}"]
+    cmd += ["-filter_complex", graph]
+    for label in labels:
+        cmd += ["-map", label]
+    cmd += ["-sn", "-f", "null", "-"]
+    return cmd
+
+
+def parse_silencedetect_stderr(stderr: str, end_of_file: float = 0.0) -> list[dict[str, float]]:
+    """
+    ``silence_start`` / ``silence_end`` pairs from ``silencedetect`` output.
+
+    Silence still open when the stream ends is closed at ``end_of_file`` (or
+    dropped when that is unknown).
+    """
+    events: list[dict[str, float]] = []
+    start: float | None = None
+    for ln in stderr.splitlines():
+        if "silencedetect" not in ln:
+            continue
+        m = _SILENCE_START.search(ln)
+        if m:
+            start = float(m.group(1))
+            continue
+        m = _SILENCE_END.search(ln)
+        if m and start is not None:
+            end = float(m.group(1))
+            events.append(
+                {
+                    "silence_start": start,
+                    "silence_end": end,
+                    "silence_duration": round(end - start, 6),
+                }
+            )
+            start = None
+    if start is not None and end_of_file > start:
+        events.append(
+            {
+                "silence_start": start,
+                "silence_end": end_of_file,
+                "silence_duration": round(end_of_file - start, 6),
+            }
+        )
+    return events
+
+
+def parse_scene_scores(stderr: str) -> list[tuple[float, float]]:
+    """``(pts_time, scene_score)`` for every frame printed by ``metadata=print``."""
+    scores: list[tuple[float, float]] = []
+    pts: float | None = None
+    for ln in stderr.splitlines():
+        if "Parsed_metadata" not in ln:
+            continue
+        m = _META_PTS.search(ln)
+        if m:
+            pts = float(m.group(1))
+            continue
+        m = _SCENE_SCORE.search(ln)
+        if m and pts is not None:
+            scores.append((pts, float(m.group(1))))
+            pts = None
+    return scores
+
+
+def score_candidates(
+    black_events: list[dict[str, float]],
+    silence_events: list[dict[str, float]],
+    scene_scores: list[tuple[float, float]] | None = None,
+    *,
+    scene_window: float = SCENE_EDGE_WINDOW,
+) -> list[dict[str, float]]:
+    """
+    Black events annotated as chapter candidates, sorted by time.
+
+    Each event gains ``silence_overlap`` (fraction of the run that is silent),
+    ``scene_score`` (strongest cut within ``scene_window`` of the run, 0 when scene
+    scoring was off) and ``score`` in 0..1: half for being black, 0.3 weighted by
+    silence overlap and 0.2 weighted by the cut score.
+    """
+    out: list[dict[str, float]] = []
+    for e in sorted(black_events, key=lambda ev: ev["black_start"]):
+        start = e["black_start"]
+        end = e.get("black_end", start + e["black_duration"])
+        silent = 0.0
+        for s in silence_events:
+            silent += max(0.0, min(end, s["silence_end"]) - max(start, s["silence_start"]))
+        overlap = min(1.0, silent / (end - start)) if end > start else 0.0
+        scene = max(
+            (
+                score
+                for t, score in scene_scores or []
+                if start - scene_window <= t <= end + scene_window
+            ),
+            default=0.0,
+        )
+        candidate = dict(e)
+        candidate["silence_overlap"] = round(overlap, 4)
+        candidate["scene_score"] = round(min(1.0, scene), 4)
+        candidate["score"] = round(0.5 + 0.3 * overlap + 0.2 * min(1.0, scene), 4)
+        out.append(candidate)
+    return out
+
+
+def detect_chapter_candidates(
+    video_path: str,
+    min_black_seconds: float = 0.4,
+    ratio_black_pixels: float = 0.98,
+    black_pixel_threshold: float = 0.08,
+    window_list: list[tuple[float, float]] | None = None,
+    *,
+    max_analysis_width: int | None = 854,
+    use_hwaccel: bool = False,
+    silence_noise_db: float = DEFAULT_SILENCE_NOISE_DB,
+    silence_min_seconds: float = DEFAULT_SILENCE_MIN_SECONDS,
+    scene_threshold: float | None = None,
+    require_silence: bool = True,
+    is_cancelled: Callable[[], bool] | None = None,
+    on_time_ratio: Callable[[float], None] | None = None,
+    duration_hint_sec: float | None = None,
+    on_metrics: Callable[[ScanMetrics], None] | None = None,
+) -> list[dict[str, float]]:
+    """
+    Scored black + silence (+ scene) chapter candidates from a single decode.
+
+    Returns ``score_candidates`` output. With ``require_silence`` only black runs
+    that overlap silence are kept, unless the file has no audio stream, in which
+    case every black run is kept and a warning is logged. ``scene_threshold`` turns
+    on scene-change scoring. Each scan window (merged and padded as in
+    ``detect_black_frames``) is decoded by its own ``-ss`` / ``-t`` pass, one after
+    another. The fused graph runs as one process per pass, whose ``ScanMetrics``
+    (mode ``"combined"``) go to ``on_metrics``.
+    """
+    cancel = is_cancelled or (lambda: False)
+    info = probe_media(video_path)
+    audio = info is not None and info.has_audio
+    if not audio:
+        logger.warning("%s has no audio stream; scoring black runs only", video_path)
+    video_filter = build_blackdetect_filter(
+        min_black_seconds, ratio_black_pixels, black_pixel_threshold, max_analysis_width
+    )
+    graph, labels = build_combined_filter(
+        video_filter,
+        audio=audio,
+        silence_noise_db=silence_noise_db,
+        silence_min_seconds=silence_min_seconds,
+        scene_threshold=scene_threshold,
+    )
+
+    duration = float(duration_hint_sec) if duration_hint_sec else 0.0
+    windows = merge_time_windows(window_list or [], duration)
+    window_set = TimeWindowSet(windows)
+    # (-ss, -t) of each pass: the whole file, or each window padded like the
+    # detector's windowed scan so time between windows is never decoded.
+    passes: list[tuple[float, float | None]] = [(0.0, None)]
+    if windows:
+        padded = merge_time_windows(
+            [(lo - WINDOW_PAD_SECONDS, hi + WINDOW_PAD_SECONDS) for lo, hi in windows],
+            duration,
+        )
+        passes = [(lo, hi - lo) for lo, hi in padded]
+    total = sum(t_out or 0.0 for _ss, t_out in passes)
+
+    def pass_ratio(base: float, length: float) -> Callable[[float], None]:
+        return lambda r: on_time_ratio((base + r * length) / total)
+
+    black: list[dict[str, float]] = []
+    silence: list[dict[str, float]] = []
+    scenes: list[tuple[float, float]] = []
+    done = 0.0
+    for ss_in, t_out in passes:
+        ratio_dur = t_out if t_out else (duration if duration > 0 else None)
+        on_ratio = on_time_ratio
+        if on_time_ratio and t_out and len(passes) > 1:
+            on_ratio = pass_ratio(done, t_out)
+        recorder = MetricsRecorder(video_path, "combined", on_metrics)
+        stderr = _run_blackdetect_stream(
+            _combined_cmd(
+                video_path,
+                graph,
+                labels,
+                use_hwaccel=use_hwaccel,
+                ss_before_input=ss_in,
+                output_duration=t_out,
+            ),
+            cancel,
+            on_ratio,
+            ratio_dur,
+            keep_line=_is_result_line,
+            recorder=recorder,
+        )
+        recorder.finish()
+        done += t_out or 0.0
+        pass_black = _parse_blackdetect_stderr(stderr)
+        _shift_events(pass_black, ss_in)
+        black.extend(pass_black)
+        for s in parse_silencedetect_stderr(stderr, ratio_dur or 0.0):
+            s["silence_start"] += ss_in
+            s["silence_end"] += ss_in
+            silence.append(s)
+        scenes.extend((t + ss_in, score) for t, score in parse_scene_scores(stderr))
+
+    candidates = score_candidates(black, silence, scenes if scene_threshold is not None else None)
+    if require_silence and audio:
+        candidates = [c for c in candidates if c["silence_overlap"] > 0]
+    if window_set:
+        candidates = [c for c in candidates if c["black_start"] in window_set]
+    return candidates
@@ -1,17 +1,43 @@
 from __future__ import annotations
 
 import re
-import subprocess
-import threading
 import time
 from collections.abc import Callable
-from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from datetime import timedelta
+from typing import TYPE_CHECKING, Any
+
+from ffmpeg_engine import ProcessJob, cpu_slices, run_processes
+from keyframes import keyframe_spans_near, probe_keyframes_near, stitch_segment_events
+from scan_metrics import (
+    PROGRESS_ARGS,
+    MetricsRecorder,
+    ProcessMetrics,
+    ProgressParser,
+    ScanMetrics,
+    progress_time_seconds,
+    read_process_io,
+)
+from time_windows import TimeWindowSet, merge_time_windows
+
+if TYPE_CHECKING:
+    from scan_checkpoint import FileCheckpoint
 
 _FFMPEG_STATUS_TIME = re.compile(r"time=\s*(\d+):(\d+):(\d+(?:\.\d+)?)")
 _OUT_TIME_US = re.compile(r"out_time_us=(\d+)")
 _OUT_TIME_MS = re.compile(r"out_time_ms=(\d+)")
 
+# Parallel segment scans only pay off on spans of at least a minute, with slices of
+# at least ~30 s each; beyond that the cap only guards against absurd job counts.
+MIN_PARALLEL_SCAN_SECONDS = 60.0
+MIN_SEGMENT_SECONDS = 30.0
+MAX_PARALLEL_JOBS = 64
+# Scan windows are decoded this much wider on each side, so black runs crossing a
+# window edge are seen whole and kept or dropped by start time as in a full pass.
+WINDOW_PAD_SECONDS = 5.0
+# With a checkpoint, a long span scanned by one process is read in chunks of this
+# length, so an interrupted scan loses at most one chunk.
+CHECKPOINT_CHUNK_SECONDS = 600.0
+
 
 class BlackdetectError(Exception):
     """FFmpeg blackdetect failed or produced no usable output."""
@@ -71,6 +97,28 @@ def build_blackdetect_filter(
     return bd
 
 
+def useful_parallel_jobs(span_sec: float, requested: int) -> int:
+    """
+    Number of FFmpeg processes ``detect_black_frames`` runs for a span of ``span_sec``.
+
+    Returns 1 when the span is too short (or unknown) for a parallel scan.
+    """
+    if requested < 2 or span_sec < MIN_PARALLEL_SCAN_SECONDS:
+        return 1
+    return max(2, min(int(requested), MAX_PARALLEL_JOBS, int(span_sec / MIN_SEGMENT_SECONDS)))
+
+
+def window_parallel_jobs(windows: list[tuple[float, float]], requested: int) -> list[int]:
+    """
+    FFmpeg processes for each of ``windows`` when they share ``requested`` jobs.
+
+    Each window gets a share proportional to its length, at least one process,
+    and no more than ``useful_parallel_jobs`` allows for its span.
+    """
+    total = sum(hi - lo for lo, hi in windows) or 1.0
+    return [useful_parallel_jobs(hi - lo, int(requested * (hi - lo) / total)) for lo, hi in windows]
+
+
 def segment_scan_spans(duration: float, jobs: int, overlap: float) -> list[tuple[float, float]]:
     """
     Return ``(ss_start, length)`` pairs for parallel scans using ``-ss`` before ``-i``.
@@ -91,22 +139,33 @@ def segment_scan_spans(duration: float, jobs: int, overlap: float) -> list[tuple
     return spans
 
 
+def _is_blackdetect_line(line: str) -> bool:
+    return "black_start" in line
+
+
+def _parse_blackdetect_line(line: str) -> dict[str, float] | None:
+    """One ``black_start:… black_end:… black_duration:…`` line, or None."""
+    if not _is_blackdetect_line(line):
+        return None
+    event: dict[str, float] = {}
+    for part in line.split():
+        if ":" not in part:
+            continue
+        key, _, value = part.partition(":")
+        try:
+            event[key] = float(value)
+        except ValueError:
+            continue
+    if "black_start" in event and "black_duration" in event:
+        return event
+    return None
+
+
 def _parse_blackdetect_stderr(stderr: str) -> list[dict[str, float]]:
     black_events: list[dict[str, float]] = []
     for ln in stderr.splitlines():
-        if "black_start" not in ln:
-            continue
-        parts = ln.split()
-        event: dict[str, float] = {}
-        for part in parts:
-            if ":" not in part:
-                continue
-            key, _, value = part.partition(":")
-            try:
-                event[key] = float(value)
-            except ValueError:
-                continue
-        if "black_start" in event and "black_duration" in event:
+        event = _parse_blackdetect_line(ln)
+        if event is not None:
             black_events.append(event)
     return black_events
 
@@ -130,6 +189,97 @@ def _merge_overlapping_events(
     return out
 
 
+def _shift_events(events: list[dict[str, float]], offset: float) -> None:
+    """Move segment-local event times onto the file timeline in place."""
+    for e in events:
+        e["black_start"] = round(e["black_start"] + offset, 4)
+        if "black_end" in e:
+            e["black_end"] = round(e["black_end"] + offset, 4)
+
+
+def _weighted_progress(
+    slots: list[float],
+    spans: list[tuple[float, float]],
+    total_len: float,
+) -> float:
+    return sum(r * length for r, (_start, length) in zip(slots, spans)) / total_len
+
+
+def chunk_split_points(
+    lo: float,
+    hi: float,
+    workers: int,
+    min_chunk: float = MIN_SEGMENT_SECONDS,
+) -> list[float]:
+    """
+    Interior split points of ``[lo, hi)`` for ``workers`` pulling chunks off a queue.
+
+    Chunk lengths follow guided self-scheduling: each is what is left divided by
+    ``2 * workers``, but at least ``min_chunk``. Early chunks are long (few process
+    starts) and the last ones short, so however unevenly parts of the file decode,
+    the workers run out of work within about one short chunk of each other.
+    """
+    points: list[float] = []
+    pos = lo
+    while True:
+        pos += max(min_chunk, (hi - pos) / (2 * max(1, workers)))
+        if hi - pos < min_chunk:
+            return points
+        points.append(pos)
+
+
+def _keyframe_segment_spans(
+    video_path: str,
+    lo: float,
+    hi: float,
+    targets: list[float],
+) -> list[tuple[float, float]] | None:
+    """
+    ``(start, length)`` spans covering ``[lo, hi)`` split at the keyframes nearest
+    to ``targets``, or None.
+
+    None means the keyframe lookup failed or found too few keyframes to split,
+    and the caller falls back to overlapping equal slices.
+    """
+    keyframes = probe_keyframes_near(video_path, targets)
+    if not keyframes:
+        return None
+    # Boundaries are passed to FFmpeg with 4 decimals; round here so the -ss of one
+    # segment and the -t of the previous one agree exactly.
+    spans = keyframe_spans_near([round(k, 4) for k in keyframes], lo, hi, targets)
+    if len(spans) < 2:
+        return None
+    return spans
+
+
+def _window_segment_spans(
+    video_path: str,
+    lo: float,
+    hi: float,
+    jobs: int,
+    min_chunk: float = MIN_SEGMENT_SECONDS,
+    max_chunk: float | None = None,
+) -> tuple[list[tuple[float, float]], bool]:
+    """
+    ``(start, length)`` chunks covering ``[lo, hi)`` for ``jobs`` workers, and
+    whether they meet on keyframes (and so are scanned with ``d=0`` and stitched)
+    rather than being ``jobs`` equal slices overlapping by 4 s. With one job and
+    ``max_chunk``, the span is cut into keyframe-aligned chunks of about that
+    length (or left whole).
+    """
+    if jobs < 2 and max_chunk:
+        targets = [lo + k * max_chunk for k in range(1, int((hi - lo) / max_chunk))]
+        aligned = _keyframe_segment_spans(video_path, lo, hi, targets) if targets else None
+        return (aligned, True) if aligned is not None else ([(lo, hi - lo)], False)
+    targets = chunk_split_points(lo, hi, jobs, min_chunk)
+    if jobs < 2 or not targets:
+        return [(lo, hi - lo)], False
+    aligned = _keyframe_segment_spans(video_path, lo, hi, targets)
+    if aligned is not None:
+        return aligned, True
+    return [(lo + start, length) for start, length in segment_scan_spans(hi - lo, jobs, 4.0)], False
+
+
 def _ffmpeg_cmd(
     video_path: str,
     vf_filter: str,
@@ -137,11 +287,18 @@ def _ffmpeg_cmd(
     use_hwaccel: bool,
     ss_before_input: float | None = None,
     output_duration: float | None = None,
+    threads: int | None = None,
+    filter_threads: int | None = None,
 ) -> list[str]:
     cmd: list[str] = ["ffmpeg"]
     if use_hwaccel:
         cmd += ["-hwaccel", "auto"]
-    cmd += ["-hide_banner", "-stats_period", "1"]
+    cmd += ["-hide_banner", *PROGRESS_ARGS]
+    if filter_threads:
+        cmd += ["-filter_threads", str(int(filter_threads))]
+    if threads:
+        # Before -i, so it sets the decoder's thread count.
+        cmd += ["-threads", str(int(threads))]
     if ss_before_input is not None and ss_before_input > 0:
         cmd += ["-ss", f"{ss_before_input:.4f}"]
     cmd += ["-i", video_path]
@@ -151,112 +308,134 @@ def _ffmpeg_cmd(
     return cmd
 
 
-def _run_blackdetect_stream(
+class _ScanJob(ProcessJob):
+    """A scan process plus what its ``-progress`` blocks reported."""
+
+    def __init__(self, cmd: list[str], **kwargs) -> None:
+        super().__init__(cmd, **kwargs)
+        self.progress = ProgressParser()
+        self.bytes_read: int | None = None
+
+    def metrics(self) -> ProcessMetrics:
+        return ProcessMetrics.from_job(self, self.progress, self.bytes_read)
+
+
+def _blackdetect_job(
     cmd: list[str],
-    cancel: Callable[[], bool],
     on_time_ratio: Callable[[float], None] | None,
     duration_for_ratio: float | None,
     *,
-    active_procs: list[subprocess.Popen] | None = None,
-    procs_lock: threading.Lock | None = None,
-) -> str:
-    """Run ffmpeg, stream stderr; return full stderr text. Raises on failure/cancel."""
-    t0 = time.monotonic()
-    last_ratio: list[float] = [0.0]
-    idle = 0
+    on_line: Callable[[str], None] | None = None,
+    keep_line: Callable[[str], bool] = _is_blackdetect_line,
+    cpus: set[int] | None = None,
+) -> _ScanJob:
+    """
+    ``_ScanJob`` for one FFmpeg run that reports decode progress as a ratio.
 
-    proc = subprocess.Popen(
+    Progress comes from the ``-progress`` blocks on stderr, which are not passed on
+    to ``on_line``.
+    """
+    last_ratio: list[float] = [0.0]
+    track = bool(on_time_ratio and duration_for_ratio and duration_for_ratio > 0)
+
+    def guess_from_wall(wall: float) -> None:
+        # Wall-clock hint when FFmpeg reports no output time (N/A on some
+        # Blu-ray / VC-1 / odd containers). Assume decode often runs well below
+        # realtime; keep this conservative so the bar does not race to 100%.
+        guess = min(0.92, wall / max(duration_for_ratio * 8.0, 30.0))
+        last_ratio[0] = max(last_ratio[0], guess)
+        on_time_ratio(last_ratio[0])
+
+    def handle_block(block: dict[str, str]) -> None:
+        pid = job.pid
+        if pid is not None:
+            job.bytes_read = read_process_io(pid) or job.bytes_read
+        if not track:
+            return
+        ts = progress_time_seconds(block)
+        if ts is None:
+            guess_from_wall(time.monotonic() - started)
+            return
+        last_ratio[0] = max(last_ratio[0], min(1.0, ts / duration_for_ratio))
+        on_time_ratio(last_ratio[0])
+
+    def handle_line(line: str) -> None:
+        if job.progress.feed(line):
+            return
+        if on_line:
+            on_line(line)
+
+    started = time.monotonic()
+    job = _ScanJob(
         cmd,
-        stderr=subprocess.PIPE,
-        stdout=subprocess.DEVNULL,
-        text=True,
-        bufsize=1,
+        on_line=handle_line,
+        keep_line=keep_line,
+        on_idle=guess_from_wall if track else None,
+        cpus=cpus,
     )
-    if active_procs is not None:
-        if procs_lock is not None:
-            with procs_lock:
-                active_procs.append(proc)
-        else:
-            active_procs.append(proc)
+    job.progress.on_block = handle_block
+    return job
 
-    assert proc.stderr is not None
-    stderr_parts: list[str] = []
 
-    if on_time_ratio:
-        on_time_ratio(0.0)
-        last_ratio[0] = 0.0
-
-    try:
-        while True:
-            if cancel():
-                proc.kill()
-                proc.wait(timeout=30)
-                raise BlackdetectCancelled()
-
-            line = proc.stderr.readline()
-            if line:
-                stderr_parts.append(line)
-                if on_time_ratio and duration_for_ratio and duration_for_ratio > 0:
-                    ts = ffmpeg_status_time_seconds(line)
-                    if ts is not None:
-                        r = min(1.0, max(0.0, ts / duration_for_ratio))
-                        last_ratio[0] = max(last_ratio[0], r)
-                        on_time_ratio(last_ratio[0])
-            elif proc.poll() is not None:
-                break
-            else:
-                idle += 1
-                time.sleep(0.02)
-                if (
-                    on_time_ratio
-                    and duration_for_ratio
-                    and duration_for_ratio > 0
-                    and idle % 40 == 0
-                ):
-                    # Wall-clock hint when FFmpeg emits few/no parseable progress lines
-                    # (some Blu-ray / VC-1 / odd containers). Assume decode often runs well
-                    # below realtime; keep this conservative so the bar does not race to 100%.
-                    wall = time.monotonic() - t0
-                    guess = min(0.92, wall / max(duration_for_ratio * 8.0, 30.0))
-                    last_ratio[0] = max(last_ratio[0], guess)
-                    on_time_ratio(last_ratio[0])
-    except BlackdetectCancelled:
-        raise
-    except Exception:
-        if proc.poll() is None:
-            proc.kill()
-            proc.wait(timeout=30)
-        raise
-    finally:
-        if active_procs is not None:
-            if procs_lock is not None:
-                with procs_lock:
-                    try:
-                        active_procs.remove(proc)
-                    except ValueError:
-                        pass
-            else:
-                try:
-                    active_procs.remove(proc)
-                except ValueError:
-                    pass
-
-    if proc.returncode is None:
-        proc.wait(timeout=30)
-    rc = proc.returncode or 0
-    stderr = "".join(stderr_parts)
+def _run_jobs(
+    jobs: list[_ScanJob],
+    cancel: Callable[[], bool],
+    recorder: MetricsRecorder | None = None,
+    **pool: Any,
+) -> None:
+    """
+    Run ``jobs`` on the shared FFmpeg engine; raise on cancel or the first failure.
 
+    ``pool`` (``max_running``, ``on_slot_free``, ``slot_cpus``) is passed on to
+    ``run_processes``. Each job's metrics are added to ``recorder`` once all of
+    them have finished.
+    """
+    run_processes(jobs, cancel, **pool)
+    if recorder is not None:
+        for job in jobs:
+            recorder.add(job.metrics())
     if cancel():
         raise BlackdetectCancelled()
+    for job in jobs:
+        if job.error is not None:
+            raise job.error
+        if job.failed:
+            raise BlackdetectError(
+                f"ffmpeg exited with code {job.returncode}",
+                returncode=job.returncode,
+                stderr="".join(job.tail)[-4000:],
+            )
+    if any(job.cancelled for job in jobs):
+        raise BlackdetectCancelled()
 
-    if rc != 0:
-        tail = stderr[-4000:]
-        raise BlackdetectError(
-            f"ffmpeg exited with code {rc}",
-            returncode=rc,
-            stderr=tail,
-        )
-    return stderr
+
+def _run_blackdetect_stream(
+    cmd: list[str],
+    cancel: Callable[[], bool],
+    on_time_ratio: Callable[[float], None] | None,
+    duration_for_ratio: float | None,
+    *,
+    on_line: Callable[[str], None] | None = None,
+    keep_line: Callable[[str], bool] = _is_blackdetect_line,
+    recorder: MetricsRecorder | None = None,
+    cpus: set[int] | None = None,
+) -> str:
+    """
+    Run ffmpeg and stream stderr; raise on failure or cancel.
+
+    Every line except ``-progress`` blocks is passed to ``on_line`` as it arrives
+    (on the engine thread). Only lines accepted by ``keep_line`` (blackdetect
+    results by default) are returned, joined; the engine keeps a short stderr tail
+    for ``BlackdetectError.stderr``, so memory stays flat however long FFmpeg runs.
+    The process's metrics go to ``recorder``; ``cpus`` pins it to those CPUs.
+    """
+    if on_time_ratio:
+        on_time_ratio(0.0)
+    job = _blackdetect_job(
+        cmd, on_time_ratio, duration_for_ratio, on_line=on_line, keep_line=keep_line, cpus=cpus
+    )
+    _run_jobs([job], cancel, recorder)
+    return "".join(job.kept)
 
 
 def detect_black_frames(
@@ -272,6 +451,14 @@ def detect_black_frames(
     is_cancelled: Callable[[], bool] | None = None,
     on_time_ratio: Callable[[float], None] | None = None,
     duration_hint_sec: float | None = None,
+    on_event: Callable[[dict[str, float]], None] | None = None,
+    on_metrics: Callable[[ScanMetrics], None] | None = None,
+    decoder_threads: int | None = None,
+    filter_threads: int | None = None,
+    pin_cpus: bool = False,
+    on_worker_idle: Callable[[], None] | None = None,
+    min_chunk_seconds: float = MIN_SEGMENT_SECONDS,
+    checkpoint: FileCheckpoint | None = None,
 ) -> list[dict[str, float]]:
     """
     Run FFmpeg ``blackdetect``.
@@ -283,14 +470,53 @@ def detect_black_frames(
     default **False**). Parallel segment workers always use software decode.
 
     ``parallel_jobs`` > 1: run multiple FFmpeg processes on time slices using ``-ss``
-    before ``-i`` (much faster on multi-core). Timestamps are shifted back to file
-    time; seek is keyframe-aligned so positions can be off by up to ~1–2 GOPs near
-    slice edges. Used for a **full-file** scan (no windows) or a **single**
-    contiguous window (for example the default trim span). Multiple disjoint windows
-    fall back to one sequential decode of the whole file. ``parallel_jobs`` 1 uses
-    a single process; with exactly one window it still skips decode outside that span
-    via ``-ss`` / ``-t`` when possible. While parallel workers run, overall progress
-    is the mean of per-segment decode ratios (polled from the coordinator thread).
+    before ``-i`` (much faster on multi-core). The span is cut into many chunks,
+    long ones first and shorter ones towards the end (``chunk_split_points``),
+    which a pool of ``parallel_jobs`` workers takes from a shared queue, so a
+    slow-to-decode stretch delays only its own chunk. Chunk boundaries are placed
+    on keyframes found with a short ffprobe read around each split point, so
+    chunks do not overlap, each decode starts on its own keyframe, and black runs
+    crossing a boundary are joined exactly (chunks scan with ``d=0``;
+    ``min_black_seconds`` is applied after joining). If no keyframes can be read,
+    ``parallel_jobs`` equal slices with a 4 s overlap and duplicate merging are
+    used instead. Each worker that finds the queue empty calls ``on_worker_idle()``
+    (on the engine thread) once per core it held (``decoder_threads``, default 1),
+    so a batch can hand those cores to the next file while the last chunks finish.
+    ``min_chunk_seconds`` is the shortest chunk; raise it where every extra read
+    position is expensive (network shares).
+
+    ``window_list`` is merged and clipped (``merge_time_windows``) and every window
+    is decoded on its own with ``-ss`` / ``-t`` (``WINDOW_PAD_SECONDS`` wider on
+    each side), so little outside the windows is decoded; events are kept when
+    they start inside a window, as with a full pass. Windows split
+    ``parallel_jobs`` between them by length (``window_parallel_jobs``) to size
+    their chunks, and the chunks of all windows share the one worker pool. With
+    no windows the whole file is chunked.
+    ``parallel_jobs`` 1 with at most one window uses a single process. While
+    parallel workers run, overall progress is the length-weighted mean of
+    per-segment decode ratios. All FFmpeg processes of a scan share one event loop
+    (``ffmpeg_engine``) rather than a thread each.
+
+    ``on_event`` receives each black event (file timeline) as soon as FFmpeg reports
+    it, possibly from worker threads. In parallel mode, runs touching a slice
+    boundary are only delivered once the slices are joined at the end; each event
+    of the returned list is delivered once (events are told apart by start time).
+
+    ``decoder_threads`` / ``filter_threads`` pass ``-threads`` / ``-filter_threads``
+    to every process (None leaves FFmpeg's own choice, usually one thread per
+    core each). ``pin_cpus`` gives each process its own ``decoder_threads`` CPUs
+    (``ffmpeg_engine.cpu_slices``) where the platform supports affinity.
+
+    ``on_metrics`` receives the scan's ``ScanMetrics`` (frames, decode fps, speed,
+    wall and CPU time, bytes read per process) after a successful scan; the same
+    record is logged as JSON on the ``scan_metrics`` logger.
+
+    ``checkpoint`` (``scan_checkpoint.FileCheckpoint``) stores the chunk plan and
+    each chunk's output as it finishes, and chunks it already holds are not
+    decoded again, so a scan interrupted by a cancel or crash resumes with the
+    missing chunks. With a checkpoint, spans that would be scanned by a single
+    process are read in ``CHECKPOINT_CHUNK_SECONDS`` chunks once they are at least
+    twice that long.
     """
     cancel = is_cancelled or (lambda: False)
     vf_filter = build_blackdetect_filter(
@@ -300,168 +526,233 @@ def detect_black_frames(
         max_analysis_width,
     )
 
-    windows: list[tuple[float, float]] = list(window_list) if window_list else []
-    single_span: tuple[float, float] | None = None
-    if len(windows) == 1:
-        w_lo, w_hi = windows[0]
-        if w_hi > w_lo:
-            single_span = (w_lo, w_hi)
-
     duration_sec = float(duration_hint_sec) if duration_hint_sec is not None else 0.0
+    windows = merge_time_windows(window_list or [], duration_sec)
+    window_set = TimeWindowSet(windows)
 
-    parallel_full_file = (
-        parallel_jobs > 1
-        and duration_sec >= 60.0
-        and len(windows) == 0
-    )
-    parallel_in_span = (
-        parallel_jobs > 1
-        and duration_sec >= 60.0
-        and single_span is not None
-        and (single_span[1] - single_span[0]) >= 60.0
-    )
-    parallel_ok = parallel_full_file or parallel_in_span
+    def in_windows(e: dict[str, float]) -> bool:
+        return not window_set or e["black_start"] in window_set
 
-    if not parallel_ok:
+    # (window, FFmpeg processes) to plan; empty means one pass over the whole file.
+    groups: list[tuple[tuple[float, float], int]] = []
+    if windows:
+        # Windows closer than twice the padding share one pass over the gap.
+        padded = merge_time_windows(
+            [(lo - WINDOW_PAD_SECONDS, hi + WINDOW_PAD_SECONDS) for lo, hi in windows],
+            duration_sec,
+        )
+        groups = list(zip(padded, window_parallel_jobs(padded, parallel_jobs)))
+    elif parallel_jobs > 1 and duration_sec >= MIN_PARALLEL_SCAN_SECONDS:
+        groups = [((0.0, duration_sec), useful_parallel_jobs(duration_sec, parallel_jobs))]
+    elif checkpoint is not None and duration_sec >= 2 * CHECKPOINT_CHUNK_SECONDS:
+        groups = [((0.0, duration_sec), 1)]
+
+    sequential = len(groups) <= 1 and all(jobs == 1 for _window, jobs in groups)
+    if sequential and checkpoint is not None and groups:
+        (g_lo, g_hi), _jobs = groups[0]
+        sequential = g_hi - g_lo < 2 * CHECKPOINT_CHUNK_SECONDS
+    if sequential:
         ss_in: float | None = None
         t_out: float | None = None
         time_off = 0.0
         ratio_dur = duration_sec if duration_sec > 0 else None
-        if single_span is not None and (single_span[1] - single_span[0]) > 0.5:
-            w_lo, w_hi = single_span
+        if groups and (groups[0][0][1] - groups[0][0][0]) > 0.5:
+            w_lo, w_hi = groups[0][0]
             ss_in = w_lo
             t_out = w_hi - w_lo
             time_off = w_lo
-            if ratio_dur is None or ratio_dur <= 0:
-                ratio_dur = t_out
-            else:
-                ratio_dur = t_out
+            ratio_dur = t_out
         cmd = _ffmpeg_cmd(
             video_path,
             vf_filter,
             use_hwaccel=use_hwaccel,
             ss_before_input=ss_in,
             output_duration=t_out,
+            threads=decoder_threads,
+            filter_threads=filter_threads,
         )
+        cpus = cpu_slices(1, decoder_threads) if pin_cpus and decoder_threads else []
+
+        def emit_line(line: str) -> None:
+            event = _parse_blackdetect_line(line)
+            if event is None:
+                return
+            _shift_events([event], time_off)
+            if in_windows(event):
+                on_event(event)
+
+        recorder = MetricsRecorder(video_path, "sequential", on_metrics)
         stderr = _run_blackdetect_stream(
             cmd,
             cancel,
             on_time_ratio,
             ratio_dur,
+            on_line=emit_line if on_event else None,
+            recorder=recorder,
+            cpus=cpus[0] if cpus else None,
         )
         black_events = _parse_blackdetect_stderr(stderr)
-        for e in black_events:
-            e["black_start"] = round(e["black_start"] + time_off, 4)
-        if len(windows) > 1:
-            black_events = [
-                e
-                for e in black_events
-                if any(start <= e["black_start"] <= end for start, end in windows)
-            ]
-        elif len(windows) == 1:
-            lo, hi = windows[0]
-            black_events = [e for e in black_events if lo <= e["black_start"] <= hi]
-        return black_events
-
-    scan_lo = 0.0
-    scan_span_len = duration_sec
-    if parallel_in_span and single_span is not None:
-        scan_lo, scan_hi = single_span
-        scan_span_len = max(0.5, scan_hi - scan_lo)
-
-    jobs = max(2, min(int(parallel_jobs), 16, max(2, int(scan_span_len / 30))))
-    overlap = 4.0
-    spans = segment_scan_spans(scan_span_len, jobs, overlap)
-    active: list[subprocess.Popen] = []
-    lock = threading.Lock()
-    progress_slots = [0.0] * jobs
-    progress_lock = threading.Lock()
-
+        _shift_events(black_events, time_off)
+        recorder.finish()
+        return [e for e in black_events if in_windows(e)]
+
+    recorder = MetricsRecorder(video_path, "segments", on_metrics)
+    # d=0 so runs cut by a keyframe boundary are reported on both sides and can be
+    # joined before the real minimum duration is applied.
+    stitch_filter = build_blackdetect_filter(
+        0.0, ratio_black_pixels, black_pixel_threshold, max_analysis_width
+    )
+    plans: list[tuple[list[tuple[float, float]], bool]] = []
+    for (lo, hi), jobs in groups:
+        # A resumed scan keeps its chunks, whatever the worker count is now.
+        plan = checkpoint.plan(lo, hi) if checkpoint is not None else None
+        if plan is None:
+            plan = _window_segment_spans(
+                video_path,
+                lo,
+                hi,
+                jobs,
+                min_chunk_seconds,
+                CHECKPOINT_CHUNK_SECONDS if checkpoint is not None else None,
+            )
+            if checkpoint is not None:
+                checkpoint.save_plan(lo, hi, *plan)
+        plans.append(plan)
+    # One entry per FFmpeg process: (start, length, boundaries of its window's slices).
+    slices: list[tuple[float, float, list[float]]] = []
+    for spans, aligned in plans:
+        boundaries = [start for start, _length in spans[1:]] if aligned else []
+        slices.extend((start, length, boundaries) for start, length in spans)
+    abs_spans = [(start, length) for start, length, _boundaries in slices]
+    total_len = sum(length for _start, length in abs_spans) or 1.0
+    progress_slots = [0.0] * len(abs_spans)
+    emitted: set[float] = set()
+
+    # All segment callbacks run on the single FFmpeg engine thread.
     def make_local_cb(job_index: int):
         def local_progress(local_r: float) -> None:
-            with progress_lock:
-                progress_slots[job_index] = min(1.0, max(0.0, local_r))
+            progress_slots[job_index] = min(1.0, max(0.0, local_r))
+            if on_time_ratio:
+                agg = _weighted_progress(progress_slots, abs_spans, total_len)
+                on_time_ratio(min(0.99, agg))
 
         return local_progress
 
-    def run_segment(job_index: int, span_start: float, seg_len: float) -> list[dict[str, float]]:
-        if cancel():
-            raise BlackdetectCancelled()
-        abs_ss = scan_lo + span_start
-        cmd = _ffmpeg_cmd(
-            video_path,
-            vf_filter,
-            use_hwaccel=False,
-            ss_before_input=abs_ss,
-            output_duration=seg_len,
-        )
-
-        stderr = _run_blackdetect_stream(
-            cmd,
-            cancel,
-            on_time_ratio=make_local_cb(job_index),
-            duration_for_ratio=seg_len,
-            active_procs=active,
-            procs_lock=lock,
-        )
-        events = _parse_blackdetect_stderr(stderr)
-        for e in events:
-            e["black_start"] = round(e["black_start"] + abs_ss, 4)
-        return events
+    def emit_once(event: dict[str, float]) -> None:
+        if not in_windows(event):
+            return
+        key = round(event["black_start"], 1)
+        if key in emitted:
+            return
+        emitted.add(key)
+        on_event(event)
+
+    def make_line_cb(abs_ss: float, boundaries: list[float]):
+        def on_segment_line(line: str) -> None:
+            event = _parse_blackdetect_line(line)
+            if event is None:
+                return
+            _shift_events([event], abs_ss)
+            if boundaries:
+                # Pieces at a slice boundary may continue in the neighbour slice.
+                start = event["black_start"]
+                end = event.get("black_end", start + event["black_duration"])
+                if any(abs(b - start) <= 0.1 or abs(b - end) <= 0.1 for b in boundaries):
+                    return
+                if event["black_duration"] < min_black_seconds:
+                    return
+            emit_once(event)
+
+        return on_segment_line
+
+    # Output of chunks a checkpoint already holds, by slice index.
+    restored: dict[int, str] = {}
+    if checkpoint is not None:
+        for i, (abs_ss, seg_len, _boundaries) in enumerate(slices):
+            text = checkpoint.chunk(abs_ss, seg_len)
+            if text is not None:
+                restored[i] = text
+                progress_slots[i] = 1.0
+
+    def make_done_cb(abs_ss: float, seg_len: float):
+        def on_segment_done(job: ProcessJob) -> None:
+            if job.returncode == 0 and not job.cancelled and job.error is None:
+                checkpoint.save_chunk(abs_ss, seg_len, "".join(job.kept))
+
+        return on_segment_done
 
-    all_events: list[dict[str, float]] = []
     if on_time_ratio:
         on_time_ratio(0.0)
-
-    try:
-        with ThreadPoolExecutor(max_workers=jobs) as pool:
-            future_list = [
-                pool.submit(run_segment, i, spans[i][0], spans[i][1]) for i in range(jobs)
-            ]
-            fut_to_idx = {fut: i for i, fut in enumerate(future_list)}
-            pending = set(future_list)
-            while pending:
-                if cancel():
-                    with lock:
-                        for p in list(active):
-                            if p.poll() is None:
-                                p.kill()
-                    raise BlackdetectCancelled()
-                if on_time_ratio:
-                    with progress_lock:
-                        agg = sum(progress_slots) / jobs
-                    on_time_ratio(min(0.99, agg))
-                finished, pending = wait(
-                    pending, timeout=0.25, return_when=FIRST_COMPLETED
+    to_scan = [i for i in range(len(slices)) if i not in restored]
+    workers = min(max(1, parallel_jobs), max(1, len(to_scan)))
+    seg_jobs: dict[int, _ScanJob] = {}
+    for i in to_scan:
+        abs_ss, seg_len, boundaries = slices[i]
+        seg_jobs[i] = _blackdetect_job(
+            _ffmpeg_cmd(
+                video_path,
+                stitch_filter if boundaries else vf_filter,
+                use_hwaccel=False,
+                ss_before_input=abs_ss,
+                output_duration=seg_len,
+                threads=decoder_threads,
+                filter_threads=filter_threads,
+            ),
+            make_local_cb(i),
+            seg_len,
+            on_line=make_line_cb(abs_ss, boundaries) if on_event else None,
+        )
+        if checkpoint is not None:
+            seg_jobs[i].on_done = make_done_cb(abs_ss, seg_len)
+
+    def slot_free() -> None:
+        # A worker found the queue empty: its cores are idle until the scan ends.
+        for _ in range(decoder_threads or 1):
+            on_worker_idle()
+
+    # A fixed pool of workers pulls chunks of every window, longest first, so
+    # slow chunks do not hold up the rest and the scan ends on short ones.
+    _run_jobs(
+        [seg_jobs[i] for i in sorted(to_scan, key=lambda i: -slices[i][1])],
+        cancel,
+        recorder,
+        max_running=workers,
+        on_slot_free=slot_free if on_worker_idle else None,
+        slot_cpus=cpu_slices(workers, decoder_threads or 1) if pin_cpus else None,
+    )
+    if on_time_ratio:
+        on_time_ratio(1.0)
+
+    merged: list[dict[str, float]] = []
+    slice_iter = iter(enumerate(slices))
+    for spans, aligned in plans:
+        window_events: list[dict[str, float]] = []
+        for i, (abs_ss, _seg_len, _boundaries) in (next(slice_iter) for _ in spans):
+            text = restored[i] if i in restored else "".join(seg_jobs[i].kept)
+            events = _parse_blackdetect_stderr(text)
+            _shift_events(events, abs_ss)
+            window_events.extend(events)
+        if len(spans) > 1:
+            boundaries = [start for start, _length in spans[1:]]
+            if aligned:
+                window_events = stitch_segment_events(
+                    window_events, boundaries, min_black_seconds
                 )
-                for fut in finished:
-                    jidx = fut_to_idx[fut]
-                    all_events.extend(fut.result())
-                    with progress_lock:
-                        progress_slots[jidx] = 1.0
-                    if on_time_ratio:
-                        with progress_lock:
-                            agg = sum(progress_slots) / jobs
-                        on_time_ratio(min(0.99, agg))
-            if on_time_ratio:
-                on_time_ratio(1.0)
-    except BlackdetectCancelled:
-        with lock:
-            for p in list(active):
-                if p.poll() is None:
-                    p.kill()
-        raise
-
-    merged = _merge_overlapping_events(all_events, gap=0.25)
-    if windows:
-        merged = [
-            e
-            for e in merged
-            if any(start <= e["black_start"] <= end for start, end in windows)
-        ]
+            else:
+                window_events = _merge_overlapping_events(window_events, gap=0.25)
+        merged.extend(e for e in window_events if in_windows(e))
+    if on_event:
+        for e in merged:
+            emit_once(e)
+    recorder.finish()
     return merged
 
 
+def chapter_times_from_events(events: list[dict[str, float]]) -> list[float]:
+    """Chapter marks at the midpoint of each black event, in seconds."""
+    return [round(e["black_start"] + (e["black_duration"] / 2), 3) for e in events]
+
+
 def format_timestamp(seconds: float) -> str:
     """Convert float seconds to HH:MM:SS.mmm format."""
     td = timedelta(seconds=seconds)
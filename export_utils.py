@@ -1,10 +1,35 @@
 from __future__ import annotations
 
-import json
+import contextlib
+import logging
 import os
-import subprocess
+import shutil
 import tempfile
-from typing import Any
+from collections.abc import Callable
+from functools import partial
+from typing import TYPE_CHECKING, Any
+
+import mkv_chapters
+import mp4_chapters
+from batch_scheduler import run_batch
+from detector import ffmpeg_status_time_seconds
+from ffmpeg_engine import ProcessJob, run_processes
+from media_probe import probe_media
+from mp4_chapters import Piece
+
+if TYPE_CHECKING:
+    from staging_cache import StagingCache
+
+logger = logging.getLogger(__name__)
+
+# Concurrent exports. Stream-copy remuxes are bound by disk bandwidth rather than
+# CPU, so a couple of files at once keeps one disk busy without thrashing it.
+DEFAULT_EXPORT_JOBS = 2
+
+# Sources whose chapters ``mkv_chapters`` / ``mp4_chapters`` rewrite without a remux.
+MATROSKA_EXTENSIONS = (".mkv", ".mka", ".mk3d", ".webm")
+MP4_EXTENSIONS = (".mp4", ".m4v")
+_COPY_CHUNK = 64 * 1024 * 1024
 
 
 class RemuxError(Exception):
@@ -15,6 +40,10 @@ class RemuxError(Exception):
         self.stderr = stderr
 
 
+class ExportCancelled(Exception):
+    """An export was cancelled; its partial output file has been removed."""
+
+
 def normalize_export_format(value: str | None) -> str:
     """Return ``mp4``, ``mkv``, ``txt`` (ffmetadata), or ``mkvmerge_txt``."""
     if not value:
@@ -31,29 +60,40 @@ def normalize_export_format(value: str | None) -> str:
     return "mp4"
 
 
-def write_ffmpeg_chapter_file(
+def chapter_spans(
     chapters: list[float],
-    output_path: str,
-    *,
     duration_sec: float | None = None,
-) -> None:
+) -> list[tuple[float, float, str]]:
     """
-    Write an FFmpeg ffmetadata chapter file.
+    (start, end, title) per chapter, sorted.
 
     Each chapter spans from its start time until the next chapter start, or
     ``duration_sec`` for the last chapter. If duration is unknown, the last
     chapter uses a minimal end offset so the file remains valid.
     """
     sorted_chapters = sorted(chapters)
+    spans: list[tuple[float, float, str]] = []
+    for i, start_time in enumerate(sorted_chapters):
+        if i + 1 < len(sorted_chapters):
+            end_sec = sorted_chapters[i + 1]
+        elif duration_sec is not None and duration_sec > start_time:
+            end_sec = duration_sec
+        else:
+            end_sec = start_time + 1.0
+        spans.append((start_time, end_sec, f"Chapter {i + 1}"))
+    return spans
+
+
+def write_ffmpeg_chapter_file(
+    chapters: list[float],
+    output_path: str,
+    *,
+    duration_sec: float | None = None,
+) -> None:
+    """Write an FFmpeg ffmetadata chapter file (chapter ends as in ``chapter_spans``)."""
     with open(output_path, "w", encoding="utf-8") as f:
         f.write(";FFMETADATA1\n")
-        for i, start_time in enumerate(sorted_chapters):
-            if i + 1 < len(sorted_chapters):
-                end_sec = sorted_chapters[i + 1]
-            elif duration_sec is not None and duration_sec > start_time:
-                end_sec = duration_sec
-            else:
-                end_sec = start_time + 1.0
+        for start_time, end_sec, title in chapter_spans(chapters, duration_sec):
             start_ms = int(start_time * 1000)
             end_ms = int(end_sec * 1000)
             if end_ms <= start_ms:
@@ -62,7 +102,7 @@ def write_ffmpeg_chapter_file(
             f.write("TIMEBASE=1/1000\n")
             f.write(f"START={start_ms}\n")
             f.write(f"END={end_ms}\n")
-            f.write(f"title=Chapter {i + 1}\n")
+            f.write(f"title={title}\n")
 
 
 def write_mkvmerge_simple_chapters(chapters: list[float], output_path: str) -> None:
@@ -84,67 +124,20 @@ def write_mkvmerge_simple_chapters(chapters: list[float], output_path: str) -> N
 
 
 def get_bitrates(input_path: str) -> tuple[int, int]:
+    """First video and audio stream bit rates, defaulting to 1 Mb/s and 128 kb/s."""
     video_bitrate = 1_000_000
     audio_bitrate = 128_000
-
-    cmd_v = [
-        "ffprobe",
-        "-v",
-        "error",
-        "-select_streams",
-        "v:0",
-        "-show_entries",
-        "stream=bit_rate",
-        "-of",
-        "json",
-        input_path,
-    ]
-    result = subprocess.run(cmd_v, capture_output=True, text=True)
-    try:
-        data: dict[str, Any] = json.loads(result.stdout)
-        video_bitrate = int(data["streams"][0]["bit_rate"])
-    except (KeyError, IndexError, ValueError, json.JSONDecodeError):
-        pass
-
-    cmd_a = [
-        "ffprobe",
-        "-v",
-        "error",
-        "-select_streams",
-        "a:0",
-        "-show_entries",
-        "stream=bit_rate",
-        "-of",
-        "json",
-        input_path,
-    ]
-    result = subprocess.run(cmd_a, capture_output=True, text=True)
-    try:
-        data = json.loads(result.stdout)
-        audio_bitrate = int(data["streams"][0]["bit_rate"])
-    except (KeyError, IndexError, ValueError, json.JSONDecodeError):
-        pass
-
+    info = probe_media(input_path)
+    if info is not None:
+        video_bitrate = info.video_bit_rate or video_bitrate
+        audio_bitrate = info.audio_bit_rate or audio_bitrate
     return video_bitrate, audio_bitrate
 
 
 def get_media_duration_seconds(path: str) -> float | None:
     """Return container duration in seconds, or None if unknown."""
-    cmd = [
-        "ffprobe",
-        "-v",
-        "error",
-        "-show_entries",
-        "format=duration",
-        "-of",
-        "default=noprint_wrappers=1:nokey=1",
-        path,
-    ]
-    result = subprocess.run(cmd, capture_output=True, text=True)
-    try:
-        return float(result.stdout.strip())
-    except ValueError:
-        return None
+    info = probe_media(path)
+    return info.duration if info is not None else None
 
 
 def build_remux_with_metadata_command(
@@ -212,19 +205,179 @@ def build_remux_with_metadata_command(
     ]
 
 
+def _remove_quietly(path: str) -> None:
+    try:
+        os.unlink(path)
+    except OSError:
+        pass
+
+
+def write_pieces(
+    source_path: str,
+    output_path: str,
+    pieces: list[Piece],
+    *,
+    on_ratio: Callable[[float], None] | None = None,
+    is_cancelled: Callable[[], bool] | None = None,
+) -> None:
+    """
+    Write ``output_path`` from literal bytes and (offset, length) ranges of the source.
+
+    Ranges are copied inside the kernel with ``os.copy_file_range`` where possible
+    (a reflink on copy-on-write filesystems), falling back to plain reads. A
+    cancelled copy removes the partial output and raises ``ExportCancelled``.
+    """
+    total = sum(len(p) if isinstance(p, bytes) else p[1] for p in pieces)
+    done = 0
+    use_range = hasattr(os, "copy_file_range")
+    try:
+        # Unbuffered, so file positions stay in step between writes and copy_file_range.
+        with open(source_path, "rb", buffering=0) as src, open(
+            output_path, "wb", buffering=0
+        ) as dst:
+            for piece in pieces:
+                if isinstance(piece, bytes):
+                    dst.write(piece)
+                    done += len(piece)
+                    continue
+                offset, length = piece
+                src.seek(offset)
+                while length > 0:
+                    if is_cancelled and is_cancelled():
+                        raise ExportCancelled()
+                    want = min(length, _COPY_CHUNK)
+                    n = 0
+                    if use_range:
+                        try:
+                            n = os.copy_file_range(src.fileno(), dst.fileno(), want)
+                        except OSError:
+                            use_range = False
+                    if not use_range:
+                        chunk = src.read(want)
+                        dst.write(chunk)
+                        n = len(chunk)
+                    if n == 0:
+                        raise OSError(f"{source_path} shrank while being copied")
+                    length -= n
+                    done += n
+                    if on_ratio and total:
+                        on_ratio(done / total)
+        shutil.copymode(source_path, output_path)
+    except BaseException:
+        _remove_quietly(output_path)
+        raise
+
+
+def clone_file(
+    source_path: str,
+    output_path: str,
+    *,
+    on_ratio: Callable[[float], None] | None = None,
+    is_cancelled: Callable[[], bool] | None = None,
+) -> None:
+    """Byte-copy ``source_path`` to ``output_path``; see ``write_pieces``."""
+    size = os.path.getsize(source_path)
+    write_pieces(
+        source_path,
+        output_path,
+        [(0, size)] if size else [],
+        on_ratio=on_ratio,
+        is_cancelled=is_cancelled,
+    )
+
+
+def write_chapters_without_remux(
+    source_path: str,
+    chapters: list[float],
+    output_path: str,
+    *,
+    duration_sec: float | None = None,
+    on_ratio: Callable[[float], None] | None = None,
+    is_cancelled: Callable[[], bool] | None = None,
+) -> bool:
+    """
+    Write chapters into a Matroska or MP4 file without FFmpeg; False if a remux is needed.
+
+    With ``output_path`` equal to ``source_path`` the source is edited in place.
+    Otherwise the source is cloned and the copy edited, or, for an MP4 whose
+    ``moov`` has to grow, copied around a new ``moov``. Either way the media
+    data is never demuxed.
+    """
+    in_place = os.path.abspath(output_path) == os.path.abspath(source_path)
+    lp, lo = source_path.lower(), output_path.lower()
+    if lp.endswith(MATROSKA_EXTENSIONS) and (in_place or lo.endswith(".mkv")):
+        editor, edit_error = mkv_chapters, mkv_chapters.MkvEditError
+    elif lp.endswith(MP4_EXTENSIONS) and (in_place or lo.endswith(".mp4")):
+        editor, edit_error = mp4_chapters, mp4_chapters.Mp4EditError
+    else:
+        return False
+    spans = chapter_spans(chapters, duration_sec)
+
+    try:
+        strategy = editor.write_chapters_in_place(source_path, spans, dry_run=True)
+        pieces = None
+        if not in_place and editor is mp4_chapters and strategy != "replaced":
+            # Appending a moov to a copy would leave a dead one in front; keep the layout.
+            pieces = mp4_chapters.plan_rewrite(source_path, spans)
+    except (edit_error, OSError) as e:
+        logger.info("%s: cannot write chapters directly (%s); remuxing", source_path, e)
+        return False
+    if in_place:
+        editor.write_chapters_in_place(source_path, spans)
+    elif pieces is not None:
+        write_pieces(source_path, output_path, pieces, on_ratio=on_ratio, is_cancelled=is_cancelled)
+    else:
+        clone_file(source_path, output_path, on_ratio=on_ratio, is_cancelled=is_cancelled)
+        try:
+            editor.write_chapters_in_place(output_path, spans)
+        except BaseException:
+            _remove_quietly(output_path)
+            raise
+    if on_ratio:
+        on_ratio(1.0)
+    return True
+
+
 def remux_from_ffmetadata_file(
     source_path: str,
     metadata_path: str,
     output_path: str,
+    *,
+    duration_sec: float | None = None,
+    on_time_ratio: Callable[[float], None] | None = None,
+    is_cancelled: Callable[[], bool] | None = None,
 ) -> None:
-    """Run FFmpeg to write ``output_path`` with embedded chapters from ffmetadata."""
+    """
+    Run FFmpeg to write ``output_path`` with embedded chapters from ffmetadata.
+
+    With ``duration_sec``, ``on_time_ratio`` follows FFmpeg's output time. A
+    cancelled or failed run removes the partial output and raises
+    ``ExportCancelled`` or ``RemuxError``.
+    """
     cmd = build_remux_with_metadata_command(source_path, metadata_path, output_path)
-    result = subprocess.run(cmd, capture_output=True, text=True)
-    if result.returncode != 0:
+    last_ratio = [0.0]
+
+    def on_line(line: str) -> None:
+        ts = ffmpeg_status_time_seconds(line)
+        if ts is not None and on_time_ratio and duration_sec and duration_sec > 0:
+            last_ratio[0] = max(last_ratio[0], min(1.0, ts / duration_sec))
+            on_time_ratio(last_ratio[0])
+
+    job = ProcessJob(cmd, on_line=on_line)
+    run_processes([job], is_cancelled)
+    if job.error is not None:
+        raise job.error
+    if job.cancelled:
+        _remove_quietly(output_path)
+        raise ExportCancelled()
+    if job.returncode != 0:
+        _remove_quietly(output_path)
         raise RemuxError(
-            f"ffmpeg exited with code {result.returncode}",
-            stderr=(result.stderr or "")[-8000:],
+            f"ffmpeg exited with code {job.returncode}",
+            stderr="".join(job.tail)[-8000:],
         )
+    if on_time_ratio:
+        on_time_ratio(1.0)
 
 
 def remux_video_with_chapters(
@@ -239,6 +392,8 @@ def remux_video_with_chapters(
     extension). Cleans up the temp metadata file on success or failure.
     """
     duration_sec = get_media_duration_seconds(source_path)
+    if write_chapters_without_remux(source_path, chapters, output_path, duration_sec=duration_sec):
+        return
     fd, meta_path = tempfile.mkstemp(suffix="_chapters_ffmeta.txt", text=True)
     os.close(fd)
     try:
@@ -249,3 +404,125 @@ def remux_video_with_chapters(
             os.unlink(meta_path)
         except OSError:
             pass
+
+
+def export_chapters_for_file(
+    source_path: str,
+    chapters: list[float],
+    export_format: str | None,
+    export_dir: str,
+    *,
+    in_place: bool = False,
+    on_time_ratio: Callable[[float], None] | None = None,
+    is_cancelled: Callable[[], bool] | None = None,
+    read_path: str | None = None,
+) -> str:
+    """
+    Export ``chapters`` for ``source_path`` into ``export_dir``; return the written path.
+
+    Sidecar formats write only the chapter text file. MP4/MKV also write the
+    ffmetadata sidecar and remux ``<name>_chaptered.<ext>`` next to it, raising
+    ``RemuxError`` when FFmpeg fails and ``ExportCancelled`` when cancelled.
+    MKV and MP4 sources exported to their own container skip FFmpeg and get
+    only their chapter table rewritten; with ``in_place`` the source itself is
+    edited and returned. ``read_path`` is a local copy of ``source_path``
+    (``staging_cache``) that copies and remuxes read instead; in-place edits
+    always go to ``source_path``.
+    """
+    read_path = read_path or source_path
+    fmt = normalize_export_format(export_format)
+    base_name = os.path.splitext(os.path.basename(source_path))[0]
+    output_basename = os.path.join(export_dir, f"{base_name}_chaptered")
+
+    if fmt == "mkvmerge_txt":
+        metadata_file = f"{output_basename}_chapters_mkvmerge.txt"
+        write_mkvmerge_simple_chapters(chapters, metadata_file)
+        return metadata_file
+
+    duration_sec = get_media_duration_seconds(read_path)
+    metadata_file = f"{output_basename}_chapters_ffmeta.txt"
+    write_ffmpeg_chapter_file(chapters, metadata_file, duration_sec=duration_sec)
+    if fmt == "txt":
+        return metadata_file
+
+    ext = ".mp4" if fmt == "mp4" else ".mkv"
+    output_file = f"{output_basename}{ext}"
+    same_container = source_path.lower().endswith(
+        MP4_EXTENSIONS if fmt == "mp4" else MATROSKA_EXTENSIONS
+    )
+    target = source_path if in_place and same_container else output_file
+    if write_chapters_without_remux(
+        source_path if target == source_path else read_path,
+        chapters,
+        target,
+        duration_sec=duration_sec,
+        on_ratio=on_time_ratio,
+        is_cancelled=is_cancelled,
+    ):
+        return target
+    remux_from_ffmetadata_file(
+        read_path,
+        metadata_file,
+        output_file,
+        duration_sec=duration_sec,
+        on_time_ratio=on_time_ratio,
+        is_cancelled=is_cancelled,
+    )
+    return output_file
+
+
+def export_batch(
+    items: list[dict[str, Any]],
+    export_dir: str,
+    *,
+    max_workers: int = DEFAULT_EXPORT_JOBS,
+    in_place: bool = False,
+    is_cancelled: Callable[[], bool] | None = None,
+    on_progress: Callable[[int, float], None] | None = None,
+    on_result: Callable[[int, str], None] | None = None,
+    on_error: Callable[[int, BaseException], None] | None = None,
+    staging: StagingCache | None = None,
+) -> bool:
+    """
+    Export queue ``items`` (``path``, ``chapters``, ``format``) with ``max_workers`` at once.
+
+    ``on_progress(index, ratio)`` may be called from worker threads;
+    ``on_result(index, written_path)`` and ``on_error(index, exc)`` run on the
+    calling thread, so failures can be collected into one report. Returns False
+    when cancelled. ``in_place`` is passed to ``export_chapters_for_file``.
+    With a ``staging`` cache, sources are read from local copies (the next
+    item's copy running during each export); in-place exports skip it.
+    """
+    if in_place:
+        staging = None
+
+    def export_one(index: int, _jobs: int) -> str:
+        item = items[index]
+        if is_cancelled and is_cancelled():
+            raise ExportCancelled()
+        if staging is None:
+            staged = contextlib.nullcontext(item["path"])
+        else:
+            staging.prefetch(other["path"] for other in items[index : index + 2])
+            staged = staging.use(item["path"], is_cancelled)
+        with staged as read_path:
+            return export_chapters_for_file(
+                item["path"],
+                item["chapters"],
+                item.get("format"),
+                export_dir,
+                in_place=in_place,
+                on_time_ratio=partial(on_progress, index) if on_progress else None,
+                is_cancelled=is_cancelled,
+                read_path=read_path,
+            )
+
+    return run_batch(
+        len(items),
+        export_one,
+        budget=max(1, max_workers),
+        is_cancelled=is_cancelled,
+        on_result=on_result,
+        on_error=on_error,
+        cancelled_errors=(ExportCancelled,),
+    )
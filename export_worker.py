@@ -0,0 +1,60 @@
+"""Qt worker that exports the queue off the GUI thread."""
+
+from __future__ import annotations
+
+from typing import TYPE_CHECKING, Any
+
+from PySide6.QtCore import QThread, Signal
+
+from export_utils import DEFAULT_EXPORT_JOBS, RemuxError, export_batch
+
+if TYPE_CHECKING:
+    from staging_cache import StagingCache
+
+
+class ExportWorker(QThread):
+    """Export many files concurrently with cancel, per-file progress and a failure report."""
+
+    file_progress = Signal(int, float)
+    file_done = Signal(int, str)
+    file_failed = Signal(int, str, str)
+    """(item index, short error, FFmpeg stderr tail or empty)."""
+    export_finished = Signal(bool)
+    """True when every item was attempted, False when cancelled."""
+
+    def __init__(
+        self,
+        items: list[dict[str, Any]],
+        export_dir: str,
+        max_workers: int = DEFAULT_EXPORT_JOBS,
+        in_place: bool = False,
+        staging: StagingCache | None = None,
+    ):
+        super().__init__()
+        self.items = items
+        self.export_dir = export_dir
+        self.max_workers = max_workers
+        self.in_place = in_place
+        self.staging = staging
+        self._cancel = False
+
+    def cancel(self) -> None:
+        self._cancel = True
+
+    def run(self) -> None:
+        def on_error(index: int, err: BaseException) -> None:
+            detail = err.stderr if isinstance(err, RemuxError) else ""
+            self.file_failed.emit(index, str(err), detail or "")
+
+        completed = export_batch(
+            self.items,
+            self.export_dir,
+            max_workers=self.max_workers,
+            in_place=self.in_place,
+            is_cancelled=lambda: self._cancel,
+            on_progress=self.file_progress.emit,
+            on_result=self.file_done.emit,
+            on_error=on_error,
+            staging=self.staging,
+        )
+        self.export_finished.emit(completed and not self._cancel)
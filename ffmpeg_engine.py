@@ -0,0 +1,546 @@
+"""
+One event loop for every running FFmpeg process.
+
+``run_processes`` hands ``ProcessJob`` objects to a process-wide engine thread that
+multiplexes all stderr pipes with ``selectors`` (on Windows, where pipes cannot be
+selected, one small reader thread per pipe feeds the same loop). Output is split
+into lines on both ``\\n`` and ``\\r`` (FFmpeg ends status lines with ``\\r``), and
+cancellation is checked every ``POLL_INTERVAL`` seconds; a cancelled job's whole
+process group is killed. Callers block on an event instead of polling, so
+dozens of concurrent FFmpeg processes cost one Python thread between them.
+
+Callbacks (``on_line``, ``on_idle``, ``is_cancelled``) run on the engine thread
+and must be quick and thread-safe. On POSIX, finished processes are reaped with
+``wait4`` so each job also reports the CPU time and peak memory it used.
+
+Every process is started through the ``process_governor``: jobs wait in the
+engine, highest priority first, until the governor grants them a slot.
+"""
+
+from __future__ import annotations
+
+import codecs
+import logging
+import os
+import queue
+import re
+import selectors
+import signal
+import subprocess
+import sys
+import threading
+import time
+from collections import deque
+from collections.abc import Callable
+from typing import Any
+
+from process_governor import (
+    ProcessGovernor,
+    ProcessSlot,
+    current_priority,
+    default_governor,
+    priority_rank,
+    process_threads,
+)
+
+logger = logging.getLogger(__name__)
+
+POLL_INTERVAL = 0.01
+# Lines of stderr kept per process for error messages.
+TAIL_LINES = 200
+
+_LINE_BREAK = re.compile(r"\r\n|\r|\n")
+
+
+class ProcessJob:
+    """
+    One command run by the engine, plus its results once ``done`` is set.
+
+    ``keep_line`` selects the lines collected in ``kept``; the last ``TAIL_LINES``
+    lines are always in ``tail``. ``on_idle(elapsed)`` is called about every
+    ``idle_interval`` seconds while the process prints nothing. After ``done``,
+    exactly one of ``error`` (spawn or callback failure), ``cancelled`` or
+    ``returncode`` describes the outcome; ``wall_sec`` is how long the process ran
+    and ``rusage`` its resource usage (POSIX, processes that exited by themselves).
+    ``cpus``, when set, pins the process to those CPU numbers (Linux only).
+    ``priority`` is the ``process_governor`` priority (default: the one of the
+    context that creates the job).
+    """
+
+    def __init__(
+        self,
+        cmd: list[str],
+        *,
+        on_line: Callable[[str], None] | None = None,
+        keep_line: Callable[[str], bool] | None = None,
+        on_idle: Callable[[float], None] | None = None,
+        idle_interval: float = 0.8,
+        is_cancelled: Callable[[], bool] | None = None,
+        on_done: Callable[[ProcessJob], None] | None = None,
+        cpus: set[int] | None = None,
+        priority: str | None = None,
+    ) -> None:
+        self.cmd = cmd
+        self.cpus = cpus
+        self.priority = priority or current_priority()
+        self.on_line = on_line
+        self.keep_line = keep_line
+        self.on_idle = on_idle
+        self.idle_interval = idle_interval
+        self.is_cancelled = is_cancelled or (lambda: False)
+        self.on_done = on_done
+
+        self.kept: list[str] = []
+        self.tail: deque[str] = deque(maxlen=TAIL_LINES)
+        self.returncode: int | None = None
+        self.cancelled = False
+        self.error: BaseException | None = None
+        self.rusage: Any = None
+        self.wall_sec = 0.0
+        self.done = threading.Event()
+
+        self._proc: subprocess.Popen | None = None
+        self._slot: ProcessSlot | None = None
+        self._decoder = codecs.getincrementaldecoder("utf-8")("replace")
+        self._partial = ""
+        self._eof = False
+        self._killed = False
+        self._started = 0.0
+        self._last_output = 0.0
+        self._last_idle = 0.0
+
+    @property
+    def pid(self) -> int | None:
+        return self._proc.pid if self._proc is not None else None
+
+    @property
+    def failed(self) -> bool:
+        return self.error is not None or (
+            not self.cancelled and self.returncode is not None and self.returncode != 0
+        )
+
+    def _emit(self, line: str) -> None:
+        if not line:
+            return
+        self.tail.append(line + "\n")
+        if self.keep_line is not None and self.keep_line(line):
+            self.kept.append(line + "\n")
+        if self.on_line is not None:
+            self.on_line(line)
+
+    def _feed(self, chunk: bytes) -> None:
+        text = self._partial + self._decoder.decode(chunk)
+        parts = _LINE_BREAK.split(text)
+        self._partial = parts.pop()
+        for line in parts:
+            self._emit(line)
+
+    def _flush(self) -> None:
+        text = self._partial + self._decoder.decode(b"", final=True)
+        self._partial = ""
+        for line in _LINE_BREAK.split(text):
+            self._emit(line)
+
+
+class _SelectorPump:
+    """Readiness-based stderr reads for POSIX."""
+
+    def __init__(self) -> None:
+        self._sel = selectors.DefaultSelector()
+        self._wake_r, self._wake_w = os.pipe()
+        os.set_blocking(self._wake_r, False)
+        os.set_blocking(self._wake_w, False)
+        self._sel.register(self._wake_r, selectors.EVENT_READ, None)
+
+    def wake(self) -> None:
+        try:
+            os.write(self._wake_w, b"\0")
+        except BlockingIOError:
+            pass
+
+    def add(self, job: ProcessJob) -> None:
+        assert job._proc is not None and job._proc.stderr is not None
+        fd = job._proc.stderr.fileno()
+        os.set_blocking(fd, False)
+        self._sel.register(fd, selectors.EVENT_READ, job)
+
+    def remove(self, job: ProcessJob) -> None:
+        assert job._proc is not None and job._proc.stderr is not None
+        try:
+            self._sel.unregister(job._proc.stderr.fileno())
+        except (KeyError, ValueError):
+            pass
+
+    def poll(self, timeout: float | None) -> list[tuple[ProcessJob, bytes]]:
+        out: list[tuple[ProcessJob, bytes]] = []
+        for key, _mask in self._sel.select(timeout):
+            if key.data is None:
+                try:
+                    while os.read(self._wake_r, 4096):
+                        pass
+                except BlockingIOError:
+                    pass
+                continue
+            try:
+                chunk = os.read(key.fd, 65536)
+            except BlockingIOError:
+                continue
+            except OSError:
+                chunk = b""
+            if not chunk:
+                self._sel.unregister(key.fd)
+            out.append((key.data, chunk))
+        return out
+
+
+class _ThreadPump:
+    """Blocking reader thread per pipe feeding one queue (Windows)."""
+
+    def __init__(self) -> None:
+        self._queue: queue.Queue[tuple[ProcessJob, bytes] | None] = queue.Queue()
+
+    def wake(self) -> None:
+        self._queue.put(None)
+
+    def add(self, job: ProcessJob) -> None:
+        threading.Thread(target=self._reader, args=(job,), daemon=True).start()
+
+    def remove(self, job: ProcessJob) -> None:
+        pass
+
+    def _reader(self, job: ProcessJob) -> None:
+        assert job._proc is not None and job._proc.stderr is not None
+        fd = job._proc.stderr.fileno()
+        while True:
+            try:
+                chunk = os.read(fd, 65536)
+            except OSError:
+                chunk = b""
+            self._queue.put((job, chunk))
+            if not chunk:
+                return
+
+    def poll(self, timeout: float | None) -> list[tuple[ProcessJob, bytes]]:
+        out: list[tuple[ProcessJob, bytes]] = []
+        try:
+            item = self._queue.get(timeout=timeout)
+        except queue.Empty:
+            return out
+        while True:
+            if item is not None:
+                out.append(item)
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                return out
+
+
+def _popen(cmd: list[str]) -> subprocess.Popen:
+    kwargs: dict = {
+        "stdin": subprocess.DEVNULL,
+        "stdout": subprocess.DEVNULL,
+        "stderr": subprocess.PIPE,
+        "bufsize": 0,
+    }
+    if sys.platform == "win32":
+        kwargs["creationflags"] = subprocess.CREATE_NEW_PROCESS_GROUP
+    else:
+        kwargs["start_new_session"] = True
+    return subprocess.Popen(cmd, **kwargs)
+
+
+def _pin(pid: int, cpus: set[int]) -> None:
+    """
+    Restrict ``pid`` and its threads to ``cpus``; best effort, Linux only.
+
+    Runs right after spawn, long before FFmpeg has opened its input and started
+    decoder threads, which inherit the main thread's mask.
+    """
+    if not hasattr(os, "sched_setaffinity"):
+        return
+    for tid in process_threads(pid):
+        try:
+            os.sched_setaffinity(tid, cpus)
+        except OSError:
+            pass
+
+
+_cpu_cursor = 0
+_cpu_cursor_lock = threading.Lock()
+
+
+def cpu_slices(count: int, width: int) -> list[set[int]]:
+    """
+    ``count`` sets of ``width`` CPUs this process may use, for ``ProcessJob.cpus``.
+
+    Consecutive calls continue where the last one stopped (wrapping around), so
+    scans started side by side are spread over the cores instead of all landing
+    on the first ones. Returns an empty list where affinity is not supported.
+    """
+    if not hasattr(os, "sched_getaffinity") or count <= 0:
+        return []
+    available = sorted(os.sched_getaffinity(0))
+    width = max(1, min(int(width), len(available)))
+    global _cpu_cursor
+    with _cpu_cursor_lock:
+        start = _cpu_cursor
+        _cpu_cursor = (start + count * width) % len(available)
+    return [
+        {available[(start + i * width + k) % len(available)] for k in range(width)}
+        for i in range(count)
+    ]
+
+
+def _reap(proc: subprocess.Popen) -> tuple[bool, Any]:
+    """Whether ``proc`` has exited, and its ``wait4`` resource usage when known."""
+    if proc.returncode is not None or sys.platform == "win32":
+        return proc.poll() is not None, None
+    try:
+        pid, status, usage = os.wait4(proc.pid, os.WNOHANG)
+    except ChildProcessError:
+        return proc.poll() is not None, None
+    if pid == 0:
+        return False, None
+    proc.returncode = os.waitstatus_to_exitcode(status)
+    return True, usage
+
+
+def _kill_group(proc: subprocess.Popen) -> None:
+    if proc.poll() is not None:
+        return
+    try:
+        if sys.platform == "win32":
+            proc.kill()
+        else:
+            os.killpg(proc.pid, signal.SIGKILL)
+    except (ProcessLookupError, PermissionError):
+        pass
+    except OSError:
+        proc.kill()
+
+
+class FfmpegEngine:
+    """Runs ``ProcessJob``s on one background thread; see the module docstring."""
+
+    def __init__(
+        self,
+        poll_interval: float = POLL_INTERVAL,
+        governor: ProcessGovernor | None = None,
+    ) -> None:
+        self.poll_interval = poll_interval
+        self.governor = governor or default_governor()
+        self._lock = threading.Lock()
+        self._pending: list[ProcessJob] = []
+        self._waiting: list[ProcessJob] = []
+        self._running: list[ProcessJob] = []
+        self._pump = _ThreadPump() if sys.platform == "win32" else _SelectorPump()
+        self._thread: threading.Thread | None = None
+        self.governor.add_listener(self._pump.wake)
+
+    def submit(self, job: ProcessJob) -> ProcessJob:
+        with self._lock:
+            self._pending.append(job)
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._loop, name="ffmpeg-engine", daemon=True
+                )
+                self._thread.start()
+        self._pump.wake()
+        return job
+
+    def _admit(self) -> None:
+        """Start waiting jobs the governor has room for, highest priority first."""
+        for job in sorted(self._waiting, key=lambda j: priority_rank(j.priority)):
+            try:
+                cancelled = job.is_cancelled()
+            except Exception as e:
+                job.error = e
+                cancelled = True
+            if cancelled:
+                self._waiting.remove(job)
+                job.cancelled = job.error is None
+                self._finish(job)
+                continue
+            slot = self.governor.try_acquire(job.priority)
+            if slot is None:
+                continue
+            self._waiting.remove(job)
+            job._slot = slot
+            self._start(job)
+
+    def _start(self, job: ProcessJob) -> None:
+        try:
+            job._proc = _popen(job.cmd)
+        except OSError as e:
+            job.error = e
+            self._finish(job)
+            return
+        if job.cpus:
+            _pin(job._proc.pid, job.cpus)
+        if job._slot is not None:
+            job._slot.attach(job._proc.pid)
+        job._started = job._last_output = job._last_idle = time.monotonic()
+        self._pump.add(job)
+        self._running.append(job)
+
+    def _finish(self, job: ProcessJob) -> None:
+        if job._proc is not None:
+            self._pump.remove(job)
+            if job._proc.stderr is not None:
+                job._proc.stderr.close()
+            job.returncode = job._proc.returncode
+            job.wall_sec = time.monotonic() - job._started
+        if job._slot is not None:
+            job._slot.release()
+            job._slot = None
+        if job in self._running:
+            self._running.remove(job)
+        if job.on_done is not None:
+            try:
+                job.on_done(job)
+            except Exception:
+                logger.exception("on_done callback failed for %s", job.cmd[:1])
+        job.done.set()
+
+    def _abort(self, job: ProcessJob, error: BaseException | None = None) -> None:
+        if error is not None and job.error is None:
+            job.error = error
+        elif error is None:
+            job.cancelled = True
+        job._killed = True
+        assert job._proc is not None
+        _kill_group(job._proc)
+
+    def _service(self, job: ProcessJob, now: float) -> None:
+        assert job._proc is not None
+        if not job._killed:
+            try:
+                if job.is_cancelled():
+                    self._abort(job)
+                elif (
+                    job.on_idle is not None
+                    and now - job._last_output >= job.idle_interval
+                    and now - job._last_idle >= job.idle_interval
+                ):
+                    job._last_idle = now
+                    job.on_idle(now - job._started)
+            except Exception as e:
+                self._abort(job, e)
+        if job._eof or job._killed:
+            exited, usage = _reap(job._proc)
+            if exited:
+                job.rusage = usage
+                self._finish(job)
+
+    def _loop(self) -> None:
+        while True:
+            with self._lock:
+                new, self._pending = self._pending, []
+            self._waiting.extend(new)
+            if self._waiting:
+                self._admit()
+            timeout = self.poll_interval if self._running or self._waiting else None
+            try:
+                ready = self._pump.poll(timeout)
+            except Exception:
+                logger.exception("FFmpeg engine poll failed")
+                ready = []
+            now = time.monotonic()
+            for job, chunk in ready:
+                if job.done.is_set():
+                    continue
+                try:
+                    if chunk:
+                        job._last_output = now
+                        job._feed(chunk)
+                    else:
+                        job._eof = True
+                        job._flush()
+                except Exception as e:
+                    self._abort(job, e)
+            for job in list(self._running):
+                self._service(job, now)
+
+
+_engine: FfmpegEngine | None = None
+_engine_lock = threading.Lock()
+
+
+def default_engine() -> FfmpegEngine:
+    global _engine
+    with _engine_lock:
+        if _engine is None:
+            _engine = FfmpegEngine()
+        return _engine
+
+
+def run_processes(
+    jobs: list[ProcessJob],
+    is_cancelled: Callable[[], bool] | None = None,
+    *,
+    engine: FfmpegEngine | None = None,
+    max_running: int | None = None,
+    on_slot_free: Callable[[], None] | None = None,
+    slot_cpus: list[set[int]] | None = None,
+) -> None:
+    """
+    Run ``jobs`` concurrently and block until all have finished.
+
+    With ``max_running``, ``jobs`` is a queue served by that many slots: each slot
+    starts the next job as soon as its previous one finishes, and
+    ``on_slot_free()`` is called (on the engine thread) whenever a slot finds the
+    queue empty; ``slot_cpus[i]`` pins the jobs run by slot ``i``
+    (``ProcessJob.cpus``). When ``is_cancelled`` turns true, or any job fails, the remaining
+    jobs are killed (or never started) and marked ``cancelled``. Outcomes are left
+    on the jobs for the caller to inspect; nothing is raised here. A job's own
+    ``on_done`` still runs when it finishes.
+    """
+    engine = engine or default_engine()
+    cancel = is_cancelled or (lambda: False)
+    abort = threading.Event()
+    queued: deque[ProcessJob] = deque(jobs)
+    queue_lock = threading.Lock()
+
+    def job_cancelled() -> bool:
+        return abort.is_set() or cancel()
+
+    slot_of: dict[int, int] = {}
+
+    def start_next(slot: int) -> None:
+        while True:
+            with queue_lock:
+                job = queued.popleft() if queued else None
+            if job is None:
+                if max_running and on_slot_free is not None:
+                    on_slot_free()
+                return
+            if not job_cancelled():
+                slot_of[id(job)] = slot
+                if slot_cpus:
+                    job.cpus = slot_cpus[slot % len(slot_cpus)]
+                engine.submit(job)
+                return
+            job.cancelled = True
+            job.done.set()
+
+    callers = {id(job): job.on_done for job in jobs}
+
+    def job_done(job: ProcessJob) -> None:
+        if job.failed:
+            abort.set()
+        caller = callers[id(job)]
+        if caller is not None:
+            try:
+                caller(job)
+            except Exception:
+                logger.exception("on_done callback failed for %s", job.cmd[:1])
+        if max_running:
+            start_next(slot_of[id(job)])
+
+    for job in jobs:
+        job.is_cancelled = job_cancelled
+        job.on_done = job_done
+    for slot in range(min(max_running, len(jobs)) if max_running else len(jobs)):
+        start_next(slot)
+    for job in jobs:
+        job.done.wait()
@@ -1,6 +1,9 @@
 from __future__ import annotations
 
-from PySide6.QtCore import QElapsedTimer, QEvent, QObject, Qt, QUrl
+import logging
+
+from PySide6.QtCore import QElapsedTimer, QEvent, QObject, QSize, Qt, QTimer, QUrl
+from PySide6.QtGui import QIcon, QPixmap
 from PySide6.QtMultimedia import QAudioOutput, QMediaMetaData, QMediaPlayer
 from PySide6.QtMultimediaWidgets import QVideoWidget
 from PySide6.QtWidgets import (
@@ -19,7 +22,8 @@ from PySide6.QtWidgets import (
 )
 
 from blackdetect_worker import EditorBlackdetectWorker, format_eta
-from detector import BlackdetectError
+from coarse_scan import CoarseScanReport
+from detector import BlackdetectError, chapter_times_from_events, format_timestamp
 from export_utils import (
     RemuxError,
     get_media_duration_seconds,
@@ -28,10 +32,17 @@ from export_utils import (
     write_ffmpeg_chapter_file,
     write_mkvmerge_simple_chapters,
 )
+from luma_index import LumaIndex
+from media_probe import prefetch_media_info
+from scan_runner import DEFAULT_SCAN_SETTINGS
 from scan_settings import ScanSettingsDialog
-from time_windows import DEFAULT_SCAN_WINDOW_LIST_TEXT
+from thumbnail_worker import ThumbnailWorker
+from thumbnails import THUMBNAIL_WIDTH
+from time_windows import expand_scan_time_windows
 from timeline import ChapterTimeline
 
+logger = logging.getLogger(__name__)
+
 
 class ChapterListWidget(QListWidget):
     def __init__(self, parent=None):
@@ -48,6 +59,30 @@ class ChapterListWidget(QListWidget):
             super().keyPressEvent(event)
 
 
+class ChapterContactSheet(QListWidget):
+    """One thumbnail per chapter; clicking a tile seeks like the chapter list does."""
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setViewMode(QListWidget.ViewMode.IconMode)
+        self.setResizeMode(QListWidget.ResizeMode.Adjust)
+        self.setMovement(QListWidget.Movement.Static)
+        self.setIconSize(QSize(THUMBNAIL_WIDTH, THUMBNAIL_WIDTH * 9 // 16))
+        self.setSpacing(4)
+        self.setUniformItemSizes(True)
+        self.setWordWrap(True)
+
+    def set_chapters(self, chapters: list[float], thumbnails: dict[float, str]) -> None:
+        self.clear()
+        for i, ts in enumerate(chapters, start=1):
+            item = QListWidgetItem(f"{i}: {format_timestamp(ts)}")
+            item.setData(1000, ts)
+            path = thumbnails.get(ts)
+            if path:
+                item.setIcon(QIcon(QPixmap(path)))
+            self.addItem(item)
+
+
 class KeyPressFilter(QObject):
     def __init__(self, editor):
         super().__init__()
@@ -92,23 +127,23 @@ class ChapterEditor(QWidget):
 
     def __init__(self):
         super().__init__()
-        self.scan_settings = {
-            "min_black_seconds": 0.4,
-            "ratio_black_pixels": 0.98,
-            "black_pixel_threshold": 0.08,
-            "window_list": DEFAULT_SCAN_WINDOW_LIST_TEXT,
-            "export_format": "mp4",
-            "max_analysis_width": 854,
-            "use_hwaccel": False,
-            "parallel_scan_jobs": 4,
-        }
+        self.scan_settings = dict(DEFAULT_SCAN_SETTINGS)
         self._was_playing_before_scrub = False
 
         self.setWindowTitle("MaChap Chapter Editor")
         self.queue_window = None
         self._scan_worker: EditorBlackdetectWorker | None = None
         self._scan_dialog: QProgressDialog | None = None
+        self._live_chapters: list[float] = []
         self._scan_elapsed: QElapsedTimer | None = None
+        self._luma_index: LumaIndex | None = None
+        self._luma_index_key: tuple[str, int | None] | None = None
+        self._thumb_worker: ThumbnailWorker | None = None
+        self._thumbnails: dict[float, str] = {}
+        self._thumb_timer = QTimer(self)
+        self._thumb_timer.setSingleShot(True)
+        self._thumb_timer.setInterval(300)
+        self._thumb_timer.timeout.connect(self._request_thumbnails)
 
         self.media_player = QMediaPlayer(self)
         self.audio_output = QAudioOutput(self)
@@ -167,6 +202,10 @@ class ChapterEditor(QWidget):
         self.chapter_list.setFixedWidth(200)
         self.chapter_list.itemClicked.connect(self.jump_to_chapter_from_list)
 
+        self.contact_sheet = ChapterContactSheet(self)
+        self.contact_sheet.setFixedWidth(2 * THUMBNAIL_WIDTH + 40)
+        self.contact_sheet.itemClicked.connect(self.jump_to_chapter_from_list)
+
         self.load_button.clicked.connect(self.load_video)
         self.detect_button.clicked.connect(self.detect_chapters)
         self.play_pause_button.clicked.connect(self.toggle_play_pause)
@@ -212,6 +251,7 @@ class ChapterEditor(QWidget):
 
         main_layout.addLayout(left_layout)
         main_layout.addWidget(self.chapter_list)
+        main_layout.addWidget(self.contact_sheet)
 
         self.setLayout(main_layout)
 
@@ -242,8 +282,12 @@ class ChapterEditor(QWidget):
         if not file_path:
             return
 
+        if file_path != self.video_path:
+            self._thumbnails = {}
+            self.timeline.set_thumbnails({})
         self.video_path = file_path
         self.media_player.setSource(QUrl.fromLocalFile(file_path))
+        prefetch_media_info([file_path])
 
         if reset_chapters:
             self.manual_chapters = []
@@ -292,7 +336,10 @@ class ChapterEditor(QWidget):
         self._scan_dialog.setLabelText("Starting FFmpeg…")
 
         self._scan_worker = EditorBlackdetectWorker(self.video_path, self.scan_settings.copy())
+        self._live_chapters = []
         self._scan_worker.progress_ratio.connect(self._on_editor_scan_progress)
+        self._scan_worker.event_found.connect(self._on_editor_scan_event)
+        self._scan_worker.coarse_report.connect(self._on_editor_coarse_report)
         self._scan_worker.finished_ok.connect(self._on_editor_scan_finished_ok)
         self._scan_worker.failed.connect(self._on_editor_scan_failed)
         self._scan_worker.canceled.connect(self._on_editor_scan_canceled)
@@ -325,6 +372,17 @@ class ChapterEditor(QWidget):
                 f"Elapsed {format_eta(elapsed)}"
             )
 
+    def _on_editor_scan_event(self, event: dict) -> None:
+        self._live_chapters.extend(chapter_times_from_events([event]))
+        self.timeline.set_preview_chapters(sorted(self._live_chapters))
+        if self._scan_dialog is not None:
+            self._scan_dialog.setWindowTitle(
+                f"Detecting black frames — {len(self._live_chapters)} found so far"
+            )
+
+    def _on_editor_coarse_report(self, report: CoarseScanReport) -> None:
+        self.detect_button.setToolTip(f"Last coarse-to-fine scan: {report.summary()}")
+
     def _on_editor_scan_finished_ok(self, chapters: list[float]) -> None:
         self.detected_chapters = chapters
         self.timeline.set_chapters(
@@ -354,6 +412,9 @@ class ChapterEditor(QWidget):
 
     def _on_editor_scan_thread_finished(self) -> None:
         self.detect_button.setEnabled(True)
+        self._live_chapters = []
+        self.timeline.set_preview_chapters([])
+        self._luma_index_key = None
         if self._scan_dialog is not None:
             self._scan_dialog.close()
             self._scan_dialog.deleteLater()
@@ -578,16 +639,44 @@ class ChapterEditor(QWidget):
         all_chapters = sorted(set(self.manual_chapters + self.detected_chapters))
 
         for i, ts in enumerate(all_chapters, start=1):
-            h = int(ts // 3600)
-            m = int((ts % 3600) // 60)
-            s = int(ts % 60)
-            ms = int((ts - int(ts)) * 1000)
-
-            label = f"{h:02}:{m:02}:{s:02}.{ms:03}"
-            item = QListWidgetItem(f"Chapter {i}: {label}")
+            item = QListWidgetItem(f"Chapter {i}: {format_timestamp(ts)}")
             item.setData(1000, ts)
             self.chapter_list.addItem(item)
 
+        self.contact_sheet.set_chapters(all_chapters, self._thumbnails)
+        if self.video_path and any(ts not in self._thumbnails for ts in all_chapters):
+            # Debounced: a scan or a run of edits asks once, for every new chapter.
+            self._thumb_timer.start()
+
+    def _request_thumbnails(self) -> None:
+        if not self.video_path:
+            return
+        if self._thumb_worker is not None and self._thumb_worker.isRunning():
+            self._thumb_timer.start()
+            return
+        chapters = sorted(set(self.manual_chapters + self.detected_chapters))
+        missing = [ts for ts in chapters if ts not in self._thumbnails]
+        if not missing:
+            return
+        worker = ThumbnailWorker(self.video_path, missing)
+        worker.thumbnails_ready.connect(self._on_thumbnails_ready)
+        worker.thumbnails_failed.connect(self._on_thumbnails_failed)
+        self._thumb_worker = worker
+        worker.start()
+
+    def _on_thumbnails_ready(self, video_path: str, paths: dict) -> None:
+        if video_path != self.video_path:
+            return
+        self._thumbnails.update(paths)
+        self.timeline.set_thumbnails(self._thumbnails)
+        self.contact_sheet.set_chapters(
+            sorted(set(self.manual_chapters + self.detected_chapters)), self._thumbnails
+        )
+
+    def _on_thumbnails_failed(self, video_path: str, message: str) -> None:
+        # Thumbnails are a convenience; the chapter list still works without them.
+        logger.warning("Thumbnail extraction failed for %s: %s", video_path, message)
+
     def delete_chapter_by_timestamp(self, ts: float) -> None:
         removed = False
 
@@ -625,9 +714,51 @@ class ChapterEditor(QWidget):
         dlg = ScanSettingsDialog(self, self.scan_settings)
         dlg.load_from(self.scan_settings)
         dlg.settingsApplied.connect(self.update_scan_settings)
+        dlg.settingsEdited.connect(self._retune_from_luma_index)
         dlg.show()
         dlg.raise_()
         dlg.activateWindow()
 
     def update_scan_settings(self, new_settings: dict) -> None:
         self.scan_settings = new_settings
+        self._retune_from_luma_index(new_settings)
+
+    def _retune_from_luma_index(self, settings: dict) -> bool:
+        """
+        Re-detect chapters from the loaded file's luma index without decoding.
+
+        Returns False (leaving chapters untouched) when the index is disabled, not
+        built yet for this file, or cannot represent the requested threshold.
+        """
+        if not self.video_path or not settings.get("luma_index"):
+            return False
+        if self._scan_worker is not None and self._scan_worker.isRunning():
+            return False
+        mw = settings.get("max_analysis_width", 854)
+        width = None if mw is not None and int(mw) <= 0 else int(mw or 854)
+        key = (self.video_path, width)
+        if self._luma_index_key != key:
+            self._luma_index = LumaIndex.open_for(self.video_path, width)
+            self._luma_index_key = key
+        if self._luma_index is None:
+            return False
+        windows = expand_scan_time_windows(
+            str(settings.get("window_list", "") or ""),
+            self.video_duration,
+        )
+        try:
+            events = self._luma_index.detect(
+                settings["min_black_seconds"],
+                settings["ratio_black_pixels"],
+                settings["black_pixel_threshold"],
+                windows,
+            )
+        except ValueError:
+            return False
+        self.detected_chapters = chapter_times_from_events(events)
+        self.timeline.set_chapters(
+            sorted(set(self.detected_chapters + self.manual_chapters)),
+            self.video_duration,
+        )
+        self.update_chapter_list()
+        return True
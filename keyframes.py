@@ -0,0 +1,151 @@
+"""Keyframe lookup and keyframe-aligned segment planning for parallel scans."""
+
+from __future__ import annotations
+
+import json
+from typing import Any
+
+import process_governor
+
+# Seconds of packets read after each seek target when looking for a keyframe.
+KEYFRAME_PROBE_WINDOW = 10.0
+
+
+def probe_keyframes_near(
+    video_path: str,
+    targets: list[float],
+    window: float = KEYFRAME_PROBE_WINDOW,
+) -> list[float] | None:
+    """
+    Keyframe times (file timeline, seconds) around each of ``targets``.
+
+    One ffprobe call reads ``window`` seconds of video packets from every target via
+    ``-read_intervals``; each interval starts at the keyframe at or before its
+    target, so at least one keyframe per target is found without reading the rest
+    of the file. Times are shifted by the container ``start_time`` to match the
+    timeline FFmpeg uses for ``-ss`` and filter timestamps. Returns None when
+    ffprobe fails.
+    """
+    if not targets:
+        return []
+    intervals = ",".join(f"{max(0.0, t):.3f}%+{window:.3f}" for t in sorted(targets))
+    cmd = [
+        "ffprobe",
+        "-v",
+        "error",
+        "-select_streams",
+        "v:0",
+        "-read_intervals",
+        intervals,
+        "-show_entries",
+        "packet=pts_time,flags:format=start_time",
+        "-of",
+        "json",
+        video_path,
+    ]
+    try:
+        result = process_governor.run(cmd)
+    except OSError:
+        return None
+    if result.returncode != 0:
+        return None
+    try:
+        data: dict[str, Any] = json.loads(result.stdout)
+    except json.JSONDecodeError:
+        return None
+    try:
+        start_time = float(data.get("format", {}).get("start_time", 0.0))
+    except (TypeError, ValueError):
+        start_time = 0.0
+    times: set[float] = set()
+    for pkt in data.get("packets", []):
+        if "K" not in str(pkt.get("flags", "")):
+            continue
+        try:
+            times.add(round(float(pkt["pts_time"]) - start_time, 6))
+        except (KeyError, TypeError, ValueError):
+            continue
+    return sorted(times)
+
+
+def keyframe_aligned_spans(
+    keyframes: list[float],
+    lo: float,
+    hi: float,
+    jobs: int,
+    *,
+    min_length: float = 1.0,
+) -> list[tuple[float, float]]:
+    """
+    Split ``[lo, hi)`` into at most ``jobs`` contiguous ``(start, length)`` spans.
+
+    Every interior boundary is the keyframe nearest to an equal split point, so
+    the spans neither overlap nor leave gaps, and a segment decoded with ``-ss``
+    at its start begins on a keyframe. Split points with no usable keyframe
+    (too close to a neighbour or outside the range) are dropped, which yields
+    fewer, longer spans.
+    """
+    if hi <= lo:
+        return []
+    step = (hi - lo) / max(1, jobs)
+    targets = [lo + i * step for i in range(1, jobs)]
+    return keyframe_spans_near(keyframes, lo, hi, targets, min_length=min_length)
+
+
+def keyframe_spans_near(
+    keyframes: list[float],
+    lo: float,
+    hi: float,
+    targets: list[float],
+    *,
+    min_length: float = 1.0,
+) -> list[tuple[float, float]]:
+    """
+    Like ``keyframe_aligned_spans``, with interior boundaries at the keyframes
+    nearest to the sorted split points ``targets`` instead of equal ones.
+    """
+    if hi <= lo:
+        return []
+    candidates = sorted(k for k in keyframes if lo + min_length <= k <= hi - min_length)
+    boundaries = [lo]
+    for target in targets:
+        usable = [k for k in candidates if k >= boundaries[-1] + min_length]
+        if not usable:
+            break
+        best = min(usable, key=lambda k: abs(k - target))
+        if best in boundaries:
+            continue
+        boundaries.append(best)
+    boundaries.append(hi)
+    return [(a, b - a) for a, b in zip(boundaries, boundaries[1:]) if b - a > 0]
+
+
+def stitch_segment_events(
+    events: list[dict[str, float]],
+    boundaries: list[float],
+    min_black_seconds: float,
+    *,
+    tolerance: float = 0.1,
+) -> list[dict[str, float]]:
+    """
+    Join black runs split by a segment boundary, then apply ``min_black_seconds``.
+
+    Segments are scanned with ``d=0`` so that a run crossing a boundary is
+    reported as two pieces, one ending and one starting within ``tolerance`` of
+    the boundary; those pieces are merged and only then filtered by duration.
+    """
+    ev = sorted((dict(e) for e in events), key=lambda e: e["black_start"])
+    out: list[dict[str, float]] = []
+    for e in ev:
+        e.setdefault("black_end", e["black_start"] + e.get("black_duration", 0.0))
+        if out:
+            prev = out[-1]
+            joins = abs(e["black_start"] - prev["black_end"]) <= tolerance and any(
+                abs(b - e["black_start"]) <= tolerance for b in boundaries
+            )
+            if joins:
+                prev["black_end"] = max(prev["black_end"], e["black_end"])
+                prev["black_duration"] = round(prev["black_end"] - prev["black_start"], 4)
+                continue
+        out.append(e)
+    return [e for e in out if e["black_duration"] >= min_black_seconds]
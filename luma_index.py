@@ -0,0 +1,391 @@
+"""
+Settings-independent per-frame luma index with in-memory blackdetect re-thresholding.
+
+One FFmpeg decode records, for every frame, the cumulative luma histogram over the
+dark end of the range (plus mean and minimum luma) into a ``.npy`` sidecar. Any
+``d`` / ``pic_th`` / ``pix_th`` combination can then be evaluated against the
+memory-mapped array with NumPy instead of decoding the file again.
+
+NumPy is an optional dependency (``pip install machap-chapter-editor[index]``);
+``numpy_available`` tells callers whether this module can be used.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import re
+import subprocess
+import threading
+from collections import deque
+from collections.abc import Callable
+from typing import Any
+
+from detector import BlackdetectCancelled, BlackdetectError
+from process_governor import default_governor
+from scan_cache import default_cache_dir, file_identity
+from time_windows import TimeWindowSet
+
+_INDEX_FORMAT_VERSION = 1
+
+# Cumulative histogram bins stored per frame: fraction of pixels with Y <= level for
+# level in 0 .. LUMA_LEVELS - 1. 96 levels cover ``pix_th`` up to ~0.36 in limited
+# range and ~0.37 in full range, well past useful black thresholds.
+LUMA_LEVELS = 96
+_FRACTION_SCALE = 65535
+
+_SHOWINFO_PTS = re.compile(r"pts_time:\s*(-?[\d.]+)")
+_SHOWINFO_SIZE = re.compile(r"\bs:(\d+)x(\d+)")
+_SHOWINFO_FMT = re.compile(r"\bfmt:(\w+)")
+
+
+def numpy_available() -> bool:
+    try:
+        import numpy  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def _np():
+    try:
+        import numpy as np
+    except ImportError as e:
+        raise RuntimeError(
+            "The luma index needs NumPy (pip install machap-chapter-editor[index])"
+        ) from e
+    return np
+
+
+def _index_dtype():
+    np = _np()
+    return np.dtype(
+        [
+            ("pts", "<f8"),
+            ("mean", "<f4"),
+            ("min", "u1"),
+            ("cdf", "<u2", (LUMA_LEVELS,)),
+        ]
+    )
+
+
+def black_level_for_threshold(black_pixel_threshold: float, *, full_range: bool) -> int:
+    """Luma code value at or below which ``blackdetect`` counts a pixel as black."""
+    th = float(black_pixel_threshold)
+    level = int(th * 255) if full_range else int(16 + th * (235 - 16))
+    if level < 0:
+        return 0
+    if level >= LUMA_LEVELS:
+        raise ValueError(
+            f"pix_th={th} needs luma level {level}; the index only stores 0..{LUMA_LEVELS - 1}"
+        )
+    return level
+
+
+def index_paths(
+    video_path: str,
+    max_analysis_width: int | None,
+    directory: str | None = None,
+) -> tuple[str, str]:
+    """Return ``(array_path, header_path)`` for the sidecar of ``video_path``."""
+    directory = directory or os.path.join(default_cache_dir(), "luma")
+    identity = file_identity(video_path)
+    blob = json.dumps(
+        {
+            "v": _INDEX_FORMAT_VERSION,
+            "file": identity,
+            "width": int(max_analysis_width or 0),
+        },
+        sort_keys=True,
+    )
+    key = hashlib.sha256(blob.encode("utf-8")).hexdigest()
+    base = os.path.join(directory, key)
+    return f"{base}.npy", f"{base}.json"
+
+
+def events_from_black_mask(
+    pts: Any,
+    black: Any,
+    min_black_seconds: float,
+) -> list[dict[str, float]]:
+    """
+    Turn a per-frame black mask into ``blackdetect`` events.
+
+    Mirrors the filter: a run starts at the first black frame's pts and ends at the
+    first non-black frame's pts (or one frame past the last pts at end of stream,
+    as FFmpeg 5+ reports it), and is reported when its duration is at least
+    ``min_black_seconds``.
+    """
+    np = _np()
+    pts = np.asarray(pts, dtype=np.float64)
+    black = np.asarray(black, dtype=bool)
+    n = int(pts.shape[0])
+    if n == 0:
+        return []
+    edges = np.diff(np.concatenate(([0], black.astype(np.int8), [0])))
+    starts = np.flatnonzero(edges == 1)
+    ends = np.flatnonzero(edges == -1)
+    start_t = pts[starts]
+    frame_dur = float(np.median(np.diff(pts))) if n > 1 else 0.0
+    end_t = np.where(ends < n, pts[np.minimum(ends, n - 1)], pts[n - 1] + frame_dur)
+    dur = end_t - start_t
+    keep = dur >= float(min_black_seconds)
+    return [
+        {
+            "black_start": round(float(s), 4),
+            "black_end": round(float(e), 4),
+            "black_duration": round(float(d), 4),
+        }
+        for s, e, d in zip(start_t[keep], end_t[keep], dur[keep])
+    ]
+
+
+class LumaIndex:
+    """Per-frame luma statistics for one file, usually memory-mapped from the sidecar."""
+
+    def __init__(self, frames: Any, *, full_range: bool = False, width: int = 0, height: int = 0):
+        self.frames = frames
+        self.full_range = full_range
+        self.width = width
+        self.height = height
+
+    @classmethod
+    def load(cls, array_path: str, header_path: str) -> LumaIndex:
+        np = _np()
+        with open(header_path, encoding="utf-8") as f:
+            header = json.load(f)
+        if header.get("version") != _INDEX_FORMAT_VERSION or header.get("levels") != LUMA_LEVELS:
+            raise ValueError(f"Unsupported luma index {header_path}")
+        frames = np.load(array_path, mmap_mode="r")
+        return cls(
+            frames,
+            full_range=bool(header.get("full_range", False)),
+            width=int(header.get("width", 0)),
+            height=int(header.get("height", 0)),
+        )
+
+    @classmethod
+    def open_for(
+        cls,
+        video_path: str,
+        max_analysis_width: int | None,
+        directory: str | None = None,
+    ) -> LumaIndex | None:
+        """Return the stored index for ``video_path``, or None if missing or unreadable."""
+        if not numpy_available():
+            return None
+        try:
+            array_path, header_path = index_paths(video_path, max_analysis_width, directory)
+            return cls.load(array_path, header_path)
+        except (OSError, ValueError):
+            return None
+
+    def __len__(self) -> int:
+        return int(self.frames.shape[0])
+
+    def black_ratio(self, black_pixel_threshold: float) -> Any:
+        """Fraction of pixels per frame that ``blackdetect`` would count as black."""
+        level = black_level_for_threshold(black_pixel_threshold, full_range=self.full_range)
+        return self.frames["cdf"][:, level] / float(_FRACTION_SCALE)
+
+    def detect(
+        self,
+        min_black_seconds: float = 0.4,
+        ratio_black_pixels: float = 0.98,
+        black_pixel_threshold: float = 0.08,
+        window_list: list[tuple[float, float]] | None = None,
+    ) -> list[dict[str, float]]:
+        """Evaluate ``blackdetect`` for the given thresholds without decoding."""
+        black = self.black_ratio(black_pixel_threshold) >= float(ratio_black_pixels)
+        events = events_from_black_mask(self.frames["pts"], black, min_black_seconds)
+        if window_list:
+            window_set = TimeWindowSet(window_list)
+            events = [e for e in events if e["black_start"] in window_set]
+        return events
+
+
+def _luma_ffmpeg_cmd(
+    video_path: str, max_analysis_width: int | None, use_hwaccel: bool
+) -> list[str]:
+    chain = []
+    if max_analysis_width is not None and max_analysis_width > 0:
+        w = max(16, int(max_analysis_width))
+        chain.append(f"scale='min({w}\\,iw)':-2")
+    chain += ["format=pix_fmts=yuv420p|yuvj420p", "showinfo", "extractplanes=y"]
+    cmd = ["ffmpeg"]
+    if use_hwaccel:
+        cmd += ["-hwaccel", "auto"]
+    cmd += [
+        "-hide_banner",
+        "-nostats",
+        "-i",
+        video_path,
+        "-vf",
+        ",".join(chain),
+        "-an",
+        "-sn",
+        "-f",
+        "rawvideo",
+        "-pix_fmt",
+        "gray",
+        "pipe:1",
+    ]
+    return cmd
+
+
+def build_luma_index(
+    video_path: str,
+    *,
+    max_analysis_width: int | None = 854,
+    use_hwaccel: bool = False,
+    is_cancelled: Callable[[], bool] | None = None,
+    on_time_ratio: Callable[[float], None] | None = None,
+    duration_hint_sec: float | None = None,
+    directory: str | None = None,
+    read_path: str | None = None,
+) -> LumaIndex:
+    """
+    Decode ``video_path`` once and write its luma index sidecar.
+
+    Frames are downscaled like a normal scan (``max_analysis_width``) and the Y plane
+    is piped out raw; ``showinfo`` supplies each frame's pts and pixel format.
+    ``read_path`` is a copy of ``video_path`` to decode instead; the sidecar still
+    belongs to ``video_path``.
+    """
+    np = _np()
+    cancel = is_cancelled or (lambda: False)
+    array_path, header_path = index_paths(video_path, max_analysis_width, directory)
+    os.makedirs(os.path.dirname(array_path), exist_ok=True)
+
+    slot = default_governor().acquire(is_cancelled=cancel)
+    if slot is None:
+        raise BlackdetectCancelled()
+    try:
+        proc = subprocess.Popen(
+            _luma_ffmpeg_cmd(read_path or video_path, max_analysis_width, use_hwaccel),
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+        )
+    except BaseException:
+        slot.release()
+        raise
+    slot.attach(proc.pid)
+    assert proc.stdout is not None and proc.stderr is not None
+
+    pts_list: deque[float] = deque()
+    pts_ready = threading.Condition()
+    frame_info: dict[str, Any] = {}
+    stderr_tail: deque[str] = deque(maxlen=200)
+
+    def read_stderr() -> None:
+        assert proc.stderr is not None
+        for raw in proc.stderr:
+            line = raw.decode("utf-8", errors="replace")
+            stderr_tail.append(line)
+            if "showinfo" not in line or "pts_time:" not in line:
+                continue
+            m = _SHOWINFO_PTS.search(line)
+            if not m:
+                continue
+            with pts_ready:
+                if "size" not in frame_info:
+                    sm = _SHOWINFO_SIZE.search(line)
+                    fm = _SHOWINFO_FMT.search(line)
+                    if sm:
+                        frame_info["size"] = (int(sm.group(1)), int(sm.group(2)))
+                    frame_info["fmt"] = fm.group(1) if fm else ""
+                pts_list.append(float(m.group(1)))
+                pts_ready.notify_all()
+        with pts_ready:
+            frame_info["eof"] = True
+            pts_ready.notify_all()
+
+    reader = threading.Thread(target=read_stderr, daemon=True)
+    reader.start()
+
+    dtype = _index_dtype()
+    blocks: list[Any] = []
+    block = np.zeros(4096, dtype=dtype)
+    filled = 0
+    duration = float(duration_hint_sec or 0.0)
+    if on_time_ratio:
+        on_time_ratio(0.0)
+
+    try:
+        with pts_ready:
+            while "size" not in frame_info and "eof" not in frame_info:
+                pts_ready.wait(timeout=0.1)
+                if cancel():
+                    raise BlackdetectCancelled()
+        size = frame_info.get("size")
+        if size is not None:
+            w, h = size
+            frame_bytes = w * h
+            while True:
+                if cancel():
+                    raise BlackdetectCancelled()
+                buf = proc.stdout.read(frame_bytes)
+                if not buf or len(buf) < frame_bytes:
+                    break
+                with pts_ready:
+                    while not pts_list and "eof" not in frame_info:
+                        pts_ready.wait(timeout=0.1)
+                    if not pts_list:
+                        break
+                    pts = pts_list.popleft()
+                y = np.frombuffer(buf, dtype=np.uint8)
+                hist = np.bincount(y, minlength=256)
+                cdf = np.cumsum(hist[:LUMA_LEVELS], dtype=np.int64)
+                rec = block[filled]
+                rec["pts"] = pts
+                rec["mean"] = float(y.mean())
+                rec["min"] = int(y.min())
+                rec["cdf"] = np.rint(cdf * (_FRACTION_SCALE / frame_bytes)).astype(np.uint16)
+                filled += 1
+                if filled == block.shape[0]:
+                    blocks.append(block)
+                    block = np.zeros(4096, dtype=dtype)
+                    filled = 0
+                if on_time_ratio and duration > 0:
+                    on_time_ratio(min(1.0, max(0.0, pts / duration)))
+        proc.wait()
+    except BaseException:
+        if proc.poll() is None:
+            proc.kill()
+            proc.wait(timeout=30)
+        raise
+    finally:
+        slot.release()
+        reader.join(timeout=5)
+
+    if cancel():
+        raise BlackdetectCancelled()
+    rc = proc.returncode or 0
+    if rc != 0 or "size" not in frame_info:
+        raise BlackdetectError(
+            f"ffmpeg exited with code {rc}" if rc else "ffmpeg produced no frames",
+            returncode=rc,
+            stderr="".join(stderr_tail)[-4000:],
+        )
+
+    blocks.append(block[:filled])
+    frames = np.concatenate(blocks)
+    w, h = frame_info["size"]
+    full_range = str(frame_info.get("fmt", "")).startswith("yuvj")
+    tmp_array = f"{array_path}.{os.getpid()}.tmp.npy"
+    np.save(tmp_array, frames)
+    os.replace(tmp_array, array_path)
+    header = {
+        "version": _INDEX_FORMAT_VERSION,
+        "levels": LUMA_LEVELS,
+        "full_range": full_range,
+        "width": w,
+        "height": h,
+        "frames": int(frames.shape[0]),
+    }
+    with open(header_path, "w", encoding="utf-8") as f:
+        json.dump(header, f)
+    if on_time_ratio:
+        on_time_ratio(1.0)
+    return LumaIndex.load(array_path, header_path)
@@ -0,0 +1,233 @@
+"""
+One cached ``ffprobe`` per file for duration, stream and chapter facts.
+
+``probe_media`` runs ``ffprobe -show_format -show_streams -show_chapters`` once and
+memoizes the parsed ``MediaInfo`` by path, size and modification time, so the
+editor, scans and exports of the same file share one probe. Concurrent requests
+for a file wait on the probe already in flight; ``prefetch_media_info`` starts
+probes for upcoming queue entries in the background.
+"""
+
+from __future__ import annotations
+
+import contextvars
+import json
+import os
+import threading
+from collections import OrderedDict
+from collections.abc import Iterable
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any
+
+import process_governor
+
+MAX_MEMO_ENTRIES = 1024
+PREFETCH_WORKERS = 4
+
+
+@dataclass(frozen=True)
+class MediaInfo:
+    path: str
+    duration: float | None
+    start_time: float
+    format_name: str
+    bit_rate: int | None
+    video_codec: str | None
+    width: int | None
+    height: int | None
+    fps: float | None
+    video_bit_rate: int | None
+    audio_codec: str | None
+    audio_bit_rate: int | None
+    chapters: tuple[float, ...]
+
+    @property
+    def has_audio(self) -> bool:
+        return self.audio_codec is not None
+
+
+def _int_or_none(value: Any) -> int | None:
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _float_or_none(value: Any) -> float | None:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _rate(value: Any) -> float | None:
+    """``30000/1001`` style frame rate to float (None for ``0/0`` or junk)."""
+    num, _, den = str(value or "").partition("/")
+    n = _float_or_none(num)
+    d = _float_or_none(den) if den else 1.0
+    if not n or not d:
+        return None
+    return n / d
+
+
+def parse_ffprobe_json(path: str, data: dict[str, Any]) -> MediaInfo:
+    """Build ``MediaInfo`` from ``ffprobe -of json`` format, streams and chapters."""
+    fmt = data.get("format") or {}
+    streams = data.get("streams") or []
+    video = next(
+        (
+            s
+            for s in streams
+            if s.get("codec_type") == "video"
+            and not (s.get("disposition") or {}).get("attached_pic")
+        ),
+        None,
+    )
+    audio = next((s for s in streams if s.get("codec_type") == "audio"), None)
+    chapters = sorted(
+        t
+        for t in (_float_or_none(c.get("start_time")) for c in data.get("chapters") or [])
+        if t is not None
+    )
+    return MediaInfo(
+        path=path,
+        duration=_float_or_none(fmt.get("duration")),
+        start_time=_float_or_none(fmt.get("start_time")) or 0.0,
+        format_name=str(fmt.get("format_name", "")),
+        bit_rate=_int_or_none(fmt.get("bit_rate")),
+        video_codec=video.get("codec_name") if video else None,
+        width=_int_or_none(video.get("width")) if video else None,
+        height=_int_or_none(video.get("height")) if video else None,
+        fps=(_rate(video.get("avg_frame_rate")) or _rate(video.get("r_frame_rate")))
+        if video
+        else None,
+        video_bit_rate=_int_or_none(video.get("bit_rate")) if video else None,
+        audio_codec=audio.get("codec_name") if audio else None,
+        audio_bit_rate=_int_or_none(audio.get("bit_rate")) if audio else None,
+        chapters=tuple(chapters),
+    )
+
+
+def _run_ffprobe(path: str) -> dict[str, Any] | None:
+    cmd = [
+        "ffprobe",
+        "-v",
+        "error",
+        "-show_format",
+        "-show_streams",
+        "-show_chapters",
+        "-of",
+        "json",
+        path,
+    ]
+    try:
+        result = process_governor.run(cmd)
+    except OSError:
+        return None
+    if result.returncode != 0:
+        return None
+    try:
+        return json.loads(result.stdout)
+    except json.JSONDecodeError:
+        return None
+
+
+def _memo_key(path: str) -> tuple[str, int, int] | None:
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return (os.path.abspath(path), st.st_size, st.st_mtime_ns)
+
+
+_lock = threading.Lock()
+_memo: OrderedDict[tuple[str, int, int], MediaInfo] = OrderedDict()
+_inflight: dict[tuple[str, int, int], Future] = {}
+_pool: ThreadPoolExecutor | None = None
+
+
+def _probe_uncached(path: str) -> MediaInfo | None:
+    data = _run_ffprobe(path)
+    return parse_ffprobe_json(path, data) if data is not None else None
+
+
+def _probe_keyed(path: str, key: tuple[str, int, int]) -> MediaInfo | None:
+    owner = False
+    with _lock:
+        info = _memo.get(key)
+        if info is not None:
+            _memo.move_to_end(key)
+            return info
+        fut = _inflight.get(key)
+        if fut is None:
+            fut = Future()
+            _inflight[key] = fut
+            owner = True
+    if not owner:
+        return fut.result()
+    try:
+        info = _probe_uncached(path)
+    except BaseException as e:
+        with _lock:
+            _inflight.pop(key, None)
+        fut.set_exception(e)
+        raise
+    with _lock:
+        _inflight.pop(key, None)
+        if info is not None:
+            _memo[key] = info
+            while len(_memo) > MAX_MEMO_ENTRIES:
+                _memo.popitem(last=False)
+    fut.set_result(info)
+    return info
+
+
+def probe_media(path: str) -> MediaInfo | None:
+    """
+    ``MediaInfo`` for ``path``, or None when the file is missing or ffprobe fails.
+
+    Results are memoized until the file's size or modification time changes;
+    failures are not, so a file that was still being copied is probed again.
+    """
+    key = _memo_key(path)
+    if key is None:
+        return None
+    return _probe_keyed(path, key)
+
+
+def _prefetch_pool() -> ThreadPoolExecutor:
+    global _pool
+    with _lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(
+                max_workers=PREFETCH_WORKERS, thread_name_prefix="media-probe"
+            )
+        return _pool
+
+
+def prefetch_media_info(paths: Iterable[str]) -> None:
+    """Start background probes for ``paths`` that are not memoized yet."""
+    pool = _prefetch_pool()
+    for path in paths:
+        key = _memo_key(path)
+        if key is None:
+            continue
+        with _lock:
+            if key in _memo or key in _inflight:
+                continue
+        pool.submit(_probe_keyed, path, key)
+
+
+def probe_media_many(paths: list[str], max_workers: int = 8) -> list[MediaInfo | None]:
+    """``probe_media`` for every path, running uncached probes concurrently."""
+    if not paths:
+        return []
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(paths)))) as pool:
+        contexts = [contextvars.copy_context() for _ in paths]
+        return list(pool.map(lambda ctx, path: ctx.run(probe_media, path), contexts, paths))
+
+
+def clear_media_cache() -> None:
+    with _lock:
+        _memo.clear()
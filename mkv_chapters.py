@@ -0,0 +1,450 @@
+"""
+Write Matroska chapters in place, without touching the media data.
+
+Only the top of the file is parsed: the EBML header, the ``Segment`` and its
+level-1 elements up to the first ``Cluster``, plus anything the ``SeekHead``
+points at. A new ``Chapters`` element is then placed, in order of preference:
+
+1. over the existing ``Chapters`` element and any ``Void`` padding right after it;
+2. into a ``Void`` before the first cluster (muxers reserve some for this);
+3. appended at the end of the file, growing the ``Segment`` size in place.
+
+Whenever the element moves, the ``SeekHead`` is rebuilt (with its ``CRC-32`` if
+it had one) inside its own space plus adjacent padding, and the old element is
+turned into ``Void``. The new data is written before anything points at it, so
+an interrupted edit leaves a playable file. ``MkvEditError`` means the file has
+to be remuxed instead.
+"""
+
+from __future__ import annotations
+
+import os
+import random
+import struct
+import zlib
+from dataclasses import dataclass
+
+EBML_ID = 0x1A45DFA3
+DOCTYPE_ID = 0x4282
+SEGMENT_ID = 0x18538067
+SEEKHEAD_ID = 0x114D9B74
+SEEK_ID = 0x4DBB
+SEEK_ID_ID = 0x53AB
+SEEK_POSITION_ID = 0x53AC
+CHAPTERS_ID = 0x1043A770
+CLUSTER_ID = 0x1F43B675
+VOID_ID = 0xEC
+CRC32_ID = 0xBF
+
+EDITION_ENTRY_ID = 0x45B9
+EDITION_UID_ID = 0x45BC
+EDITION_FLAG_DEFAULT_ID = 0x45DB
+CHAPTER_ATOM_ID = 0xB6
+CHAPTER_UID_ID = 0x73C4
+CHAPTER_TIME_START_ID = 0x91
+CHAPTER_TIME_END_ID = 0x92
+CHAPTER_DISPLAY_ID = 0x80
+CHAP_STRING_ID = 0x85
+CHAP_LANGUAGE_ID = 0x437C
+
+MATROSKA_DOCTYPES = ("matroska", "webm")
+# Level-1 elements read before giving up on finding the first cluster.
+MAX_HEADER_ELEMENTS = 4096
+
+_UNKNOWN = object()
+
+
+class MkvEditError(Exception):
+    """The file cannot be edited in place; remux it instead."""
+
+
+@dataclass
+class _Element:
+    id: int
+    offset: int
+    header_len: int
+    size: int
+
+    @property
+    def data_offset(self) -> int:
+        return self.offset + self.header_len
+
+    @property
+    def end(self) -> int:
+        return self.offset + self.header_len + self.size
+
+
+# --- EBML encoding ---------------------------------------------------------
+
+
+def _encode_id(element_id: int) -> bytes:
+    return element_id.to_bytes((element_id.bit_length() + 7) // 8, "big")
+
+
+def encode_size(size: int, length: int | None = None) -> bytes:
+    """EBML variable-size integer; the shortest form unless ``length`` is given."""
+    if length is None:
+        length = 1
+        while size >= (1 << (7 * length)) - 1:
+            length += 1
+    if length > 8 or size >= (1 << (7 * length)) - 1:
+        raise MkvEditError(f"size {size} does not fit in {length} byte(s)")
+    return ((1 << (7 * length)) | size).to_bytes(length, "big")
+
+
+def _element(element_id: int, payload: bytes) -> bytes:
+    return _encode_id(element_id) + encode_size(len(payload)) + payload
+
+
+def _uint(element_id: int, value: int) -> bytes:
+    return _element(element_id, value.to_bytes(max(1, (value.bit_length() + 7) // 8), "big"))
+
+
+def _with_crc(payload: bytes, crc: bool) -> bytes:
+    if not crc:
+        return payload
+    return _element(CRC32_ID, struct.pack("<I", zlib.crc32(payload))) + payload
+
+
+def void_header(total_len: int) -> bytes:
+    """Header of a ``Void`` element that spans exactly ``total_len`` bytes."""
+    if total_len < 2:
+        raise MkvEditError("cannot fill a 1-byte gap with Void")
+    for length in range(1, 9):
+        data = total_len - 1 - length
+        if 0 <= data < (1 << (7 * length)) - 1:
+            return bytes([VOID_ID]) + encode_size(data, length)
+    raise MkvEditError(f"gap of {total_len} bytes is too large for Void")
+
+
+def build_chapters_element(
+    spans: list[tuple[float, float, str]],
+    *,
+    crc: bool = False,
+    language: str = "eng",
+) -> bytes:
+    """Serialize one default edition with a ``ChapterAtom`` per (start, end, title)."""
+    rng = random.Random()
+    # UIDs with the top bit set are always 8 bytes, so element sizes are predictable.
+    uid_bit = 1 << 62
+    atoms = b""
+    for start, end, title in spans:
+        display = _element(CHAP_STRING_ID, title.encode("utf-8")) + _element(
+            CHAP_LANGUAGE_ID, language.encode("ascii")
+        )
+        atoms += _element(
+            CHAPTER_ATOM_ID,
+            _uint(CHAPTER_UID_ID, rng.getrandbits(62) | uid_bit)
+            + _uint(CHAPTER_TIME_START_ID, round(start * 1e9))
+            + _uint(CHAPTER_TIME_END_ID, round(end * 1e9))
+            + _element(CHAPTER_DISPLAY_ID, display),
+        )
+    edition = _element(
+        EDITION_ENTRY_ID,
+        _uint(EDITION_UID_ID, rng.getrandbits(62) | uid_bit)
+        + _uint(EDITION_FLAG_DEFAULT_ID, 1)
+        + atoms,
+    )
+    return _element(CHAPTERS_ID, _with_crc(edition, crc))
+
+
+# --- EBML decoding ---------------------------------------------------------
+
+
+def _read_vint(buf: bytes, pos: int, *, keep_marker: bool) -> tuple[object, int]:
+    if pos >= len(buf):
+        raise MkvEditError("truncated EBML element")
+    first = buf[pos]
+    if first == 0:
+        raise MkvEditError("invalid EBML variable-size integer")
+    length = 8 - first.bit_length() + 1
+    if pos + length > len(buf):
+        raise MkvEditError("truncated EBML element")
+    value = int.from_bytes(buf[pos : pos + length], "big")
+    if keep_marker:
+        return value, length
+    value &= (1 << (7 * length)) - 1
+    if value == (1 << (7 * length)) - 1:
+        return _UNKNOWN, length
+    return value, length
+
+
+def _parse_header(buf: bytes, pos: int = 0) -> tuple[int, object, int]:
+    """Return (element id, size or ``_UNKNOWN``, header length) at ``pos``."""
+    element_id, id_len = _read_vint(buf, pos, keep_marker=True)
+    size, size_len = _read_vint(buf, pos + id_len, keep_marker=False)
+    return int(element_id), size, id_len + size_len
+
+
+def _children(payload: bytes) -> list[tuple[int, bytes]]:
+    out: list[tuple[int, bytes]] = []
+    pos = 0
+    while pos < len(payload):
+        element_id, size, header_len = _parse_header(payload, pos)
+        if size is _UNKNOWN:
+            raise MkvEditError("unknown-size child element")
+        start = pos + header_len
+        out.append((element_id, payload[start : start + int(size)]))
+        pos = start + int(size)
+    return out
+
+
+class _MatroskaFile:
+    """Level-1 layout of a Matroska file opened for reading and writing."""
+
+    def __init__(self, f, *, dry_run: bool = False) -> None:
+        self.f = f
+        self.dry_run = dry_run
+        self.file_size = os.fstat(f.fileno()).st_size
+        head = self._read_element_at(0)
+        if head.id != EBML_ID:
+            raise MkvEditError("not an EBML file")
+        doctype = b""
+        for child_id, data in _children(self._read(head.data_offset, head.size)):
+            if child_id == DOCTYPE_ID:
+                doctype = data.rstrip(b"\0")
+        if doctype.decode("ascii", "replace") not in MATROSKA_DOCTYPES:
+            raise MkvEditError(f"unsupported DocType {doctype!r}")
+
+        segment = self._read_element_at(head.end, allow_unknown=True)
+        if segment.id != SEGMENT_ID:
+            raise MkvEditError("no Segment after the EBML header")
+        self.segment = segment
+        self.segment_size_known = segment.size >= 0
+        self.segment_start = segment.data_offset
+
+        self.front: list[_Element] = []
+        pos = self.segment_start
+        for _ in range(MAX_HEADER_ELEMENTS):
+            if pos >= self.file_size:
+                break
+            el = self._read_element_at(pos, allow_unknown=True)
+            if el.id == CLUSTER_ID:
+                break
+            if el.size < 0:
+                raise MkvEditError("unknown-size element before the first cluster")
+            self.front.append(el)
+            pos = el.end
+        else:
+            raise MkvEditError("no cluster found near the start of the file")
+        self.first_cluster = pos
+
+        self.seekhead = next((el for el in self.front if el.id == SEEKHEAD_ID), None)
+        self.seek_entries: list[tuple[int, int]] = []
+        self.seekhead_crc = False
+        if self.seekhead is not None:
+            payload = self._read(self.seekhead.data_offset, self.seekhead.size)
+            for child_id, data in _children(payload):
+                if child_id == CRC32_ID:
+                    self.seekhead_crc = True
+                elif child_id == SEEK_ID:
+                    entry = dict(_children(data))
+                    if SEEK_ID_ID in entry and SEEK_POSITION_ID in entry:
+                        self.seek_entries.append(
+                            (
+                                int.from_bytes(entry[SEEK_ID_ID], "big"),
+                                int.from_bytes(entry[SEEK_POSITION_ID], "big"),
+                            )
+                        )
+
+        self.chapters = next((el for el in self.front if el.id == CHAPTERS_ID), None)
+        self.chapters_crc = False
+        if self.chapters is None:
+            for element_id, rel in self.seek_entries:
+                if element_id == CHAPTERS_ID:
+                    el = self._read_element_at(self.segment_start + rel)
+                    if el.id == CHAPTERS_ID:
+                        self.chapters = el
+                    break
+        if self.chapters is not None:
+            first = self._read(self.chapters.data_offset, min(self.chapters.size, 12))
+            self.chapters_crc = bool(first) and _parse_header(first)[0] == CRC32_ID
+
+    def _secondary_seekhead_lists_chapters(self) -> bool:
+        for element_id, rel in self.seek_entries:
+            if element_id != SEEKHEAD_ID:
+                continue
+            other = self._read_element_at(self.segment_start + rel)
+            for child_id, data in _children(self._read(other.data_offset, other.size)):
+                if child_id == SEEK_ID:
+                    if dict(_children(data)).get(SEEK_ID_ID) == _encode_id(CHAPTERS_ID):
+                        return True
+        return False
+
+    def _read(self, offset: int, size: int) -> bytes:
+        self.f.seek(offset)
+        data = self.f.read(size)
+        if len(data) != size:
+            raise MkvEditError("unexpected end of file")
+        return data
+
+    def _read_element_at(self, offset: int, *, allow_unknown: bool = False) -> _Element:
+        self.f.seek(offset)
+        buf = self.f.read(12)
+        element_id, size, header_len = _parse_header(buf)
+        if size is _UNKNOWN:
+            if not allow_unknown:
+                raise MkvEditError("unexpected unknown-size element")
+            size = -1
+        return _Element(element_id, offset, header_len, int(size))
+
+    def _write(self, offset: int, data: bytes) -> None:
+        if self.dry_run:
+            return
+        self.f.seek(offset)
+        self.f.write(data)
+
+    def _space_after(self, el: _Element) -> int:
+        """Bytes from ``el.offset`` through any ``Void`` elements that follow it."""
+        end = el.end
+        while end < self.file_size:
+            other = self._read_element_at(end, allow_unknown=True)
+            if other.id != VOID_ID or other.size < 0:
+                break
+            end = other.end
+        return end - el.offset
+
+    @staticmethod
+    def _fits(need: int, space: int) -> bool:
+        return need == space or space - need >= 2
+
+    @staticmethod
+    def _padded(data: bytes, space: int) -> bytes:
+        """``data`` followed by a ``Void`` covering the rest of ``space``."""
+        rest = space - len(data)
+        return data if rest == 0 else data + void_header(rest)
+
+    def _segment_reaches_eof(self) -> bool:
+        return not self.segment_size_known or self.segment.end == self.file_size
+
+    def _seekhead_bytes(self, chapters_offset: int) -> bytes:
+        entries = [(eid, pos) for eid, pos in self.seek_entries if eid != CHAPTERS_ID]
+        entries.append((CHAPTERS_ID, chapters_offset - self.segment_start))
+        payload = b"".join(
+            _element(SEEK_ID, _element(SEEK_ID_ID, _encode_id(eid)) + _uint(SEEK_POSITION_ID, pos))
+            for eid, pos in entries
+        )
+        return _element(SEEKHEAD_ID, _with_crc(payload, self.seekhead_crc))
+
+    def _resize_segment(self, delta: int) -> None:
+        if not self.segment_size_known or delta == 0:
+            return
+        id_len = len(_encode_id(SEGMENT_ID))
+        size_field = encode_size(self.segment.size + delta, self.segment.header_len - id_len)
+        self._write(self.segment.offset + id_len, size_field)
+
+    def _sync(self) -> None:
+        if self.dry_run:
+            return
+        self.f.flush()
+        os.fsync(self.f.fileno())
+
+    def write_chapters(self, spans: list[tuple[float, float, str]]) -> str:
+        new = build_chapters_element(spans, crc=self.chapters_crc or self.seekhead_crc)
+        old = self.chapters
+
+        if old is not None:
+            space = self._space_after(old)
+            if self._fits(len(new), space):
+                self._write(old.offset, self._padded(new, space))
+                return "replaced"
+            if old.offset + space == self.file_size and self._segment_reaches_eof():
+                self._resize_segment(len(new) - space)
+                self._write(old.offset, new)
+                if not self.dry_run:
+                    self.f.truncate(old.offset + len(new))
+                return "replaced"
+
+        if self.seekhead is None:
+            raise MkvEditError("no SeekHead to index the new Chapters element")
+        if self._secondary_seekhead_lists_chapters():
+            # It would keep pointing at the old element.
+            raise MkvEditError("Chapters are indexed by a secondary SeekHead")
+        seek_space = self._space_after(self.seekhead)
+
+        # Padding after the SeekHead: grow the SeekHead and put the chapters at the end.
+        offset = self.seekhead.offset + seek_space - len(new)
+        if offset > self.seekhead.offset and self._fits(
+            len(self._seekhead_bytes(offset)) + len(new), seek_space
+        ):
+            seekhead = self._seekhead_bytes(offset)
+            self._write(offset, new)
+            self._sync()
+            self._write(self.seekhead.offset, self._padded(seekhead, seek_space - len(new)))
+            strategy = "void"
+        else:
+            target = None
+            for el in self.front:
+                if el.id == VOID_ID and el.offset >= self.seekhead.offset + seek_space:
+                    space = self._space_after(el)
+                    if self._fits(len(new), space):
+                        target = (el.offset, space)
+                        break
+            if target is not None:
+                offset = target[0]
+            elif not self._segment_reaches_eof():
+                raise MkvEditError("data after the Segment; cannot append")
+            else:
+                offset = self.file_size
+            seekhead = self._seekhead_bytes(offset)
+            if not self._fits(len(seekhead), seek_space):
+                raise MkvEditError("no room in the SeekHead for a Chapters entry")
+            if target is not None:
+                self._write(offset, self._padded(new, target[1]))
+                strategy = "void"
+            else:
+                self._write(offset, new)
+                self._resize_segment(len(new))
+                strategy = "appended"
+            self._sync()
+            self._write(self.seekhead.offset, self._padded(seekhead, seek_space))
+
+        if old is not None:
+            self._write(old.offset, void_header(old.end - old.offset))
+        return strategy
+
+
+def write_chapters_in_place(
+    path: str,
+    spans: list[tuple[float, float, str]],
+    *,
+    dry_run: bool = False,
+) -> str:
+    """
+    Add or replace the chapters of the Matroska file at ``path`` in place.
+
+    ``spans`` holds (start_sec, end_sec, title) per chapter. Returns how the
+    element was placed (``"replaced"``, ``"void"`` or ``"appended"``); raises
+    ``MkvEditError`` before writing anything when the file needs a remux.
+    ``dry_run`` only plans the edit, leaving the file untouched.
+    """
+    with open(path, "rb" if dry_run else "r+b") as f:
+        strategy = _MatroskaFile(f, dry_run=dry_run).write_chapters(spans)
+        if not dry_run:
+            f.flush()
+            os.fsync(f.fileno())
+    return strategy
+
+
+def read_chapters(path: str) -> list[tuple[float, float, str]]:
+    """(start_sec, end_sec, title) of every chapter in the first edition, or []."""
+    with open(path, "rb") as f:
+        mkv = _MatroskaFile(f)
+        if mkv.chapters is None:
+            return []
+        payload = mkv._read(mkv.chapters.data_offset, mkv.chapters.size)
+    out: list[tuple[float, float, str]] = []
+    editions = [data for cid, data in _children(payload) if cid == EDITION_ENTRY_ID]
+    for atom_id, atom in _children(editions[0]) if editions else []:
+        if atom_id != CHAPTER_ATOM_ID:
+            continue
+        fields = dict(_children(atom))
+        display = dict(_children(fields.get(CHAPTER_DISPLAY_ID, b"")))
+        out.append(
+            (
+                int.from_bytes(fields.get(CHAPTER_TIME_START_ID, b"\0"), "big") / 1e9,
+                int.from_bytes(fields.get(CHAPTER_TIME_END_ID, b"\0"), "big") / 1e9,
+                display.get(CHAP_STRING_ID, b"").decode("utf-8", "replace"),
+            )
+        )
+    return out
@@ -0,0 +1,300 @@
+"""
+Write MP4 chapters by rewriting only the ``moov`` box.
+
+Chapters are stored as a Nero ``chpl`` box in ``moov/udta``, which FFmpeg,
+MP4Box, mpv, VLC and most hardware players read. Media data never passes
+through Python:
+
+* ``write_chapters_in_place`` edits the file itself. The new ``moov`` reuses the
+  old one's space plus any ``free``/``skip`` boxes after it; a ``moov`` at the end
+  of the file simply grows; otherwise the new ``moov`` is appended and the old one
+  is renamed to ``free``. No chunk moves, so no offsets change.
+* ``plan_rewrite`` describes a new file with the same layout: the bytes before
+  ``moov``, the new ``moov`` with its ``stco``/``co64`` chunk offsets shifted by
+  the size change, and the rest of the source as a byte range to copy.
+
+Files whose chapters live in a QuickTime chapter track (``tref/chap``) would
+keep showing the old track's titles, so they raise ``Mp4EditError`` like any
+other layout this module does not handle; callers remux those instead.
+"""
+
+from __future__ import annotations
+
+import os
+import struct
+from dataclasses import dataclass
+
+# Nero chapters count in one byte and store start times in 100 ns units.
+MAX_CHPL_CHAPTERS = 255
+_CHPL_TIMESCALE = 10_000_000
+
+_CONTAINERS = {b"moov", b"trak", b"mdia", b"minf", b"stbl", b"edts", b"dinf", b"udta", b"tref"}
+_PADDING = (b"free", b"skip")
+# A rewritten file is described as literal bytes and (offset, length) ranges of the source.
+Piece = bytes | tuple[int, int]
+
+
+class Mp4EditError(Exception):
+    """The file cannot be edited at box level; remux it instead."""
+
+
+@dataclass
+class _Box:
+    type: bytes
+    offset: int
+    header_len: int
+    size: int
+
+    @property
+    def end(self) -> int:
+        return self.offset + self.size
+
+    @property
+    def data_offset(self) -> int:
+        return self.offset + self.header_len
+
+
+def _box(box_type: bytes, payload: bytes) -> bytes:
+    if len(payload) + 8 <= 0xFFFFFFFF:
+        return struct.pack(">I4s", len(payload) + 8, box_type) + payload
+    return struct.pack(">I4sQ", 1, box_type, len(payload) + 16) + payload
+
+
+def _free_box(total_len: int) -> bytes:
+    if total_len < 8:
+        raise Mp4EditError("gap too small for a free box")
+    return struct.pack(">I4s", total_len, b"free") + b"\0" * (total_len - 8)
+
+
+def _parse_box_header(buf: bytes, pos: int, limit: int) -> _Box:
+    if pos + 8 > limit:
+        raise Mp4EditError("truncated box header")
+    size, box_type = struct.unpack_from(">I4s", buf, pos)
+    header_len = 8
+    if size == 1:
+        if pos + 16 > limit:
+            raise Mp4EditError("truncated box header")
+        (size,) = struct.unpack_from(">Q", buf, pos + 8)
+        header_len = 16
+    elif size == 0:
+        size = limit - pos
+    if size < header_len or pos + size > limit:
+        raise Mp4EditError(f"bad size for box {box_type!r}")
+    return _Box(box_type, pos, header_len, size)
+
+
+def _children(buf: bytes, start: int, end: int) -> list[_Box]:
+    out: list[_Box] = []
+    pos = start
+    while pos + 8 <= end:
+        box = _parse_box_header(buf, pos, end)
+        out.append(box)
+        pos = box.end
+    return out
+
+
+def build_chpl(spans: list[tuple[float, float, str]]) -> bytes:
+    """A version-1 ``chpl`` box for (start, end, title) spans; ends are implied."""
+    if len(spans) > MAX_CHPL_CHAPTERS:
+        raise Mp4EditError(f"Nero chapters hold at most {MAX_CHPL_CHAPTERS} entries")
+    payload = struct.pack(">B3xIB", 1, 0, len(spans))
+    for start, _end, title in spans:
+        raw = title.encode("utf-8")[:255]
+        payload += struct.pack(">QB", round(start * _CHPL_TIMESCALE), len(raw)) + raw
+    return _box(b"chpl", payload)
+
+
+def _parse_chpl(payload: bytes) -> list[tuple[float, str]]:
+    version = payload[0]
+    pos = 8 if version else 4
+    count = payload[pos]
+    pos += 1
+    out: list[tuple[float, str]] = []
+    for _ in range(count):
+        start, length = struct.unpack_from(">QB", payload, pos)
+        pos += 9
+        title = payload[pos : pos + length].decode("utf-8", "replace")
+        out.append((start / _CHPL_TIMESCALE, title))
+        pos += length
+    return out
+
+
+def _shift_chunk_offsets(
+    moov: bytearray, start: int, end: int, moved_from: int, delta: int
+) -> None:
+    """Add ``delta`` to every ``stco``/``co64`` entry at or after ``moved_from``."""
+    for box in _children(moov, start, end):
+        if box.type in _CONTAINERS:
+            _shift_chunk_offsets(moov, box.data_offset, box.end, moved_from, delta)
+        elif box.type in (b"stco", b"co64"):
+            fmt, width = (">I", 4) if box.type == b"stco" else (">Q", 8)
+            (count,) = struct.unpack_from(">I", moov, box.data_offset + 4)
+            pos = box.data_offset + 8
+            if pos + count * width > box.end:
+                raise Mp4EditError(f"truncated {box.type.decode()} table")
+            for _ in range(count):
+                (value,) = struct.unpack_from(fmt, moov, pos)
+                if value >= moved_from:
+                    value += delta
+                    if width == 4 and value > 0xFFFFFFFF:
+                        raise Mp4EditError("chunk offsets overflow stco")
+                    struct.pack_into(fmt, moov, pos, value)
+                pos += width
+
+
+def _has_chapter_track(moov: bytes, start: int, end: int) -> bool:
+    for box in _children(moov, start, end):
+        if box.type == b"chap":
+            return True
+        if box.type in _CONTAINERS and _has_chapter_track(moov, box.data_offset, box.end):
+            return True
+    return False
+
+
+class _Mp4File:
+    """Top-level layout of an MP4 file and its ``moov`` box."""
+
+    def __init__(self, f) -> None:
+        self.f = f
+        self.file_size = os.fstat(f.fileno()).st_size
+        self.boxes: list[_Box] = []
+        # A last box with size 0 runs to the end of the file, so nothing can be appended.
+        self.open_ended = False
+        pos = 0
+        while pos < self.file_size:
+            f.seek(pos)
+            head = f.read(16)
+            if len(head) < 8:
+                raise Mp4EditError("trailing bytes after the last box")
+            box = _parse_box_header(head + bytes(16 - len(head)), 0, self.file_size - pos)
+            box.offset = pos
+            self.open_ended = struct.unpack_from(">I", head)[0] == 0
+            self.boxes.append(box)
+            pos = box.end
+        if not self.boxes or self.boxes[0].type != b"ftyp":
+            raise Mp4EditError("not an MP4 file")
+        moovs = [b for b in self.boxes if b.type == b"moov"]
+        if len(moovs) != 1:
+            raise Mp4EditError("expected exactly one moov box")
+        self.moov = moovs[0]
+        self.fragmented = any(b.type == b"moof" for b in self.boxes)
+        f.seek(self.moov.offset)
+        self.moov_bytes = f.read(self.moov.size)
+
+    def chapters(self) -> list[tuple[float, str]]:
+        moov = self.moov_bytes
+        for udta in _children(moov, self.moov.header_len, self.moov.size):
+            if udta.type != b"udta":
+                continue
+            for box in _children(moov, udta.data_offset, udta.end):
+                if box.type == b"chpl":
+                    return _parse_chpl(moov[box.data_offset : box.end])
+        return []
+
+    def new_moov(self, spans: list[tuple[float, float, str]]) -> bytes:
+        moov = self.moov_bytes
+        if _has_chapter_track(moov, self.moov.header_len, self.moov.size):
+            raise Mp4EditError("chapters are stored in a QuickTime chapter track")
+        chpl = build_chpl(spans)
+        parts: list[bytes] = []
+        found_udta = False
+        for child in _children(moov, self.moov.header_len, self.moov.size):
+            raw = moov[child.offset : child.end]
+            if child.type == b"udta":
+                found_udta = True
+                kept = [
+                    moov[b.offset : b.end]
+                    for b in _children(moov, child.data_offset, child.end)
+                    if b.type != b"chpl"
+                ]
+                raw = _box(b"udta", chpl + b"".join(kept))
+            parts.append(raw)
+        if not found_udta:
+            parts.append(_box(b"udta", chpl))
+        return _box(b"moov", b"".join(parts))
+
+    def space_after_moov(self) -> int:
+        end = self.moov.end
+        for box in self.boxes:
+            if box.offset == end and box.type in _PADDING:
+                end = box.end
+        return end - self.moov.offset
+
+    def _write(self, offset: int, data: bytes) -> None:
+        self.f.seek(offset)
+        self.f.write(data)
+
+
+def write_chapters_in_place(
+    path: str,
+    spans: list[tuple[float, float, str]],
+    *,
+    dry_run: bool = False,
+) -> str:
+    """
+    Replace the Nero chapters of the MP4 at ``path`` without moving any media.
+
+    Returns ``"replaced"`` when the new ``moov`` took the old one's place (plus
+    padding, or the end of the file) and ``"appended"`` when it went to the end
+    of the file. Raises ``Mp4EditError`` before writing when the file needs a
+    remux; ``dry_run`` stops after that check.
+    """
+    with open(path, "rb" if dry_run else "r+b") as f:
+        mp4 = _Mp4File(f)
+        moov = mp4.new_moov(spans)
+        space = mp4.space_after_moov()
+        at_end = mp4.moov.offset + space == mp4.file_size
+        fits = len(moov) == space or space - len(moov) >= 8
+        if not (fits or at_end) and (mp4.fragmented or mp4.open_ended):
+            raise Mp4EditError("no room for a larger moov")
+        if dry_run:
+            return "replaced" if fits or at_end else "appended"
+        if fits:
+            rest = space - len(moov)
+            mp4._write(mp4.moov.offset, moov + (_free_box(rest) if rest else b""))
+            strategy = "replaced"
+        elif at_end:
+            mp4._write(mp4.moov.offset, moov)
+            f.truncate(mp4.moov.offset + len(moov))
+            strategy = "replaced"
+        else:
+            mp4._write(mp4.file_size, moov)
+            f.flush()
+            os.fsync(f.fileno())
+            mp4._write(mp4.moov.offset + 4, b"free")
+            strategy = "appended"
+        f.flush()
+        os.fsync(f.fileno())
+    return strategy
+
+
+def plan_rewrite(path: str, spans: list[tuple[float, float, str]]) -> list[Piece]:
+    """
+    Pieces of a copy of ``path`` with new chapters and the original box order.
+
+    Everything after ``moov`` shifts by its change in size, so chunk offsets
+    pointing there are patched; a ``moov`` in front stays in front for
+    progressive playback.
+    """
+    with open(path, "rb") as f:
+        mp4 = _Mp4File(f)
+        if mp4.fragmented:
+            raise Mp4EditError("fragmented MP4")
+        moov = bytearray(mp4.new_moov(spans))
+    delta = len(moov) - mp4.moov.size
+    if delta:
+        header_len = _parse_box_header(moov, 0, len(moov)).header_len
+        _shift_chunk_offsets(moov, header_len, len(moov), mp4.moov.end, delta)
+    pieces: list[Piece] = []
+    if mp4.moov.offset:
+        pieces.append((0, mp4.moov.offset))
+    pieces.append(bytes(moov))
+    if mp4.moov.end < mp4.file_size:
+        pieces.append((mp4.moov.end, mp4.file_size - mp4.moov.end))
+    return pieces
+
+
+def read_chapters(path: str) -> list[tuple[float, str]]:
+    """(start_sec, title) of each Nero chapter in ``path``, or []."""
+    with open(path, "rb") as f:
+        return _Mp4File(f).chapters()
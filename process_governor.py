@@ -0,0 +1,334 @@
+"""
+One admission point for every FFmpeg and ffprobe process the app starts.
+
+Each process takes a ``ProcessSlot`` from the ``ProcessGovernor`` before it is
+spawned, so scans, probes and exports started from different threads (the editor
+scan, the queue, thumbnails) share one cap on concurrent processes. Processes run
+at one of three priorities, taken from the calling context (``scan_priority``):
+
+* ``FOREGROUND``: the editor's own scan. While one runs, background processes are
+  stopped (``SIGSTOP``) and continued when it ends, and no new ones start, so the
+  interactive scan gets the whole machine and finishes first.
+* ``NORMAL``: the default (CLI, exports, thumbnails).
+* ``BACKGROUND``: batch scans. Their processes get a low CPU priority (``nice``)
+  and the idle I/O class (``ionice``, Linux) right after spawn.
+
+Stopped processes do not count against the cap. Pausing, ``nice`` and ``ionice``
+are best effort and skipped where the platform does not support them.
+"""
+
+from __future__ import annotations
+
+import contextvars
+import ctypes
+import functools
+import logging
+import os
+import platform
+import signal
+import subprocess
+import sys
+import threading
+from collections.abc import Callable, Iterator
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+FOREGROUND = "foreground"
+NORMAL = "normal"
+BACKGROUND = "background"
+PRIORITIES = (FOREGROUND, NORMAL, BACKGROUND)
+
+BACKGROUND_NICE = 10
+# ioprio_set(2) numbers per architecture; other machines skip ionice.
+_IOPRIO_SET = {"x86_64": 251, "aarch64": 30, "arm64": 30, "riscv64": 30, "i686": 289}
+_IOPRIO_WHO_PROCESS = 1
+_IOPRIO_CLASS_IDLE = 3
+_IOPRIO_CLASS_SHIFT = 13
+
+_priority: contextvars.ContextVar[str] = contextvars.ContextVar("scan_priority", default=NORMAL)
+
+
+def current_priority() -> str:
+    return _priority.get()
+
+
+def priority_rank(priority: str) -> int:
+    """Order in which waiting processes are admitted (lower first)."""
+    return PRIORITIES.index(priority) if priority in PRIORITIES else 1
+
+
+def default_process_limit() -> int:
+    # Twice the cores: processes block on reads and pipes, and ffprobe calls are short.
+    return 2 * max(1, os.cpu_count() or 1)
+
+
+def process_threads(pid: int) -> list[int]:
+    """Thread ids of ``pid`` (just ``pid`` where ``/proc`` is not available)."""
+    try:
+        return [int(t) for t in os.listdir(f"/proc/{pid}/task")]
+    except (OSError, ValueError):
+        return [pid]
+
+
+@functools.cache
+def _libc() -> ctypes.CDLL | None:
+    try:
+        return ctypes.CDLL(None, use_errno=True)
+    except OSError:
+        return None
+
+
+def _ioprio_set_idle(tid: int) -> None:
+    number = _IOPRIO_SET.get(platform.machine()) if sys.platform.startswith("linux") else None
+    libc = _libc() if number is not None else None
+    if libc is None:
+        return
+    try:
+        libc.syscall(
+            number,
+            _IOPRIO_WHO_PROCESS,
+            tid,
+            _IOPRIO_CLASS_IDLE << _IOPRIO_CLASS_SHIFT,
+        )
+    except AttributeError:
+        pass
+
+
+def lower_priority(pid: int, nice: int = BACKGROUND_NICE) -> None:
+    """
+    Give ``pid`` and its threads a low CPU priority and the idle I/O class.
+
+    Runs right after spawn, before FFmpeg starts decoder threads (which inherit
+    both), as ``ffmpeg_engine`` does for CPU pinning.
+    """
+    for tid in process_threads(pid):
+        if hasattr(os, "setpriority"):
+            try:
+                os.setpriority(os.PRIO_PROCESS, tid, nice)
+            except OSError:
+                pass
+        _ioprio_set_idle(tid)
+
+
+def _signal_process(pid: int, sig: int) -> None:
+    try:
+        if os.getpgid(pid) == pid:
+            os.killpg(pid, sig)
+        else:
+            os.kill(pid, sig)
+    except OSError:
+        pass
+
+
+class ProcessSlot:
+    """Permission for one process; ``attach`` its pid after spawn, ``release`` once it exits."""
+
+    def __init__(self, governor: ProcessGovernor, priority: str) -> None:
+        self.governor = governor
+        self.priority = priority
+        self.pid: int | None = None
+        self.stopped = False
+        self._released = False
+
+    def attach(self, pid: int) -> None:
+        self.governor._attach(self, pid)
+
+    def release(self) -> None:
+        self.governor._release(self)
+
+
+class ProcessGovernor:
+    """
+    Caps concurrent processes at ``max_processes`` and pauses background ones
+    while a foreground scan is active; see the module docstring.
+    """
+
+    def __init__(self, max_processes: int | None = None) -> None:
+        self.max_processes = max(1, int(max_processes or default_process_limit()))
+        self._cond = threading.Condition()
+        self._slots: list[ProcessSlot] = []
+        self._foreground = 0
+        self._listeners: list[Callable[[], None]] = []
+
+    @property
+    def paused(self) -> bool:
+        """Whether background processes are held because a foreground scan runs."""
+        return self._foreground > 0
+
+    def set_limit(self, max_processes: int | None) -> None:
+        """Change the cap (None or 0: ``default_process_limit``)."""
+        with self._cond:
+            self.max_processes = max(1, int(max_processes or default_process_limit()))
+        self._changed()
+
+    def add_listener(self, callback: Callable[[], None]) -> None:
+        """``callback()`` runs whenever a slot may have become available."""
+        with self._cond:
+            self._listeners.append(callback)
+
+    def running(self) -> int:
+        """Processes counted against the cap (stopped background ones are not)."""
+        with self._cond:
+            return self._load()
+
+    def _load(self) -> int:
+        return sum(1 for slot in self._slots if not slot.stopped)
+
+    def _admissible(self, priority: str) -> bool:
+        if priority == BACKGROUND and self.paused:
+            return False
+        return self._load() < self.max_processes
+
+    def try_acquire(self, priority: str | None = None) -> ProcessSlot | None:
+        """A slot if one is free for ``priority`` (default: the context's) right now."""
+        priority = priority or current_priority()
+        with self._cond:
+            if not self._admissible(priority):
+                return None
+            return self._take(priority)
+
+    def acquire(
+        self,
+        priority: str | None = None,
+        is_cancelled: Callable[[], bool] | None = None,
+        poll_interval: float = 0.1,
+    ) -> ProcessSlot | None:
+        """Wait for a slot; None when ``is_cancelled`` turns true first."""
+        priority = priority or current_priority()
+        with self._cond:
+            while not self._admissible(priority):
+                if is_cancelled is not None and is_cancelled():
+                    return None
+                self._cond.wait(poll_interval if is_cancelled is not None else None)
+            return self._take(priority)
+
+    def _take(self, priority: str) -> ProcessSlot:
+        slot = ProcessSlot(self, priority)
+        self._slots.append(slot)
+        if priority == FOREGROUND:
+            self._set_foreground(+1)
+        return slot
+
+    def _attach(self, slot: ProcessSlot, pid: int) -> None:
+        if slot.priority == BACKGROUND:
+            lower_priority(pid)
+        with self._cond:
+            slot.pid = pid
+            if slot.priority == BACKGROUND and self.paused and not slot._released:
+                # A foreground scan began between admission and spawn.
+                self._stop(slot)
+
+    def _release(self, slot: ProcessSlot) -> None:
+        with self._cond:
+            if slot._released:
+                return
+            slot._released = True
+            self._slots.remove(slot)
+            if slot.priority == FOREGROUND:
+                self._set_foreground(-1)
+        self._changed()
+
+    @contextmanager
+    def foreground(self) -> Iterator[None]:
+        """Hold background processes for the duration of the block."""
+        with self._cond:
+            self._set_foreground(+1)
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._set_foreground(-1)
+            self._changed()
+
+    def _set_foreground(self, delta: int) -> None:
+        was_paused = self.paused
+        self._foreground += delta
+        if self.paused and not was_paused:
+            for slot in self._slots:
+                if slot.priority == BACKGROUND and slot.pid is not None:
+                    self._stop(slot)
+        elif was_paused and not self.paused:
+            for slot in self._slots:
+                if slot.stopped:
+                    slot.stopped = False
+                    _signal_process(slot.pid, signal.SIGCONT)
+
+    def _stop(self, slot: ProcessSlot) -> None:
+        if not hasattr(signal, "SIGSTOP") or slot.pid is None:
+            return
+        slot.stopped = True
+        _signal_process(slot.pid, signal.SIGSTOP)
+
+    def _changed(self) -> None:
+        with self._cond:
+            self._cond.notify_all()
+            listeners = list(self._listeners)
+        for callback in listeners:
+            try:
+                callback()
+            except Exception:
+                logger.exception("Process governor listener failed")
+
+
+_governor: ProcessGovernor | None = None
+_governor_lock = threading.Lock()
+
+
+def default_governor() -> ProcessGovernor:
+    global _governor
+    with _governor_lock:
+        if _governor is None:
+            _governor = ProcessGovernor()
+        return _governor
+
+
+@contextmanager
+def scan_priority(priority: str, governor: ProcessGovernor | None = None) -> Iterator[None]:
+    """
+    Run the block's processes at ``priority``.
+
+    A ``FOREGROUND`` block also keeps background processes paused from start to
+    end, not just while one of its own processes runs.
+    """
+    token = _priority.set(priority)
+    try:
+        if priority == FOREGROUND:
+            with (governor or default_governor()).foreground():
+                yield
+        else:
+            yield
+    finally:
+        _priority.reset(token)
+
+
+def run(
+    cmd: list[str],
+    *,
+    priority: str | None = None,
+    governor: ProcessGovernor | None = None,
+) -> subprocess.CompletedProcess:
+    """
+    ``subprocess.run(cmd, capture_output=True, text=True)`` inside a governor slot.
+
+    For short tools such as ffprobe; raises ``OSError`` when ``cmd`` cannot start.
+    """
+    slot = (governor or default_governor()).acquire(priority)
+    assert slot is not None
+    try:
+        with subprocess.Popen(
+            cmd,
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            text=True,
+        ) as proc:
+            slot.attach(proc.pid)
+            try:
+                stdout, stderr = proc.communicate()
+            except BaseException:
+                proc.kill()
+                raise
+        return subprocess.CompletedProcess(proc.args, proc.returncode, stdout, stderr)
+    finally:
+        slot.release()
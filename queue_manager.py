@@ -18,31 +18,21 @@ from PySide6.QtWidgets import (
 )
 
 from blackdetect_worker import BatchBlackdetectWorker, format_eta
-from export_utils import (
-    get_media_duration_seconds,
-    normalize_export_format,
-    RemuxError,
-    remux_from_ffmetadata_file,
-    write_ffmpeg_chapter_file,
-    write_mkvmerge_simple_chapters,
-)
+from coarse_scan import CoarseScanReport
+from detector import chapter_times_from_events
+from export_utils import DEFAULT_EXPORT_JOBS, normalize_export_format
+from export_worker import ExportWorker
+from media_probe import prefetch_media_info
+from scan_checkpoint import BatchCheckpoint, default_checkpoint_path
+from scan_cost import batch_eta
+from scan_runner import DEFAULT_SCAN_SETTINGS, staging_from_settings
 from scan_settings import ScanSettingsDialog
-from time_windows import DEFAULT_SCAN_WINDOW_LIST_TEXT
 
 
 class QueueManager(QMainWindow):
     def __init__(self, parent=None):
         super().__init__(parent)
-        self.scan_settings = {
-            "min_black_seconds": 0.4,
-            "ratio_black_pixels": 0.98,
-            "black_pixel_threshold": 0.08,
-            "window_list": DEFAULT_SCAN_WINDOW_LIST_TEXT,
-            "export_format": "mp4",
-            "max_analysis_width": 854,
-            "use_hwaccel": False,
-            "parallel_scan_jobs": 4,
-        }
+        self.scan_settings = dict(DEFAULT_SCAN_SETTINGS)
         self.setWindowTitle("MaChap File Queue")
         self.resize(600, 500)
 
@@ -99,7 +89,42 @@ class QueueManager(QMainWindow):
 
         self.scan_thread: BatchBlackdetectWorker | None = None
         self.progress_dialog: QProgressDialog | None = None
+        self.export_thread: ExportWorker | None = None
+        self.export_progress_dialog: QProgressDialog | None = None
+        self._export_rows: list[QListWidgetItem] = []
+        self._export_ratios: dict[int, float] = {}
+        self._export_failures: list[str] = []
         self._scan_elapsed: QElapsedTimer | None = None
+        self._batch_ratios: dict[int, float] = {}
+        self._batch_costs: list[float] = []
+        self._batch_cores = 1
+        self._batch_found = 0
+        self._checkpoint: BatchCheckpoint | None = None
+        self._restore_checkpoint()
+
+    def _restore_checkpoint(self) -> None:
+        """Reload the queue of a scan that was cancelled or cut short by a crash."""
+        pending = BatchCheckpoint.pending(default_checkpoint_path())
+        if pending is None:
+            return
+        paths, settings = pending
+        self.scan_settings = {**DEFAULT_SCAN_SETTINGS, **settings}
+        results = BatchCheckpoint(default_checkpoint_path(), paths, self.scan_settings).results()
+        for path in paths:
+            self.import_list.addItem(QListWidgetItem(path))
+            events = results.get(path)
+            self.project_files.append(
+                {
+                    "path": path,
+                    "chapters": chapter_times_from_events(events) if events is not None else [],
+                    "settings": self.scan_settings.copy(),
+                }
+            )
+        prefetch_media_info(paths)
+        self.statusBar().showMessage(
+            f"Restored an interrupted scan ({len(results)} of {len(paths)} files done). "
+            "Scan All Files resumes it."
+        )
 
     def load_files(self) -> None:
         files, _ = QFileDialog.getOpenFileNames(
@@ -115,12 +140,12 @@ class QueueManager(QMainWindow):
                     "settings": self.scan_settings.copy(),
                 }
             )
+        # Durations, codecs and chapters are needed by the scan and the editor;
+        # probe in the background so neither waits on ffprobe later.
+        prefetch_media_info(files)
 
     def export_files(self) -> None:
-        for i in range(self.export_list.count()):
-            data = self.export_list.item(i).data(1000)
-            if data:
-                self.process_export_item(data)
+        self._start_export()
 
     def scan_all_files(self) -> None:
         paths = [self.import_list.item(i).text() for i in range(self.import_list.count())]
@@ -134,6 +159,9 @@ class QueueManager(QMainWindow):
 
         self._scan_elapsed = QElapsedTimer()
         self._scan_elapsed.start()
+        self._batch_ratios = {}
+        self._batch_costs = []
+        self._batch_found = 0
 
         self.progress_dialog = QProgressDialog(self)
         self.progress_dialog.setWindowTitle("Scanning videos")
@@ -147,10 +175,18 @@ class QueueManager(QMainWindow):
         self.progress_dialog.setAutoReset(False)
         self.progress_dialog.canceled.connect(self.cancel_scan)
 
-        self.scan_thread = BatchBlackdetectWorker(paths, self.scan_settings.copy())
+        # Progress of an interrupted scan of this queue with these settings is resumed.
+        self._checkpoint = BatchCheckpoint(default_checkpoint_path(), paths, self.scan_settings)
+        self.scan_thread = BatchBlackdetectWorker(
+            paths, self.scan_settings.copy(), checkpoint=self._checkpoint
+        )
+        self.scan_thread.plan_ready.connect(self._on_batch_plan)
         self.scan_thread.file_progress.connect(self._on_batch_scan_progress)
+        self.scan_thread.event_found.connect(self._on_batch_scan_event)
+        self.scan_thread.coarse_report.connect(self._on_batch_coarse_report)
         self.scan_thread.result.connect(self.handle_scan_result)
         self.scan_thread.file_error.connect(self._on_batch_file_error)
+        self.scan_thread.batch_completed.connect(self._clear_checkpoint)
         self.scan_thread.finished.connect(self.finish_scan)
         self.scan_thread.canceled.connect(self.finish_scan)
 
@@ -159,21 +195,37 @@ class QueueManager(QMainWindow):
         self.scan_thread.start()
         self.progress_dialog.show()
 
+    def _on_batch_plan(self, costs: list, cores: int) -> None:
+        self._batch_costs = [float(c) for c in costs]
+        self._batch_cores = max(1, int(cores))
+
     def _on_batch_scan_progress(self, idx: int, total: int, path: str, ratio: float) -> None:
-        overall = (idx + min(1.0, ratio)) / max(total, 1)
+        self._batch_ratios[idx] = min(1.0, max(self._batch_ratios.get(idx, 0.0), ratio))
+        # Files weigh by predicted scan cost, so a film counts for more than a clip.
+        costs = self._batch_costs if len(self._batch_costs) == total else [1.0] * total
+        done = sum(1 for r in self._batch_ratios.values() if r >= 1.0)
+        running = sum(1 for r in self._batch_ratios.values() if r < 1.0)
+        el = self._scan_elapsed.elapsed() / 1000.0 if self._scan_elapsed is not None else 0.0
+        overall, eta = batch_eta(costs, self._batch_ratios, el, self._batch_cores)
         if self.progress_dialog is not None:
             self.progress_dialog.setValue(int(1000 * overall))
-        el = self._scan_elapsed.elapsed() / 1000.0 if self._scan_elapsed is not None else 0.0
-        eta = el * (1.0 / max(overall, 0.01) - 1.0) if overall > 0.02 else None
         name = os.path.basename(path) if path else ""
         label = (
-            f"File {idx + 1} of {total}\n{name}\n"
+            f"{done} of {total} files done, {running} scanning\n{name}\n"
             f"Overall about {overall * 100:.0f}% — ETA ~ {format_eta(eta)}\n"
-            f"Elapsed {format_eta(el)}"
+            f"Elapsed {format_eta(el)} — {self._batch_found} black segment(s) found"
         )
         if self.progress_dialog is not None:
             self.progress_dialog.setLabelText(label)
 
+    def _on_batch_scan_event(self, _idx: int, _event: dict) -> None:
+        self._batch_found += 1
+
+    def _on_batch_coarse_report(self, idx: int, report: CoarseScanReport) -> None:
+        if 0 <= idx < len(self.project_files):
+            name = os.path.basename(self.project_files[idx]["path"])
+            self.statusBar().showMessage(f"{name}: {report.summary()}")
+
     def _on_batch_file_error(self, path: str, message: str) -> None:
         QMessageBox.warning(
             self,
@@ -222,6 +274,12 @@ class QueueManager(QMainWindow):
         if self.scan_thread is not None and self.scan_thread.isRunning():
             self.scan_thread.cancel()
 
+    def _clear_checkpoint(self) -> None:
+        if self._checkpoint is not None:
+            self._checkpoint.clear()
+            self._checkpoint = None
+        self.statusBar().clearMessage()
+
     def handle_scan_result(self, index: int, chapters: list[float]) -> None:
         if 0 <= index < len(self.project_files):
             self.project_files[index]["chapters"] = chapters
@@ -236,46 +294,118 @@ class QueueManager(QMainWindow):
             self.progress_dialog = None
         self._scan_elapsed = None
 
-    def process_export_item(self, file_info: dict[str, Any]) -> None:
-        path = file_info["path"]
-        chapters = file_info["chapters"]
-        export_format = normalize_export_format(file_info.get("format"))
-
-        base_name = os.path.splitext(os.path.basename(path))[0]
-        output_basename = os.path.join(self.export_dir, f"{base_name}_chaptered")
-        duration_sec = get_media_duration_seconds(path)
-
-        fmt = export_format
-        if fmt == "mkvmerge_txt":
-            metadata_file = f"{output_basename}_chapters_mkvmerge.txt"
-            write_mkvmerge_simple_chapters(chapters, metadata_file)
+    def _start_export(self) -> None:
+        if self.export_thread is not None and self.export_thread.isRunning():
+            QMessageBox.information(self, "Export in progress", "An export is already running.")
             return
-
-        if fmt == "txt":
-            metadata_file = f"{output_basename}_chapters_ffmeta.txt"
-            write_ffmpeg_chapter_file(chapters, metadata_file, duration_sec=duration_sec)
+        rows: list[QListWidgetItem] = []
+        items: list[dict[str, Any]] = []
+        for i in range(self.export_list.count()):
+            row = self.export_list.item(i)
+            data = row.data(1000)
+            if data:
+                rows.append(row)
+                items.append(data)
+        if not items:
+            QMessageBox.information(
+                self, "Nothing to export", "Add scanned files to the export queue first."
+            )
             return
 
-        metadata_file = f"{output_basename}_chapters_ffmeta.txt"
-        write_ffmpeg_chapter_file(chapters, metadata_file, duration_sec=duration_sec)
-
-        ext = ".mp4" if fmt == "mp4" else ".mkv"
-        output_file = f"{output_basename}{ext}"
+        self._export_rows = rows
+        self._export_ratios = {}
+        self._export_failures = []
+
+        self.export_progress_dialog = QProgressDialog(self)
+        self.export_progress_dialog.setWindowTitle("Exporting videos")
+        self.export_progress_dialog.setLabelText("Starting…")
+        self.export_progress_dialog.setCancelButtonText("Cancel")
+        self.export_progress_dialog.setRange(0, 1000)
+        self.export_progress_dialog.setValue(0)
+        self.export_progress_dialog.setMinimumDuration(0)
+        self.export_progress_dialog.setAutoClose(False)
+        self.export_progress_dialog.setAutoReset(False)
+        self.export_progress_dialog.canceled.connect(self.cancel_export)
+
+        jobs = int(self.scan_settings.get("export_jobs", DEFAULT_EXPORT_JOBS))
+        self.export_thread = ExportWorker(
+            items,
+            self.export_dir,
+            max_workers=jobs,
+            in_place=bool(self.scan_settings.get("export_in_place", False)),
+            staging=staging_from_settings(self.scan_settings),
+        )
+        self.export_thread.file_progress.connect(self._on_export_progress)
+        self.export_thread.file_done.connect(self._on_export_done)
+        self.export_thread.file_failed.connect(self._on_export_failed)
+        self.export_thread.export_finished.connect(self.finish_export)
+
+        self.export_button.setEnabled(False)
+        self.export_all_button.setEnabled(False)
+        self.export_thread.start()
+        self.export_progress_dialog.show()
+
+    def _set_export_row_status(self, idx: int, status: str) -> None:
+        row = self._export_rows[idx]
+        data = row.data(1000)
+        base = f"{os.path.basename(data['path'])} → {data['format']}"
+        row.setText(f"{base}  {status}" if status else base)
+
+    def _update_export_dialog(self) -> None:
+        total = len(self._export_rows)
+        overall = sum(self._export_ratios.values()) / max(total, 1)
+        finished = sum(1 for r in self._export_ratios.values() if r >= 1.0)
+        if self.export_progress_dialog is not None:
+            self.export_progress_dialog.setValue(int(1000 * overall))
+            self.export_progress_dialog.setLabelText(
+                f"{finished} of {total} files done — {len(self._export_failures)} failed\n"
+                f"Overall about {overall * 100:.0f}%"
+            )
 
-        try:
-            remux_from_ffmetadata_file(path, metadata_file, output_file)
-        except RemuxError as e:
-            QMessageBox.critical(
+    def _on_export_progress(self, idx: int, ratio: float) -> None:
+        ratio = min(0.999, max(self._export_ratios.get(idx, 0.0), ratio))
+        self._export_ratios[idx] = ratio
+        self._set_export_row_status(idx, f"{ratio * 100:.0f}%")
+        self._update_export_dialog()
+
+    def _on_export_done(self, idx: int, _written: str) -> None:
+        self._export_ratios[idx] = 1.0
+        self._set_export_row_status(idx, "✓")
+        self._update_export_dialog()
+
+    def _on_export_failed(self, idx: int, message: str, stderr: str) -> None:
+        self._export_ratios[idx] = 1.0
+        self._set_export_row_status(idx, "✗")
+        name = os.path.basename(self._export_rows[idx].data(1000)["path"])
+        detail = (stderr or "").strip().splitlines()
+        self._export_failures.append(f"{name}: {detail[-1] if detail else message}")
+        self._update_export_dialog()
+
+    def cancel_export(self) -> None:
+        if self.export_thread is not None and self.export_thread.isRunning():
+            self.export_thread.cancel()
+
+    def finish_export(self, completed: bool) -> None:
+        self.export_button.setEnabled(True)
+        self.export_all_button.setEnabled(True)
+        if self.export_progress_dialog is not None:
+            self.export_progress_dialog.close()
+            self.export_progress_dialog.deleteLater()
+            self.export_progress_dialog = None
+        if not completed:
+            for idx in range(len(self._export_rows)):
+                if self._export_ratios.get(idx, 0.0) < 1.0:
+                    self._set_export_row_status(idx, "")
+        if self._export_failures:
+            QMessageBox.warning(
                 self,
-                "FFmpeg failed",
-                (e.stderr or str(e))[-2000:],
+                "Export finished with errors",
+                f"{len(self._export_failures)} file(s) failed:\n\n"
+                + "\n".join(self._export_failures),
             )
 
     def export_all_files(self) -> None:
-        for i in range(self.export_list.count()):
-            data = self.export_list.item(i).data(1000)
-            if data:
-                self.process_export_item(data)
+        self._start_export()
 
     def select_export_directory(self) -> None:
         dir_path = QFileDialog.getExistingDirectory(
@@ -0,0 +1,283 @@
+"""
+Automatic choice of parallel scan jobs and FFmpeg thread counts per file.
+
+A scan has ``cores`` CPU cores to itself (the CPU budget in the editor, a file's
+share of it in a batch). FFmpeg left to itself starts about one decoder thread
+per core in every process, so ``jobs`` slices oversubscribe the machine
+``jobs`` times over; one single-threaded process per core suits codecs and
+resolutions whose decoders scale poorly, while large frames decode faster with
+a few threads per process. ``autotune_scan`` keeps ``jobs * threads`` at
+``cores`` and picks the split:
+
+* from ``TuningStore`` when the file's codec/resolution class was measured
+  before with the same core count,
+* otherwise with a short probe that decodes a few seconds of the file with each
+  candidate split and keeps the fastest, when the scan is long enough for the
+  probe to pay off (the winner is stored for the class),
+* otherwise from a resolution heuristic.
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import os
+import threading
+import time
+from collections.abc import Callable
+from dataclasses import dataclass, replace
+from typing import Any
+
+from detector import _ffmpeg_cmd, build_blackdetect_filter, useful_parallel_jobs
+from ffmpeg_engine import ProcessJob, run_processes
+from media_probe import MediaInfo
+from scan_cache import default_cache_dir
+
+logger = logging.getLogger(__name__)
+
+_TUNING_FORMAT_VERSION = 1
+MAX_DECODER_THREADS = 16
+# Media seconds each probe process decodes.
+PROBE_SECONDS = 3.0
+# A probe costs a few seconds per candidate; below this the heuristic is used.
+MIN_PROBE_SPAN_SECONDS = 600.0
+
+
+@dataclass(frozen=True)
+class ScanTuning:
+    """``jobs`` FFmpeg processes with ``threads`` decoder threads each."""
+
+    jobs: int
+    threads: int
+    filter_threads: int = 1
+    source: str = "heuristic"
+    """``"stored"``, ``"probe"`` or ``"heuristic"``."""
+
+
+def media_class(info: MediaInfo | None) -> str:
+    """Codec and resolution bucket such as ``h264-1080p``; files in a class decode alike."""
+    if info is None:
+        return "unknown"
+    height = info.height or 0
+    if height <= 0:
+        bucket = "unknown"
+    elif height <= 576:
+        bucket = "sd"
+    elif height <= 720:
+        bucket = "720p"
+    elif height <= 1080:
+        bucket = "1080p"
+    else:
+        bucket = "uhd"
+    return f"{info.video_codec or 'unknown'}-{bucket}"
+
+
+def thread_candidates(cores: int) -> list[int]:
+    """Decoder thread counts worth trying: 1, 2, 4, … up to ``cores``."""
+    out: list[int] = []
+    threads = 1
+    while threads <= min(cores, MAX_DECODER_THREADS):
+        out.append(threads)
+        threads *= 2
+    return out
+
+
+def heuristic_tuning(cores: int, info: MediaInfo | None) -> ScanTuning:
+    """Split without measuring: one thread per process up to SD, more for larger frames."""
+    height = (info.height if info is not None else None) or 0
+    threads = 1 if height <= 576 else 2 if height <= 1080 else 4
+    threads = max(1, min(threads, cores))
+    return ScanTuning(jobs=max(1, cores // threads), threads=threads)
+
+
+def fit_to_span(
+    tuning: ScanTuning,
+    span_sec: float,
+    cores: int,
+    max_jobs: int | None = None,
+) -> ScanTuning:
+    """
+    Cut ``tuning.jobs`` to what a span of ``span_sec`` can use
+    (``useful_parallel_jobs``) and to ``max_jobs`` readers, and give the freed
+    cores to the remaining decoders.
+    """
+    jobs = useful_parallel_jobs(span_sec, min(tuning.jobs, max_jobs or tuning.jobs))
+    if jobs >= tuning.jobs:
+        return tuning
+    threads = min(MAX_DECODER_THREADS, max(tuning.threads, cores // jobs))
+    return replace(tuning, jobs=jobs, threads=threads)
+
+
+def probe_tuning(
+    video_path: str,
+    duration_sec: float,
+    cores: int,
+    *,
+    max_analysis_width: int | None = 854,
+    seconds: float = PROBE_SECONDS,
+    is_cancelled: Callable[[], bool] | None = None,
+) -> tuple[ScanTuning, float] | None:
+    """
+    Time every candidate split of ``cores`` on ``seconds`` of media per process.
+
+    Each candidate runs ``cores // threads`` processes at once on different parts
+    of the file, as a parallel scan would. Returns the fastest split and its speed
+    (media seconds per wall second), or None when cancelled or FFmpeg failed.
+    """
+    vf = build_blackdetect_filter(0.4, 0.98, 0.08, max_analysis_width)
+    best: tuple[ScanTuning, float] | None = None
+    for threads in thread_candidates(cores):
+        procs = max(1, cores // threads)
+        jobs = [
+            ProcessJob(
+                _ffmpeg_cmd(
+                    video_path,
+                    vf,
+                    use_hwaccel=False,
+                    ss_before_input=duration_sec * (i + 1) / (procs + 1),
+                    output_duration=seconds,
+                    threads=threads,
+                    filter_threads=1,
+                )
+            )
+            for i in range(procs)
+        ]
+        t0 = time.monotonic()
+        run_processes(jobs, is_cancelled)
+        wall = max(time.monotonic() - t0, 1e-3)
+        if any(job.failed or job.cancelled for job in jobs):
+            return None
+        speed = procs * seconds / wall
+        logger.debug("Probe %s: %d x %d threads -> %.1fx", video_path, procs, threads, speed)
+        if best is None or speed > best[1]:
+            best = (ScanTuning(jobs=procs, threads=threads, source="probe"), speed)
+    return best
+
+
+class TuningStore:
+    """Best measured ``ScanTuning`` per media class and core count, in one JSON file."""
+
+    def __init__(self, path: str | None = None) -> None:
+        self.path = path or os.path.join(default_cache_dir(), "autotune.json")
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(class_name: str, cores: int) -> str:
+        return f"{class_name}@{int(cores)}"
+
+    def _load(self) -> dict[str, Any]:
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        if not isinstance(data, dict) or data.get("version") != _TUNING_FORMAT_VERSION:
+            return {}
+        entries = data.get("entries")
+        return entries if isinstance(entries, dict) else {}
+
+    def get(self, class_name: str, cores: int) -> ScanTuning | None:
+        entry = self._load().get(self._key(class_name, cores))
+        try:
+            return ScanTuning(
+                jobs=max(1, int(entry["jobs"])),
+                threads=max(1, int(entry["threads"])),
+                filter_threads=max(1, int(entry.get("filter_threads", 1))),
+                source="stored",
+            )
+        except (TypeError, KeyError, ValueError, AttributeError):
+            return None
+
+    def put(self, class_name: str, cores: int, tuning: ScanTuning, speed: float) -> None:
+        """Remember ``tuning`` for the class; failures to write are logged and ignored."""
+        with self._lock:
+            entries = self._load()
+            entries[self._key(class_name, cores)] = {
+                "jobs": tuning.jobs,
+                "threads": tuning.threads,
+                "filter_threads": tuning.filter_threads,
+                "speed": round(speed, 2),
+            }
+            payload = {"version": _TUNING_FORMAT_VERSION, "entries": entries}
+            tmp = f"{self.path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            try:
+                os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+                with open(tmp, "w", encoding="utf-8") as f:
+                    json.dump(payload, f, indent=1, sort_keys=True)
+                os.replace(tmp, self.path)
+            except OSError as e:
+                logger.warning("Could not write scan tuning %s: %s", self.path, e)
+                try:
+                    os.unlink(tmp)
+                except OSError:
+                    pass
+
+
+_shared_store: TuningStore | None = None
+_class_locks: dict[str, threading.Lock] = {}
+_class_locks_guard = threading.Lock()
+
+
+def shared_tuning_store() -> TuningStore:
+    global _shared_store
+    if _shared_store is None:
+        _shared_store = TuningStore()
+    return _shared_store
+
+
+def _class_lock(key: str) -> threading.Lock:
+    with _class_locks_guard:
+        return _class_locks.setdefault(key, threading.Lock())
+
+
+def autotune_scan(
+    video_path: str,
+    info: MediaInfo | None,
+    span_sec: float,
+    cores: int,
+    *,
+    max_analysis_width: int | None = 854,
+    store: TuningStore | None = None,
+    probe: bool = True,
+    is_cancelled: Callable[[], bool] | None = None,
+    max_jobs: int | None = None,
+) -> ScanTuning:
+    """
+    Jobs and threads for scanning ``span_sec`` seconds of ``video_path`` on ``cores``.
+
+    Files of one class scanned side by side wait for a single probe instead of
+    each running their own. ``max_jobs`` caps the processes reading the file
+    (slow storage); the cores left over become decoder threads.
+    """
+    cores = max(1, int(cores))
+    if cores == 1:
+        return ScanTuning(jobs=1, threads=1)
+    store = store or shared_tuning_store()
+    class_name = media_class(info)
+    with _class_lock(f"{store.path}:{class_name}@{cores}"):
+        tuning = store.get(class_name, cores)
+        duration = (info.duration if info is not None else None) or 0.0
+        if tuning is None and probe and span_sec >= MIN_PROBE_SPAN_SECONDS and duration > 0:
+            found = probe_tuning(
+                video_path,
+                duration,
+                cores,
+                max_analysis_width=max_analysis_width,
+                is_cancelled=is_cancelled,
+            )
+            if found is not None:
+                tuning, speed = found
+                store.put(class_name, cores, tuning, speed)
+    if tuning is None:
+        tuning = heuristic_tuning(cores, info)
+    tuning = fit_to_span(tuning, span_sec, cores, max_jobs)
+    logger.info(
+        "Scan tuning for %s (%s, %d cores): %d jobs x %d threads (%s)",
+        video_path,
+        class_name,
+        cores,
+        tuning.jobs,
+        tuning.threads,
+        tuning.source,
+    )
+    return tuning
@@ -0,0 +1,373 @@
+"""
+Scan throughput benchmark on synthetic videos with known black segments.
+
+Test videos are generated locally from FFmpeg's ``lavfi`` ``testsrc2`` source, with
+black frames painted over exact frame ranges by ``drawbox``, so the ground truth
+is known to the frame. Each video is encoded once into a work directory and
+reused. ``run_suite`` times ``detect_black_frames`` on every video for every
+combination of ``parallel_jobs``, ``max_analysis_width`` and scan windows, scores
+the events against the ground truth and returns a JSON-ready report;
+``compare_reports`` flags throughput or timestamp-drift regressions against a
+saved baseline. ``machap bench`` is the command line front end.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import os
+import platform
+import statistics
+import subprocess
+import time
+from collections.abc import Callable, Iterable
+from dataclasses import asdict, dataclass
+from typing import Any
+
+from detector import detect_black_frames
+from scan_runner import DEFAULT_SCAN_SETTINGS
+
+logger = logging.getLogger(__name__)
+
+REPORT_FORMAT_VERSION = 1
+
+_ENCODER_ARGS: dict[str, list[str]] = {
+    "h264": ["-c:v", "libx264", "-preset", "ultrafast"],
+    "hevc": ["-c:v", "libx265", "-preset", "ultrafast", "-x265-params", "log-level=error"],
+    "mpeg4": ["-c:v", "mpeg4", "-q:v", "4"],
+}
+
+WINDOW_LAYOUTS = ("full", "span", "edges")
+
+
+@dataclass(frozen=True)
+class SyntheticVideo:
+    """A generated test video: picture format, codec, GOP and where it is black."""
+
+    name: str
+    width: int
+    height: int
+    codec: str
+    gop: int
+    duration: float
+    black: tuple[tuple[float, float], ...]
+    fps: int = 25
+
+    @property
+    def filename(self) -> str:
+        blob = json.dumps(asdict(self), sort_keys=True)
+        digest = hashlib.sha256(blob.encode("utf-8")).hexdigest()[:12]
+        return f"{self.name}-{digest}.mkv"
+
+
+# Black runs sit at the very start, on likely slice boundaries (the middle and
+# quarters of the file) and near the end, and range from 0.4 s to several seconds.
+QUICK_SUITE = (
+    SyntheticVideo(
+        "h264-360p-gop48",
+        640,
+        360,
+        "h264",
+        48,
+        90.0,
+        ((0.0, 1.0), (22.0, 22.4), (44.8, 45.6), (67.0, 69.0), (88.0, 89.0)),
+    ),
+)
+
+FULL_SUITE = QUICK_SUITE + (
+    SyntheticVideo(
+        "h264-720p-gop250",
+        1280,
+        720,
+        "h264",
+        250,
+        180.0,
+        ((0.0, 2.0), (44.0, 46.0), (89.6, 90.4), (120.0, 120.4), (134.8, 136.0), (170.0, 178.0)),
+    ),
+    SyntheticVideo(
+        "hevc-1080p-gop60",
+        1920,
+        1080,
+        "hevc",
+        60,
+        120.0,
+        ((10.0, 11.0), (59.6, 60.4), (90.0, 92.0), (115.0, 116.0)),
+    ),
+    SyntheticVideo(
+        "mpeg4-576p-gop12",
+        720,
+        576,
+        "mpeg4",
+        12,
+        120.0,
+        ((5.0, 5.4), (29.8, 30.6), (60.0, 63.0), (100.0, 101.0)),
+    ),
+    SyntheticVideo(
+        "h264-360p-long",
+        640,
+        360,
+        "h264",
+        250,
+        600.0,
+        tuple((t, t + 1.2) for t in range(30, 600, 60)),
+    ),
+)
+
+
+@dataclass(frozen=True)
+class ScanConfig:
+    parallel_jobs: int
+    max_analysis_width: int | None
+    windows: str = "full"
+
+    def window_list(self, duration: float) -> list[tuple[float, float]]:
+        """Scan windows for ``duration``: none, the default trimmed span, or both ends."""
+        if self.windows == "span":
+            return [(5.0, max(5.0, duration - 30.0))]
+        if self.windows == "edges":
+            quarter = duration / 4.0
+            return [(0.0, quarter), (duration - quarter, duration)]
+        return []
+
+
+def default_configs(
+    jobs: Iterable[int] = (1, 2, 4),
+    widths: Iterable[int | None] = (None, 854, 320),
+    windows: Iterable[str] = WINDOW_LAYOUTS,
+) -> list[ScanConfig]:
+    return [ScanConfig(j, w, win) for j in jobs for w in widths for win in windows]
+
+
+def build_generate_command(video: SyntheticVideo, output_path: str) -> list[str]:
+    """FFmpeg command rendering ``video``: ``testsrc2`` with black boxes over its black spans."""
+    chain = [f"testsrc2=size={video.width}x{video.height}:rate={video.fps}"]
+    for start, end in video.black:
+        # Half-open [start, end): black_end is reported as the first picture frame.
+        chain.append(
+            f"drawbox=x=0:y=0:w=iw:h=ih:color=black:t=fill"
+            f":enable='gte(t\\,{start:.3f})*lt(t\\,{end:.3f})'"
+        )
+    chain.append("format=yuv420p")
+    return [
+        "ffmpeg",
+        "-hide_banner",
+        "-nostats",
+        "-loglevel",
+        "error",
+        "-f",
+        "lavfi",
+        "-i",
+        ",".join(chain),
+        "-t",
+        f"{video.duration:.3f}",
+        *_ENCODER_ARGS[video.codec],
+        "-g",
+        str(video.gop),
+        "-fflags",
+        "+bitexact",
+        "-y",
+        output_path,
+    ]
+
+
+def ensure_video(video: SyntheticVideo, directory: str) -> str:
+    """Path of ``video`` in ``directory``, generating it first if it is not there yet."""
+    path = os.path.join(directory, video.filename)
+    if os.path.isfile(path):
+        return path
+    os.makedirs(directory, exist_ok=True)
+    partial = path + ".part.mkv"
+    logger.info("generating %s", video.filename)
+    proc = subprocess.run(
+        build_generate_command(video, partial),
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+        text=True,
+        errors="replace",
+    )
+    if proc.returncode != 0:
+        try:
+            os.remove(partial)
+        except OSError:
+            pass
+        raise RuntimeError(f"generating {video.name} failed: {proc.stderr.strip()[-2000:]}")
+    os.replace(partial, path)
+    return path
+
+
+def ground_truth(
+    video: SyntheticVideo, windows: list[tuple[float, float]]
+) -> list[tuple[float, float]]:
+    """Black spans a scan with ``windows`` should report (start inside a window)."""
+    return [
+        (start, end)
+        for start, end in video.black
+        if not windows or any(lo <= start <= hi for lo, hi in windows)
+    ]
+
+
+def score_events(
+    truth: list[tuple[float, float]], events: list[dict[str, float]]
+) -> dict[str, Any]:
+    """
+    Match detected events to true black spans by overlap and measure the drift.
+
+    Each true span takes the overlapping event with the nearest start; events left
+    over are ``spurious``. Drift is in seconds, detected minus true.
+    """
+    unused = list(events)
+    start_drift: list[float] = []
+    end_drift: list[float] = []
+    missed = 0
+    for start, end in truth:
+        overlapping = [e for e in unused if e["black_start"] < end and e["black_end"] > start]
+        if not overlapping:
+            missed += 1
+            continue
+        best = min(overlapping, key=lambda e: abs(e["black_start"] - start))
+        unused.remove(best)
+        start_drift.append(best["black_start"] - start)
+        end_drift.append(best["black_end"] - end)
+    drifts = [abs(d) for d in start_drift + end_drift]
+    return {
+        "expected": len(truth),
+        "matched": len(start_drift),
+        "missed": missed,
+        "spurious": len(unused),
+        "max_start_drift": round(max(map(abs, start_drift), default=0.0), 4),
+        "max_end_drift": round(max(map(abs, end_drift), default=0.0), 4),
+        "mean_abs_drift": round(statistics.fmean(drifts), 4) if drifts else 0.0,
+    }
+
+
+def run_case(
+    video: SyntheticVideo,
+    path: str,
+    config: ScanConfig,
+    *,
+    repeat: int = 1,
+) -> dict[str, Any]:
+    """Time ``detect_black_frames`` on one video with one configuration."""
+    windows = config.window_list(video.duration)
+    scanned = sum(hi - lo for lo, hi in windows) if windows else video.duration
+    walls: list[float] = []
+    cpu: list[float] = []
+    events: list[dict[str, float]] = []
+    for _ in range(max(1, repeat)):
+        children_before = os.times()
+        t0 = time.perf_counter()
+        events = detect_black_frames(
+            path,
+            DEFAULT_SCAN_SETTINGS["min_black_seconds"],
+            DEFAULT_SCAN_SETTINGS["ratio_black_pixels"],
+            DEFAULT_SCAN_SETTINGS["black_pixel_threshold"],
+            windows,
+            max_analysis_width=config.max_analysis_width,
+            parallel_jobs=config.parallel_jobs,
+            duration_hint_sec=video.duration,
+        )
+        walls.append(time.perf_counter() - t0)
+        children_after = os.times()
+        cpu.append(
+            (children_after.children_user - children_before.children_user)
+            + (children_after.children_system - children_before.children_system)
+        )
+    wall = statistics.median(walls)
+    return {
+        "video": video.name,
+        "config": asdict(config),
+        "scanned_sec": round(scanned, 3),
+        "wall_sec": [round(w, 4) for w in walls],
+        "median_wall_sec": round(wall, 4),
+        "ffmpeg_cpu_sec": round(statistics.median(cpu), 4),
+        "speed_x": round(scanned / wall, 3) if wall > 0 else None,
+        "frames_per_sec": round(scanned * video.fps / wall, 1) if wall > 0 else None,
+        "accuracy": score_events(ground_truth(video, windows), events),
+    }
+
+
+def _ffmpeg_version() -> str:
+    try:
+        out = subprocess.run(
+            ["ffmpeg", "-hide_banner", "-version"], capture_output=True, text=True, timeout=10
+        ).stdout
+    except (OSError, subprocess.SubprocessError):
+        return ""
+    return out.splitlines()[0] if out else ""
+
+
+def run_suite(
+    videos: Iterable[SyntheticVideo],
+    configs: Iterable[ScanConfig],
+    *,
+    directory: str,
+    repeat: int = 1,
+    on_result: Callable[[dict[str, Any]], None] | None = None,
+) -> dict[str, Any]:
+    """Generate (or reuse) every video and run every configuration on it."""
+    configs = list(configs)
+    videos = list(videos)
+    results: list[dict[str, Any]] = []
+    for video in videos:
+        path = ensure_video(video, directory)
+        for config in configs:
+            result = run_case(video, path, config, repeat=repeat)
+            results.append(result)
+            if on_result:
+                on_result(result)
+    return {
+        "version": REPORT_FORMAT_VERSION,
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "machine": {
+            "platform": platform.platform(),
+            "python": platform.python_version(),
+            "cpu_count": os.cpu_count(),
+            "ffmpeg": _ffmpeg_version(),
+        },
+        "videos": [asdict(v) for v in videos],
+        "results": results,
+    }
+
+
+def _case_key(result: dict[str, Any]) -> str:
+    return json.dumps([result["video"], result["config"]], sort_keys=True)
+
+
+def compare_reports(
+    baseline: dict[str, Any],
+    current: dict[str, Any],
+    *,
+    max_slowdown: float = 1.25,
+    max_drift: float = 0.05,
+) -> list[str]:
+    """
+    Regressions of ``current`` against ``baseline``, one message each.
+
+    A case regresses when its median wall time grows by more than ``max_slowdown``,
+    when it misses a black run or reports a spurious one the baseline did not, or
+    when its start/end drift exceeds ``max_drift`` seconds and the baseline's.
+    """
+    before = {_case_key(r): r for r in baseline.get("results", [])}
+    problems: list[str] = []
+    for result in current.get("results", []):
+        old = before.get(_case_key(result))
+        label = f"{result['video']} {result['config']}"
+        acc = result["accuracy"]
+        old_acc = old["accuracy"] if old else {"missed": 0, "spurious": 0}
+        if acc["missed"] > old_acc["missed"] or acc["spurious"] > old_acc["spurious"]:
+            problems.append(
+                f"{label}: {acc['missed']} missed / {acc['spurious']} spurious "
+                f"(was {old_acc['missed']} / {old_acc['spurious']})"
+            )
+        for key in ("max_start_drift", "max_end_drift"):
+            if acc[key] > max_drift and (old is None or acc[key] > old_acc[key]):
+                problems.append(f"{label}: {key} {acc[key]:.3f}s > {max_drift:.3f}s")
+        if old and old["median_wall_sec"] > 0:
+            ratio = result["median_wall_sec"] / old["median_wall_sec"]
+            if ratio > max_slowdown:
+                problems.append(
+                    f"{label}: {ratio:.2f}x slower "
+                    f"({old['median_wall_sec']:.2f}s -> {result['median_wall_sec']:.2f}s)"
+                )
+    return problems
@@ -0,0 +1,302 @@
+"""On-disk cache of blackdetect results keyed by file identity and detection settings."""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import os
+import sys
+import threading
+from collections.abc import Callable
+from functools import partial
+from typing import Any
+
+from coarse_scan import CoarseScanReport, detect_black_frames_coarse_to_fine
+from combined_detect import (
+    DEFAULT_SCENE_THRESHOLD,
+    DEFAULT_SILENCE_NOISE_DB,
+    detect_chapter_candidates,
+)
+from detector import detect_black_frames
+
+logger = logging.getLogger(__name__)
+
+_CACHE_FORMAT_VERSION = 1
+DEFAULT_SCAN_CACHE_MAX_BYTES = 64 * 1024 * 1024
+
+
+def default_cache_dir() -> str:
+    """
+    Per-user cache root for MaChap.
+
+    ``MACHAP_CACHE_DIR`` overrides the platform default (``%LOCALAPPDATA%`` on
+    Windows, ``~/Library/Caches`` on macOS, ``$XDG_CACHE_HOME`` or ``~/.cache``
+    elsewhere).
+    """
+    override = os.environ.get("MACHAP_CACHE_DIR")
+    if override:
+        return override
+    if sys.platform == "win32":
+        base = os.environ.get("LOCALAPPDATA") or os.path.expanduser("~\\AppData\\Local")
+        return os.path.join(base, "machap", "cache")
+    if sys.platform == "darwin":
+        return os.path.expanduser("~/Library/Caches/machap")
+    base = os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache")
+    return os.path.join(base, "machap")
+
+
+def file_identity(path: str) -> dict[str, Any]:
+    """
+    Return ``{"path", "size", "mtime_ns"}`` for ``path``.
+
+    A file that is replaced or re-encoded in place changes size or mtime, so any
+    result stored under the old identity is no longer returned.
+    """
+    st = os.stat(path)
+    return {
+        "path": os.path.normcase(os.path.abspath(path)),
+        "size": int(st.st_size),
+        "mtime_ns": int(st.st_mtime_ns),
+    }
+
+
+def detection_fingerprint(
+    min_black_seconds: float,
+    ratio_black_pixels: float,
+    black_pixel_threshold: float,
+    max_analysis_width: int | None,
+    window_list: list[tuple[float, float]] | None,
+    scan_mode: str = "full",
+    detection_mode: str = "black",
+    silence_noise_db: float = DEFAULT_SILENCE_NOISE_DB,
+) -> dict[str, Any]:
+    """Settings that change blackdetect output, normalized so equal settings compare equal."""
+    fingerprint: dict[str, Any] = {
+        "min_black_seconds": round(float(min_black_seconds), 6),
+        "ratio_black_pixels": round(float(ratio_black_pixels), 6),
+        "black_pixel_threshold": round(float(black_pixel_threshold), 6),
+        "max_analysis_width": int(max_analysis_width) if max_analysis_width else 0,
+        "windows": [[round(float(lo), 3), round(float(hi), 3)] for lo, hi in window_list or []],
+    }
+    if detection_mode != "black":
+        fingerprint["detection_mode"] = detection_mode
+        fingerprint["silence_noise_db"] = round(float(silence_noise_db), 3)
+    elif scan_mode != "full":
+        # Coarse scans can miss short runs, so they never answer for a full scan.
+        fingerprint["scan_mode"] = scan_mode
+    return fingerprint
+
+
+def _cache_key(identity: dict[str, Any], fingerprint: dict[str, Any]) -> str:
+    blob = json.dumps(
+        {"v": _CACHE_FORMAT_VERSION, "file": identity, "settings": fingerprint},
+        sort_keys=True,
+        separators=(",", ":"),
+    )
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+
+def prune_cache_dir(directory: str, max_bytes: int, *, suffix: str = "") -> int:
+    """
+    Delete least recently used files in ``directory`` until it fits in ``max_bytes``.
+
+    Recency is the file mtime (cache hits touch their entry). Only files ending in
+    ``suffix`` are considered. Returns the number of files removed.
+    """
+    try:
+        names = os.listdir(directory)
+    except OSError:
+        return 0
+    entries: list[tuple[float, int, str]] = []
+    total = 0
+    for name in names:
+        if suffix and not name.endswith(suffix):
+            continue
+        full = os.path.join(directory, name)
+        try:
+            st = os.stat(full)
+        except OSError:
+            continue
+        entries.append((st.st_mtime, st.st_size, full))
+        total += st.st_size
+    if total <= max_bytes:
+        return 0
+    entries.sort()
+    removed = 0
+    for _mtime, size, full in entries:
+        if total <= max_bytes:
+            break
+        try:
+            os.unlink(full)
+        except OSError:
+            continue
+        total -= size
+        removed += 1
+    return removed
+
+
+class ScanCache:
+    """
+    Directory of JSON entries, one per (file identity, detection settings) pair.
+
+    Entries are evicted least-recently-used once the directory grows past
+    ``max_bytes``. Unreadable or stale entries are treated as misses.
+    """
+
+    def __init__(self, directory: str | None = None, max_bytes: int = DEFAULT_SCAN_CACHE_MAX_BYTES):
+        self.directory = directory or os.path.join(default_cache_dir(), "scans")
+        self.max_bytes = max(0, int(max_bytes))
+        self._lock = threading.Lock()
+
+    def _entry_path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.json")
+
+    def get(self, video_path: str, fingerprint: dict[str, Any]) -> list[dict[str, float]] | None:
+        """Return cached events for ``video_path`` under ``fingerprint``, or None on a miss."""
+        try:
+            identity = file_identity(video_path)
+        except OSError:
+            return None
+        entry = self._entry_path(_cache_key(identity, fingerprint))
+        try:
+            with open(entry, encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if data.get("file") != identity or data.get("settings") != fingerprint:
+            return None
+        events = data.get("events")
+        if not isinstance(events, list):
+            return None
+        try:
+            os.utime(entry)
+        except OSError:
+            pass
+        return [dict(e) for e in events]
+
+    def put(
+        self,
+        video_path: str,
+        fingerprint: dict[str, Any],
+        events: list[dict[str, float]],
+    ) -> None:
+        """Store ``events`` for ``video_path``; failures to write are logged and ignored."""
+        try:
+            identity = file_identity(video_path)
+        except OSError:
+            return
+        entry = self._entry_path(_cache_key(identity, fingerprint))
+        payload = {
+            "version": _CACHE_FORMAT_VERSION,
+            "file": identity,
+            "settings": fingerprint,
+            "events": events,
+        }
+        tmp = f"{entry}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(payload, f, separators=(",", ":"))
+            os.replace(tmp, entry)
+        except OSError as e:
+            logger.warning("Could not write scan cache entry %s: %s", entry, e)
+            try:
+                os.unlink(tmp)
+            except OSError:
+                pass
+            return
+        with self._lock:
+            prune_cache_dir(self.directory, self.max_bytes, suffix=".json")
+
+    def invalidate(self, video_path: str, fingerprint: dict[str, Any]) -> None:
+        """Drop the entry for ``video_path`` under ``fingerprint`` if present."""
+        try:
+            identity = file_identity(video_path)
+        except OSError:
+            return
+        try:
+            os.unlink(self._entry_path(_cache_key(identity, fingerprint)))
+        except OSError:
+            pass
+
+    def clear(self) -> None:
+        prune_cache_dir(self.directory, 0, suffix=".json")
+
+
+def detect_black_frames_cached(
+    video_path: str,
+    min_black_seconds: float = 0.4,
+    ratio_black_pixels: float = 0.98,
+    black_pixel_threshold: float = 0.08,
+    window_list: list[tuple[float, float]] | None = None,
+    *,
+    max_analysis_width: int | None = 854,
+    cache: ScanCache | None = None,
+    force_rescan: bool = False,
+    scan_mode: str = "full",
+    detection_mode: str = "black",
+    silence_noise_db: float = DEFAULT_SILENCE_NOISE_DB,
+    on_time_ratio: Callable[[float], None] | None = None,
+    read_path: str | None = None,
+    on_report: Callable[[CoarseScanReport], None] | None = None,
+    **kwargs: Any,
+) -> list[dict[str, float]]:
+    """
+    ``detect_black_frames`` with a lookup in ``cache`` first.
+
+    A hit returns the stored events without starting FFmpeg. ``force_rescan``
+    skips the lookup but still stores the fresh result. Options that only affect
+    speed (``parallel_jobs``, ``use_hwaccel``, …) are not part of the key.
+    ``scan_mode`` other than ``"full"`` runs ``detect_black_frames_coarse_to_fine``
+    with that ``-skip_frame`` mode and is cached separately. ``detection_mode``
+    other than ``"black"`` runs the fused ``detect_chapter_candidates`` pass instead
+    (``scan_mode`` and ``parallel_jobs`` do not apply to it). ``read_path`` is a
+    copy of ``video_path`` to decode instead (``staging_cache``); results are still
+    cached under ``video_path``. ``on_report`` gets the ``CoarseScanReport`` of a
+    coarse-to-fine scan (not of cache hits).
+    """
+    fingerprint = detection_fingerprint(
+        min_black_seconds,
+        ratio_black_pixels,
+        black_pixel_threshold,
+        max_analysis_width,
+        window_list,
+        scan_mode,
+        detection_mode,
+        silence_noise_db,
+    )
+    if cache is not None and not force_rescan:
+        hit = cache.get(video_path, fingerprint)
+        if hit is not None:
+            if on_time_ratio:
+                on_time_ratio(1.0)
+            return hit
+
+    detect = detect_black_frames
+    if detection_mode != "black":
+        # Runs are only kept once silence is known, so nothing is streamed.
+        kwargs.pop("parallel_jobs", None)
+        kwargs.pop("on_event", None)
+        detect = partial(
+            detect_chapter_candidates,
+            silence_noise_db=silence_noise_db,
+            scene_threshold=(
+                DEFAULT_SCENE_THRESHOLD if detection_mode == "black_silence_scene" else None
+            ),
+        )
+    elif scan_mode != "full":
+        detect = partial(detect_black_frames_coarse_to_fine, mode=scan_mode, on_report=on_report)
+    events = detect(
+        read_path or video_path,
+        min_black_seconds=min_black_seconds,
+        ratio_black_pixels=ratio_black_pixels,
+        black_pixel_threshold=black_pixel_threshold,
+        window_list=window_list,
+        max_analysis_width=max_analysis_width,
+        on_time_ratio=on_time_ratio,
+        **kwargs,
+    )
+    if cache is not None:
+        cache.put(video_path, fingerprint, events)
+    return events
@@ -0,0 +1,205 @@
+"""
+On-disk progress of a batch scan, so an interrupted queue resumes where it stopped.
+
+``BatchCheckpoint`` keeps one JSON file per queue: the file list, the settings
+that shape results, each finished file's events and, for files still scanning,
+the chunk plan of ``detect_black_frames`` and the blackdetect output of every
+chunk that finished. It is written after every finished file and chunk
+(atomically, so a crash leaves the previous version). Opening the checkpoint
+again with the same result settings resumes: finished files are not scanned
+again and a partly scanned file only decodes its missing chunks. An entry
+whose file changed size or modification time since is dropped.
+
+A ``FileCheckpoint`` is what ``detect_black_frames`` gets as ``checkpoint``.
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import os
+import threading
+from typing import Any
+
+from scan_cache import default_cache_dir, file_identity
+
+logger = logging.getLogger(__name__)
+
+_CHECKPOINT_FORMAT_VERSION = 1
+
+# Settings that change scan results; a checkpoint only resumes when they match.
+RESULT_SETTINGS = (
+    "min_black_seconds",
+    "ratio_black_pixels",
+    "black_pixel_threshold",
+    "window_list",
+    "max_analysis_width",
+    "scan_mode",
+    "detection_mode",
+    "silence_noise_db",
+)
+
+
+def default_checkpoint_path() -> str:
+    """Checkpoint of the editor's queue scan."""
+    return os.path.join(default_cache_dir(), "queue_checkpoint.json")
+
+
+def result_settings(settings: dict[str, Any]) -> dict[str, Any]:
+    return {key: settings.get(key) for key in RESULT_SETTINGS}
+
+
+def _span_key(start: float, length: float) -> str:
+    # Chunk bounds come from the same plan on resume, so 4 decimals match exactly.
+    return f"{start:.4f}+{length:.4f}"
+
+
+class FileCheckpoint:
+    """Chunk plan and finished chunks of one file's scan; see the module docstring."""
+
+    def __init__(self, batch: BatchCheckpoint, entry: dict[str, Any]) -> None:
+        self._batch = batch
+        self._entry = entry
+        self.restored_seconds = 0.0
+        """Media seconds of chunks handed back by ``chunk`` (not decoded this time)."""
+
+    def plan(self, lo: float, hi: float) -> tuple[list[tuple[float, float]], bool] | None:
+        """Stored ``(spans, aligned)`` chunk plan of the window ``[lo, hi)``."""
+        with self._batch._lock:
+            stored = self._entry.get("plans", {}).get(_span_key(lo, hi - lo))
+        if not stored:
+            return None
+        return [(float(start), float(length)) for start, length in stored["spans"]], bool(
+            stored["aligned"]
+        )
+
+    def save_plan(
+        self, lo: float, hi: float, spans: list[tuple[float, float]], aligned: bool
+    ) -> None:
+        with self._batch._lock:
+            plans = self._entry.setdefault("plans", {})
+            plans[_span_key(lo, hi - lo)] = {"spans": [list(s) for s in spans], "aligned": aligned}
+        self._batch.save()
+
+    def chunk(self, start: float, length: float) -> str | None:
+        """Blackdetect lines of the finished chunk at ``start``, or None."""
+        with self._batch._lock:
+            text = self._entry.get("chunks", {}).get(_span_key(start, length))
+        if text is not None:
+            self.restored_seconds += length
+        return text
+
+    def save_chunk(self, start: float, length: float, text: str) -> None:
+        with self._batch._lock:
+            self._entry.setdefault("chunks", {})[_span_key(start, length)] = text
+        self._batch.save()
+
+
+class BatchCheckpoint:
+    """
+    Checkpoint file of one batch scan over ``paths`` with ``settings``.
+
+    Progress already in ``path`` is kept when its result settings equal these;
+    otherwise the checkpoint starts empty.
+    """
+
+    def __init__(self, path: str, paths: list[str], settings: dict[str, Any]) -> None:
+        self.path = path
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()
+        self._settings = result_settings(settings)
+        stored = self._read(path)
+        files: dict[str, Any] = {}
+        if stored is not None and stored.get("settings") == self._settings:
+            old = stored.get("files") or {}
+            for video in paths:
+                entry = old.get(video)
+                if isinstance(entry, dict) and entry.get("identity") == _identity(video):
+                    files[video] = entry
+        self._data: dict[str, Any] = {
+            "version": _CHECKPOINT_FORMAT_VERSION,
+            "settings": self._settings,
+            "queue_settings": dict(settings),
+            "paths": list(paths),
+            "files": files,
+        }
+
+    @staticmethod
+    def _read(path: str) -> dict[str, Any] | None:
+        try:
+            with open(path, encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if not isinstance(data, dict) or data.get("version") != _CHECKPOINT_FORMAT_VERSION:
+            return None
+        return data
+
+    @classmethod
+    def pending(cls, path: str) -> tuple[list[str], dict[str, Any]] | None:
+        """``(paths, settings)`` of the unfinished batch saved in ``path``, if any."""
+        data = cls._read(path)
+        if data is None or not isinstance(data.get("paths"), list):
+            return None
+        return [str(p) for p in data["paths"]], dict(data.get("queue_settings") or {})
+
+    def results(self) -> dict[str, list[dict[str, float]]]:
+        """Events of the files already finished, by path."""
+        with self._lock:
+            return {
+                video: list(entry["events"])
+                for video, entry in self._data["files"].items()
+                if entry.get("events") is not None
+            }
+
+    def file(self, video_path: str) -> FileCheckpoint:
+        """The chunk checkpoint of ``video_path``, started now if it has none."""
+        identity = _identity(video_path)
+        with self._lock:
+            entry = self._data["files"].get(video_path)
+            if entry is None or entry.get("identity") != identity:
+                entry = {"identity": identity}
+                self._data["files"][video_path] = entry
+        return FileCheckpoint(self, entry)
+
+    def finish(self, video_path: str, events: list[dict[str, float]]) -> None:
+        """Record ``video_path`` as scanned; its chunk progress is no longer needed."""
+        with self._lock:
+            self._data["files"][video_path] = {
+                "identity": _identity(video_path),
+                "events": events,
+            }
+        self.save()
+
+    def save(self) -> None:
+        """Write the checkpoint; failures are logged and the batch carries on."""
+        with self._save_lock:
+            with self._lock:
+                blob = json.dumps(self._data, separators=(",", ":"))
+            tmp = f"{self.path}.{os.getpid()}.tmp"
+            try:
+                os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+                with open(tmp, "w", encoding="utf-8") as f:
+                    f.write(blob)
+                os.replace(tmp, self.path)
+            except OSError as e:
+                logger.warning("Could not write scan checkpoint %s: %s", self.path, e)
+                try:
+                    os.unlink(tmp)
+                except OSError:
+                    pass
+
+    def clear(self) -> None:
+        """Delete the checkpoint file (the batch is complete)."""
+        with self._save_lock:
+            try:
+                os.unlink(self.path)
+            except OSError:
+                pass
+
+
+def _identity(video_path: str) -> dict[str, Any] | None:
+    try:
+        return file_identity(video_path)
+    except OSError:
+        return None
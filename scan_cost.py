@@ -0,0 +1,198 @@
+"""
+Predicted scan cost per file, for ordering a batch and estimating its ETA.
+
+A scan's cost is the CPU time its FFmpeg processes spend, in core-seconds. The
+prior is per media second of the scanned span: decoding work grows with the
+decoded pixel rate (width × height × fps, scaled by how expensive the codec is)
+and with the bitrate (entropy decoding), and sampled scan modes decode only a
+fraction of the frames. ``CostModel`` corrects the prior with a factor per media
+class and scan mode (``h264-1080p/full``), fitted from the CPU time recorded for
+finished scans and kept in ``scan_cost.json`` in the cache directory.
+
+``batch_order`` sorts files by predicted cost: longest first (LPT) keeps the
+long files from being the last ones running alone, shortest first (SJF) finishes
+the most files early. ``batch_eta`` weights per-file progress by cost.
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import os
+import threading
+from collections.abc import Sequence
+from typing import Any
+
+from media_probe import MediaInfo
+from scan_autotune import media_class
+from scan_cache import default_cache_dir
+
+logger = logging.getLogger(__name__)
+
+_COST_FORMAT_VERSION = 1
+
+ORDER_LONGEST_FIRST = "longest_first"
+ORDER_SHORTEST_FIRST = "shortest_first"
+ORDER_QUEUE = "queue"
+BATCH_ORDERS = (ORDER_LONGEST_FIRST, ORDER_SHORTEST_FIRST, ORDER_QUEUE)
+
+# Core-seconds to decode one pixel of H.264 (about 400 fps of 1080p on one core).
+PIXEL_COST = 1.2e-9
+# Core-seconds per bit of video stream (entropy decoding, about 80 Mbit/s per core).
+BIT_COST = 1.25e-8
+# Decoder cost relative to H.264; codecs not listed count as 1.
+CODEC_COST = {
+    "av1": 2.0,
+    "h264": 1.0,
+    "hevc": 1.6,
+    "mjpeg": 0.6,
+    "mpeg2video": 0.5,
+    "mpeg4": 0.6,
+    "prores": 0.8,
+    "vp8": 0.9,
+    "vp9": 1.4,
+}
+# Share of the full decode that sampled scan modes pay (keyframes, reference frames).
+MODE_COST = {"full": 1.0, "nokey": 0.1, "noref": 0.4}
+# Used for the pixel rate when ffprobe reports no video geometry.
+_FALLBACK_PIXEL_RATE = 1280 * 720 * 25
+# Weight of a new measurement in a class's correction factor.
+CALIBRATION_WEIGHT = 0.3
+
+
+def prior_cost_per_second(info: MediaInfo | None, scan_mode: str = "full") -> float:
+    """Core-seconds per media second to scan a file like ``info``, before calibration."""
+    pixel_rate = _FALLBACK_PIXEL_RATE
+    bit_rate = 0
+    codec = 1.0
+    if info is not None:
+        if info.width and info.height:
+            pixel_rate = info.width * info.height * (info.fps or 25.0)
+        bit_rate = info.video_bit_rate or info.bit_rate or 0
+        codec = CODEC_COST.get(info.video_codec or "", 1.0)
+    return (codec * pixel_rate * PIXEL_COST + bit_rate * BIT_COST) * MODE_COST.get(scan_mode, 1.0)
+
+
+class CostModel:
+    """Prior scan costs corrected by recorded history; see the module docstring."""
+
+    def __init__(self, path: str | None = None) -> None:
+        self.path = path or os.path.join(default_cache_dir(), "scan_cost.json")
+        self._lock = threading.Lock()
+        self._entries: dict[str, Any] | None = None
+
+    @staticmethod
+    def _key(info: MediaInfo | None, scan_mode: str) -> str:
+        return f"{media_class(info)}/{scan_mode}"
+
+    def _load(self) -> dict[str, Any]:
+        if self._entries is None:
+            try:
+                with open(self.path, encoding="utf-8") as f:
+                    data = json.load(f)
+            except (OSError, ValueError):
+                data = None
+            entries = data.get("entries") if isinstance(data, dict) else None
+            valid = isinstance(entries, dict) and data.get("version") == _COST_FORMAT_VERSION
+            self._entries = entries if valid else {}
+        return self._entries
+
+    def factor(self, info: MediaInfo | None, scan_mode: str = "full") -> float:
+        """Measured / prior cost for the class; 1.0 until a scan of it was recorded."""
+        with self._lock:
+            entry = self._load().get(self._key(info, scan_mode))
+        try:
+            return max(0.01, float(entry["factor"]))
+        except (TypeError, KeyError, ValueError):
+            return 1.0
+
+    def predict(self, info: MediaInfo | None, span_sec: float, scan_mode: str = "full") -> float:
+        """Core-seconds a scan of ``span_sec`` media seconds of the file is expected to take."""
+        span = max(0.0, span_sec)
+        return span * prior_cost_per_second(info, scan_mode) * self.factor(info, scan_mode)
+
+    def record(
+        self,
+        info: MediaInfo | None,
+        span_sec: float,
+        cpu_sec: float,
+        scan_mode: str = "full",
+    ) -> None:
+        """Fold a finished scan's CPU time into its class; write failures are logged."""
+        prior = max(0.0, span_sec) * prior_cost_per_second(info, scan_mode)
+        if prior <= 0 or cpu_sec <= 0:
+            return
+        observed = min(100.0, max(0.01, cpu_sec / prior))
+        key = self._key(info, scan_mode)
+        with self._lock:
+            entries = self._load()
+            entry = entries.get(key)
+            samples = int(entry.get("samples", 0)) if isinstance(entry, dict) else 0
+            if samples:
+                observed = (1 - CALIBRATION_WEIGHT) * float(entry["factor"]) + (
+                    CALIBRATION_WEIGHT * observed
+                )
+            entries[key] = {"factor": round(observed, 4), "samples": samples + 1}
+            self._write(entries)
+
+    def _write(self, entries: dict[str, Any]) -> None:
+        payload = {"version": _COST_FORMAT_VERSION, "entries": entries}
+        tmp = f"{self.path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(payload, f, indent=1, sort_keys=True)
+            os.replace(tmp, self.path)
+        except OSError as e:
+            logger.warning("Could not write scan cost history %s: %s", self.path, e)
+            try:
+                os.unlink(tmp)
+            except OSError:
+                pass
+
+
+_shared_model: CostModel | None = None
+
+
+def shared_cost_model() -> CostModel:
+    global _shared_model
+    if _shared_model is None:
+        _shared_model = CostModel()
+    return _shared_model
+
+
+def batch_order(costs: Sequence[float], order: str = ORDER_LONGEST_FIRST) -> list[int]:
+    """Indices of ``costs`` in scan order; ties keep queue order."""
+    indices = list(range(len(costs)))
+    if order == ORDER_LONGEST_FIRST:
+        indices.sort(key=lambda i: -costs[i])
+    elif order == ORDER_SHORTEST_FIRST:
+        indices.sort(key=lambda i: costs[i])
+    return indices
+
+
+def batch_eta(
+    costs: Sequence[float],
+    ratios: dict[int, float],
+    elapsed_sec: float,
+    cores: int,
+) -> tuple[float, float | None]:
+    """
+    ``(overall progress, seconds left)`` of a batch from per-file progress ``ratios``.
+
+    Progress is weighted by each file's predicted cost. The time left blends the
+    model's estimate (remaining core-seconds over ``cores``) with the rate seen so
+    far, trusting the observed rate more as the batch advances.
+    """
+    total = sum(costs)
+    if total <= 0:
+        return 0.0, None
+    done = sum(cost * min(1.0, max(0.0, ratios.get(i, 0.0))) for i, cost in enumerate(costs))
+    overall = done / total
+    if overall >= 1.0:
+        return 1.0, 0.0
+    predicted = (total - done) / max(1, cores)
+    if overall <= 0 or elapsed_sec <= 0:
+        return overall, predicted
+    observed = elapsed_sec * (1.0 / overall - 1.0)
+    return overall, overall * observed + (1.0 - overall) * predicted
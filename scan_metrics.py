@@ -0,0 +1,222 @@
+"""
+Per-scan metrics from FFmpeg's structured ``-progress`` channel.
+
+Scan commands run with ``-nostats -progress pipe:2``, so FFmpeg writes blocks of
+``key=value`` lines (``frame``, ``fps``, ``out_time_us``, ``speed``, …, ending in
+``progress=continue`` or ``progress=end``) to stderr next to the filter output.
+``ProgressParser`` turns those into dicts. When a scan finishes, its processes'
+last blocks, CPU time (from ``wait4``) and bytes read (``/proc/<pid>/io`` on Linux)
+become one ``ScanMetrics`` record, which callers get through ``on_metrics`` and
+which is also logged as one JSON object on the ``scan_metrics`` logger.
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import re
+import time
+from collections.abc import Callable
+from dataclasses import asdict, dataclass, field
+from typing import Any
+
+logger = logging.getLogger(__name__)
+
+PROGRESS_ARGS = ["-nostats", "-progress", "pipe:2", "-stats_period", "1"]
+
+_KEY_VALUE = re.compile(r"^([a-z_0-9]+)=\s*(.*)$")
+
+
+class ProgressParser:
+    """
+    Collects ``-progress`` blocks from stderr lines.
+
+    ``feed`` returns True for lines that belong to the progress channel so callers
+    can skip them. ``on_block`` receives each completed block; the latest one is
+    kept in ``last``.
+    """
+
+    def __init__(self, on_block: Callable[[dict[str, str]], None] | None = None) -> None:
+        self.on_block = on_block
+        self.last: dict[str, str] = {}
+        self.blocks = 0
+        self._current: dict[str, str] = {}
+
+    def feed(self, line: str) -> bool:
+        m = _KEY_VALUE.match(line)
+        if not m:
+            return False
+        key, value = m.group(1), m.group(2).strip()
+        self._current[key] = value
+        if key == "progress":
+            self.last, self._current = self._current, {}
+            self.blocks += 1
+            if self.on_block:
+                self.on_block(self.last)
+        return True
+
+
+def progress_time_seconds(block: dict[str, str]) -> float | None:
+    """Output time of a progress block, or None while FFmpeg reports ``N/A``."""
+    for key in ("out_time_us", "out_time_ms"):
+        # out_time_ms is in microseconds too (a long-standing FFmpeg quirk).
+        value = block.get(key, "")
+        if value.lstrip("-").isdigit():
+            return max(0.0, int(value) / 1_000_000)
+    return None
+
+
+def _float(value: str | None) -> float | None:
+    if not value:
+        return None
+    try:
+        return float(value.rstrip("x"))
+    except ValueError:
+        return None
+
+
+def read_process_io(pid: int) -> int | None:
+    """Bytes ``pid`` has read through read syscalls (``rchar``), or None off Linux."""
+    try:
+        with open(f"/proc/{pid}/io", encoding="ascii") as f:
+            for line in f:
+                if line.startswith("rchar:"):
+                    return int(line.split()[1])
+    except (OSError, ValueError, IndexError):
+        pass
+    return None
+
+
+@dataclass
+class ProcessMetrics:
+    """One FFmpeg process of a scan."""
+
+    frames: int = 0
+    media_sec: float = 0.0
+    fps: float | None = None
+    speed: float | None = None
+    wall_sec: float = 0.0
+    cpu_user_sec: float | None = None
+    cpu_system_sec: float | None = None
+    max_rss_kb: int | None = None
+    bytes_read: int | None = None
+
+    @classmethod
+    def from_job(cls, job: Any, progress: ProgressParser, bytes_read: int | None) -> ProcessMetrics:
+        """Build from a finished ``ffmpeg_engine.ProcessJob`` and its parsed progress."""
+        block = progress.last
+        frames = block.get("frame", "")
+        metrics = cls(
+            frames=int(frames) if frames.isdigit() else 0,
+            media_sec=progress_time_seconds(block) or 0.0,
+            fps=_float(block.get("fps")),
+            speed=_float(block.get("speed")),
+            wall_sec=round(job.wall_sec, 4),
+            bytes_read=bytes_read,
+        )
+        usage = job.rusage
+        if usage is not None:
+            metrics.cpu_user_sec = round(usage.ru_utime, 4)
+            metrics.cpu_system_sec = round(usage.ru_stime, 4)
+            metrics.max_rss_kb = int(usage.ru_maxrss)
+        return metrics
+
+
+def _sum_or_none(values: list[float | int | None]) -> float | int | None:
+    known = [v for v in values if v is not None]
+    return sum(known) if known else None
+
+
+@dataclass
+class ScanMetrics:
+    """
+    Resource use of one scan: totals over its FFmpeg processes plus each process.
+
+    ``decode_fps`` and ``speed`` are over the scan's wall time, so parallel slices
+    add up; ``cpu_sec`` is user plus system time of all processes.
+    """
+
+    path: str
+    mode: str
+    wall_sec: float = 0.0
+    processes: list[ProcessMetrics] = field(default_factory=list)
+
+    @property
+    def frames(self) -> int:
+        return sum(p.frames for p in self.processes)
+
+    @property
+    def media_sec(self) -> float:
+        return sum(p.media_sec for p in self.processes)
+
+    @property
+    def decode_fps(self) -> float | None:
+        return self.frames / self.wall_sec if self.wall_sec > 0 else None
+
+    @property
+    def speed(self) -> float | None:
+        return self.media_sec / self.wall_sec if self.wall_sec > 0 else None
+
+    @property
+    def cpu_sec(self) -> float | None:
+        return _sum_or_none(
+            [
+                None if p.cpu_user_sec is None else p.cpu_user_sec + (p.cpu_system_sec or 0.0)
+                for p in self.processes
+            ]
+        )
+
+    @property
+    def bytes_read(self) -> int | None:
+        return _sum_or_none([p.bytes_read for p in self.processes])
+
+    def extend(self, other: ScanMetrics) -> None:
+        """Add the processes of a nested scan (for example coarse-scan refinement)."""
+        self.processes.extend(other.processes)
+
+    def to_dict(self) -> dict[str, Any]:
+        def rounded(value: float | None, digits: int) -> float | None:
+            return None if value is None else round(value, digits)
+
+        return {
+            "path": self.path,
+            "mode": self.mode,
+            "wall_sec": round(self.wall_sec, 4),
+            "frames": self.frames,
+            "media_sec": round(self.media_sec, 3),
+            "decode_fps": rounded(self.decode_fps, 1),
+            "speed": rounded(self.speed, 3),
+            "cpu_sec": rounded(self.cpu_sec, 4),
+            "bytes_read": self.bytes_read,
+            "processes": [asdict(p) for p in self.processes],
+        }
+
+
+class MetricsRecorder:
+    """Times a scan and finishes it into a ``ScanMetrics`` delivered and logged once."""
+
+    def __init__(
+        self,
+        path: str,
+        mode: str,
+        on_metrics: Callable[[ScanMetrics], None] | None = None,
+    ) -> None:
+        self.metrics = ScanMetrics(path, mode)
+        self.on_metrics = on_metrics
+        self._t0 = time.monotonic()
+
+    def add(self, process: ProcessMetrics) -> None:
+        self.metrics.processes.append(process)
+
+    def finish(self) -> ScanMetrics:
+        self.metrics.wall_sec = time.monotonic() - self._t0
+        log_metrics(self.metrics)
+        if self.on_metrics:
+            self.on_metrics(self.metrics)
+        return self.metrics
+
+
+def log_metrics(metrics: ScanMetrics) -> None:
+    """One JSON object per scan on the ``scan_metrics`` logger (INFO)."""
+    if logger.isEnabledFor(logging.INFO):
+        logger.info(json.dumps(metrics.to_dict(), separators=(",", ":")))
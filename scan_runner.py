@@ -0,0 +1,515 @@
+"""Qt-free scan pipeline shared by the GUI workers and the ``machap`` command line."""
+
+from __future__ import annotations
+
+import contextlib
+from collections.abc import Callable
+from functools import partial
+from typing import Any
+
+from batch_scheduler import default_worker_budget, run_batch
+from coarse_scan import COARSE_MODES, CoarseScanReport
+from combined_detect import DEFAULT_SILENCE_NOISE_DB, DETECTION_MODES
+from detector import useful_parallel_jobs, window_parallel_jobs
+from export_utils import DEFAULT_EXPORT_JOBS, get_media_duration_seconds
+from luma_index import (
+    LumaIndex,
+    black_level_for_threshold,
+    build_luma_index,
+    numpy_available,
+)
+from media_probe import probe_media, probe_media_many
+from scan_autotune import autotune_scan
+from scan_cache import ScanCache, detect_black_frames_cached
+from scan_checkpoint import BatchCheckpoint, FileCheckpoint
+from scan_cost import BATCH_ORDERS, ORDER_LONGEST_FIRST, batch_order, shared_cost_model
+from scan_metrics import ScanMetrics
+from staging_cache import StagingCache, shared_staging_cache
+from storage_class import STORAGE_CLASSES, StorageInfo, detect_storage, read_policy
+from time_windows import DEFAULT_SCAN_WINDOW_LIST_TEXT, expand_scan_time_windows
+
+DEFAULT_SCAN_SETTINGS: dict[str, Any] = {
+    "min_black_seconds": 0.4,
+    "ratio_black_pixels": 0.98,
+    "black_pixel_threshold": 0.08,
+    "window_list": DEFAULT_SCAN_WINDOW_LIST_TEXT,
+    "export_format": "mp4",
+    "max_analysis_width": 854,
+    "use_hwaccel": False,
+    "parallel_scan_jobs": 0,
+    "pin_scan_workers": False,
+    "storage_class": "auto",
+    "stage_remote_files": False,
+    "staging_dir": "",
+    "staging_max_gb": 50,
+    "force_rescan": False,
+    "luma_index": False,
+    "cpu_budget": 0,
+    "scan_mode": "full",
+    "detection_mode": "black",
+    "silence_noise_db": DEFAULT_SILENCE_NOISE_DB,
+    "export_jobs": DEFAULT_EXPORT_JOBS,
+    "export_in_place": False,
+    "batch_order": ORDER_LONGEST_FIRST,
+}
+
+# Core-seconds assumed for a file whose length or format is unknown.
+MIN_FILE_COST = 1.0
+
+# ``full`` decodes every frame; the others are coarse-to-fine ``-skip_frame`` modes.
+SCAN_MODES = ("full", *COARSE_MODES)
+
+
+def _max_analysis_width_from_settings(settings: dict[str, Any]) -> int | None:
+    mw = settings.get("max_analysis_width", 854)
+    if mw is None:
+        return 854
+    mw = int(mw)
+    return mw if mw > 0 else None
+
+
+def _use_hwaccel_from_settings(settings: dict[str, Any]) -> bool:
+    return bool(settings.get("use_hwaccel", False))
+
+
+def _parallel_scan_jobs_from_settings(settings: dict[str, Any]) -> int:
+    """Segment jobs per file; 0 means tune them (and FFmpeg threads) per file."""
+    return max(0, int(settings.get("parallel_scan_jobs", 0) or 0))
+
+
+def _pin_scan_workers_from_settings(settings: dict[str, Any]) -> bool:
+    return bool(settings.get("pin_scan_workers", False))
+
+
+def _storage_from_settings(settings: dict[str, Any], video_path: str) -> StorageInfo:
+    """Storage under ``video_path``: detected, or the class forced by ``storage_class``."""
+    kind = str(settings.get("storage_class", "auto") or "auto")
+    if kind in STORAGE_CLASSES:
+        return StorageInfo(kind, detect_storage(video_path, probe=False).device, "settings")
+    return detect_storage(video_path)
+
+
+def staging_from_settings(settings: dict[str, Any]) -> StagingCache | None:
+    """The shared staging cache when ``stage_remote_files`` is on, else None."""
+    if not settings.get("stage_remote_files", False):
+        return None
+    max_gb = float(settings.get("staging_max_gb", 50) or 0)
+    return shared_staging_cache(
+        str(settings.get("staging_dir", "") or "") or None,
+        int(max_gb * 1024**3) if max_gb > 0 else None,
+    )
+
+
+def _cpu_budget_from_settings(settings: dict[str, Any]) -> int:
+    budget = int(settings.get("cpu_budget", 0) or 0)
+    return budget if budget > 0 else default_worker_budget()
+
+
+def _force_rescan_from_settings(settings: dict[str, Any]) -> bool:
+    return bool(settings.get("force_rescan", False))
+
+
+def _scan_mode_from_settings(settings: dict[str, Any]) -> str:
+    mode = str(settings.get("scan_mode", "full") or "full")
+    return mode if mode in SCAN_MODES else "full"
+
+
+def _detection_mode_from_settings(settings: dict[str, Any]) -> str:
+    mode = str(settings.get("detection_mode", "black") or "black")
+    return mode if mode in DETECTION_MODES else "black"
+
+
+def _silence_noise_db_from_settings(settings: dict[str, Any]) -> float:
+    return float(settings.get("silence_noise_db", DEFAULT_SILENCE_NOISE_DB))
+
+
+def _cost_mode_from_settings(settings: dict[str, Any]) -> str:
+    """Key of the scan's cost in ``scan_cost``: the scan mode, or the fused detection mode."""
+    detection = _detection_mode_from_settings(settings)
+    return _scan_mode_from_settings(settings) if detection == "black" else detection
+
+
+def _batch_order_from_settings(settings: dict[str, Any]) -> str:
+    order = str(settings.get("batch_order", ORDER_LONGEST_FIRST) or ORDER_LONGEST_FIRST)
+    return order if order in BATCH_ORDERS else ORDER_LONGEST_FIRST
+
+
+def _luma_index_from_settings(settings: dict[str, Any]) -> bool:
+    """True when the luma index is enabled, NumPy is present, and ``pix_th`` fits in it."""
+    if not settings.get("luma_index", False) or not numpy_available():
+        return False
+    if _detection_mode_from_settings(settings) != "black":
+        return False
+    try:
+        black_level_for_threshold(settings["black_pixel_threshold"], full_range=True)
+        black_level_for_threshold(settings["black_pixel_threshold"], full_range=False)
+    except ValueError:
+        return False
+    return True
+
+
+_shared_scan_cache: ScanCache | None = None
+
+
+def shared_scan_cache() -> ScanCache:
+    """Process-wide scan result cache used by the editor, the queue and the CLI."""
+    global _shared_scan_cache
+    if _shared_scan_cache is None:
+        _shared_scan_cache = ScanCache()
+    return _shared_scan_cache
+
+
+def detect_with_luma_index(
+    video_path: str,
+    settings: dict[str, Any],
+    window_list: list[tuple[float, float]],
+    *,
+    is_cancelled: Callable[[], bool],
+    on_time_ratio: Callable[[float], None] | None,
+    duration_hint_sec: float | None,
+    read_path: str | None = None,
+) -> list[dict[str, float]]:
+    """Re-threshold the file's luma index, decoding once (``read_path``) to build it if missing."""
+    width = _max_analysis_width_from_settings(settings)
+    index = None
+    if not _force_rescan_from_settings(settings):
+        index = LumaIndex.open_for(video_path, width)
+    if index is None:
+        index = build_luma_index(
+            video_path,
+            max_analysis_width=width,
+            use_hwaccel=_use_hwaccel_from_settings(settings),
+            is_cancelled=is_cancelled,
+            on_time_ratio=on_time_ratio,
+            duration_hint_sec=duration_hint_sec,
+            read_path=read_path,
+        )
+    return index.detect(
+        settings["min_black_seconds"],
+        settings["ratio_black_pixels"],
+        settings["black_pixel_threshold"],
+        window_list,
+    )
+
+
+def scan_file(
+    video_path: str,
+    settings: dict[str, Any],
+    *,
+    is_cancelled: Callable[[], bool] | None = None,
+    on_time_ratio: Callable[[float], None] | None = None,
+    cache: ScanCache | None | bool = True,
+    duration_sec: float | None = None,
+    on_event: Callable[[dict[str, float]], None] | None = None,
+    on_metrics: Callable[[ScanMetrics], None] | None = None,
+    cores: int | None = None,
+    on_worker_idle: Callable[[], None] | None = None,
+    read_path: str | None = None,
+    checkpoint: FileCheckpoint | None = None,
+    on_report: Callable[[CoarseScanReport], None] | None = None,
+) -> list[dict[str, float]]:
+    """
+    Probe, expand scan windows, and detect black events for one file per ``settings``.
+
+    ``cache`` is a ``ScanCache``, True for the shared cache, or False/None to always
+    decode. ``duration_sec`` skips the ffprobe call when the caller already knows
+    it. Progress is only reported when the duration is known. ``on_event`` gets
+    black events while FFmpeg is still running (black-only full and coarse scans;
+    cache hits, luma index and fused silence scans only return the list).
+    ``on_metrics`` gets a ``ScanMetrics`` per FFmpeg decode pass (none for cache
+    hits or luma index scans). With ``parallel_scan_jobs`` 0, full black scans get
+    their jobs and FFmpeg thread counts from ``autotune_scan`` for ``cores`` cores
+    (default: the ``cpu_budget`` setting). ``on_worker_idle`` is passed to
+    ``detect_black_frames`` for full black scans. On a spinning disk or network
+    share (``storage_class``), full black scans use at most ``read_policy``'s
+    readers, with the cores left over as FFmpeg decoder threads in auto mode.
+    ``read_path`` is a local copy of ``video_path`` (``staging_cache``) that every
+    FFmpeg pass reads instead; its storage, not the source's, sets the reader
+    limits, and results are cached under ``video_path``. ``checkpoint`` lets a
+    full black scan resume its finished chunks (``scan_checkpoint``). ``on_report``
+    gets the ``CoarseScanReport`` (decode savings and recall bound) of a
+    coarse-to-fine scan. The CPU time of decode passes is recorded in
+    ``scan_cost``'s history. Raises ``BlackdetectError`` / ``BlackdetectCancelled``
+    like ``detect_black_frames``.
+    """
+    cancel = is_cancelled or (lambda: False)
+    read_path = read_path or video_path
+    if duration_sec is None:
+        duration_sec = get_media_duration_seconds(read_path)
+    duration = duration_sec or 0.0
+    window_list = expand_scan_time_windows(
+        str(settings.get("window_list", "") or ""),
+        duration,
+    )
+    span = scan_span_seconds(window_list, duration)
+    ratio_cb = on_time_ratio if duration > 0 else None
+    duration_hint = duration if duration > 0 else None
+
+    if _luma_index_from_settings(settings):
+        return detect_with_luma_index(
+            video_path,
+            settings,
+            window_list,
+            is_cancelled=cancel,
+            on_time_ratio=ratio_cb,
+            duration_hint_sec=duration_hint,
+            read_path=read_path,
+        )
+
+    common: dict[str, Any] = {
+        "min_black_seconds": settings["min_black_seconds"],
+        "ratio_black_pixels": settings["ratio_black_pixels"],
+        "black_pixel_threshold": settings["black_pixel_threshold"],
+        "window_list": window_list,
+        "max_analysis_width": _max_analysis_width_from_settings(settings),
+        "use_hwaccel": _use_hwaccel_from_settings(settings),
+        "parallel_jobs": _parallel_scan_jobs_from_settings(settings),
+        "is_cancelled": cancel,
+        "on_time_ratio": ratio_cb,
+        "duration_hint_sec": duration_hint,
+        "on_event": on_event,
+    }
+    passes: list[ScanMetrics] = []
+
+    def collect_metrics(metrics: ScanMetrics) -> None:
+        passes.append(metrics)
+        if on_metrics:
+            on_metrics(metrics)
+
+    common["on_metrics"] = collect_metrics
+    full_black = (
+        _scan_mode_from_settings(settings) == "full"
+        and _detection_mode_from_settings(settings) == "black"
+    )
+    if full_black and on_worker_idle:
+        common["on_worker_idle"] = on_worker_idle
+    if full_black and checkpoint is not None:
+        common["checkpoint"] = checkpoint
+    if not full_black:
+        storage_kind = ""
+    elif read_path != video_path:
+        storage_kind = detect_storage(read_path).kind
+    else:
+        storage_kind = _storage_from_settings(settings, video_path).kind
+    policy = read_policy(storage_kind)
+    if policy.min_chunk_seconds:
+        common["min_chunk_seconds"] = policy.min_chunk_seconds
+    if policy.max_readers and common["parallel_jobs"] > policy.max_readers:
+        common["parallel_jobs"] = policy.max_readers
+    if common["parallel_jobs"] == 0:
+        cores = cores or _cpu_budget_from_settings(settings)
+        common["parallel_jobs"] = cores
+        if full_black:
+            tuning = autotune_scan(
+                read_path,
+                probe_media(read_path),
+                span,
+                cores,
+                max_analysis_width=common["max_analysis_width"],
+                # Probe timings on slow storage would not suit the class elsewhere.
+                probe=policy.max_readers is None,
+                is_cancelled=cancel,
+                max_jobs=policy.max_readers,
+            )
+            common["parallel_jobs"] = tuning.jobs
+            common["decoder_threads"] = tuning.threads
+            common["filter_threads"] = tuning.filter_threads
+            common["pin_cpus"] = _pin_scan_workers_from_settings(settings)
+    if cache is True:
+        cache = shared_scan_cache()
+    events = detect_black_frames_cached(
+        video_path,
+        cache=cache or None,
+        force_rescan=_force_rescan_from_settings(settings),
+        scan_mode=_scan_mode_from_settings(settings),
+        detection_mode=_detection_mode_from_settings(settings),
+        silence_noise_db=_silence_noise_db_from_settings(settings),
+        read_path=read_path if read_path != video_path else None,
+        on_report=on_report,
+        **common,
+    )
+    if passes:
+        shared_cost_model().record(
+            probe_media(read_path),
+            span - (checkpoint.restored_seconds if checkpoint is not None else 0.0),
+            sum(
+                m.cpu_sec if m.cpu_sec is not None else m.wall_sec * max(1, len(m.processes))
+                for m in passes
+            ),
+            _cost_mode_from_settings(settings),
+        )
+    return events
+
+
+def scan_span_seconds(window_list: list[tuple[float, float]], duration_sec: float) -> float:
+    """Media seconds a scan decodes: the windows' total, or the whole file."""
+    return sum(hi - lo for lo, hi in window_list) if window_list else max(0.0, duration_sec)
+
+
+def predicted_scan_costs(
+    paths: list[str],
+    settings: dict[str, Any],
+    durations: list[float],
+) -> list[float]:
+    """``scan_cost`` predictions (core-seconds) for scanning ``paths`` with ``settings``."""
+    infos = probe_media_many(paths)
+    model = shared_cost_model()
+    mode = _cost_mode_from_settings(settings)
+    window_text = str(settings.get("window_list", "") or "")
+    costs = []
+    for info, duration in zip(infos, durations):
+        span = scan_span_seconds(expand_scan_time_windows(window_text, duration), duration)
+        # Files of unknown length still take a moment (and show up in progress).
+        costs.append(max(MIN_FILE_COST, model.predict(info, span, mode)))
+    return costs
+
+
+def planned_parallel_jobs(settings: dict[str, Any], duration_sec: float, requested: int) -> int:
+    """FFmpeg processes a scan of a file this long would use with ``requested`` jobs."""
+    if duration_sec <= 0 or _luma_index_from_settings(settings):
+        return 1
+    if _detection_mode_from_settings(settings) != "black":
+        # The fused black + silence graph always runs as a single process.
+        return 1
+    if _scan_mode_from_settings(settings) != "full":
+        # The sampled pass is one process; refinement regions are short.
+        return 1
+    windows = expand_scan_time_windows(str(settings.get("window_list", "") or ""), duration_sec)
+    if not windows:
+        return useful_parallel_jobs(duration_sec, requested)
+    # Chunks of every window share one pool of at most ``requested`` processes.
+    return min(max(1, requested), sum(window_parallel_jobs(windows, requested)))
+
+
+def probe_durations(paths: list[str], max_workers: int = 8) -> list[float]:
+    """Container durations for ``paths`` (0.0 when unknown), probed concurrently."""
+    infos = probe_media_many(paths, max_workers)
+    return [(info.duration or 0.0) if info is not None else 0.0 for info in infos]
+
+
+def scan_batch(
+    paths: list[str],
+    settings: dict[str, Any],
+    *,
+    is_cancelled: Callable[[], bool] | None = None,
+    on_start: Callable[[int, int], None] | None = None,
+    on_progress: Callable[[int, float], None] | None = None,
+    on_result: Callable[[int, list[dict[str, float]]], None] | None = None,
+    on_error: Callable[[int, BaseException], None] | None = None,
+    cache: ScanCache | None | bool = True,
+    on_event: Callable[[int, dict[str, float]], None] | None = None,
+    on_metrics: Callable[[int, ScanMetrics], None] | None = None,
+    on_plan: Callable[[list[float], int], None] | None = None,
+    checkpoint: BatchCheckpoint | None = None,
+    on_report: Callable[[int, CoarseScanReport], None] | None = None,
+) -> bool:
+    """
+    Scan ``paths`` concurrently within the ``cpu_budget`` setting (0 = all cores).
+
+    Files run side by side and each gets a share of the free workers for segment
+    parallelism, giving workers back as its last chunks drain so the next file
+    can start on them; ``parallel_scan_jobs`` = 1 keeps every file to a single
+    sequential pass, and 0 treats each file's share as cores for ``autotune_scan``.
+    Files on one spinning disk or network share are only scanned a few at a time
+    (``storage_class.read_policy``). With ``stage_remote_files``, files on network
+    shares are copied to the local staging directory first, the next file's copy
+    running while the current one is scanned, and scans read the copies.
+    Files start in the ``batch_order`` setting's order of predicted cost
+    (``scan_cost``; longest first by default), and ``on_plan(costs, budget)``
+    gets the predictions in core-seconds before the first file starts.
+    With a ``checkpoint``, files it holds as finished are reported through
+    ``on_result`` without scanning, partly scanned files resume their chunks,
+    and every finished file and chunk is recorded in it.
+    ``on_start(index, jobs)``, ``on_progress(index, ratio)``, ``on_event(index,
+    event)``, ``on_metrics(index, metrics)`` and ``on_report(index, report)``
+    (coarse-to-fine scans) may be called from worker threads;
+    ``on_result`` / ``on_error`` run on the calling thread. Returns False when
+    cancelled.
+    """
+    durations = probe_durations(paths)
+    staging = staging_from_settings(settings)
+    storages = [
+        detect_storage(staging.directory)
+        if staging is not None and staging.should_stage(path)
+        else _storage_from_settings(settings, path)
+        for path in paths
+    ]
+    per_file_cap = _parallel_scan_jobs_from_settings(settings)
+    budget = _cpu_budget_from_settings(settings)
+    max_jobs = 1 if per_file_cap == 1 else budget
+    costs = predicted_scan_costs(paths, settings, durations)
+    finished: dict[str, list[dict[str, float]]] = {}
+    if checkpoint is not None:
+        finished = checkpoint.results()
+        # The queue is on disk before the first file starts.
+        checkpoint.save()
+    order = [
+        i
+        for i in batch_order(costs, _batch_order_from_settings(settings))
+        if paths[i] not in finished
+    ]
+    following = dict(zip(order, order[1:]))
+    if on_plan:
+        on_plan(costs, budget)
+    for index, path in enumerate(paths):
+        if path in finished and on_result:
+            on_result(index, finished[path])
+
+    def useful(index: int) -> int:
+        jobs = planned_parallel_jobs(settings, durations[index], max_jobs)
+        readers = read_policy(storages[index].kind).max_readers
+        # In auto mode a file's share is cores, and those beyond its readers
+        # become decoder threads; a fixed job count is processes.
+        return min(jobs, readers) if readers and per_file_cap else jobs
+
+    def device_group(index: int) -> tuple[tuple[str, str], int] | None:
+        limit = read_policy(storages[index].kind).files_per_device
+        return ((storages[index].kind, storages[index].device), limit) if limit else None
+
+    def scan_one(index: int, jobs: int, release: Callable[[], None]) -> list[dict[str, float]]:
+        if on_start:
+            on_start(index, jobs)
+        file_settings = dict(settings)
+        if per_file_cap:
+            file_settings["parallel_scan_jobs"] = jobs
+        if staging is None:
+            staged = contextlib.nullcontext(paths[index])
+        else:
+            # Queue this file's copy, then the next one's to run during the scan.
+            staging.prefetch(paths[i] for i in (index, following.get(index)) if i is not None)
+            staged = staging.use(paths[index], is_cancelled)
+        with staged as read_path:
+            return scan_file(
+                paths[index],
+                file_settings,
+                is_cancelled=is_cancelled,
+                on_time_ratio=(lambda r: on_progress(index, r)) if on_progress else None,
+                cache=cache,
+                duration_sec=durations[index],
+                on_event=partial(on_event, index) if on_event else None,
+                on_metrics=partial(on_metrics, index) if on_metrics else None,
+                cores=jobs,
+                on_worker_idle=release,
+                read_path=read_path,
+                checkpoint=checkpoint.file(paths[index]) if checkpoint is not None else None,
+                on_report=partial(on_report, index) if on_report else None,
+            )
+
+    def file_done(index: int, events: list[dict[str, float]]) -> None:
+        if checkpoint is not None:
+            checkpoint.finish(paths[index], events)
+        if on_result:
+            on_result(index, events)
+
+    return run_batch(
+        len(paths),
+        scan_one,
+        useful_jobs=useful,
+        budget=budget,
+        order=order,
+        is_cancelled=is_cancelled,
+        on_result=file_done,
+        on_error=on_error,
+        early_release=True,
+        group_of=device_group,
+    )
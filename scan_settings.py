@@ -19,6 +19,8 @@ from time_windows import DEFAULT_SCAN_WINDOW_LIST_TEXT
 
 class ScanSettingsDialog(QDialog):
     settingsApplied = Signal(dict)
+    settingsEdited = Signal(dict)
+    """Emitted on every detection threshold edit, for live previews before Apply."""
 
     def __init__(self, parent=None, initial_settings=None):
         super().__init__(parent)
@@ -33,7 +35,21 @@ class ScanSettingsDialog(QDialog):
             "export_format": "mp4",
             "max_analysis_width": 854,
             "use_hwaccel": False,
-            "parallel_scan_jobs": 4,
+            "parallel_scan_jobs": 0,
+            "pin_scan_workers": False,
+            "storage_class": "auto",
+            "stage_remote_files": False,
+            "staging_dir": "",
+            "staging_max_gb": 50,
+            "force_rescan": False,
+            "luma_index": False,
+            "cpu_budget": 0,
+            "scan_mode": "full",
+            "detection_mode": "black",
+            "silence_noise_db": -50.0,
+            "export_jobs": 2,
+            "export_in_place": False,
+            "batch_order": "longest_first",
         }
 
         layout = QFormLayout()
@@ -87,17 +103,146 @@ class ScanSettingsDialog(QDialog):
         layout.addRow(self.use_hwaccel)
 
         self.parallel_scan_jobs = QSpinBox()
-        self.parallel_scan_jobs.setRange(1, 12)
-        self.parallel_scan_jobs.setValue(int(self.settings.get("parallel_scan_jobs", 4)))
+        self.parallel_scan_jobs.setRange(0, 12)
+        self.parallel_scan_jobs.setSpecialValueText("Auto")
+        self.parallel_scan_jobs.setValue(int(self.settings.get("parallel_scan_jobs", 0) or 0))
         self.parallel_scan_jobs.setToolTip(
             "Number of parallel FFmpeg processes on different time ranges (1 = one "
-            "slow pass, most accurate). Values >1 use fast input seek and can approach "
-            "several× speed on a multi-core CPU. With a single scan time window (including "
-            "the default trim), parallel slices apply inside that window only. "
-            "Not used when multiple disjoint scan windows are set."
+            "slow pass, most accurate). Auto picks the number of processes and FFmpeg "
+            "decoder threads per file from the core count, codec and resolution, "
+            "measured once per kind of file and remembered. Values >1 use fast input "
+            "seek and can approach several× speed on a multi-core CPU. Parallel slices "
+            "apply inside the scan time windows only (including the default trim); "
+            "the time ranges are served from one queue of keyframe-aligned chunks. "
+            "Queue scans share the batch CPU budget instead; 1 still keeps every file to "
+            "a single pass."
         )
         layout.addRow("Parallel scan jobs:", self.parallel_scan_jobs)
 
+        self.pin_scan_workers = QCheckBox("Pin scan processes to CPU cores (Auto only)")
+        self.pin_scan_workers.setChecked(bool(self.settings.get("pin_scan_workers", False)))
+        self.pin_scan_workers.setToolTip(
+            "Give every FFmpeg process of an auto-tuned scan its own cores (Linux), so "
+            "decoder threads do not migrate between cores or crowd onto the same ones."
+        )
+        layout.addRow(self.pin_scan_workers)
+
+        self.storage_class = QComboBox()
+        self.storage_class.addItem("Auto-detect", "auto")
+        self.storage_class.addItem("SSD / NVMe", "ssd")
+        self.storage_class.addItem("Spinning disk (HDD)", "hdd")
+        self.storage_class.addItem("Network share (NAS, SMB, NFS)", "network")
+        self._select_combo_data(self.storage_class, self.settings.get("storage_class", "auto"))
+        self.storage_class.setToolTip(
+            "Parallel scan jobs read one file at several places at once, which makes a "
+            "spinning disk seek back and forth and a network share serve many small "
+            "requests. On those, a file is read by one process (HDD) or two processes "
+            "with long chunks (network) and fewer files of the same disk or share are "
+            "scanned at once; Auto gives the spare cores to FFmpeg's decoder threads. "
+            "Auto-detect checks the filesystem, the disk's rotational flag and, if "
+            "needed, how fast the file answers random reads."
+        )
+        layout.addRow("Source storage:", self.storage_class)
+
+        self.stage_remote_files = QCheckBox("Copy files on network shares to local disk first")
+        self.stage_remote_files.setChecked(bool(self.settings.get("stage_remote_files", False)))
+        self.stage_remote_files.setToolTip(
+            "Queue scans and exports copy each file from a network share into a local "
+            "staging folder in the cache directory and read the copy; the next file is "
+            "copied while the current one is processed. Writing chapters into the "
+            "source file still edits the original."
+        )
+        layout.addRow(self.stage_remote_files)
+
+        self.staging_max_gb = QSpinBox()
+        self.staging_max_gb.setRange(1, 10000)
+        self.staging_max_gb.setSuffix(" GB")
+        self.staging_max_gb.setValue(int(self.settings.get("staging_max_gb", 50) or 50))
+        self.staging_max_gb.setToolTip(
+            "Size limit of the staging folder. The least recently used copies are "
+            "deleted to make room; larger files are read from the share."
+        )
+        layout.addRow("Local staging limit:", self.staging_max_gb)
+
+        self.cpu_budget = QSpinBox()
+        self.cpu_budget.setRange(0, 256)
+        self.cpu_budget.setSpecialValueText("All cores")
+        self.cpu_budget.setValue(int(self.settings.get("cpu_budget", 0) or 0))
+        self.cpu_budget.setToolTip(
+            "Total FFmpeg processes for Scan All Files. The queue scans several files at "
+            "once and gives each a share of this budget for parallel time slices, so many "
+            "short files and one long film both keep every core busy."
+        )
+        layout.addRow("Batch CPU budget (processes):", self.cpu_budget)
+
+        self.batch_order = QComboBox()
+        self.batch_order.addItem("Longest scans first", "longest_first")
+        self.batch_order.addItem("Shortest scans first", "shortest_first")
+        self.batch_order.addItem("Queue order", "queue")
+        self._select_combo_data(self.batch_order, self.settings.get("batch_order", "longest_first"))
+        self.batch_order.setToolTip(
+            "Order in which Scan All Files starts the queue, by predicted scan time "
+            "(length, codec, resolution and bitrate, corrected by the times of earlier "
+            "scans). Longest first finishes the whole queue soonest because no long "
+            "file is left running alone at the end; shortest first gets the most files "
+            "done early."
+        )
+        layout.addRow("Batch order:", self.batch_order)
+
+        self.force_rescan = QCheckBox("Ignore cached results (force rescan)")
+        self.force_rescan.setChecked(bool(self.settings.get("force_rescan", False)))
+        self.force_rescan.setToolTip(
+            "Scan results are cached per file and detection settings, so scanning an "
+            "unchanged file again returns instantly. Check this to decode the file again "
+            "and refresh the cached result."
+        )
+        layout.addRow(self.force_rescan)
+
+        self.luma_index = QCheckBox("Build luma index for instant re-tuning (needs NumPy)")
+        self.luma_index.setChecked(bool(self.settings.get("luma_index", False)))
+        self.luma_index.setToolTip(
+            "The first scan records per-frame darkness statistics instead of running "
+            "blackdetect. Afterwards, changing the duration, ratio or threshold above "
+            "re-detects from that index in milliseconds without decoding the file again. "
+            "Supports black pixel thresholds up to about 0.36."
+        )
+        layout.addRow(self.luma_index)
+
+        self.scan_mode = QComboBox()
+        self.scan_mode.addItem("Full (decode every frame)", "full")
+        self.scan_mode.addItem("Coarse-to-fine: keyframes first", "nokey")
+        self.scan_mode.addItem("Coarse-to-fine: reference frames first", "noref")
+        self._select_combo_data(self.scan_mode, self.settings.get("scan_mode", "full"))
+        self.scan_mode.setToolTip(
+            "Coarse-to-fine modes first decode only keyframes (or only reference frames), "
+            "then decode every frame just around the black runs found. Much faster on "
+            "long files, but a black run that contains no sampled frame is missed; with "
+            "keyframes every 2 s, runs shorter than 2 s may be skipped."
+        )
+        layout.addRow("Scan mode:", self.scan_mode)
+
+        self.detection_mode = QComboBox()
+        self.detection_mode.addItem("Black frames", "black")
+        self.detection_mode.addItem("Black + silence (one pass)", "black_silence")
+        self.detection_mode.addItem(
+            "Black + silence + scene cuts (one pass)", "black_silence_scene"
+        )
+        self._select_combo_data(self.detection_mode, self.settings.get("detection_mode", "black"))
+        self.detection_mode.setToolTip(
+            "Black + silence decodes video and audio in the same FFmpeg pass and keeps only "
+            "black stretches that are also silent, which skips dark scenes inside a show. "
+            "Scene cuts add a sharpness score. Files without audio keep every black "
+            "stretch. Runs as one process per file (parallel scan jobs do not apply)."
+        )
+        layout.addRow("Detect:", self.detection_mode)
+
+        self.silence_noise_db = QDoubleSpinBox()
+        self.silence_noise_db.setRange(-90.0, 0.0)
+        self.silence_noise_db.setSingleStep(1.0)
+        self.silence_noise_db.setSuffix(" dB")
+        self.silence_noise_db.setValue(float(self.settings.get("silence_noise_db", -50.0)))
+        layout.addRow("Silence below:", self.silence_noise_db)
+
         self.export_format = QComboBox()
         self.export_format.addItem("MP4 (queue export / remux)", "mp4")
         self.export_format.addItem("MKV (queue export / remux)", "mkv")
@@ -110,6 +255,26 @@ class ScanSettingsDialog(QDialog):
 
         layout.addRow("Export format (queue / default file type):", self.export_format)
 
+        self.export_jobs = QSpinBox()
+        self.export_jobs.setRange(1, 8)
+        self.export_jobs.setValue(int(self.settings.get("export_jobs", 2)))
+        self.export_jobs.setToolTip(
+            "Files remuxed at once by Export Files. Remuxing copies streams, so it is "
+            "limited by disk speed rather than CPU: 2 suits a single disk, raise it when "
+            "sources and the export folder are on different fast drives."
+        )
+        layout.addRow("Parallel exports:", self.export_jobs)
+
+        self.export_in_place = QCheckBox("Write chapters into the source file (MKV/MP4)")
+        self.export_in_place.setChecked(bool(self.settings.get("export_in_place", False)))
+        self.export_in_place.setToolTip(
+            "MKV exports of Matroska files and MP4 exports of MP4 files only rewrite the "
+            "chapter table, never the audio or video. Checked, the source file itself is "
+            "updated in milliseconds instead of writing a _chaptered copy. Files that "
+            "cannot be edited this way are still remuxed to a copy."
+        )
+        layout.addRow(self.export_in_place)
+
         self.buttons = QDialogButtonBox(QDialogButtonBox.Ok | QDialogButtonBox.Cancel)
         self.buttons.accepted.connect(self.accept)
         self.buttons.rejected.connect(self.reject)
@@ -127,6 +292,17 @@ class ScanSettingsDialog(QDialog):
 
         self.setLayout(layout)
 
+        for spin in (self.min_black, self.ratio_black, self.threshold_black):
+            spin.valueChanged.connect(self._emit_edited)
+
+    @staticmethod
+    def _select_combo_data(combo: QComboBox, value) -> None:
+        idx = combo.findData(value)
+        combo.setCurrentIndex(0 if idx < 0 else idx)
+
+    def _emit_edited(self, _value: float) -> None:
+        self.settingsEdited.emit(self.get_settings())
+
     def load_from(self, settings: dict) -> None:
         """Refresh widget values from a settings dict (same keys as ``get_settings``)."""
         self.min_black.setValue(settings["min_black_seconds"])
@@ -136,7 +312,20 @@ class ScanSettingsDialog(QDialog):
         mw = settings.get("max_analysis_width", 854)
         self.max_analysis_width.setValue(854 if mw is None else int(mw))
         self.use_hwaccel.setChecked(bool(settings.get("use_hwaccel", False)))
-        self.parallel_scan_jobs.setValue(int(settings.get("parallel_scan_jobs", 4)))
+        self.parallel_scan_jobs.setValue(int(settings.get("parallel_scan_jobs", 0) or 0))
+        self.pin_scan_workers.setChecked(bool(settings.get("pin_scan_workers", False)))
+        self._select_combo_data(self.storage_class, settings.get("storage_class", "auto"))
+        self.stage_remote_files.setChecked(bool(settings.get("stage_remote_files", False)))
+        self.staging_max_gb.setValue(int(settings.get("staging_max_gb", 50) or 50))
+        self.cpu_budget.setValue(int(settings.get("cpu_budget", 0) or 0))
+        self._select_combo_data(self.batch_order, settings.get("batch_order", "longest_first"))
+        self.force_rescan.setChecked(bool(settings.get("force_rescan", False)))
+        self.luma_index.setChecked(bool(settings.get("luma_index", False)))
+        self._select_combo_data(self.scan_mode, settings.get("scan_mode", "full"))
+        self._select_combo_data(self.detection_mode, settings.get("detection_mode", "black"))
+        self.silence_noise_db.setValue(float(settings.get("silence_noise_db", -50.0)))
+        self.export_jobs.setValue(int(settings.get("export_jobs", 2)))
+        self.export_in_place.setChecked(bool(settings.get("export_in_place", False)))
         current_fmt = normalize_export_format(settings.get("export_format", "mp4"))
         idx = self.export_format.findData(current_fmt)
         self.export_format.setCurrentIndex(0 if idx < 0 else idx)
@@ -154,6 +343,21 @@ class ScanSettingsDialog(QDialog):
             "max_analysis_width": self.max_analysis_width.value(),
             "use_hwaccel": self.use_hwaccel.isChecked(),
             "parallel_scan_jobs": self.parallel_scan_jobs.value(),
+            "pin_scan_workers": self.pin_scan_workers.isChecked(),
+            "storage_class": str(self.storage_class.currentData() or "auto"),
+            "stage_remote_files": self.stage_remote_files.isChecked(),
+            # Not editable here; kept from the settings the dialog was opened with.
+            "staging_dir": str(self.settings.get("staging_dir", "") or ""),
+            "staging_max_gb": self.staging_max_gb.value(),
+            "cpu_budget": self.cpu_budget.value(),
+            "batch_order": str(self.batch_order.currentData() or "longest_first"),
+            "force_rescan": self.force_rescan.isChecked(),
+            "luma_index": self.luma_index.isChecked(),
+            "scan_mode": str(self.scan_mode.currentData() or "full"),
+            "detection_mode": str(self.detection_mode.currentData() or "black"),
+            "silence_noise_db": self.silence_noise_db.value(),
+            "export_jobs": self.export_jobs.value(),
+            "export_in_place": self.export_in_place.isChecked(),
         }
 
     def apply_settings(self) -> None:
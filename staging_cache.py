@@ -0,0 +1,284 @@
+"""
+Local copies of queue files that live on network shares.
+
+A queue file on a network mount is read over the wire by every FFmpeg pass: the
+scan, keyframe probes, the export remux. ``StagingCache`` copies such files to a
+local scratch directory in the background, one at a time, so the passes read the
+local copy instead; callers pipeline it by asking for file N+1 (``prefetch``)
+while file N is being processed. The directory is bounded by ``max_bytes``:
+copies not in use are evicted least recently used first, and a file that would
+not fit is read from its original location.
+
+A copy carries its source's size and modification time and is only used while
+the source still has them. Copies survive restarts and are adopted again.
+Edits of the source file itself (in-place chapter writes) always go to the
+original, never to a copy.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import logging
+import os
+import shutil
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Callable, Iterable, Iterator
+from concurrent.futures import Future, ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeout
+from contextlib import contextmanager
+from dataclasses import dataclass
+
+from scan_cache import default_cache_dir
+from storage_class import NETWORK, detect_storage
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_STAGING_MAX_BYTES = 50 * 1024**3
+_COPY_BUFFER = 8 * 1024 * 1024
+_PART_SUFFIX = ".part"
+
+
+def default_staging_dir() -> str:
+    return os.path.join(default_cache_dir(), "staging")
+
+
+def is_remote(path: str) -> bool:
+    """Whether ``path`` is on a network filesystem (the files worth staging)."""
+    return detect_storage(path, probe=False).kind == NETWORK
+
+
+@dataclass
+class _Entry:
+    name: str
+    size: int
+    source: str | None = None
+    mtime_ns: int | None = None
+    future: Future | None = None
+    pins: int = 0
+    ready: bool = False
+
+
+class StagingCache:
+    """
+    Bounded directory of local copies; see the module docstring.
+
+    ``should_stage(path)`` selects the files that are copied (default: files on
+    network filesystems); others are always read in place.
+    """
+
+    def __init__(
+        self,
+        directory: str | None = None,
+        max_bytes: int = DEFAULT_STAGING_MAX_BYTES,
+        *,
+        should_stage: Callable[[str], bool] | None = None,
+    ) -> None:
+        self.directory = directory or default_staging_dir()
+        self.max_bytes = max(0, int(max_bytes))
+        self.should_stage = should_stage or is_remote
+        self._lock = threading.Lock()
+        self._entries: OrderedDict[str, _Entry] = OrderedDict()
+        # One copy at a time: parallel reads are what slows a share down.
+        self._copier = ThreadPoolExecutor(max_workers=1, thread_name_prefix="staging")
+        self._adopt_existing()
+
+    def _adopt_existing(self) -> None:
+        try:
+            names = os.listdir(self.directory)
+        except OSError:
+            return
+        found: list[tuple[float, _Entry]] = []
+        for name in names:
+            full = os.path.join(self.directory, name)
+            if name.endswith(_PART_SUFFIX):
+                _remove_quietly(full)
+                continue
+            try:
+                st = os.stat(full)
+            except OSError:
+                continue
+            entry = _Entry(name, st.st_size, mtime_ns=st.st_mtime_ns, ready=True)
+            found.append((st.st_ctime, entry))
+        for _ctime, entry in sorted(found, key=lambda item: item[0]):
+            self._entries[entry.name] = entry
+
+    @staticmethod
+    def local_name(path: str) -> str:
+        """File name of ``path``'s copy: a hash of its location plus its base name."""
+        key = os.path.normcase(os.path.abspath(path)).encode("utf-8", "surrogatepass")
+        return f"{hashlib.sha1(key).hexdigest()[:16]}-{os.path.basename(path)}"
+
+    def local_path(self, path: str) -> str:
+        return os.path.join(self.directory, self.local_name(path))
+
+    @property
+    def used_bytes(self) -> int:
+        with self._lock:
+            return sum(entry.size for entry in self._entries.values())
+
+    def prefetch(self, paths: Iterable[str]) -> None:
+        """Start copying ``paths`` in the background (in order, after earlier requests)."""
+        for path in paths:
+            self._request(path)
+
+    def _request(self, path: str, pin: bool = False) -> _Entry | None:
+        """The entry staging ``path``, queueing its copy if needed; None to read in place."""
+        try:
+            if not self.should_stage(path):
+                return None
+            st = os.stat(path)
+        except OSError:
+            return None
+        name = self.local_name(path)
+        with self._lock:
+            entry = self._entries.get(name)
+            if entry is not None and entry.size == st.st_size and entry.mtime_ns == st.st_mtime_ns:
+                entry.source = path
+                entry.pins += pin
+                self._entries.move_to_end(name)
+                return entry
+            if entry is not None:
+                # The source changed since it was copied; replace the copy once idle.
+                if entry.pins or not _finished(entry):
+                    return None
+                self._drop(entry)
+            if st.st_size > self.max_bytes or not self._make_room(st.st_size):
+                return None
+            entry = _Entry(name, st.st_size, path, st.st_mtime_ns, pins=int(pin))
+            self._entries[name] = entry
+            entry.future = self._copier.submit(self._copy, entry)
+            return entry
+
+    def _make_room(self, size: int) -> bool:
+        used = sum(entry.size for entry in self._entries.values())
+        for entry in list(self._entries.values()):
+            if used + size <= self.max_bytes:
+                break
+            if entry.pins == 0 and entry.ready:
+                used -= entry.size
+                self._drop(entry)
+        return used + size <= self.max_bytes
+
+    def _drop(self, entry: _Entry) -> None:
+        self._entries.pop(entry.name, None)
+        _remove_quietly(os.path.join(self.directory, entry.name))
+
+    def _copy(self, entry: _Entry) -> bool:
+        assert entry.source is not None
+        target = os.path.join(self.directory, entry.name)
+        part = target + _PART_SUFFIX
+        t0 = time.monotonic()
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            with open(entry.source, "rb") as src, open(part, "wb") as dst:
+                shutil.copyfileobj(src, dst, _COPY_BUFFER)
+            shutil.copystat(entry.source, part)
+            st = os.stat(part)
+            if st.st_size != entry.size or st.st_mtime_ns != entry.mtime_ns:
+                raise OSError(f"{entry.source} changed while being staged")
+            os.replace(part, target)
+        except OSError as e:
+            logger.warning("Could not stage %s: %s", entry.source, e)
+            _remove_quietly(part)
+            with self._lock:
+                self._entries.pop(entry.name, None)
+            return False
+        with self._lock:
+            entry.ready = True
+        logger.info(
+            "Staged %s (%.0f MB in %.1fs)",
+            entry.source,
+            entry.size / 1e6,
+            time.monotonic() - t0,
+        )
+        return True
+
+    def staged_path(self, path: str) -> str:
+        """The finished local copy of ``path`` if there is one, else ``path``; never waits."""
+        name = self.local_name(path)
+        with self._lock:
+            entry = self._entries.get(name)
+            ready = entry is not None and entry.ready
+        if not ready:
+            return path
+        try:
+            st = os.stat(path)
+        except OSError:
+            return path
+        if entry.size != st.st_size or entry.mtime_ns != st.st_mtime_ns:
+            return path
+        return os.path.join(self.directory, name)
+
+    @contextmanager
+    def use(
+        self,
+        path: str,
+        is_cancelled: Callable[[], bool] | None = None,
+        poll_interval: float = 0.1,
+    ) -> Iterator[str]:
+        """
+        Yield the path to read ``path`` from, waiting for its copy to finish.
+
+        The copy is not evicted until the block ends. Files that are not staged,
+        do not fit or fail to copy yield ``path`` itself, as does cancelling the
+        wait (the copy carries on for later).
+        """
+        entry = self._request(path, pin=True)
+        if entry is None:
+            yield path
+            return
+        try:
+            future = entry.future
+            while future is not None and not future.done():
+                if is_cancelled is not None and is_cancelled():
+                    break
+                try:
+                    future.result(timeout=poll_interval)
+                except FutureTimeout:
+                    continue
+                except Exception:
+                    logger.exception("Staging %s failed", path)
+                    break
+            yield self.local_path(path) if entry.ready else path
+        finally:
+            with self._lock:
+                entry.pins -= 1
+
+    def clear(self) -> None:
+        """Delete every copy that is not in use."""
+        with self._lock:
+            for entry in list(self._entries.values()):
+                if entry.pins == 0 and _finished(entry):
+                    self._drop(entry)
+
+
+def _finished(entry: _Entry) -> bool:
+    return entry.future is None or entry.future.done()
+
+
+def _remove_quietly(path: str) -> None:
+    try:
+        os.unlink(path)
+    except OSError:
+        pass
+
+
+_shared: StagingCache | None = None
+_shared_lock = threading.Lock()
+
+
+def shared_staging_cache(
+    directory: str | None = None,
+    max_bytes: int | None = None,
+) -> StagingCache:
+    """Process-wide cache for ``directory``; a different directory replaces it."""
+    global _shared
+    directory = directory or default_staging_dir()
+    with _shared_lock:
+        if _shared is None or _shared.directory != directory:
+            _shared = StagingCache(directory, max_bytes or DEFAULT_STAGING_MAX_BYTES)
+        elif max_bytes:
+            _shared.max_bytes = int(max_bytes)
+        return _shared
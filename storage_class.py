@@ -0,0 +1,229 @@
+"""
+What kind of storage a video file lives on, for planning how a scan reads it.
+
+Parallel scan slices each open the file and read from a different offset. On
+flash that costs nothing, but a spinning disk seeks between the readers and a
+network share serves them over one link, so both can end up slower than a single
+sequential pass. ``detect_storage`` classifies a file's storage:
+
+* ``network`` when its filesystem (``/proc/mounts``) is NFS, SMB/CIFS, SSHFS, …
+* ``ssd`` when the block device's ``queue/rotational`` flag in ``/sys`` is 0,
+* otherwise, with ``probe``, from the latency of a few random reads of the file
+  (``hdd`` when slow), or ``hdd`` when the flag says the disk spins,
+* else ``unknown`` (treated like ``ssd``).
+
+``read_policy`` turns the class into reader limits for the scan planner.
+Results are memoized per filesystem.
+"""
+
+from __future__ import annotations
+
+import os
+import random
+import threading
+import time
+from dataclasses import dataclass
+
+SSD = "ssd"
+HDD = "hdd"
+NETWORK = "network"
+UNKNOWN = "unknown"
+STORAGE_CLASSES = (SSD, HDD, NETWORK)
+
+NETWORK_FILESYSTEMS = frozenset(
+    {
+        "9p",
+        "afs",
+        "ceph",
+        "cifs",
+        "davfs",
+        "fuse.rclone",
+        "fuse.sshfs",
+        "glusterfs",
+        "lustre",
+        "ncpfs",
+        "nfs",
+        "nfs4",
+        "smb3",
+        "smbfs",
+    }
+)
+# Mean random read latency above which storage counts as a spinning disk.
+SLOW_RANDOM_READ_MS = 4.0
+RANDOM_READS = 8
+RANDOM_READ_SIZE = 4096
+# Shortest chunk per reader on a network share: long sequential reads per request.
+NETWORK_MIN_CHUNK_SECONDS = 300.0
+
+
+@dataclass(frozen=True)
+class StorageInfo:
+    """Class of the storage under a file, and the disk or share it belongs to."""
+
+    kind: str
+    device: str = ""
+    source: str = "default"
+    """``"mounts"``, ``"sysfs"``, ``"probe"``, ``"settings"`` or ``"default"``."""
+
+
+@dataclass(frozen=True)
+class ReadPolicy:
+    """
+    How many processes may read one file (``max_readers``, None = no limit) and
+    how many files of one disk or share are scanned at once (``files_per_device``).
+    """
+
+    max_readers: int | None = None
+    files_per_device: int | None = None
+    min_chunk_seconds: float | None = None
+
+
+_POLICIES = {
+    # One sequential reader per disk; FFmpeg's decoder threads use the cores.
+    HDD: ReadPolicy(max_readers=1, files_per_device=1),
+    # A few long streams rather than many short ranged reads over the link.
+    NETWORK: ReadPolicy(
+        max_readers=2, files_per_device=2, min_chunk_seconds=NETWORK_MIN_CHUNK_SECONDS
+    ),
+}
+
+
+def read_policy(kind: str) -> ReadPolicy:
+    return _POLICIES.get(kind, ReadPolicy())
+
+
+def _unescape_mount_field(field: str) -> str:
+    # /proc/mounts writes spaces, tabs and backslashes as octal escapes.
+    return (
+        field.replace("\\040", " ")
+        .replace("\\011", "\t")
+        .replace("\\012", "\n")
+        .replace("\\134", "\\")
+    )
+
+
+def mount_for(path: str, mounts_path: str = "/proc/mounts") -> tuple[str, str, str] | None:
+    """``(source, mount point, filesystem type)`` of the mount holding ``path``."""
+    try:
+        with open(mounts_path, encoding="utf-8", errors="replace") as f:
+            lines = f.readlines()
+    except OSError:
+        return None
+    real = os.path.realpath(path)
+    best: tuple[str, str, str] | None = None
+    for line in lines:
+        fields = line.split()
+        if len(fields) < 3:
+            continue
+        source, point, fstype = (_unescape_mount_field(x) for x in fields[:3])
+        inside = real == point or real.startswith(point.rstrip("/") + "/")
+        if inside and (best is None or len(point) >= len(best[1])):
+            best = (source, point, fstype)
+    return best
+
+
+def _block_dir(st_dev: int, mount_source: str | None, sys_root: str) -> str | None:
+    candidates = [os.path.join(sys_root, "dev", "block", f"{os.major(st_dev)}:{os.minor(st_dev)}")]
+    if mount_source and mount_source.startswith("/dev/"):
+        name = os.path.basename(os.path.realpath(mount_source))
+        candidates.append(os.path.join(sys_root, "class", "block", name))
+    for candidate in candidates:
+        if os.path.isdir(candidate):
+            return os.path.realpath(candidate)
+    return None
+
+
+def rotational_flag(
+    st_dev: int,
+    mount_source: str | None = None,
+    sys_root: str = "/sys",
+) -> tuple[bool, str] | None:
+    """
+    Whether the block device behind ``st_dev`` spins, and the whole disk's name.
+
+    Partitions have no queue of their own, so their parent disk is read. None when
+    the device is not in ``/sys`` (btrfs and ZFS report anonymous devices; then
+    ``mount_source`` such as ``/dev/sda2`` is tried).
+    """
+    block = _block_dir(st_dev, mount_source, sys_root)
+    if block is None:
+        return None
+    for directory in (block, os.path.dirname(block)):
+        try:
+            with open(os.path.join(directory, "queue", "rotational"), encoding="ascii") as f:
+                return f.read().strip() == "1", os.path.basename(directory)
+        except OSError:
+            continue
+    return None
+
+
+def random_read_latency_ms(
+    path: str,
+    reads: int = RANDOM_READS,
+    size: int = RANDOM_READ_SIZE,
+) -> float | None:
+    """Mean time of ``reads`` reads at random offsets of ``path``, or None if unreadable."""
+    try:
+        fd = os.open(path, os.O_RDONLY | getattr(os, "O_BINARY", 0))
+    except OSError:
+        return None
+    try:
+        length = os.fstat(fd).st_size
+        if length <= size * reads:
+            return None
+        rng = random.Random(length)
+        total = 0.0
+        for _ in range(reads):
+            offset = rng.randrange(0, length - size)
+            t0 = time.perf_counter()
+            os.lseek(fd, offset, os.SEEK_SET)
+            os.read(fd, size)
+            total += time.perf_counter() - t0
+        return total / reads * 1000.0
+    except OSError:
+        return None
+    finally:
+        os.close(fd)
+
+
+_memo: dict[int, StorageInfo] = {}
+_memo_lock = threading.Lock()
+
+
+def detect_storage(path: str, *, probe: bool = True) -> StorageInfo:
+    """Classify the storage holding ``path``; see the module docstring."""
+    try:
+        st_dev = os.stat(path).st_dev
+    except OSError:
+        return StorageInfo(UNKNOWN)
+    with _memo_lock:
+        known = _memo.get(st_dev)
+    if known is not None and (known.kind != UNKNOWN or not probe):
+        return known
+    info = _classify(path, st_dev, probe)
+    with _memo_lock:
+        _memo[st_dev] = info
+    return info
+
+
+def _classify(path: str, st_dev: int, probe: bool) -> StorageInfo:
+    mount = mount_for(path)
+    if mount is not None and mount[2] in NETWORK_FILESYSTEMS:
+        return StorageInfo(NETWORK, mount[0], "mounts")
+    flag = rotational_flag(st_dev, mount[0] if mount else None)
+    device = flag[1] if flag else mount[1] if mount else str(st_dev)
+    if flag is not None and not flag[0]:
+        return StorageInfo(SSD, device, "sysfs")
+    # Virtual disks (virtio, Xen) often claim to spin whatever backs them, so a
+    # rotational flag is confirmed by timing reads when probing is allowed.
+    latency = random_read_latency_ms(path) if probe else None
+    if latency is not None:
+        return StorageInfo(HDD if latency > SLOW_RANDOM_READ_MS else SSD, device, "probe")
+    if flag is not None:
+        return StorageInfo(HDD, device, "sysfs")
+    return StorageInfo(UNKNOWN, device)
+
+
+def clear_storage_cache() -> None:
+    with _memo_lock:
+        _memo.clear()
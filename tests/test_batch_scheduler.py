@@ -0,0 +1,120 @@
+import threading
+import time
+
+from batch_scheduler import run_batch, worker_share
+from detector import useful_parallel_jobs
+
+
+def test_worker_share_splits_free_workers() -> None:
+    assert worker_share(32, 300, 1) == 1
+    assert worker_share(32, 1, 64) == 32
+    assert worker_share(32, 4, 64) == 8
+    assert worker_share(32, 1, 3) == 3
+    assert worker_share(0, 5, 4) == 0
+    assert worker_share(3, 10, 4) == 1
+
+
+def test_useful_parallel_jobs_limits() -> None:
+    assert useful_parallel_jobs(45.0, 8) == 1
+    assert useful_parallel_jobs(3 * 3600.0, 32) == 32
+    assert useful_parallel_jobs(90.0, 32) == 3
+    assert useful_parallel_jobs(3600.0, 1) == 1
+
+
+def test_run_batch_respects_budget_and_reports_results() -> None:
+    lock = threading.Lock()
+    in_use = [0]
+    peak = [0]
+    grants: dict[int, int] = {}
+
+    def scan_one(index: int, jobs: int) -> int:
+        with lock:
+            grants[index] = jobs
+            in_use[0] += jobs
+            peak[0] = max(peak[0], in_use[0])
+        time.sleep(0.02)
+        with lock:
+            in_use[0] -= jobs
+        if index == 3:
+            raise ValueError("broken file")
+        return index * 10
+
+    results: dict[int, int] = {}
+    errors: dict[int, str] = {}
+    ok = run_batch(
+        8,
+        scan_one,
+        useful_jobs=lambda i: 4 if i == 0 else 1,
+        budget=4,
+        on_result=results.__setitem__,
+        on_error=lambda i, e: errors.__setitem__(i, str(e)),
+        poll_interval=0.01,
+    )
+    assert ok
+    assert peak[0] <= 4
+    assert grants[0] == 1  # eight files waiting: one worker each
+    assert results == {i: i * 10 for i in range(8) if i != 3}
+    assert errors == {3: "broken file"}
+
+
+def test_run_batch_single_long_file_gets_whole_budget() -> None:
+    grants: list[int] = []
+    run_batch(1, lambda i, jobs: grants.append(jobs), useful_jobs=lambda i: 64, budget=16)
+    assert grants == [16]
+
+
+def test_run_batch_cancel() -> None:
+    started: list[int] = []
+    cancel = threading.Event()
+
+    def scan_one(index: int, jobs: int) -> None:
+        started.append(index)
+        cancel.set()
+
+    ok = run_batch(10, scan_one, budget=1, is_cancelled=cancel.is_set, poll_interval=0.01)
+    assert not ok
+    assert len(started) < 10
+
+
+def test_run_batch_early_release_starts_next_file_on_freed_workers() -> None:
+    started: dict[int, float] = {}
+    grants: dict[int, int] = {}
+
+    def scan_one(index: int, jobs: int, release) -> None:
+        started[index] = time.monotonic()
+        grants[index] = jobs
+        if index == 0:
+            for _ in range(3):  # more than granted is ignored
+                release()
+            time.sleep(0.3)
+
+    ok = run_batch(2, scan_one, budget=1, poll_interval=0.01, early_release=True)
+    assert ok
+    assert grants == {0: 1, 1: 1}
+    assert started[1] - started[0] < 0.25
+
+
+def test_run_batch_limits_files_per_group() -> None:
+    lock = threading.Lock()
+    active: dict[str, int] = {"hdd": 0, "ssd": 0}
+    peak: dict[str, int] = {"hdd": 0, "ssd": 0}
+    started: list[int] = []
+
+    def group(index: int) -> tuple[str, int] | None:
+        return ("hdd", 1) if index < 3 else None
+
+    def scan_one(index: int, jobs: int) -> None:
+        key = "hdd" if index < 3 else "ssd"
+        with lock:
+            started.append(index)
+            active[key] += 1
+            peak[key] = max(peak[key], active[key])
+        time.sleep(0.03)
+        with lock:
+            active[key] -= 1
+
+    assert run_batch(6, scan_one, budget=4, poll_interval=0.01, group_of=group)
+    assert peak["hdd"] == 1
+    assert peak["ssd"] > 1
+    # Files behind a busy disk do not hold up the rest of the queue.
+    assert started.index(3) < started.index(1)
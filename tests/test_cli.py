@@ -0,0 +1,73 @@
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+import cli
+from cli import build_parser, expand_inputs
+
+
+def _touch(path: str) -> str:
+    with open(path, "wb") as f:
+        f.write(b"\0")
+    return path
+
+
+def test_expand_inputs_globs_lists_and_dedup() -> None:
+    with tempfile.TemporaryDirectory() as tmp:
+        os.makedirs(os.path.join(tmp, "season1"))
+        a = _touch(os.path.join(tmp, "a.mkv"))
+        b = _touch(os.path.join(tmp, "season1", "b.mkv"))
+        _touch(os.path.join(tmp, "notes.txt"))
+        listing = os.path.join(tmp, "list.txt")
+        with open(listing, "w", encoding="utf-8") as f:
+            f.write(f"# queue\n\n{a}\n{os.path.join(tmp, 'missing.mkv')}\n")
+
+        paths = expand_inputs([os.path.join(tmp, "**", "*.mkv")], [listing])
+        assert paths == [a, b, os.path.join(tmp, "missing.mkv")]
+
+
+def test_scan_writes_json_lines(monkeypatch) -> None:
+    import scan_runner
+
+    def fake_scan_file(path, settings, **kwargs):
+        if path.endswith("bad.mkv"):
+            raise OSError("unreadable")
+        return [{"black_start": 10.0, "black_end": 11.0, "black_duration": 1.0}]
+
+    monkeypatch.setattr(scan_runner, "scan_file", fake_scan_file)
+    monkeypatch.setattr(scan_runner, "probe_durations", lambda paths: [0.0] * len(paths))
+    with tempfile.TemporaryDirectory() as tmp:
+        out = os.path.join(tmp, "out.jsonl")
+        rc = cli.main(["scan", "good.mkv", "bad.mkv", "-j", "2", "-o", out])
+        with open(out, encoding="utf-8") as f:
+            records = {r["path"]: r for r in map(json.loads, f)}
+    assert rc == 1
+    assert records["good.mkv"]["chapters"] == [10.5]
+    assert records["bad.mkv"]["error"] == "unreadable"
+
+
+def test_scan_settings_follow_arguments() -> None:
+    args = build_parser().parse_args(["scan", "x.mkv", "--windows", "", "--max-width", "0"])
+    settings = cli._settings_from_args(args)
+    assert settings["window_list"] == ""
+    assert settings["max_analysis_width"] == 0
+
+
+def test_cli_import_does_not_load_qt() -> None:
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    qt_modules = (
+        "PySide6",
+        "gui",
+        "blackdetect_worker",
+        "queue_manager",
+        "scan_settings",
+        "timeline",
+    )
+    code = (
+        "import sys, cli; "
+        f"sys.exit(1 if any(m.split('.')[0] in {qt_modules!r} for m in sys.modules) else 0)"
+    )
+    result = subprocess.run([sys.executable, "-c", code], cwd=root)
+    assert result.returncode == 0
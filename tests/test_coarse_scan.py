@@ -0,0 +1,59 @@
+import coarse_scan
+from coarse_scan import candidate_regions, detect_black_frames_coarse_to_fine, max_sample_gap
+from process_governor import BACKGROUND, current_priority, scan_priority
+from scan_runner import DEFAULT_SCAN_SETTINGS, scan_file
+
+
+def test_candidate_regions_span_neighbouring_samples() -> None:
+    samples = [float(t) for t in range(0, 100, 2)]
+    events = [{"black_start": 38.0, "black_end": 42.0, "black_duration": 4.0}]
+    assert candidate_regions(samples, events, 100.0) == [(35.5, 42.5)]
+
+
+def test_candidate_regions_merge_and_clip_to_file() -> None:
+    samples = [0.0, 10.0, 20.0, 30.0]
+    events = [
+        {"black_start": 10.0, "black_end": 20.0, "black_duration": 10.0},
+        {"black_start": 20.5, "black_end": 30.0, "black_duration": 9.5},
+        {"black_start": 30.0, "black_end": 31.0, "black_duration": 1.0},
+    ]
+    assert candidate_regions(samples, events, 31.0, pad=0.0) == [(0.0, 31.0)]
+    assert candidate_regions(samples, [], 31.0) == []
+
+
+def test_max_sample_gap_includes_head_and_tail() -> None:
+    assert max_sample_gap([1.0, 2.0, 3.0], 10.0) == 7.0
+    assert max_sample_gap([], 5.0) == 5.0
+
+
+def _fake_coarse_pass(cmd, cancel, on_ratio, duration, on_line=None, recorder=None) -> str:
+    for t in range(0, 100, 2):
+        on_line(f"[Parsed_showinfo_0 @ 0x1] n:{t} pts_time:{t}")
+    return (
+        "[blackdetect @ 0x1] black_start:10 black_end:12 black_duration:2\n"
+        "[blackdetect @ 0x1] black_start:50 black_end:52 black_duration:2\n"
+    )
+
+
+def test_refine_processes_keep_the_callers_priority(monkeypatch) -> None:
+    priorities: list[str] = []
+
+    def fake_refine(video_path, **kwargs) -> list[dict[str, float]]:
+        priorities.append(current_priority())
+        return []
+
+    monkeypatch.setattr(coarse_scan, "_run_blackdetect_stream", _fake_coarse_pass)
+    monkeypatch.setattr(coarse_scan, "detect_black_frames", fake_refine)
+    with scan_priority(BACKGROUND):
+        detect_black_frames_coarse_to_fine("a.mkv", parallel_jobs=2, duration_hint_sec=100.0)
+    assert priorities == [BACKGROUND, BACKGROUND]
+
+
+def test_scan_file_hands_the_report_to_its_caller(monkeypatch) -> None:
+    monkeypatch.setattr(coarse_scan, "_run_blackdetect_stream", _fake_coarse_pass)
+    monkeypatch.setattr(coarse_scan, "detect_black_frames", lambda path, **kwargs: [])
+    reports = []
+    settings = {**DEFAULT_SCAN_SETTINGS, "window_list": "", "scan_mode": "nokey"}
+    scan_file("a.mkv", settings, cache=False, duration_sec=100.0, on_report=reports.append)
+    assert [(r.mode, r.candidates, r.sampled_frames) for r in reports] == [("nokey", 2, 50)]
+    assert reports[0].decoded_fraction == 0.1
@@ -0,0 +1,75 @@
+import combined_detect
+from combined_detect import (
+    build_combined_filter,
+    detect_chapter_candidates,
+    parse_scene_scores,
+    parse_silencedetect_stderr,
+    score_candidates,
+)
+
+STDERR = """\
+[Parsed_metadata_3 @ 0x1] frame:0    pts:128000  pts_time:10
+[Parsed_metadata_3 @ 0x1] lavfi.scene_score=1.000000
+[silencedetect @ 0x2] silence_start: 10
+[silencedetect @ 0x2] silence_end: 13.000045 | silence_duration: 3.000045
+[blackdetect @ 0x3] black_start:10 black_end:13 black_duration:3
+[Parsed_metadata_3 @ 0x1] frame:1    pts:294400  pts_time:23
+[Parsed_metadata_3 @ 0x1] lavfi.scene_score=0.798845
+[blackdetect @ 0x3] black_start:23 black_end:25 black_duration:2
+[silencedetect @ 0x2] silence_start: 28.5
+"""
+
+
+def test_parse_silence_closes_open_run_at_end_of_file() -> None:
+    assert parse_silencedetect_stderr(STDERR, 30.0) == [
+        {"silence_start": 10.0, "silence_end": 13.000045, "silence_duration": 3.000045},
+        {"silence_start": 28.5, "silence_end": 30.0, "silence_duration": 1.5},
+    ]
+    assert len(parse_silencedetect_stderr(STDERR)) == 1
+
+
+def test_parse_scene_scores_pairs_pts_with_score() -> None:
+    assert parse_scene_scores(STDERR) == [(10.0, 1.0), (23.0, 0.798845)]
+
+
+def test_score_candidates_rank_silent_black_highest() -> None:
+    black = [
+        {"black_start": 23.0, "black_end": 25.0, "black_duration": 2.0},
+        {"black_start": 10.0, "black_end": 13.0, "black_duration": 3.0},
+    ]
+    silence = parse_silencedetect_stderr(STDERR)
+    out = score_candidates(black, silence, parse_scene_scores(STDERR))
+    assert [c["black_start"] for c in out] == [10.0, 23.0]
+    assert out[0]["silence_overlap"] == 1.0
+    assert out[0]["score"] == 1.0
+    assert out[1]["silence_overlap"] == 0.0
+    assert out[1]["score"] == round(0.5 + 0.2 * 0.798845, 4)
+
+
+def test_build_combined_filter_maps_audio_only_when_present() -> None:
+    graph, labels = build_combined_filter("blackdetect=d=0.4", audio=True, scene_threshold=0.3)
+    assert labels == ["[v]", "[a]"]
+    assert graph.startswith("[0:v:0]blackdetect=d=0.4,select='gt(scene\\,0.3)'")
+    assert "[0:a:0]silencedetect=n=-50.0dB:d=0.3[a]" in graph
+    graph, labels = build_combined_filter("blackdetect=d=0.4", audio=False)
+    assert labels == ["[v]"]
+    assert graph == "[0:v:0]blackdetect=d=0.4[v]"
+
+
+def test_each_window_gets_its_own_seek_bounded_pass(monkeypatch) -> None:
+    ran: list[tuple[float, float]] = []
+
+    def fake_stream(cmd, cancel, on_ratio, duration, **kwargs) -> str:
+        ss = float(cmd[cmd.index("-ss") + 1])
+        ran.append((ss, float(cmd[cmd.index("-t") + 1])))
+        return "[blackdetect @ 0x3] black_start:10 black_end:12 black_duration:2\n"
+
+    monkeypatch.setattr(combined_detect, "probe_media", lambda path: None)
+    monkeypatch.setattr(combined_detect, "_run_blackdetect_stream", fake_stream)
+    found = detect_chapter_candidates(
+        "a.mkv",
+        window_list=[(1800.0, 1900.0), (600.0, 700.0)],
+        duration_hint_sec=3600.0,
+    )
+    assert ran == [(595.0, 110.0), (1795.0, 110.0)]
+    assert [c["black_start"] for c in found] == [605.0, 1805.0]
@@ -1,8 +1,19 @@
+import sys
+
+import pytest
+
+import detector
 from detector import (
+    BlackdetectError,
+    _run_blackdetect_stream,
     build_blackdetect_filter,
+    chunk_split_points,
+    detect_black_frames,
     ffmpeg_status_time_seconds,
     segment_scan_spans,
+    window_parallel_jobs,
 )
+from ffmpeg_engine import TAIL_LINES
 
 
 def test_ffmpeg_status_time_seconds() -> None:
@@ -36,3 +47,112 @@ def test_segment_scan_spans_cover_duration() -> None:
     assert spans[0][0] == 0.0
     last_start, last_len = spans[-1]
     assert last_start + last_len >= 1000.0 - 0.01
+
+
+def _stderr_writer(lines: int, exit_code: int) -> list[str]:
+    code = (
+        "import sys\n"
+        f"for i in range({lines}):\n"
+        "    sys.stderr.write(f'noise line {i}\\n')\n"
+        "    if i == 5:\n"
+        "        sys.stderr.write('[blackdetect @ 0x1] black_start:1 black_end:2 "
+        "black_duration:1\\n')\n"
+        f"sys.exit({exit_code})\n"
+    )
+    return [sys.executable, "-c", code]
+
+
+def test_run_stream_delivers_lines_and_keeps_only_results() -> None:
+    seen: list[str] = []
+    out = _run_blackdetect_stream(
+        _stderr_writer(1000, 0), lambda: False, None, None, on_line=seen.append
+    )
+    assert len(seen) == 1001
+    assert out.strip() == "[blackdetect @ 0x1] black_start:1 black_end:2 black_duration:1"
+
+
+def test_run_stream_error_carries_bounded_tail() -> None:
+    with pytest.raises(BlackdetectError) as info:
+        _run_blackdetect_stream(_stderr_writer(5000, 3), lambda: False, None, None)
+    assert info.value.returncode == 3
+    assert "noise line 4999" in info.value.stderr
+    assert "noise line 0\n" not in info.value.stderr
+    assert info.value.stderr.count("\n") <= TAIL_LINES
+
+
+def test_window_parallel_jobs_shares_budget_by_length() -> None:
+    assert window_parallel_jobs([(0.0, 600.0), (3000.0, 3600.0)], 8) == [4, 4]
+    assert window_parallel_jobs([(0.0, 60.0), (100.0, 1900.0)], 4) == [1, 3]
+    assert window_parallel_jobs([(0.0, 600.0), (3000.0, 3600.0)], 1) == [1, 1]
+
+
+def test_disjoint_windows_run_as_separate_seek_bounded_jobs(monkeypatch) -> None:
+    ran: list[list[tuple[float, float]]] = []
+
+    def fake_run_jobs(jobs, cancel, recorder=None, **pool) -> None:
+        assert pool["max_running"] == 1
+        wave = []
+        for job in jobs:
+            ss = float(job.cmd[job.cmd.index("-ss") + 1])
+            wave.append((ss, float(job.cmd[job.cmd.index("-t") + 1])))
+            job.kept = [
+                "[blackdetect @ 0x1] black_start:1 black_end:2 black_duration:1\n",
+                "[blackdetect @ 0x1] black_start:6 black_end:7 black_duration:1\n",
+            ]
+        ran.append(wave)
+
+    monkeypatch.setattr(detector, "_run_jobs", fake_run_jobs)
+    events = detect_black_frames(
+        "x.mkv",
+        window_list=[(1800.0, 3600.0), (60.0, 300.0), (250.0, 400.0)],
+        parallel_jobs=1,
+        duration_hint_sec=3600.0,
+    )
+    # Merged, clipped and padded by WINDOW_PAD_SECONDS; one queue, longest first.
+    assert ran == [[(1795.0, 1805.0), (55.0, 350.0)]]
+    # Runs starting in the padding are dropped, as in a full-file pass.
+    assert [e["black_start"] for e in events] == [61.0, 1801.0]
+
+
+def test_nearby_windows_share_one_padded_pass(monkeypatch) -> None:
+    ran: list[tuple[float, float]] = []
+
+    def seek_bounds(cmd: list[str]) -> tuple[float, float]:
+        return float(cmd[cmd.index("-ss") + 1]), float(cmd[cmd.index("-t") + 1])
+
+    def output(ss: float, t: float) -> str:
+        # One run from 100 s to 103 s, at the end of the first window.
+        if not ss <= 100.0 < ss + t:
+            return ""
+        start, end = 100.0 - ss, min(103.0, ss + t) - ss
+        line = f"black_start:{start} black_end:{end} black_duration:{end - start}"
+        return f"[blackdetect @ 0x1] {line}\n"
+
+    def fake_stream(cmd, cancel, on_ratio, duration, **kwargs) -> str:
+        ran.append(seek_bounds(cmd))
+        return output(*ran[-1])
+
+    def fake_run_jobs(jobs, cancel, recorder=None, **pool) -> None:
+        for job in jobs:
+            ran.append(seek_bounds(job.cmd))
+            job.kept = [output(*ran[-1])]
+
+    monkeypatch.setattr(detector, "_run_blackdetect_stream", fake_stream)
+    monkeypatch.setattr(detector, "_run_jobs", fake_run_jobs)
+    events = detect_black_frames(
+        "x.mkv",
+        window_list=[(60.0, 100.0), (106.0, 150.0)],
+        parallel_jobs=1,
+        duration_hint_sec=3600.0,
+    )
+    assert ran == [(55.0, 100.0)]
+    assert [e["black_start"] for e in events] == [100.0]
+
+
+def test_chunk_split_points_shrink_towards_the_end() -> None:
+    points = chunk_split_points(0.0, 3600.0, 4)
+    lengths = [b - a for a, b in zip([0.0, *points], [*points, 3600.0])]
+    assert lengths[0] == 450.0  # remaining / (2 * workers)
+    assert all(a >= b for a, b in zip(lengths[:-2], lengths[1:-1]))
+    assert min(lengths) >= 30.0 and lengths[-1] < 60.0
+    assert chunk_split_points(0.0, 50.0, 4) == []
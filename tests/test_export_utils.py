@@ -1,8 +1,18 @@
 import os
+import sys
 import tempfile
+import threading
+import time
 
+import pytest
+
+import export_utils
 from export_utils import (
+    ExportCancelled,
+    RemuxError,
+    export_batch,
     normalize_export_format,
+    remux_from_ffmetadata_file,
     write_ffmpeg_chapter_file,
     write_mkvmerge_simple_chapters,
 )
@@ -58,3 +68,91 @@ def test_build_remux_command_copy_for_mp4() -> None:
     )
     assert "-c" in cmd and "copy" in cmd
     assert "libx264" not in cmd
+
+
+def _fake_remux(monkeypatch, code: str) -> None:
+    monkeypatch.setattr(
+        export_utils,
+        "build_remux_with_metadata_command",
+        lambda _src, _meta, out: [sys.executable, "-c", code, out],
+    )
+
+
+def test_remux_reports_progress_and_failure(tmp_path, monkeypatch) -> None:
+    _fake_remux(
+        monkeypatch,
+        "import sys; sys.stderr.write('frame=1 time=00:00:05.00 speed=9x\\r'); sys.exit(1)",
+    )
+    ratios: list[float] = []
+    out = tmp_path / "out.mkv"
+    with pytest.raises(RemuxError) as info:
+        remux_from_ffmetadata_file(
+            "in.mkv", "meta.txt", str(out), duration_sec=10.0, on_time_ratio=ratios.append
+        )
+    assert ratios == [0.5]
+    assert "time=00:00:05.00" in info.value.stderr
+
+
+def test_cancelled_remux_removes_partial_output(tmp_path, monkeypatch) -> None:
+    _fake_remux(
+        monkeypatch,
+        "import sys, time; open(sys.argv[1], 'w').write('x'); "
+        "sys.stderr.write('up\\n'); sys.stderr.flush(); time.sleep(30)",
+    )
+    out = tmp_path / "out.mp4"
+    stop = threading.Event()
+
+    def cancel_once_written() -> None:
+        deadline = time.monotonic() + 10
+        while not out.exists() and time.monotonic() < deadline:
+            time.sleep(0.01)
+        stop.set()
+
+    threading.Thread(target=cancel_once_written).start()
+    t0 = time.monotonic()
+    with pytest.raises(ExportCancelled):
+        remux_from_ffmetadata_file("in.mp4", "meta.txt", str(out), is_cancelled=stop.is_set)
+    assert time.monotonic() - t0 < 10
+    assert not out.exists()
+
+
+def test_export_batch_collects_failures_and_limits_concurrency(monkeypatch) -> None:
+    lock = threading.Lock()
+    running = [0, 0]
+
+    def fake_export(
+        path, chapters, fmt, export_dir, *, in_place, on_time_ratio, is_cancelled, read_path
+    ):
+        assert read_path == path
+        with lock:
+            running[0] += 1
+            running[1] = max(running[1], running[0])
+        time.sleep(0.05)
+        with lock:
+            running[0] -= 1
+        if path == "bad.mp4":
+            raise RemuxError("ffmpeg exited with code 1", stderr="broken")
+        on_time_ratio(1.0)
+        return os.path.join(export_dir, path)
+
+    monkeypatch.setattr(export_utils, "export_chapters_for_file", fake_export)
+    items = [
+        {"path": p, "chapters": [1.0], "format": "mp4"} for p in ("a.mp4", "bad.mp4", "c.mp4")
+    ]
+    written: dict[int, str] = {}
+    errors: dict[int, BaseException] = {}
+    progress: list[int] = []
+    completed = export_batch(
+        items,
+        "out",
+        max_workers=2,
+        on_progress=lambda i, _r: progress.append(i),
+        on_result=written.__setitem__,
+        on_error=errors.__setitem__,
+    )
+    assert completed
+    assert written == {0: os.path.join("out", "a.mp4"), 2: os.path.join("out", "c.mp4")}
+    assert list(errors) == [1] and errors[1].stderr == "broken"
+    assert sorted(progress) == [0, 2]
+    assert running[1] == 2
+
@@ -0,0 +1,78 @@
+import sys
+import threading
+import time
+
+from ffmpeg_engine import ProcessJob, run_processes
+
+
+def _python(code: str) -> list[str]:
+    return [sys.executable, "-c", code]
+
+
+def test_lines_split_on_carriage_returns_and_newlines() -> None:
+    lines: list[str] = []
+    job = ProcessJob(
+        _python("import sys; sys.stderr.write('frame=1\\rframe=2\\r\\nblack_start:1\\nend')"),
+        on_line=lines.append,
+        keep_line=lambda line: line.startswith("black"),
+    )
+    run_processes([job])
+    assert lines == ["frame=1", "frame=2", "black_start:1", "end"]
+    assert job.kept == ["black_start:1\n"]
+    assert job.returncode == 0 and not job.failed
+
+
+def test_failure_kills_sibling_jobs() -> None:
+    slow = ProcessJob(_python("import time; time.sleep(30)"))
+    bad = ProcessJob(_python("import sys; sys.stderr.write('boom\\n'); sys.exit(3)"))
+    t0 = time.monotonic()
+    run_processes([slow, bad])
+    assert time.monotonic() - t0 < 10
+    assert bad.failed and bad.returncode == 3
+    assert list(bad.tail) == ["boom\n"]
+    assert slow.cancelled and not slow.failed
+
+
+def test_cancel_is_observed_quickly() -> None:
+    started = threading.Event()
+    jobs = [
+        ProcessJob(
+            _python("import sys, time; print('up', file=sys.stderr, flush=True); time.sleep(30)"),
+            on_line=lambda _line: started.set(),
+        )
+        for _ in range(8)
+    ]
+    stop = threading.Event()
+    threading.Thread(target=lambda: started.wait(10) and stop.set()).start()
+    t0 = time.monotonic()
+    run_processes(jobs, stop.is_set)
+    assert time.monotonic() - t0 < 10
+    assert all(job.cancelled for job in jobs)
+
+
+def test_spawn_error_is_reported_on_the_job() -> None:
+    job = ProcessJob(["machap-no-such-binary"])
+    run_processes([job])
+    assert isinstance(job.error, OSError)
+
+
+def test_max_running_serves_a_queue_from_fixed_slots() -> None:
+    lock = threading.Lock()
+    running = [0]
+    peak = [0]
+    slots_freed: list[int] = []
+
+    def on_line(line: str) -> None:
+        with lock:
+            running[0] += 1 if line == "up" else -1
+            peak[0] = max(peak[0], running[0])
+
+    code = (
+        "import sys, time; print('up', file=sys.stderr, flush=True); time.sleep(0.05); "
+        "print('down', file=sys.stderr, flush=True)"
+    )
+    jobs = [ProcessJob(_python(code), on_line=on_line) for _ in range(5)]
+    run_processes(jobs, max_running=2, on_slot_free=lambda: slots_freed.append(1))
+    assert all(job.returncode == 0 for job in jobs)
+    assert peak[0] <= 2
+    assert len(slots_freed) == 2
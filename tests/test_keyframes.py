@@ -0,0 +1,48 @@
+from keyframes import keyframe_aligned_spans, keyframe_spans_near, stitch_segment_events
+
+
+def test_keyframe_aligned_spans_are_contiguous_without_overlap() -> None:
+    keyframes = [float(k) for k in range(0, 1000, 7)]
+    spans = keyframe_aligned_spans(keyframes, 0.0, 1000.0, 4)
+    assert len(spans) == 4
+    assert spans[0][0] == 0.0
+    for (start, length), (next_start, _len) in zip(spans, spans[1:]):
+        assert start + length == next_start
+        assert next_start in keyframes
+    last_start, last_len = spans[-1]
+    assert last_start + last_len == 1000.0
+
+
+def test_keyframe_aligned_spans_drop_unusable_split_points() -> None:
+    # Only one keyframe inside the range: a 4-way split degrades to two spans.
+    spans = keyframe_aligned_spans([0.0, 130.0, 999.5], 0.0, 1000.0, 4)
+    assert spans == [(0.0, 130.0), (130.0, 870.0)]
+    assert keyframe_aligned_spans([], 10.0, 20.0, 1) == [(10.0, 10.0)]
+
+
+def test_keyframe_spans_near_follows_uneven_targets() -> None:
+    keyframes = [float(k) for k in range(0, 1000, 10)]
+    spans = keyframe_spans_near(keyframes, 0.0, 1000.0, [503.0, 752.0, 877.0])
+    assert spans == [(0.0, 500.0), (500.0, 250.0), (750.0, 130.0), (880.0, 120.0)]
+
+
+def test_stitch_joins_runs_split_at_boundary_before_min_duration() -> None:
+    events = [
+        {"black_start": 99.8, "black_end": 100.0, "black_duration": 0.2},
+        {"black_start": 100.0, "black_end": 100.3, "black_duration": 0.3},
+        {"black_start": 150.0, "black_end": 150.1, "black_duration": 0.1},
+        {"black_start": 200.0, "black_end": 201.0, "black_duration": 1.0},
+    ]
+    out = stitch_segment_events(events, [100.0, 200.0], 0.4)
+    assert out == [
+        {"black_start": 99.8, "black_end": 100.3, "black_duration": 0.5},
+        {"black_start": 200.0, "black_end": 201.0, "black_duration": 1.0},
+    ]
+
+
+def test_stitch_does_not_join_runs_away_from_boundaries() -> None:
+    events = [
+        {"black_start": 10.0, "black_end": 10.5, "black_duration": 0.5},
+        {"black_start": 10.55, "black_end": 11.0, "black_duration": 0.45},
+    ]
+    assert len(stitch_segment_events(events, [50.0], 0.4)) == 2
@@ -0,0 +1,50 @@
+import pytest
+
+from luma_index import LUMA_LEVELS, black_level_for_threshold
+
+
+def test_black_level_limited_and_full_range() -> None:
+    assert black_level_for_threshold(0.08, full_range=False) == int(16 + 0.08 * 219)
+    assert black_level_for_threshold(0.0, full_range=False) == 16
+    assert black_level_for_threshold(0.1, full_range=True) == 25
+
+
+def test_black_level_out_of_index_range() -> None:
+    with pytest.raises(ValueError):
+        black_level_for_threshold(0.9, full_range=False)
+    assert black_level_for_threshold(0.36, full_range=False) < LUMA_LEVELS
+
+
+def test_events_from_black_mask_matches_blackdetect_runs() -> None:
+    np = pytest.importorskip("numpy")
+    from luma_index import events_from_black_mask
+
+    pts = np.arange(20) * 0.5
+    black = np.zeros(20, dtype=bool)
+    black[2:6] = True  # 1.0 .. 3.0 -> 2.0 s
+    black[10:11] = True  # 5.0 .. 5.5 -> too short
+    black[17:] = True  # 8.5 .. last pts 9.5 + one frame -> 1.5 s
+    events = events_from_black_mask(pts, black, 1.0)
+    assert events == [
+        {"black_start": 1.0, "black_end": 3.0, "black_duration": 2.0},
+        {"black_start": 8.5, "black_end": 10.0, "black_duration": 1.5},
+    ]
+
+
+def test_luma_index_detect_rethresholds() -> None:
+    np = pytest.importorskip("numpy")
+    from luma_index import LumaIndex, _index_dtype
+
+    frames = np.zeros(10, dtype=_index_dtype())
+    frames["pts"] = np.arange(10) * 1.0
+    level = black_level_for_threshold(0.08, full_range=False)
+    # Frames 3..6 are 99% dark at the default threshold, but only 50% dark at pix_th=0.
+    frames["cdf"][3:7, level:] = 65535 * 99 // 100
+    frames["cdf"][3:7, :level] = 65535 // 2
+    index = LumaIndex(frames)
+
+    assert index.detect(2.0, 0.98, 0.08) == [
+        {"black_start": 3.0, "black_end": 7.0, "black_duration": 4.0}
+    ]
+    assert index.detect(2.0, 0.98, 0.0) == []
+    assert index.detect(2.0, 0.98, 0.08, [(10.0, 20.0)]) == []
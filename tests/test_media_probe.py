@@ -0,0 +1,98 @@
+import os
+import threading
+
+import media_probe
+from media_probe import parse_ffprobe_json, probe_media, probe_media_many
+
+FFPROBE_JSON = {
+    "streams": [
+        {"codec_type": "video", "codec_name": "mjpeg", "disposition": {"attached_pic": 1}},
+        {
+            "codec_type": "video",
+            "codec_name": "h264",
+            "width": 1920,
+            "height": 1080,
+            "avg_frame_rate": "30000/1001",
+            "bit_rate": "5000000",
+        },
+        {"codec_type": "audio", "codec_name": "aac", "bit_rate": "192000"},
+    ],
+    "chapters": [{"start_time": "300.5"}, {"start_time": "0.000000"}],
+    "format": {
+        "duration": "1234.5",
+        "start_time": "1.4",
+        "format_name": "mov,mp4,m4a,3gp,3g2,mj2",
+        "bit_rate": "5300000",
+    },
+}
+
+
+def test_parse_ffprobe_json_picks_real_video_stream() -> None:
+    info = parse_ffprobe_json("a.mp4", FFPROBE_JSON)
+    assert info.duration == 1234.5
+    assert info.start_time == 1.4
+    assert info.video_codec == "h264"
+    assert (info.width, info.height) == (1920, 1080)
+    assert round(info.fps, 3) == 29.97
+    assert info.video_bit_rate == 5_000_000
+    assert info.audio_codec == "aac" and info.has_audio
+    assert info.audio_bit_rate == 192_000
+    assert info.chapters == (0.0, 300.5)
+
+
+def test_parse_ffprobe_json_tolerates_missing_fields() -> None:
+    info = parse_ffprobe_json("x.ts", {"streams": [{"codec_type": "video"}], "format": {}})
+    assert info.duration is None
+    assert info.fps is None
+    assert not info.has_audio
+    assert info.chapters == ()
+
+
+def test_probe_media_memoizes_until_file_changes(tmp_path, monkeypatch) -> None:
+    media_probe.clear_media_cache()
+    calls: list[str] = []
+
+    def fake_run(path: str):
+        calls.append(path)
+        return FFPROBE_JSON
+
+    monkeypatch.setattr(media_probe, "_run_ffprobe", fake_run)
+    video = tmp_path / "v.mp4"
+    video.write_bytes(b"x")
+    assert probe_media(str(video)).duration == 1234.5
+    assert probe_media(str(video)).duration == 1234.5
+    assert len(calls) == 1
+
+    video.write_bytes(b"xy")
+    os.utime(video, ns=(1, 1))
+    probe_media(str(video))
+    assert len(calls) == 2
+    assert probe_media(str(tmp_path / "missing.mp4")) is None
+
+
+def test_concurrent_probes_share_one_ffprobe(tmp_path, monkeypatch) -> None:
+    media_probe.clear_media_cache()
+    started = threading.Event()
+    release = threading.Event()
+    calls: list[str] = []
+
+    def slow_run(path: str):
+        calls.append(path)
+        started.set()
+        release.wait(5)
+        return FFPROBE_JSON
+
+    monkeypatch.setattr(media_probe, "_run_ffprobe", slow_run)
+    video = tmp_path / "v.mkv"
+    video.write_bytes(b"x")
+    out: list = []
+    first = threading.Thread(target=lambda: out.append(probe_media(str(video))))
+    first.start()
+    started.wait(5)
+    second = threading.Thread(target=lambda: out.append(probe_media_many([str(video)] * 3)))
+    second.start()
+    release.set()
+    first.join(5)
+    second.join(5)
+    assert calls == [str(video)]
+    assert out[0].duration == 1234.5
@@ -0,0 +1,115 @@
+import struct
+import zlib
+
+import pytest
+
+import export_utils
+from mkv_chapters import (
+    CHAPTERS_ID,
+    CLUSTER_ID,
+    CRC32_ID,
+    DOCTYPE_ID,
+    EBML_ID,
+    SEEK_ID,
+    SEEK_ID_ID,
+    SEEK_POSITION_ID,
+    SEEKHEAD_ID,
+    SEGMENT_ID,
+    MkvEditError,
+    _children,
+    _element,
+    _encode_id,
+    _uint,
+    build_chapters_element,
+    encode_size,
+    read_chapters,
+    void_header,
+    write_chapters_in_place,
+)
+
+INFO_ID = 0x1549A966
+CLUSTER = _element(CLUSTER_ID, _uint(0xE7, 0) + b"\x42" * 4000)
+
+
+def _mkv(path, *, padding: int, chapters: bytes = b"") -> bytes:
+    info = _element(INFO_ID, _uint(0x2AD7B1, 1_000_000))
+
+    def seekhead(info_pos: int) -> bytes:
+        seek = _element(SEEK_ID_ID, _encode_id(INFO_ID)) + _uint(SEEK_POSITION_ID, info_pos)
+        return _element(SEEKHEAD_ID, _element(SEEK_ID, seek))
+
+    head_len = len(seekhead(0)) + padding
+    body = seekhead(head_len)
+    if padding:
+        body += void_header(padding) + b"\0" * (padding - len(void_header(padding)))
+    body += info + chapters + CLUSTER
+    data = _element(EBML_ID, _element(DOCTYPE_ID, b"matroska"))
+    data += _encode_id(SEGMENT_ID) + encode_size(len(body), 8) + body
+    path.write_bytes(data)
+    return data
+
+
+SPANS = [(0.0, 10.0, "Chapter 1"), (10.0, 23.5, "Chapter 2"), (23.5, 30.0, "Chapter 3")]
+
+
+def test_chapters_go_into_padding_without_moving_media(tmp_path) -> None:
+    mkv = tmp_path / "a.mkv"
+    before = _mkv(mkv, padding=400)
+    assert read_chapters(str(mkv)) == []
+    assert write_chapters_in_place(str(mkv), SPANS) == "void"
+    after = mkv.read_bytes()
+    assert len(after) == len(before)
+    assert after.endswith(CLUSTER)
+    assert read_chapters(str(mkv)) == SPANS
+
+
+def test_growing_chapters_are_appended_and_segment_resized(tmp_path) -> None:
+    mkv = tmp_path / "b.mkv"
+    _mkv(mkv, padding=60, chapters=build_chapters_element(SPANS[:1]))
+    many = [(float(i), float(i + 1), f"Chapter {i + 1}") for i in range(40)]
+    assert write_chapters_in_place(str(mkv), many) == "appended"
+    assert read_chapters(str(mkv)) == many
+    data = mkv.read_bytes()
+    segment_at = data.index(_encode_id(SEGMENT_ID))
+    size = int.from_bytes(data[segment_at + 4 : segment_at + 12], "big") & ((1 << 56) - 1)
+    assert segment_at + 12 + size == len(data)
+    # Rewriting the appended element again resizes it rather than appending more.
+    assert write_chapters_in_place(str(mkv), many[:2]) == "replaced"
+    assert write_chapters_in_place(str(mkv), many) == "replaced"
+    assert len(mkv.read_bytes()) == len(data)
+
+
+def test_no_room_for_seekhead_entry_leaves_file_untouched(tmp_path) -> None:
+    mkv = tmp_path / "c.mkv"
+    before = _mkv(mkv, padding=0)
+    with pytest.raises(MkvEditError):
+        write_chapters_in_place(str(mkv), SPANS, dry_run=True)
+    with pytest.raises(MkvEditError):
+        write_chapters_in_place(str(mkv), SPANS)
+    assert mkv.read_bytes() == before
+
+
+def test_crc_is_written_when_the_file_uses_them() -> None:
+    element = build_chapters_element(SPANS, crc=True)
+    (payload,) = [data for cid, data in _children(element) if cid == CHAPTERS_ID]
+    (crc_id, crc), *_ = _children(payload)
+    assert crc_id == CRC32_ID
+    assert struct.unpack("<I", crc)[0] == zlib.crc32(payload[6:])
+
+
+def test_mkv_export_edits_chapters_without_ffmpeg(tmp_path, monkeypatch) -> None:
+    source = tmp_path / "show.mkv"
+    original = _mkv(source, padding=400)
+    monkeypatch.setattr(export_utils, "get_media_duration_seconds", lambda _p: 30.0)
+    monkeypatch.setattr(export_utils, "run_processes", pytest.fail)
+
+    written = export_utils.export_chapters_for_file(str(source), [10.0, 0.0], "mkv", str(tmp_path))
+    assert written == str(tmp_path / "show_chaptered.mkv")
+    assert source.read_bytes() == original
+    assert read_chapters(written) == [(0.0, 10.0, "Chapter 1"), (10.0, 30.0, "Chapter 2")]
+
+    in_place = export_utils.export_chapters_for_file(
+        str(source), [5.0], "mkv", str(tmp_path), in_place=True
+    )
+    assert in_place == str(source)
+    assert read_chapters(in_place) == [(5.0, 30.0, "Chapter 1")]
@@ -0,0 +1,98 @@
+import struct
+
+import pytest
+
+from export_utils import write_chapters_without_remux
+from mp4_chapters import (
+    Mp4EditError,
+    _box,
+    plan_rewrite,
+    read_chapters,
+    write_chapters_in_place,
+)
+
+SPANS = [(0.0, 12.5, "Intro"), (12.5, 60.0, "Part 1"), (60.0, 90.0, "Credits")]
+CHUNKS = [b"A" * 300, b"B" * 500, b"C" * 200]
+
+
+def _moov(chunk_offsets: list[int], *, chapter_track: bool = False) -> bytes:
+    table = b"".join(struct.pack(">I", o) for o in chunk_offsets)
+    stco = _box(b"stco", struct.pack(">II", 0, len(chunk_offsets)) + table)
+    trak = _box(b"mdia", _box(b"minf", _box(b"stbl", stco)))
+    if chapter_track:
+        trak = _box(b"tref", _box(b"chap", struct.pack(">I", 2))) + trak
+    return _box(b"moov", _box(b"mvhd", b"\0" * 100) + _box(b"trak", trak))
+
+
+def _mp4(path, *, moov_first: bool, free: int = 0, chapter_track: bool = False) -> None:
+    ftyp = _box(b"ftyp", b"isom\0\0\0\x01isommp41")
+    media = b"".join(CHUNKS)
+    padding = _box(b"free", b"\0" * (free - 8)) if free else b""
+    moov_len = len(_moov([0, 0, 0], chapter_track=chapter_track))
+    mdat_data = len(ftyp) + 8 + (moov_len + len(padding) if moov_first else 0)
+    offsets = [mdat_data, mdat_data + 300, mdat_data + 800]
+    moov = _moov(offsets, chapter_track=chapter_track) + padding
+    mdat = _box(b"mdat", media)
+    path.write_bytes(ftyp + moov + mdat if moov_first else ftyp + mdat + moov)
+
+
+def _chunks(path) -> list[bytes]:
+    """Media read back through the last (live) ``stco`` table."""
+    data = path.read_bytes()
+    pos = data.rindex(b"stco") + 8
+    (count,) = struct.unpack_from(">I", data, pos)
+    offsets = struct.unpack_from(f">{count}I", data, pos + 4)
+    return [data[o : o + len(c)] for o, c in zip(offsets, CHUNKS)]
+
+
+def _pieces_to_bytes(source, pieces) -> bytes:
+    data = source.read_bytes()
+    return b"".join(p if isinstance(p, bytes) else data[p[0] : p[0] + p[1]] for p in pieces)
+
+
+def test_padding_after_moov_is_reused(tmp_path) -> None:
+    mp4 = tmp_path / "a.mp4"
+    _mp4(mp4, moov_first=True, free=400)
+    size = mp4.stat().st_size
+    assert write_chapters_in_place(str(mp4), SPANS) == "replaced"
+    assert mp4.stat().st_size == size
+    assert read_chapters(str(mp4)) == [(s, t) for s, _e, t in SPANS]
+    assert _chunks(mp4) == CHUNKS
+
+
+def test_moov_without_room_is_appended_and_old_one_freed(tmp_path) -> None:
+    mp4 = tmp_path / "b.mp4"
+    _mp4(mp4, moov_first=True)
+    assert write_chapters_in_place(str(mp4), SPANS) == "appended"
+    assert mp4.read_bytes().count(b"moov") == 1
+    assert read_chapters(str(mp4))[-1] == (60.0, "Credits")
+    assert _chunks(mp4) == CHUNKS
+
+
+def test_rewrite_keeps_moov_in_front_and_patches_chunk_offsets(tmp_path) -> None:
+    src = tmp_path / "c.mp4"
+    _mp4(src, moov_first=True)
+    out = tmp_path / "c_out.mp4"
+    out.write_bytes(_pieces_to_bytes(src, plan_rewrite(str(src), SPANS)))
+    assert out.read_bytes().index(b"moov") < out.read_bytes().index(b"mdat")
+    assert read_chapters(str(out))[0] == (0.0, "Intro")
+    assert _chunks(out) == CHUNKS
+
+
+def test_quicktime_chapter_track_needs_remux(tmp_path) -> None:
+    mp4 = tmp_path / "d.mp4"
+    _mp4(mp4, moov_first=False, chapter_track=True)
+    with pytest.raises(Mp4EditError):
+        write_chapters_in_place(str(mp4), SPANS, dry_run=True)
+
+
+def test_rewrite_that_would_overflow_stco_falls_back_to_remux(tmp_path) -> None:
+    src = tmp_path / "e.mp4"
+    ftyp = _box(b"ftyp", b"isom\0\0\0\x01isommp41")
+    # Media near 4 GiB: a larger moov in front pushes it past what stco can hold.
+    offsets = [2**32 - 30, 2**32 - 20, 2**32 - 10]
+    src.write_bytes(ftyp + _moov(offsets) + _box(b"mdat", b"".join(CHUNKS)))
+    out = tmp_path / "e_out.mp4"
+    chapters = [s for s, _e, _t in SPANS]
+    assert not write_chapters_without_remux(str(src), chapters, str(out), duration_sec=90.0)
+    assert not out.exists()
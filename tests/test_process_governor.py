@@ -0,0 +1,106 @@
+import os
+import subprocess
+import sys
+import threading
+import time
+
+import pytest
+
+import process_governor
+from batch_scheduler import run_batch
+from ffmpeg_engine import FfmpegEngine, ProcessJob, run_processes
+from process_governor import (
+    BACKGROUND,
+    FOREGROUND,
+    NORMAL,
+    ProcessGovernor,
+    current_priority,
+    scan_priority,
+)
+
+
+def _python(code: str) -> list[str]:
+    return [sys.executable, "-c", code]
+
+
+def _state(pid: int) -> str:
+    with open(f"/proc/{pid}/stat", encoding="ascii") as f:
+        return f.read().rsplit(")", 1)[1].split()[0]
+
+
+def test_cap_and_background_hold() -> None:
+    governor = ProcessGovernor(max_processes=2)
+    first = governor.try_acquire(NORMAL)
+    background = governor.try_acquire(BACKGROUND)
+    assert first is not None and background is not None
+    assert governor.try_acquire(NORMAL) is None
+    first.release()
+    with governor.foreground():
+        assert governor.try_acquire(BACKGROUND) is None
+        fg = governor.try_acquire(FOREGROUND)
+        assert fg is not None
+        fg.release()
+    assert governor.try_acquire(BACKGROUND) is not None
+
+
+@pytest.mark.skipif(not sys.platform.startswith("linux"), reason="uses /proc and SIGSTOP")
+def test_foreground_scan_stops_and_continues_background_processes() -> None:
+    governor = ProcessGovernor(max_processes=1)
+    slot = governor.try_acquire(BACKGROUND)
+    assert slot is not None
+    proc = subprocess.Popen(_python("import time; time.sleep(30)"), start_new_session=True)
+    try:
+        slot.attach(proc.pid)
+        assert os.getpriority(os.PRIO_PROCESS, proc.pid) == process_governor.BACKGROUND_NICE
+        with governor.foreground():
+            time.sleep(0.05)
+            assert _state(proc.pid) == "T"
+            # The stopped process does not count, so the editor can still start one.
+            assert governor.running() == 0
+            editor = governor.try_acquire(FOREGROUND)
+            assert editor is not None
+            editor.release()
+        time.sleep(0.05)
+        assert _state(proc.pid) != "T"
+    finally:
+        proc.kill()
+        proc.wait()
+        slot.release()
+
+
+def test_engine_admits_jobs_within_the_cap() -> None:
+    engine = FfmpegEngine(governor=ProcessGovernor(max_processes=1))
+    lock = threading.Lock()
+    running = [0]
+    peak = [0]
+
+    def on_line(line: str) -> None:
+        with lock:
+            running[0] += 1 if line == "up" else -1
+            peak[0] = max(peak[0], running[0])
+
+    code = (
+        "import sys, time; print('up', file=sys.stderr, flush=True); time.sleep(0.05); "
+        "print('down', file=sys.stderr, flush=True)"
+    )
+    jobs = [ProcessJob(_python(code), on_line=on_line) for _ in range(3)]
+    run_processes(jobs, engine=engine)
+    assert all(job.returncode == 0 for job in jobs)
+    assert peak[0] == 1
+    assert engine.governor.running() == 0
+
+
+def test_priority_follows_the_context_into_batch_threads() -> None:
+    seen: list[str] = []
+    with scan_priority(BACKGROUND):
+        assert ProcessJob(["true"]).priority == BACKGROUND
+        run_batch(2, lambda i, jobs: seen.append(current_priority()), budget=2)
+    assert seen == [BACKGROUND, BACKGROUND]
+    assert current_priority() == NORMAL
+
+
+def test_run_captures_output_in_a_slot() -> None:
+    governor = ProcessGovernor(max_processes=1)
+    result = process_governor.run(_python("print('hi')"), governor=governor)
+    assert result.returncode == 0 and result.stdout == "hi\n"
+    assert governor.running() == 0
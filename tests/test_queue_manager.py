@@ -0,0 +1,35 @@
+import os
+
+import pytest
+
+pytest.importorskip("PySide6.QtWidgets")
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+from PySide6.QtWidgets import QApplication, QListWidgetItem  # noqa: E402
+
+import blackdetect_worker  # noqa: E402
+from queue_manager import QueueManager  # noqa: E402
+from scan_checkpoint import BatchCheckpoint, default_checkpoint_path  # noqa: E402
+
+
+def test_cancelled_batch_keeps_its_checkpoint(tmp_path, monkeypatch) -> None:
+    monkeypatch.setenv("MACHAP_CACHE_DIR", str(tmp_path / "cache"))
+    video = tmp_path / "a.mkv"
+    video.write_bytes(b"\0" * 100)
+
+    def cancelled_scan(paths, settings, *, checkpoint=None, **callbacks) -> bool:
+        checkpoint.save()
+        return False
+
+    monkeypatch.setattr(blackdetect_worker, "scan_batch", cancelled_scan)
+    app = QApplication.instance() or QApplication([])
+    queue = QueueManager()
+    queue.import_list.addItem(QListWidgetItem(str(video)))
+    queue.scan_all_files()
+    queue.scan_thread.wait()
+    app.processEvents()
+
+    assert BatchCheckpoint.pending(default_checkpoint_path()) is not None
+    restored = QueueManager()
+    assert restored.import_list.count() == 1
+    assert restored.project_files[0]["path"] == str(video)
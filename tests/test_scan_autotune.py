@@ -0,0 +1,104 @@
+import json
+
+from detector import _ffmpeg_cmd
+from ffmpeg_engine import cpu_slices
+from media_probe import MediaInfo
+from scan_autotune import (
+    ScanTuning,
+    TuningStore,
+    autotune_scan,
+    fit_to_span,
+    heuristic_tuning,
+    media_class,
+    thread_candidates,
+)
+
+
+def _info(codec: str | None, height: int | None, duration: float = 3600.0) -> MediaInfo:
+    return MediaInfo(
+        path="a.mkv",
+        duration=duration,
+        start_time=0.0,
+        format_name="matroska,webm",
+        bit_rate=None,
+        video_codec=codec,
+        width=None,
+        height=height,
+        fps=25.0,
+        video_bit_rate=None,
+        audio_codec=None,
+        audio_bit_rate=None,
+        chapters=(),
+    )
+
+
+def test_media_class_buckets_codec_and_height() -> None:
+    assert media_class(_info("h264", 576)) == "h264-sd"
+    assert media_class(_info("hevc", 1080)) == "hevc-1080p"
+    assert media_class(_info("av1", 2160)) == "av1-uhd"
+    assert media_class(_info(None, None)) == "unknown-unknown"
+    assert media_class(None) == "unknown"
+
+
+def test_heuristic_keeps_jobs_times_threads_at_cores() -> None:
+    assert heuristic_tuning(8, _info("mpeg2video", 576)) == ScanTuning(8, 1)
+    assert heuristic_tuning(8, _info("h264", 1080)) == ScanTuning(4, 2)
+    assert heuristic_tuning(8, _info("hevc", 2160)) == ScanTuning(2, 4)
+    assert heuristic_tuning(2, _info("hevc", 2160)) == ScanTuning(1, 2)
+    assert thread_candidates(6) == [1, 2, 4]
+
+
+def test_short_spans_trade_jobs_for_decoder_threads() -> None:
+    assert fit_to_span(ScanTuning(8, 1), 3600.0, 8) == ScanTuning(8, 1)
+    assert fit_to_span(ScanTuning(8, 1), 90.0, 8) == ScanTuning(3, 2)
+    assert fit_to_span(ScanTuning(8, 1), 40.0, 8) == ScanTuning(1, 8)
+
+
+def test_stored_tuning_is_used_without_probing(tmp_path, monkeypatch) -> None:
+    store = TuningStore(str(tmp_path / "autotune.json"))
+    store.put("hevc-1080p", 8, ScanTuning(2, 4, source="probe"), 91.234)
+    data = json.loads((tmp_path / "autotune.json").read_text())
+    assert data["entries"]["hevc-1080p@8"] == {
+        "jobs": 2,
+        "threads": 4,
+        "filter_threads": 1,
+        "speed": 91.23,
+    }
+
+    def no_probe(*_args, **_kwargs):
+        raise AssertionError("probed despite a stored tuning")
+
+    monkeypatch.setattr("scan_autotune.probe_tuning", no_probe)
+    tuning = autotune_scan("a.mkv", _info("hevc", 1080), 3600.0, 8, store=store)
+    assert (tuning.jobs, tuning.threads, tuning.source) == (2, 4, "stored")
+    # Another core count is a different entry; without a probe the heuristic answers.
+    tuning = autotune_scan("a.mkv", _info("hevc", 1080), 3600.0, 4, store=store, probe=False)
+    assert (tuning.jobs, tuning.threads, tuning.source) == (2, 2, "heuristic")
+
+
+def test_probe_result_is_stored_per_class(tmp_path, monkeypatch) -> None:
+    store = TuningStore(str(tmp_path / "autotune.json"))
+    calls: list[int] = []
+
+    def fake_probe(_path, _duration, cores, **_kwargs):
+        calls.append(cores)
+        return ScanTuning(cores // 2, 2, source="probe"), 50.0
+
+    monkeypatch.setattr("scan_autotune.probe_tuning", fake_probe)
+    first = autotune_scan("a.mkv", _info("h264", 720), 3600.0, 8, store=store)
+    second = autotune_scan("b.mkv", _info("h264", 720), 3600.0, 8, store=store)
+    assert calls == [8]
+    assert (first.jobs, first.source) == (4, "probe")
+    assert (second.jobs, second.source) == (4, "stored")
+    # Too short to be worth a probe.
+    autotune_scan("c.mkv", _info("vp9", 720), 120.0, 8, store=store)
+    assert calls == [8]
+
+
+def test_thread_options_and_cpu_slices() -> None:
+    cmd = _ffmpeg_cmd("a.mkv", "blackdetect", use_hwaccel=False, threads=2, filter_threads=1)
+    assert cmd.index("-threads") < cmd.index("-i")
+    assert cmd[cmd.index("-filter_threads") + 1] == "1"
+    slices = cpu_slices(2, 1)
+    assert len(slices) in (0, 2)
+    assert all(len(cpus) == 1 for cpus in slices)
@@ -0,0 +1,52 @@
+import copy
+
+from scan_benchmark import (
+    QUICK_SUITE,
+    ScanConfig,
+    build_generate_command,
+    compare_reports,
+    ground_truth,
+    score_events,
+)
+
+
+def _event(start: float, end: float) -> dict[str, float]:
+    return {"black_start": start, "black_end": end, "black_duration": end - start}
+
+
+def test_score_events_counts_misses_spurious_and_drift() -> None:
+    truth = [(0.0, 1.0), (20.0, 22.0), (50.0, 51.0)]
+    events = [_event(0.0, 1.04), _event(19.96, 22.0), _event(70.0, 71.0)]
+    score = score_events(truth, events)
+    assert (score["matched"], score["missed"], score["spurious"]) == (2, 1, 1)
+    assert score["max_start_drift"] == 0.04
+    assert score["max_end_drift"] == 0.04
+
+
+def test_ground_truth_and_generator_follow_the_windows_and_spans() -> None:
+    video = QUICK_SUITE[0]
+    edges = ScanConfig(1, None, "edges").window_list(video.duration)
+    assert ground_truth(video, edges) == [(0.0, 1.0), (22.0, 22.4), (88.0, 89.0)]
+    assert ground_truth(video, []) == list(video.black)
+    cmd = build_generate_command(video, "out.mkv")
+    filters = cmd[cmd.index("-i") + 1]
+    assert filters.count("drawbox") == len(video.black)
+    assert "gte(t\\,44.800)*lt(t\\,45.600)" in filters
+
+
+def test_compare_reports_flags_slowdown_and_new_misses() -> None:
+    case = {
+        "video": "v",
+        "config": {"parallel_jobs": 2, "max_analysis_width": 854, "windows": "full"},
+        "median_wall_sec": 2.0,
+        "accuracy": {"missed": 0, "spurious": 0, "max_start_drift": 0.0, "max_end_drift": 0.0},
+    }
+    baseline = {"results": [case]}
+    assert compare_reports(baseline, copy.deepcopy(baseline)) == []
+
+    slower = copy.deepcopy(case)
+    slower["median_wall_sec"] = 3.0
+    slower["accuracy"]["missed"] = 1
+    problems = compare_reports(baseline, {"results": [slower]})
+    assert len(problems) == 2
+    assert "1.50x slower" in problems[1]
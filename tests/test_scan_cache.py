@@ -0,0 +1,77 @@
+import os
+import tempfile
+
+import scan_cache
+from scan_cache import (
+    ScanCache,
+    detect_black_frames_cached,
+    detection_fingerprint,
+    prune_cache_dir,
+)
+
+
+def _video(tmpdir: str, name: str = "clip.mkv", data: bytes = b"x" * 100) -> str:
+    path = os.path.join(tmpdir, name)
+    with open(path, "wb") as f:
+        f.write(data)
+    return path
+
+
+def test_fingerprint_normalizes_values() -> None:
+    a = detection_fingerprint(0.4, 0.98, 0.08, 854, [(5.0, 570.0)])
+    b = detection_fingerprint(0.4000000001, 0.98, 0.08, 854, [(5, 570)])
+    assert a == b
+    assert detection_fingerprint(0.4, 0.98, 0.08, None, None)["max_analysis_width"] == 0
+
+
+def test_cache_roundtrip_and_identity_change() -> None:
+    with tempfile.TemporaryDirectory() as tmp:
+        video = _video(tmp)
+        cache = ScanCache(os.path.join(tmp, "cache"))
+        fp = detection_fingerprint(0.4, 0.98, 0.08, 854, None)
+        assert cache.get(video, fp) is None
+
+        events = [{"black_start": 1.0, "black_end": 2.0, "black_duration": 1.0}]
+        cache.put(video, fp, events)
+        assert cache.get(video, fp) == events
+        assert cache.get(video, detection_fingerprint(0.5, 0.98, 0.08, 854, None)) is None
+
+        with open(video, "ab") as f:
+            f.write(b"more")
+        assert cache.get(video, fp) is None
+
+
+def test_cached_detect_skips_ffmpeg_on_hit(monkeypatch) -> None:
+    calls: list[str] = []
+
+    def fake_detect(path, **kwargs):
+        calls.append(path)
+        return [{"black_start": 3.0, "black_end": 4.0, "black_duration": 1.0}]
+
+    monkeypatch.setattr(scan_cache, "detect_black_frames", fake_detect)
+    with tempfile.TemporaryDirectory() as tmp:
+        video = _video(tmp)
+        cache = ScanCache(os.path.join(tmp, "cache"))
+        first = detect_black_frames_cached(video, cache=cache, parallel_jobs=4)
+        ratios: list[float] = []
+        second = detect_black_frames_cached(
+            video, cache=cache, parallel_jobs=1, on_time_ratio=ratios.append
+        )
+        assert first == second
+        assert len(calls) == 1
+        assert ratios == [1.0]
+
+        detect_black_frames_cached(video, cache=cache, force_rescan=True)
+        assert len(calls) == 2
+
+
+def test_prune_cache_dir_evicts_oldest() -> None:
+    with tempfile.TemporaryDirectory() as tmp:
+        for i in range(4):
+            path = os.path.join(tmp, f"{i}.json")
+            with open(path, "w") as f:
+                f.write("x" * 100)
+            os.utime(path, (1000 + i, 1000 + i))
+        removed = prune_cache_dir(tmp, 250, suffix=".json")
+        assert removed == 2
+        assert sorted(os.listdir(tmp)) == ["2.json", "3.json"]
@@ -0,0 +1,76 @@
+import os
+
+import pytest
+
+import detector
+from detector import BlackdetectCancelled, detect_black_frames
+from scan_checkpoint import BatchCheckpoint
+
+SETTINGS = {"min_black_seconds": 0.4, "window_list": "", "scan_mode": "full"}
+EVENT = {"black_start": 1.0, "black_end": 2.0, "black_duration": 1.0}
+
+
+def _video(tmp_path, name: str) -> str:
+    path = tmp_path / name
+    path.write_bytes(b"\0" * 100)
+    return str(path)
+
+
+def test_finished_files_and_chunks_survive_a_restart(tmp_path) -> None:
+    a, b = _video(tmp_path, "a.mkv"), _video(tmp_path, "b.mkv")
+    path = str(tmp_path / "checkpoint.json")
+    first = BatchCheckpoint(path, [a, b], SETTINGS)
+    first.finish(a, [EVENT])
+    first.file(b).save_chunk(600.0, 600.0, "line\n")
+    assert BatchCheckpoint.pending(path) == ([a, b], SETTINGS)
+
+    again = BatchCheckpoint(path, [a, b], SETTINGS)
+    assert again.results() == {a: [EVENT]}
+    resumed = again.file(b)
+    assert resumed.chunk(600.0, 600.0) == "line\n" and resumed.restored_seconds == 600.0
+    assert resumed.chunk(0.0, 600.0) is None
+
+    # Other result settings, or a file that changed, start over.
+    assert BatchCheckpoint(path, [a, b], {**SETTINGS, "min_black_seconds": 1.0}).results() == {}
+    with open(a, "ab") as f:
+        f.write(b"x")
+    assert BatchCheckpoint(path, [a, b], SETTINGS).results() == {}
+    again.clear()
+    assert not os.path.exists(path) and BatchCheckpoint.pending(path) is None
+
+
+def test_interrupted_scan_only_decodes_missing_chunks(tmp_path, monkeypatch) -> None:
+    video = _video(tmp_path, "film.mkv")
+    ran: list[float] = []
+    interrupt = [True]
+
+    def fake_run_jobs(jobs, cancel, recorder=None, **pool) -> None:
+        for job in jobs:
+            ss = float(job.cmd[job.cmd.index("-ss") + 1])
+            ran.append(ss)
+            job.kept = ["[blackdetect @ 0x1] black_start:10 black_end:11 black_duration:1\n"]
+            job.returncode = 0
+            job.on_done(job)
+            if interrupt[0]:
+                raise BlackdetectCancelled()
+
+    monkeypatch.setattr(detector, "_run_jobs", fake_run_jobs)
+    windows = [(60.0, 300.0), (1800.0, 2400.0)]
+    checkpoint = BatchCheckpoint(str(tmp_path / "c.json"), [video], SETTINGS)
+    with pytest.raises(BlackdetectCancelled):
+        detect_black_frames(
+            video,
+            window_list=windows,
+            duration_hint_sec=3600.0,
+            checkpoint=checkpoint.file(video),
+        )
+    assert ran == [1795.0]
+
+    interrupt[0] = False
+    resumed = BatchCheckpoint(str(tmp_path / "c.json"), [video], SETTINGS).file(video)
+    events = detect_black_frames(
+        video, window_list=windows, duration_hint_sec=3600.0, checkpoint=resumed
+    )
+    assert ran == [1795.0, 55.0]
+    assert resumed.restored_seconds == 610.0
+    assert [e["black_start"] for e in events] == [65.0, 1805.0]
@@ -0,0 +1,70 @@
+import pytest
+
+from media_probe import MediaInfo
+from scan_cost import (
+    ORDER_LONGEST_FIRST,
+    ORDER_QUEUE,
+    ORDER_SHORTEST_FIRST,
+    CostModel,
+    batch_eta,
+    batch_order,
+    prior_cost_per_second,
+)
+
+
+def _info(codec: str, width: int, height: int, video_bit_rate: int | None = None) -> MediaInfo:
+    return MediaInfo(
+        path="a.mkv",
+        duration=3600.0,
+        start_time=0.0,
+        format_name="matroska,webm",
+        bit_rate=None,
+        video_codec=codec,
+        width=width,
+        height=height,
+        fps=25.0,
+        video_bit_rate=video_bit_rate,
+        audio_codec=None,
+        audio_bit_rate=None,
+        chapters=(),
+    )
+
+
+def test_prior_grows_with_pixels_codec_bitrate_and_mode() -> None:
+    sd = prior_cost_per_second(_info("h264", 720, 576))
+    hd = prior_cost_per_second(_info("h264", 1920, 1080))
+    assert hd > 4 * sd
+    assert prior_cost_per_second(_info("hevc", 1920, 1080)) > hd
+    assert prior_cost_per_second(_info("h264", 1920, 1080, 20_000_000)) > hd
+    assert prior_cost_per_second(_info("h264", 1920, 1080), "nokey") < hd / 5
+    assert prior_cost_per_second(None) > 0
+
+
+def test_recorded_scans_calibrate_their_class(tmp_path) -> None:
+    model = CostModel(str(tmp_path / "scan_cost.json"))
+    hd = _info("h264", 1920, 1080)
+    prior = model.predict(hd, 600.0)
+    assert prior == pytest.approx(600.0 * prior_cost_per_second(hd))
+    model.record(hd, 600.0, 3 * prior)
+    assert model.predict(hd, 600.0) == pytest.approx(3 * prior)
+    # Later scans move the factor part of the way; other classes are untouched.
+    model.record(hd, 600.0, prior)
+    assert 1 * prior < model.predict(hd, 600.0) < 3 * prior
+    assert model.factor(_info("hevc", 1920, 1080)) == 1.0
+    # The history is read back from disk.
+    assert CostModel(model.path).predict(hd, 600.0) == pytest.approx(model.predict(hd, 600.0))
+
+
+def test_batch_order_and_cost_weighted_eta() -> None:
+    costs = [10.0, 100.0, 1.0, 100.0]
+    assert batch_order(costs, ORDER_LONGEST_FIRST) == [1, 3, 0, 2]
+    assert batch_order(costs, ORDER_SHORTEST_FIRST) == [2, 0, 1, 3]
+    assert batch_order(costs, ORDER_QUEUE) == [0, 1, 2, 3]
+
+    overall, eta = batch_eta([90.0, 10.0], {}, 0.0, cores=2)
+    assert (overall, eta) == (0.0, 50.0)
+    # The short file done is a tenth of the work, not half of it.
+    overall, eta = batch_eta([90.0, 10.0], {1: 1.0}, 5.0, cores=2)
+    assert overall == pytest.approx(0.1)
+    assert eta == pytest.approx(0.1 * 45.0 + 0.9 * 45.0)
+    assert batch_eta([90.0, 10.0], {0: 1.0, 1: 1.0}, 60.0, cores=2) == (1.0, 0.0)
@@ -0,0 +1,88 @@
+import sys
+
+from detector import _run_blackdetect_stream
+from scan_metrics import (
+    MetricsRecorder,
+    ProcessMetrics,
+    ProgressParser,
+    ScanMetrics,
+    progress_time_seconds,
+)
+
+
+def test_progress_parser_collects_blocks_and_claims_their_lines() -> None:
+    blocks: list[dict[str, str]] = []
+    parser = ProgressParser(blocks.append)
+    assert not parser.feed("[blackdetect @ 0x1] black_start:1 black_end:2")
+    for line in ("frame=10", "fps=0.00", "out_time_us=400000", "speed=N/A", "progress=continue"):
+        assert parser.feed(line)
+    for line in ("frame=250", "out_time_us=10000000", "speed= 114x", "progress=end"):
+        parser.feed(line)
+    assert parser.blocks == 2
+    assert blocks[0]["frame"] == "10"
+    assert parser.last == {
+        "frame": "250",
+        "out_time_us": "10000000",
+        "speed": "114x",
+        "progress": "end",
+    }
+
+
+def test_progress_time_seconds() -> None:
+    assert progress_time_seconds({"out_time_us": "62340000"}) == 62.34
+    assert progress_time_seconds({"out_time_us": "N/A", "out_time_ms": "1500000"}) == 1.5
+    assert progress_time_seconds({"out_time_us": "-9223372036854775807"}) == 0.0
+    assert progress_time_seconds({"out_time_us": "N/A"}) is None
+
+
+def test_scan_metrics_totals() -> None:
+    scan = ScanMetrics(
+        "a.mkv",
+        "segments",
+        wall_sec=2.0,
+        processes=[
+            ProcessMetrics(frames=100, media_sec=4.0, cpu_user_sec=1.0, cpu_system_sec=0.5),
+            ProcessMetrics(frames=300, media_sec=12.0, bytes_read=2048),
+        ],
+    )
+    assert scan.decode_fps == 200.0
+    assert scan.speed == 8.0
+    assert scan.cpu_sec == 1.5
+    assert scan.bytes_read == 2048
+    data = scan.to_dict()
+    assert data["frames"] == 400
+    assert data["media_sec"] == 16.0
+    assert len(data["processes"]) == 2
+    assert ScanMetrics("a.mkv", "sequential").decode_fps is None
+
+
+def test_run_stream_reports_progress_and_metrics() -> None:
+    code = (
+        "import sys\n"
+        "for i in range(1, 5):\n"
+        "    sys.stderr.write(f'frame={i * 25}\\nout_time_us={i * 1000000}\\n')\n"
+        "    sys.stderr.write('speed=10x\\nprogress=continue\\n')\n"
+        "sys.stderr.write('[blackdetect @ 0x1] black_start:1 black_end:2 black_duration:1\\n')\n"
+        "sys.stderr.write('frame=100\\nout_time_us=4000000\\nprogress=end\\n')\n"
+    )
+    ratios: list[float] = []
+    seen: list[str] = []
+    done: list[ScanMetrics] = []
+    recorder = MetricsRecorder("a.mkv", "sequential", done.append)
+    out = _run_blackdetect_stream(
+        [sys.executable, "-c", code],
+        lambda: False,
+        ratios.append,
+        8.0,
+        on_line=seen.append,
+        recorder=recorder,
+    )
+    recorder.finish()
+    assert "black_start:1" in out
+    assert seen == ["[blackdetect @ 0x1] black_start:1 black_end:2 black_duration:1"]
+    assert 0.125 in ratios and ratios[-1] == 0.5
+    assert ratios == sorted(ratios)
+    assert len(done) == 1
+    (process,) = done[0].processes
+    assert process.frames == 100 and process.media_sec == 4.0
+    assert process.cpu_user_sec is not None and process.wall_sec > 0
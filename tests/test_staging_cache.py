@@ -0,0 +1,73 @@
+import os
+import time
+
+from staging_cache import StagingCache
+
+
+def _source(tmp_path, name: str, size: int) -> str:
+    path = tmp_path / "share" / name
+    path.parent.mkdir(exist_ok=True)
+    path.write_bytes(os.urandom(size))
+    return str(path)
+
+
+def _cache(tmp_path, max_bytes: int) -> StagingCache:
+    return StagingCache(str(tmp_path / "staging"), max_bytes, should_stage=lambda path: True)
+
+
+def test_use_reads_a_local_copy_and_reuses_it(tmp_path) -> None:
+    source = _source(tmp_path, "a.mkv", 10_000)
+    cache = _cache(tmp_path, 100_000)
+    with cache.use(source) as local:
+        assert local != source and os.path.dirname(local) == cache.directory
+        with open(local, "rb") as a, open(source, "rb") as b:
+            assert a.read() == b.read()
+    assert cache.staged_path(source) == local
+    # A new instance adopts the copy instead of copying again.
+    again = _cache(tmp_path, 100_000)
+    entry = again._request(source)
+    assert entry is not None and entry.ready and entry.future is None
+    # A changed source is not read from its stale copy.
+    with open(source, "ab") as f:
+        f.write(b"more")
+    assert cache.staged_path(source) == source
+
+
+def test_least_recently_used_copies_are_evicted_but_not_pinned_ones(tmp_path) -> None:
+    a, b, c = (_source(tmp_path, f"{name}.mkv", 4_000) for name in "abc")
+    cache = _cache(tmp_path, 10_000)
+    with cache.use(a) as local_a:
+        with cache.use(b):
+            pass
+        with cache.use(c) as local_c:
+            # ``a`` is older but still in use, so ``b`` made room.
+            assert local_c != c
+            assert cache.staged_path(a) == local_a
+            assert cache.staged_path(b) == b
+    assert cache.used_bytes == 8_000
+
+
+def test_files_that_do_not_fit_or_are_local_are_read_in_place(tmp_path) -> None:
+    big = _source(tmp_path, "big.mkv", 20_000)
+    cache = _cache(tmp_path, 10_000)
+    with cache.use(big) as local:
+        assert local == big
+    local_only = StagingCache(str(tmp_path / "staging"), 10_000, should_stage=lambda path: False)
+    small = _source(tmp_path, "small.mkv", 100)
+    with local_only.use(small) as local:
+        assert local == small
+    assert not os.path.exists(local_only.local_path(small))
+
+
+def test_use_waits_for_a_copy_that_is_still_running(tmp_path) -> None:
+    source = _source(tmp_path, "slow.mkv", 1_000)
+    cache = _cache(tmp_path, 100_000)
+    copy = cache._copy
+
+    def slow_copy(entry) -> bool:
+        time.sleep(0.5)
+        return copy(entry)
+
+    cache._copy = slow_copy
+    with cache.use(source, poll_interval=0.05) as local:
+        assert local == cache.local_path(source) and os.path.exists(local)
@@ -0,0 +1,65 @@
+import os
+
+import storage_class
+from storage_class import (
+    HDD,
+    NETWORK,
+    SSD,
+    detect_storage,
+    mount_for,
+    random_read_latency_ms,
+    read_policy,
+    rotational_flag,
+)
+
+
+def test_mount_for_picks_the_longest_mount_point(tmp_path) -> None:
+    mounts = tmp_path / "mounts"
+    mounts.write_text(
+        "/dev/sda1 / ext4 rw 0 0\n"
+        "//nas/media /mnt/my\\040media cifs rw 0 0\n"
+        "/dev/sdb1 /mnt ext4 rw 0 0\n"
+    )
+    assert mount_for("/mnt/my media/show/ep1.mkv", str(mounts)) == (
+        "//nas/media",
+        "/mnt/my media",
+        "cifs",
+    )
+    assert mount_for("/mnt/other.mkv", str(mounts))[1] == "/mnt"
+    assert mount_for("/home/x.mkv", str(mounts))[2] == "ext4"
+
+
+def test_rotational_flag_reads_the_parent_disk_of_a_partition(tmp_path) -> None:
+    disk = tmp_path / "devices" / "sda"
+    (disk / "queue").mkdir(parents=True)
+    (disk / "queue" / "rotational").write_text("1\n")
+    (disk / "sda2").mkdir()
+    (tmp_path / "dev" / "block").mkdir(parents=True)
+    os.symlink(disk / "sda2", tmp_path / "dev" / "block" / "8:2")
+    assert rotational_flag(os.makedev(8, 2), sys_root=str(tmp_path)) == (True, "sda")
+    assert rotational_flag(os.makedev(8, 3), sys_root=str(tmp_path)) is None
+
+
+def test_network_mounts_win_and_policies_limit_readers(tmp_path, monkeypatch) -> None:
+    video = tmp_path / "a.mkv"
+    video.write_bytes(b"\0" * 100_000)
+    storage_class.clear_storage_cache()
+    monkeypatch.setattr(
+        storage_class, "mount_for", lambda path: ("nas:/media", str(tmp_path), "nfs4")
+    )
+    info = detect_storage(str(video))
+    assert (info.kind, info.device, info.source) == (NETWORK, "nas:/media", "mounts")
+    storage_class.clear_storage_cache()
+    assert read_policy(HDD).max_readers == 1 and read_policy(HDD).files_per_device == 1
+    assert read_policy(NETWORK).min_chunk_seconds == storage_class.NETWORK_MIN_CHUNK_SECONDS
+    assert read_policy(SSD).max_readers is None
+
+
+def test_random_read_probe(tmp_path) -> None:
+    small = tmp_path / "small.bin"
+    small.write_bytes(b"x" * 100)
+    assert random_read_latency_ms(str(small)) is None
+    big = tmp_path / "big.bin"
+    big.write_bytes(b"x" * 1_000_000)
+    latency = random_read_latency_ms(str(big))
+    assert latency is not None and latency >= 0.0
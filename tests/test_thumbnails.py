@@ -0,0 +1,91 @@
+import os
+import sys
+
+import thumbnails
+from thumbnails import (
+    build_select_expr,
+    build_thumbnail_command,
+    extract_thumbnails,
+    match_frames,
+    thumbnail_path,
+)
+
+# Writes one "JPEG" per frame pts in argv[2:] and logs them like showinfo.
+_FAKE_FFMPEG = (
+    "import sys\n"
+    "for i, pts in enumerate(sys.argv[2:], start=1):\n"
+    "    open(sys.argv[1] % i, 'w').write(pts)\n"
+    "    sys.stderr.write(f'[Parsed_showinfo_2 @ 0x1] n:{i - 1} pts_time:{pts} \\n')\n"
+)
+
+
+def _fake_ffmpeg(monkeypatch, frame_pts: list[str], calls: list[list[float]]) -> None:
+    def build(_video, times, pattern, **_kwargs):
+        calls.append(list(times))
+        return [sys.executable, "-c", _FAKE_FFMPEG, pattern, *frame_pts]
+
+    monkeypatch.setattr(thumbnails, "build_thumbnail_command", build)
+
+
+def test_select_expr_has_one_term_per_distinct_timestamp() -> None:
+    expr = build_select_expr([40.0, 12.5, 12.5])
+    assert expr.count("gte(t") == 2
+    assert expr.index("12.500") < expr.index("40.000")
+    assert build_select_expr([]) == "0"
+
+
+def test_match_frames_picks_first_frame_at_or_after_each_time() -> None:
+    frames = [0.0, 10.01, 40.0]
+    assert match_frames([0.0, 10.0, 10.01, 39.9, 95.0], frames) == {
+        0.0: 0,
+        10.0: 1,
+        10.01: 1,
+        39.9: 2,
+        95.0: 2,
+    }
+    assert match_frames([1.0], []) == {}
+
+
+def test_only_uncached_timestamps_are_extracted(tmp_path, monkeypatch) -> None:
+    video = tmp_path / "v.mkv"
+    video.write_bytes(b"x")
+    cache = tmp_path / "thumbs"
+    calls: list[list[float]] = []
+    _fake_ffmpeg(monkeypatch, ["5.005", "61.2"], calls)
+
+    first = extract_thumbnails(str(video), [5.0, 60.0], directory=str(cache))
+    assert calls == [[5.0, 60.0]]
+    assert open(first[60.0]).read() == "61.2"
+    assert first[5.0] == thumbnail_path(str(video), 5.0, directory=str(cache))
+
+    again = extract_thumbnails(str(video), [5.0, 60.0, 90.0], directory=str(cache))
+    assert calls[-1] == [90.0]
+    assert again[5.0] == first[5.0]
+    assert sorted(os.listdir(cache)) == sorted(os.path.basename(p) for p in again.values())
+
+
+def test_cache_is_pruned_to_its_size_cap(tmp_path, monkeypatch) -> None:
+    video = tmp_path / "v.mp4"
+    video.write_bytes(b"x")
+    cache = tmp_path / "thumbs"
+    _fake_ffmpeg(monkeypatch, ["1.0"], [])
+    for t in range(5):
+        extract_thumbnails(str(video), [float(t)], directory=str(cache), max_bytes=9)
+    assert len(os.listdir(cache)) == 3
+
+
+def test_many_timestamps_are_split_into_seeking_passes(tmp_path, monkeypatch) -> None:
+    video = tmp_path / "v.mkv"
+    video.write_bytes(b"x")
+    calls: list[list[float]] = []
+    _fake_ffmpeg(monkeypatch, ["10.0", "20.0", "30.0", "40.0", "50.0"], calls)
+    monkeypatch.setattr(thumbnails, "THUMBNAILS_PER_PASS", 2)
+    times = [50.0, 10.0, 40.0, 20.0, 30.0]
+    found = extract_thumbnails(str(video), times, directory=str(tmp_path / "thumbs"))
+    assert calls == [[10.0, 20.0], [30.0, 40.0], [50.0]]
+    assert sorted(found) == sorted(times)
+
+    cmd = build_thumbnail_command(str(video), [600.0, 630.0], "%06d.jpg")
+    assert cmd[cmd.index("-ss") + 1] == "599.000" and "-copyts" in cmd
+    assert cmd[cmd.index("-t") + 1] == "61.000"
+    assert "-ss" not in build_thumbnail_command(str(video), [0.5], "%06d.jpg")
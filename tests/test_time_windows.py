@@ -1,6 +1,8 @@
 from time_windows import (
     DEFAULT_SCAN_WINDOW_LIST_TEXT,
+    TimeWindowSet,
     expand_scan_time_windows,
+    merge_time_windows,
     parse_time_range_list,
 )
 
@@ -59,3 +61,27 @@ def test_expand_skips_end_when_duration_unknown() -> None:
 def test_expand_invalid_window_dropped() -> None:
     """Start not strictly before computed end."""
     assert expand_scan_time_windows("00:00:05-$END-00:00:30", 32.0) == []
+
+
+def test_expand_merges_overlaps_and_clips_to_duration() -> None:
+    text = "00:20:00-00:40:00,00:00:00-00:10:00,00:05:00-00:12:00,00:12:00-00:13:00"
+    assert expand_scan_time_windows(text, 1800.0) == [(0.0, 780.0), (1200.0, 1800.0)]
+    assert expand_scan_time_windows("00:40:00-00:50:00", 1800.0) == []
+
+
+def test_merge_keeps_unknown_duration_ends() -> None:
+    assert merge_time_windows([(5.0, 9.0), (-1.0, 2.0), (3.0, 3.0)]) == [(0.0, 2.0), (5.0, 9.0)]
+
+
+def test_window_set_membership_is_inclusive() -> None:
+    windows = TimeWindowSet([(600.0, 1200.0), (0.0, 60.0)])
+    assert [t in windows for t in (0.0, 60.0, 60.5, 599.9, 600.0, 1200.0, 1200.1)] == [
+        True,
+        True,
+        False,
+        False,
+        True,
+        True,
+        False,
+    ]
+    assert not TimeWindowSet([])
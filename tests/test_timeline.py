@@ -0,0 +1,17 @@
+import pytest
+
+pytest.importorskip("PySide6.QtWidgets")
+
+from timeline import marker_columns  # noqa: E402
+
+
+def test_marker_columns_decimates_to_one_per_pixel() -> None:
+    times = sorted([i * 0.01 for i in range(100_000)])  # 1000 s of dense events
+    columns = marker_columns(times, 0.0, 1000.0, 500)
+    assert columns == list(range(500))
+
+
+def test_marker_columns_only_visible_window() -> None:
+    times = [1.0, 50.0, 50.5, 99.0, 300.0]
+    assert marker_columns(times, 40.0, 60.0, 600) == [100, 105, 590]
+    assert marker_columns(times, 0.0, 0.0, 600) == []
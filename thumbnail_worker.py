@@ -0,0 +1,39 @@
+"""Qt worker that extracts chapter thumbnails off the GUI thread."""
+
+from __future__ import annotations
+
+from PySide6.QtCore import QThread, Signal
+
+from thumbnails import THUMBNAIL_WIDTH, ThumbnailError, extract_thumbnails
+
+
+class ThumbnailWorker(QThread):
+    """Extract (or fetch from the cache) one thumbnail per chapter timestamp."""
+
+    thumbnails_ready = Signal(str, dict)
+    """(video path, {time: jpeg path}) — emitted even when cancelled, with what was cached."""
+    thumbnails_failed = Signal(str, str)
+    """(video path, error message)."""
+
+    def __init__(self, video_path: str, times: list[float], width: int = THUMBNAIL_WIDTH):
+        super().__init__()
+        self.video_path = video_path
+        self.times = list(times)
+        self.width = width
+        self._cancel = False
+
+    def cancel(self) -> None:
+        self._cancel = True
+
+    def run(self) -> None:
+        try:
+            paths = extract_thumbnails(
+                self.video_path,
+                self.times,
+                width=self.width,
+                is_cancelled=lambda: self._cancel,
+            )
+        except (OSError, ThumbnailError) as e:
+            self.thumbnails_failed.emit(self.video_path, str(e))
+            return
+        self.thumbnails_ready.emit(self.video_path, paths)
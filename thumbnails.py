@@ -0,0 +1,258 @@
+"""
+Chapter thumbnails from one FFmpeg pass, kept in a size-bounded on-disk cache.
+
+The requested timestamps go into a ``select`` expression: the first frame at or
+after each timestamp is picked, scaled down and written as a JPEG, and
+``showinfo`` reports which pts each output frame had. Thousands of timestamps
+are split into passes of ``THUMBNAILS_PER_PASS``, so the expression stays far
+below the OS limit on one argument; each pass seeks to just before its first
+timestamp. By default only
+keyframes are decoded (``-skip_frame nokey``), so a two-hour file costs little
+more than reading it; chapter points after a cut usually start on a keyframe
+anyway. Thumbnails are cached under ``default_cache_dir()/thumbs`` keyed by file
+identity, timestamp and width, so only new chapters are extracted, and the
+directory is pruned least recently used first.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import os
+import re
+import shutil
+import tempfile
+from bisect import bisect_left
+from collections.abc import Callable
+
+from ffmpeg_engine import ProcessJob, run_processes
+from scan_cache import default_cache_dir, file_identity, prune_cache_dir
+
+logger = logging.getLogger(__name__)
+
+_THUMB_FORMAT_VERSION = 1
+THUMBNAIL_WIDTH = 160
+DEFAULT_THUMBNAIL_CACHE_MAX_BYTES = 32 * 1024 * 1024
+# Decode this far past the last timestamp so it still finds a following keyframe.
+_TAIL_SECONDS = 30.0
+# Timestamps per FFmpeg pass: about 60 bytes of ``select`` each, well under the
+# 128 KiB Linux allows for a single argument.
+THUMBNAILS_PER_PASS = 500
+# A pass starting mid-file seeks this far before its first timestamp.
+_SEEK_MARGIN_SECONDS = 1.0
+
+_SHOWINFO_PTS = re.compile(r"pts_time:\s*(-?[\d.]+)")
+
+
+class ThumbnailError(Exception):
+    """FFmpeg failed to extract thumbnails."""
+
+    def __init__(self, message: str, *, stderr: str = "") -> None:
+        super().__init__(message)
+        self.stderr = stderr
+
+
+def thumbnail_dir() -> str:
+    return os.path.join(default_cache_dir(), "thumbs")
+
+
+def thumbnail_path(
+    video_path: str,
+    time_sec: float,
+    width: int = THUMBNAIL_WIDTH,
+    *,
+    keyframes_only: bool = True,
+    directory: str | None = None,
+) -> str:
+    """Cache path of the thumbnail for ``time_sec`` in ``video_path`` (it may not exist)."""
+    blob = json.dumps(
+        {
+            "v": _THUMB_FORMAT_VERSION,
+            "file": file_identity(video_path),
+            "t": round(float(time_sec), 3),
+            "width": int(width),
+            "keyframes": bool(keyframes_only),
+        },
+        sort_keys=True,
+    )
+    key = hashlib.sha256(blob.encode("utf-8")).hexdigest()
+    return os.path.join(directory or thumbnail_dir(), f"{key}.jpg")
+
+
+def build_select_expr(times: list[float]) -> str:
+    """
+    ``select`` expression passing the first frame at or after each of ``times``.
+
+    A frame passes for timestamp T when it is at or past T and the previously
+    selected frame (if any) was before T, so each timestamp yields one frame and
+    timestamps closer together than a frame share it.
+    """
+    terms = [
+        f"gte(t\\,{t:.3f})*(isnan(prev_selected_t)+lt(prev_selected_t\\,{t:.3f}))"
+        for t in sorted(set(times))
+    ]
+    return "+".join(terms) or "0"
+
+
+def build_thumbnail_command(
+    video_path: str,
+    times: list[float],
+    output_pattern: str,
+    *,
+    width: int = THUMBNAIL_WIDTH,
+    keyframes_only: bool = True,
+) -> list[str]:
+    """
+    FFmpeg command writing the thumbnails of ``times`` to ``output_pattern``.
+
+    The input is seeked to just before the earliest timestamp; ``-copyts`` keeps
+    ``select`` and ``showinfo`` on file time.
+    """
+    cmd = ["ffmpeg", "-hide_banner", "-nostats"]
+    if keyframes_only:
+        cmd += ["-skip_frame", "nokey"]
+    start = max(0.0, min(times) - _SEEK_MARGIN_SECONDS) if times else 0.0
+    if start > 0:
+        cmd += ["-ss", f"{start:.3f}", "-copyts"]
+    if times:
+        cmd += ["-t", f"{max(times) + _TAIL_SECONDS - start:.3f}"]
+    cmd += [
+        "-i",
+        video_path,
+        "-an",
+        "-sn",
+        "-dn",
+        "-vf",
+        f"select='{build_select_expr(times)}',scale={int(width)}:-2,showinfo",
+        "-vsync",
+        "passthrough",
+        "-q:v",
+        "5",
+        "-y",
+        output_pattern,
+    ]
+    return cmd
+
+
+def match_frames(times: list[float], frame_pts: list[float]) -> dict[float, int]:
+    """
+    Index into ``frame_pts`` (sorted) of the frame shown for each timestamp.
+
+    That is the first frame at or after it, or the last frame when the file ends
+    first. Timestamps with no frames at all are left out.
+    """
+    out: dict[float, int] = {}
+    if not frame_pts:
+        return out
+    for t in times:
+        # Millisecond tolerance: showinfo rounds pts_time, timestamps are rounded too.
+        i = bisect_left(frame_pts, t - 0.0005)
+        out[t] = min(i, len(frame_pts) - 1)
+    return out
+
+
+def extract_thumbnails(
+    video_path: str,
+    times: list[float],
+    *,
+    width: int = THUMBNAIL_WIDTH,
+    keyframes_only: bool = True,
+    directory: str | None = None,
+    max_bytes: int = DEFAULT_THUMBNAIL_CACHE_MAX_BYTES,
+    is_cancelled: Callable[[], bool] | None = None,
+) -> dict[float, str]:
+    """
+    Return ``{time: jpeg path}`` for each of ``times``, extracting missing ones.
+
+    Cached thumbnails are touched (the cache is LRU by mtime); missing ones come
+    from one FFmpeg run per ``THUMBNAILS_PER_PASS`` timestamps, after which the
+    cache is pruned to ``max_bytes``. A cancelled run returns what was cached
+    or extracted before it; a failed run raises ``ThumbnailError``.
+    """
+    directory = directory or thumbnail_dir()
+    result: dict[float, str] = {}
+    missing: list[float] = []
+    for t in times:
+        path = thumbnail_path(
+            video_path, t, width, keyframes_only=keyframes_only, directory=directory
+        )
+        if os.path.isfile(path):
+            try:
+                os.utime(path)
+            except OSError:
+                pass
+            result[t] = path
+        else:
+            missing.append(t)
+    if not missing:
+        return result
+
+    os.makedirs(directory, exist_ok=True)
+    pending = sorted(set(missing))
+    for first in range(0, len(pending), THUMBNAILS_PER_PASS):
+        batch = pending[first : first + THUMBNAILS_PER_PASS]
+        if not _extract_pass(
+            video_path, batch, result, width, keyframes_only, directory, is_cancelled
+        ):
+            break
+
+    removed = prune_cache_dir(directory, max_bytes, suffix=".jpg")
+    if removed:
+        logger.debug("Pruned %d thumbnails from %s", removed, directory)
+    # A cap smaller than one file's thumbnails evicts some of what was just written.
+    return {t: p for t, p in result.items() if os.path.isfile(p)}
+
+
+def _extract_pass(
+    video_path: str,
+    times: list[float],
+    result: dict[float, str],
+    width: int,
+    keyframes_only: bool,
+    directory: str,
+    is_cancelled: Callable[[], bool] | None,
+) -> bool:
+    """Extract ``times`` into the cache with one FFmpeg run; False if cancelled."""
+    work_dir = tempfile.mkdtemp(prefix="extract-", dir=directory)
+    try:
+        frame_pts: list[float] = []
+
+        def on_line(line: str) -> None:
+            if "showinfo" in line and "pts_time:" in line:
+                m = _SHOWINFO_PTS.search(line)
+                if m:
+                    frame_pts.append(float(m.group(1)))
+
+        cmd = build_thumbnail_command(
+            video_path,
+            times,
+            os.path.join(work_dir, "%06d.jpg"),
+            width=width,
+            keyframes_only=keyframes_only,
+        )
+        job = ProcessJob(cmd, on_line=on_line)
+        run_processes([job], is_cancelled)
+        if job.error is not None:
+            raise job.error
+        if job.cancelled:
+            return False
+        if job.returncode != 0:
+            raise ThumbnailError(
+                f"ffmpeg exited with code {job.returncode}",
+                stderr="".join(job.tail)[-8000:],
+            )
+
+        for t, index in match_frames(times, frame_pts).items():
+            frame = os.path.join(work_dir, f"{index + 1:06d}.jpg")
+            if not os.path.isfile(frame):
+                continue
+            path = thumbnail_path(
+                video_path, t, width, keyframes_only=keyframes_only, directory=directory
+            )
+            # Several timestamps may share a frame, so copy rather than move.
+            shutil.copyfile(frame, path)
+            result[t] = path
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    return True
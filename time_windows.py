@@ -4,6 +4,8 @@ from __future__ import annotations
 
 import logging
 import re
+from bisect import bisect_right
+from collections.abc import Iterable
 from typing import Final
 
 logger = logging.getLogger(__name__)
@@ -62,6 +64,7 @@ def expand_scan_time_windows(time_string: str, duration_sec: float) -> list[tupl
     the end of the file (same ``HH:MM:SS`` integer parsing as fixed times).
 
     When ``duration_sec`` is unknown (<= 0), ``-$END-`` segments are skipped.
+    The result is sorted, merged and clipped by ``merge_time_windows``.
     """
     if not time_string or not time_string.strip():
         return []
@@ -97,4 +100,50 @@ def expand_scan_time_windows(time_string: str, duration_sec: float) -> list[tupl
                 out.append((start, end))
         except (ValueError, TypeError) as e:
             logger.warning("Failed to parse time range %r: %s", pair, e)
+    return merge_time_windows(out, duration_sec)
+
+
+def merge_time_windows(
+    windows: Iterable[tuple[float, float]],
+    duration_sec: float = 0.0,
+) -> list[tuple[float, float]]:
+    """
+    Sort ``windows``, clip them to ``[0, duration_sec]`` and merge any that overlap
+    or touch, so each second is scanned at most once.
+
+    When ``duration_sec`` is unknown (<= 0) only the start is clipped. Empty
+    windows are dropped.
+    """
+    out: list[tuple[float, float]] = []
+    for lo, hi in sorted((float(lo), float(hi)) for lo, hi in windows):
+        lo = max(0.0, lo)
+        if duration_sec > 0:
+            hi = min(hi, float(duration_sec))
+        if hi <= lo:
+            continue
+        if out and lo <= out[-1][1]:
+            out[-1] = (out[-1][0], max(out[-1][1], hi))
+        else:
+            out.append((lo, hi))
     return out
+
+
+class TimeWindowSet:
+    """
+    Disjoint time windows with a bisection lookup: ``t in windows`` costs
+    O(log windows) instead of testing every window. Bounds are inclusive.
+    """
+
+    def __init__(self, windows: Iterable[tuple[float, float]]) -> None:
+        self.windows = merge_time_windows(windows)
+        self._starts = [lo for lo, _hi in self.windows]
+
+    def __contains__(self, t: float) -> bool:
+        i = bisect_right(self._starts, t) - 1
+        return i >= 0 and t <= self.windows[i][1]
+
+    def __bool__(self) -> bool:
+        return bool(self.windows)
+
+    def __len__(self) -> int:
+        return len(self.windows)
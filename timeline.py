@@ -1,6 +1,33 @@
-from PySide6.QtCore import QPointF, Signal, Qt
-from PySide6.QtGui import QColor, QPainter, QPen
-from PySide6.QtWidgets import QSizePolicy, QWidget
+from bisect import bisect_left, bisect_right
+from html import escape
+
+from PySide6.QtCore import QEvent, QPointF, QRect, QRectF, Qt, QUrl, Signal
+from PySide6.QtGui import QColor, QPainter, QPen, QPixmap
+from PySide6.QtWidgets import QSizePolicy, QToolTip, QWidget
+
+from detector import format_timestamp
+
+
+def marker_columns(times: list[float], start: float, span: float, width: int) -> list[int]:
+    """
+    Distinct pixel columns for the sorted ``times`` inside ``[start, start + span]``.
+
+    Thousands of candidate events collapse to at most ``width`` lines, and only
+    the visible slice of ``times`` is looked at (found by bisection).
+    """
+    if width <= 0 or span <= 0:
+        return []
+    lo = bisect_left(times, start)
+    hi = bisect_right(times, start + span)
+    scale = width / span
+    columns: list[int] = []
+    last = -1
+    for t in times[lo:hi]:
+        x = min(int((t - start) * scale), width - 1)
+        if x != last:
+            columns.append(x)
+            last = x
+    return columns
 
 
 class ChapterTimeline(QWidget):
@@ -10,6 +37,9 @@ class ChapterTimeline(QWidget):
     """True when a drag-scrub begins; False on release (if a scrub occurred)."""
 
     _drag_threshold_px = 4
+    _hover_radius_px = 6
+    _zoom_step = 1.25
+    _min_view_seconds = 5.0
 
     def __init__(self, parent=None):
         super().__init__(parent)
@@ -18,68 +48,208 @@ class ChapterTimeline(QWidget):
         self.setMinimumHeight(20)
         self.setMaximumHeight(24)
         self.setMouseTracking(True)
+        self.setToolTip("Wheel: zoom · Shift+wheel: pan · Middle-click: whole file")
 
         self.chapter_times = []
-        self.video_duration = 1
+        self.preview_times = []
+        # Chapter time -> thumbnail image, shown when hovering near that marker.
+        self.thumbnails: dict[float, str] = {}
+        self._video_duration = 1
         self.playhead_time = 0
+        # Visible range in seconds; (0, duration) unless zoomed in.
+        self.view_start = 0.0
+        self.view_span = None
+
+        # Background, preview and chapter markers, rebuilt only when they or the
+        # size/zoom change; playhead moves repaint just the strips they touch.
+        self._layer: QPixmap | None = None
+        self._playhead_x = 0
 
         self._scrub_active = False
         self._press_pos: QPointF | None = None
 
+    @property
+    def video_duration(self):
+        return self._video_duration
+
+    @video_duration.setter
+    def video_duration(self, value):
+        self._video_duration = max(value, 1)
+        self._clamp_view()
+        self._invalidate()
+
     def set_chapters(self, chapter_times, video_duration):
         """chapter_times: list of floats (in seconds)"""
-        self.chapter_times = chapter_times
-        self.video_duration = max(video_duration, 1)
+        self.chapter_times = sorted(chapter_times)
+        self.video_duration = video_duration
+
+    def set_preview_chapters(self, preview_times):
+        """Provisional markers (for example from a scan still running), drawn dimmer."""
+        self.preview_times = sorted(preview_times)
+        self._invalidate()
+
+    def set_thumbnails(self, thumbnails: dict[float, str]) -> None:
+        self.thumbnails = dict(thumbnails)
+
+    def reset_zoom(self) -> None:
+        self.view_start = 0.0
+        self.view_span = None
+        self._invalidate()
+
+    def _view(self) -> tuple[float, float]:
+        span = self.view_span or self._video_duration
+        return self.view_start, span
+
+    def _clamp_view(self) -> None:
+        if self.view_span is None:
+            return
+        duration = self._video_duration
+        span = max(min(self._min_view_seconds, duration), min(self.view_span, duration))
+        if span >= duration:
+            self.view_start, self.view_span = 0.0, None
+            return
+        self.view_span = span
+        self.view_start = max(0.0, min(self.view_start, duration - span))
+
+    def _invalidate(self) -> None:
+        self._layer = None
+        self._playhead_x = self._x_at_time(self.playhead_time)
         self.update()
 
+    def _x_at_time(self, t: float) -> int:
+        start, span = self._view()
+        w = self.width()
+        x = int(((t - start) / span) * w) if span else 0
+        return max(0, min(x, w - 1))
+
     def _time_at_x(self, x: float) -> float:
         w = self.width()
-        if w <= 0 or not self.video_duration:
+        if w <= 0 or not self._video_duration:
             return 0.0
+        start, span = self._view()
         rel = max(0.0, min(1.0, x / w))
-        return rel * self.video_duration
+        return start + rel * span
 
     def _emit_seek_for_event(self, event) -> None:
         seek_time = self._time_at_x(event.position().x())
         self.seekRequested.emit(seek_time)
 
-    def paintEvent(self, event):
-        painter = QPainter(self)
+    def _chapter_near_x(self, x: float) -> float | None:
+        """The chapter marker closest to ``x`` within ``_hover_radius_px``, if any."""
+        times = self.chapter_times
+        i = bisect_left(times, self._time_at_x(x))
+        best = None
+        for t in times[max(i - 1, 0) : i + 1]:
+            dx = abs(self._x_at_time(t) - x)
+            if dx <= self._hover_radius_px and (best is None or dx < best[0]):
+                best = (dx, t)
+        return best[1] if best else None
+
+    def _preview_html(self, x: float) -> str | None:
+        t = self._chapter_near_x(x)
+        if t is None:
+            return None
+        label = f"Chapter {bisect_left(self.chapter_times, t) + 1} · {format_timestamp(t)}"
+        path = self.thumbnails.get(t)
+        if not path:
+            return escape(label)
+        src = escape(QUrl.fromLocalFile(path).toString(), quote=True)
+        return f'<img src="{src}"><br>{escape(label)}'
+
+    def _render_layer(self) -> QPixmap:
         width = self.width()
         height = self.height()
+        ratio = self.devicePixelRatioF()
+        layer = QPixmap(max(1, int(width * ratio)), max(1, int(height * ratio)))
+        layer.setDevicePixelRatio(ratio)
+        layer.fill(QColor(40, 0, 0))  # Dark red background
 
-        painter.fillRect(event.rect(), QColor(40, 0, 0))  # Dark red background
+        painter = QPainter(layer)
+        start, span = self._view()
 
-        # chapter markers
-        pen = QPen(QColor(255, 100, 100))
-        pen.setWidth(2)
+        # provisional markers from a running scan
+        pen = QPen(QColor(255, 200, 120, 160))
+        pen.setWidth(1)
+        pen.setStyle(Qt.PenStyle.DashLine)
         painter.setPen(pen)
-
-        for chapter in self.chapter_times:
-            x = int((chapter / self.video_duration) * width)
-            x = max(0, min(x, width - 1))
+        for x in marker_columns(self.preview_times, start, span, width):
             painter.drawLine(x, 0, x, height)
 
-        # Playhead
-        playhead_x = int((self.playhead_time / self.video_duration) * width)
-        playhead_x = max(0, min(playhead_x, width - 1))
-        pen = QPen(QColor(0, 255, 255))  # Cyan
+        # chapter markers
+        pen = QPen(QColor(255, 100, 100))
         pen.setWidth(2)
         painter.setPen(pen)
-        painter.drawLine(playhead_x, 0, playhead_x, height)
+        for x in marker_columns(self.chapter_times, start, span, width):
+            painter.drawLine(x, 0, x, height)
 
         pen = QPen(QColor(200, 200, 200, 100))
         pen.setWidth(1)
         painter.setPen(pen)
         painter.drawLine(0, height - 1, width, height - 1)
+        painter.end()
+        return layer
+
+    def paintEvent(self, event):
+        if self._layer is None:
+            self._layer = self._render_layer()
+        painter = QPainter(self)
+        target = QRectF(event.rect())
+        ratio = self._layer.devicePixelRatio()
+        source = QRectF(target.topLeft() * ratio, target.size() * ratio)
+        painter.drawPixmap(target, self._layer, source)
+
+        # Playhead
+        start, span = self._view()
+        if start <= self.playhead_time <= start + span:
+            pen = QPen(QColor(0, 255, 255))  # Cyan
+            pen.setWidth(2)
+            painter.setPen(pen)
+            painter.drawLine(self._playhead_x, 0, self._playhead_x, self.height())
+
+    def _playhead_strip(self, x: int) -> QRect:
+        return QRect(x - 2, 0, 5, self.height())
+
+    def event(self, event):
+        if event.type() == QEvent.Type.ToolTip:
+            html = self._preview_html(event.pos().x())
+            if html:
+                QToolTip.showText(event.globalPos(), html, self)
+                return True
+        return super().event(event)
 
     def sizeHint(self):
         return self.parent().size() if self.parent() else super().sizeHint()
 
+    def resizeEvent(self, event):
+        self._invalidate()
+        super().resizeEvent(event)
+
+    def wheelEvent(self, event):
+        delta = event.angleDelta()
+        start, span = self._view()
+        if event.modifiers() & Qt.KeyboardModifier.ShiftModifier or delta.x():
+            steps = (delta.x() or delta.y()) / 120.0
+            if self.view_span is not None:
+                self.view_start -= steps * span * 0.1
+        elif delta.y():
+            anchor = self._time_at_x(event.position().x())
+            rel = (anchor - start) / span if span else 0.0
+            factor = self._zoom_step ** (-delta.y() / 120.0)
+            self.view_span = span * factor
+            self.view_start = anchor - rel * self.view_span
+        else:
+            return super().wheelEvent(event)
+        self._clamp_view()
+        self._invalidate()
+        event.accept()
+
     def mousePressEvent(self, event):
+        if event.button() == Qt.MouseButton.MiddleButton:
+            self.reset_zoom()
+            return
         if event.button() != Qt.MouseButton.LeftButton:
             return super().mousePressEvent(event)
-        if not self.video_duration or self.width() <= 0:
+        if not self._video_duration or self.width() <= 0:
             return
 
         self._press_pos = QPointF(event.position())
@@ -87,7 +257,7 @@ class ChapterTimeline(QWidget):
         self._emit_seek_for_event(event)
 
     def mouseMoveEvent(self, event):
-        if not self.video_duration or self.width() <= 0:
+        if not self._video_duration or self.width() <= 0:
             return super().mouseMoveEvent(event)
 
         if event.buttons() & Qt.MouseButton.LeftButton:
@@ -99,6 +269,13 @@ class ChapterTimeline(QWidget):
             if self._press_pos is not None:
                 self._emit_seek_for_event(event)
                 return
+        elif QToolTip.isVisible():
+            # Follow the cursor from marker to marker once a preview is up.
+            html = self._preview_html(event.position().x())
+            if html:
+                QToolTip.showText(event.globalPosition().toPoint(), html, self)
+            else:
+                QToolTip.hideText()
 
         super().mouseMoveEvent(event)
 
@@ -113,5 +290,17 @@ class ChapterTimeline(QWidget):
         super().mouseReleaseEvent(event)
 
     def set_playhead_time(self, time_sec):
-        self.playhead_time = min(max(time_sec, 0), self.video_duration)
-        self.update()
+        self.playhead_time = min(max(time_sec, 0), self._video_duration)
+        start, span = self._view()
+        if self.view_span is not None and not start <= self.playhead_time <= start + span:
+            # Zoomed in and playback left the view: page so the playhead stays visible.
+            self.view_start = self.playhead_time - span * 0.1
+            self._clamp_view()
+            self._invalidate()
+            return
+        x = self._x_at_time(self.playhead_time)
+        if x == self._playhead_x:
+            return
+        self.update(self._playhead_strip(self._playhead_x))
+        self._playhead_x = x
+        self.update(self._playhead_strip(x))